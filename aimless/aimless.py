@@ -14,7 +14,10 @@ you would prefer a different minimum log level.
 
 import ConfigParser
 from ConfigParser import NoOptionError
+from contextlib import contextmanager
+import copy
 import csv
+import errno
 import logging
 from logging.handlers import RotatingFileHandler
 import os
@@ -23,11 +26,23 @@ import random
 import shutil
 from string import Template
 import sys
+import threading
 import time
 import datetime
-import math
-from common import enum, cmakedir
-from torque import TorqueJob, TorqueSubmissionHandler, is_running
+import numpy as np
+import pipes
+from common import enum, cmakedir, stage_file, InvalidDataError
+from torque import (TorqueJob, TorqueSubmissionHandler, CachedStatusHandler,
+                    is_running, array_job_ids, DEF_STAT_TTL)
+from watch import FileWatcher, read_exit_status
+from local import LocalSubmissionHandler
+from archive import Archiver, ArchiveError, CODECS, DEF_MAX_COMPRESSORS
+from restart import Restart
+from dumpave import read_record, RecordTail
+from journal import Journal, EVENTS, replay
+from timing import PathTimings, PHASES, TIMINGS_KEY, write_timings_csv
+from results import ResultStore
+from mdcrd import MdcrdReader, read_natoms
 import optparse
 
 TEN_MB = 10485760
@@ -59,8 +74,20 @@ RES_DIR_FMT = "\t%-8s: %s%s"
 SUM_FMT = "%-8s: %2d%s"
 ACC_KEY = "accepted"
 DEF_WAIT_SECS = 10
+DEF_STAT_SECS = 300
 TSTAMP_FMT = '%Y-%m-%d %H:%M:%S'
-FLOAT_FMT = " % 11.7f"
+
+# Job Modes #
+# stage: submit each stage when the previous one has finished
+# depend: submit a whole path up front as a Torque dependency chain
+# path: run a whole path in one job using the node-side runner
+JMODES = enum(STAGE='stage', DEPEND='depend', PATH='path')
+REVVEL_CMD = 'aimless_revvel'
+
+# Backends #
+# torque: submit jobs to the queue with qsub
+# local: run jobs in a bounded pool of processes on this machine
+BACKENDS = enum(TORQUE='torque', LOCAL='local')
 
 # Basin Constants #
 # Three possible basin results
@@ -71,6 +98,9 @@ RC1_FWD_KEY = 'RC1fw'
 RC1_BACK_KEY = 'RC1bw'
 RC2_FWD_KEY = 'RC2fw'
 RC2_BACK_KEY = 'RC2bw'
+# The step at which a segment was stopped after committing to a basin
+COMMIT_FWD_KEY = 'commitfw'
+COMMIT_BACK_KEY = 'commitbw'
 RC1_LOW_A_KEY = 'RC1loA'
 RC1_HIGH_A_KEY = 'RC1hiA'
 RC2_LOW_A_KEY = 'RC2loA'
@@ -90,9 +120,26 @@ POSTDT_RST_NAME = "postdt.rst"
 POSTFWD_RST_NAME = "postforward.rst"
 POSTBACK_RST_NAME = "postbackward.rst"
 AMBER_JOB_TPL = 'amber_job.tpl'
+PATH_JOB_TPL = 'path_job.tpl'
+# The stage name journaled for a whole-path job
+PATH_STAGE = 'path'
+JOURNAL_NAME = 'journal.jsonl'
 OUT_DIR = 'output'
+# Each path runs in its own directory under WORK_DIR, which is renamed into
+# OUT_DIR once the path is finished
+WORK_DIR = 'work'
+PATH_DIR_FMT = '%02d'
+# The chain's target directory as seen from a path directory
+TGT_FROM_PATH = os.path.join(os.pardir, os.pardir)
+CHAIN_DIR_FMT = 'chain%02d'
+# CHAIN_DIR_FMT for the chain matching a job array index, in shell syntax
+CHAIN_ARRAY_DIR = 'chain$(printf %02d $PBS_ARRAYID)'
+# PATH_DIR_FMT for the path matching a job array index offset by the given
+# number, in shell syntax
+PATH_ARRAY_DIR_FMT = '$(printf %%02d $((PBS_ARRAYID + %d)))'
 
 # Constant Files #
+CONS_RST_NAME = "cons.rst"
 BACK_CONS_NAME = "cons_back.dat"
 FWD_CONS_NAME = "cons_fwd.dat"
 DT_CONS_NAME = "cons_dt.dat"
@@ -115,8 +162,41 @@ FWD_MDCRD_NAME = "forward.mdcrd"
 DT_MDCRD_NAME = "dt.mdcrd"
 STARTER_MDCRD_NAME = "starter.mdcrd"
 
+# Completion Sentinels #
+# Written by the job script with the job's exit status when it finishes
+DONE_EXT = ".done"
+BACK_DONE_NAME = "backward" + DONE_EXT
+FWD_DONE_NAME = "forward" + DONE_EXT
+DT_DONE_NAME = "dt" + DONE_EXT
+STARTER_DONE_NAME = "starter" + DONE_EXT
+
+# Whole-Path Jobs #
+PATH_CFG_NAME = "path.ini"
+PATH_OUT_NAME = "path.out"
+PATH_DONE_NAME = "path" + DONE_EXT
+PATH_RESULT_NAME = "path_result.ini"
+RESULT_SEC = 'result'
+
+# Stages #
+STAGES = enum(STARTER='starter', DT='dt', FWD='forward', BACK='backward')
+# The files for each stage's job: the shooter (None when the path's chosen
+# shooter is used), the directional restart, input, output, and mdcrd files.
+STAGE_FILES = {
+    STAGES.STARTER: (None, FWD_RST_NAME, STARTER_IN_NAME, STARTER_OUT_NAME,
+                     STARTER_MDCRD_NAME),
+    STAGES.DT: (FWD_RST_NAME, POSTDT_RST_NAME, DT_IN_NAME, DT_OUT_NAME,
+                DT_MDCRD_NAME),
+    STAGES.FWD: (POSTDT_RST_NAME, POSTFWD_RST_NAME, FWD_IN_NAME, FWD_OUT_NAME,
+                 FWD_MDCRD_NAME),
+    STAGES.BACK: (POSTFWD_RST_NAME, POSTBACK_RST_NAME, BACK_IN_NAME,
+                  BACK_OUT_NAME, BACK_MDCRD_NAME),
+}
+
 # Config Keys #
 NUM_PATHS_KEY = 'numpaths'
+NUM_CHAINS_KEY = 'numchains'
+STAT_TTL_KEY = 'statttl'
+ARRAY_JOBS_KEY = 'arrayjobs'
 TOTAL_STEPS_KEY = 'totalsteps'
 BW_STEPS_KEY = 'bwsteps'
 FW_STEPS_KEY = 'fwsteps'
@@ -135,12 +215,26 @@ WALLTIME_KEY = 'walltime'
 MAIL_KEY = 'mail'
 INFILE_KEY = 'infile'
 OUTFILE_KEY = 'outfile'
-
-# Cleanup #
-# Files generated by a path run
+DONE_FILE_KEY = 'donefile'
+PRE_CMDS_KEY = 'pre_cmds'
+PATH_CFG_KEY = 'pathcfg'
+PATH_NUM_KEY = 'pathnum'
+JOB_MODE_KEY = 'jobmode'
+COMMIT_DWELL_KEY = 'commitdwell'
+DUMP_STEPS_KEY = 'dumpsteps'
+BACKEND_KEY = 'backend'
+MAX_JOBS_KEY = 'maxjobs'
+COMPRESS_KEY = 'compress'
+COMPRESSORS_KEY = 'compressors'
+
+# Path Files #
+# Files generated in a path's directory by a path run
 GEN_FILES = [BACK_OUT_NAME, FWD_OUT_NAME, DT_OUT_NAME, STARTER_OUT_NAME,
              BACK_MDCRD_NAME, FWD_MDCRD_NAME, DT_MDCRD_NAME, STARTER_MDCRD_NAME,
-             BACK_CONS_NAME, FWD_CONS_NAME, DT_CONS_NAME]
+             BACK_CONS_NAME, FWD_CONS_NAME, DT_CONS_NAME,
+             BACK_DONE_NAME, FWD_DONE_NAME, DT_DONE_NAME, STARTER_DONE_NAME]
+# Additional files generated by a whole-path job
+PATH_FILES = [PATH_CFG_NAME, PATH_DONE_NAME, PATH_RESULT_NAME]
 
 # Exceptions #
 
@@ -155,6 +249,43 @@ class EnvError(Exception):
 # Logic #
 
 
+class TemplateCache(object):
+    """Holds compiled templates keyed by their location.  A template is only
+    read again once its modification time (or size) changes, saving an
+    open and read of every template on each job submission.
+    """
+
+    def __init__(self):
+        self._tpls = {}
+        self._lock = threading.Lock()
+
+    def get(self, tpl_loc):
+        """Returns the compiled Template for the given location.  Raises
+        OSError or IOError if the template cannot be read.
+
+        tpl_loc -- The location of the template.
+        """
+        tpl_stat = os.stat(tpl_loc)
+        stamp = (tpl_stat.st_mtime, tpl_stat.st_size)
+        with self._lock:
+            cached = self._tpls.get(tpl_loc)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(tpl_loc, 'r') as tpl_file:
+            tpl = Template(tpl_file.read())
+        with self._lock:
+            self._tpls[tpl_loc] = (stamp, tpl)
+        return tpl
+
+    def clear(self):
+        "Drops all of the cached templates."
+        with self._lock:
+            self._tpls.clear()
+
+# The templates shared by write_tpl_files and every AimlessShooter
+TPL_CACHE = TemplateCache()
+
+
 def calc_params(total_steps):
     """Returns a dict with calculated values based on the given number of total
     steps.
@@ -168,7 +299,7 @@ def calc_params(total_steps):
 
 # Associates the template with the target file name and a description of its purpose.
 TPL_LIST = [
-    ("cons.tpl", "cons.rst",
+    ("cons.tpl", CONS_RST_NAME,
      "force constants are zero - this is just to get final bond lengths"),
     ("instarter.tpl", STARTER_IN_NAME,
      "generate the velocities for this shooting point"),
@@ -178,37 +309,166 @@ TPL_LIST = [
 ]
 
 
-def write_tpl_files(tpl_dir, tgt_dir, params):
+def write_tpl_files(tpl_dir, tgt_dir, params, tpl_cache=TPL_CACHE):
     """Writes the templates in tpl_dir to tgt_dir using params as the source
     for template values
 
     tpl_dir -- The directory containing the templates.
     tgt_dir -- The target directory for the filled templates.
     params -- A dict of parameters to use when filling the templates.
+    tpl_cache -- The TemplateCache to read the templates through (defaults
+                 to the shared TPL_CACHE).
     """
     for tpl_name, tgt_name, tpl_desc in TPL_LIST:
         tpl_loc = os.path.join(tpl_dir, tpl_name)
         try:
-            with open(tpl_loc, 'r') as tpl_file:
-                tpl = Template(tpl_file.read())
-                result = tpl.safe_substitute(params)
-                tgt_loc = os.path.join(tgt_dir, tgt_name)
-                try:
-                    with open(tgt_loc, 'w') as tgt_file:
-                        tgt_file.write(result)
-                except (OSError, IOError) as e:
-                    raise EnvError(
-                        "Couldn't write target '%s': %s" % (tgt_loc, e))
+            tpl = tpl_cache.get(tpl_loc)
         except (OSError, IOError) as e:
             raise TemplateError(
                 "Couldn't read template '%s' (this template creates '%s' for '%s'): %s" % (
                     tpl_loc, tgt_name, tpl_desc, e))
+        result = tpl.safe_substitute(params)
+        tgt_loc = os.path.join(tgt_dir, tgt_name)
+        try:
+            with open(tgt_loc, 'w') as tgt_file:
+                tgt_file.write(result)
+        except (OSError, IOError) as e:
+            raise EnvError(
+                "Couldn't write target '%s': %s" % (tgt_loc, e))
+
+
+def done_loc(out_loc):
+    """Returns the location of the completion sentinel for the job writing
+    to the given output location."""
+    return os.path.splitext(out_loc)[0] + DONE_EXT
+
+
+def rev_vel(fwd_loc, back_loc):
+    """Writes a copy of the given forward restart file to back_loc with all
+    of the velocities reversed.  The coordinate block is copied through
+    unchanged.
+
+    fwd_loc -- The restart file to read.
+    back_loc -- The restart file to write.
+    """
+    rst = Restart.read(fwd_loc)
+    if rst.vels is None:
+        raise InvalidDataError("No velocities in '%s'" % fwd_loc)
+    np.negative(rst.vels, out=rst.vels)
+    rst.title = "%s Made by %s at %s" % (rst.title.split()[0],
+                                         os.path.basename(__file__),
+                                         datetime.datetime.now().
+                                         strftime(TSTAMP_FMT))
+    rst.write(back_loc)
+
+
+def clear_done(out_loc):
+    """Removes the completion sentinel for the job writing to the given
+    output location if one exists."""
+    if os.path.exists(done_loc(out_loc)):
+        os.remove(done_loc(out_loc))
+
+
+def write_path_cfg(aims, shooter, cfg_loc):
+    """Writes the settings the aimless_path runner needs to run a path for
+    the given AimlessShooter.
+
+    aims -- The AimlessShooter running the path.
+    shooter -- The chosen shooter file for the path.
+    cfg_loc -- The location of the file to write.
+    """
+    config = ConfigParser.ConfigParser()
+    config.optionxform = str
+    config.add_section(MAIN_SEC)
+    config.set(MAIN_SEC, TGT_DIR_KEY, aims.tgt_dir)
+    config.set(MAIN_SEC, PATH_NUM_KEY, str(aims.cur_path))
+    config.set(MAIN_SEC, TPL_DIR_KEY, os.path.abspath(aims.tpl_dir))
+    config.set(MAIN_SEC, TOPO_KEY, os.path.abspath(aims.topo_loc))
+    config.set(MAIN_SEC, SHOOTER_KEY, os.path.abspath(shooter))
+    for sec_name, params in ((JOBS_SEC, aims.job_params),
+                             (BASINS_SEC, aims.bp)):
+        config.add_section(sec_name)
+        for key, val in params.items():
+            config.set(sec_name, key, str(val))
+    with open(cfg_loc, 'w') as cfg_file:
+        config.write(cfg_file)
+
+
+def read_path_cfg(cfg_loc):
+    """Reads a file written by write_path_cfg, returning the ConfigParser
+    instance."""
+    config = ConfigParser.ConfigParser()
+    config.optionxform = str
+    if not config.read(cfg_loc):
+        raise EnvError("Couldn't read path configuration '%s'" % cfg_loc)
+    return config
+
+
+def write_path_result(result, result_loc):
+    """Atomically writes the basin results for a path to the given location.
+
+    result -- The result of calc_basins.
+    result_loc -- The location of the file to write.
+    """
+    config = ConfigParser.ConfigParser()
+    config.optionxform = str
+    config.add_section(RESULT_SEC)
+    for key, val in result.items():
+        config.set(RESULT_SEC, key, str(val))
+    tmp_loc = result_loc + ".tmp"
+    with open(tmp_loc, 'w') as result_file:
+        config.write(result_file)
+    os.rename(tmp_loc, result_loc)
+
+
+def read_path_result(result_loc):
+    """Reads the basin results written by write_path_result."""
+    config = ConfigParser.ConfigParser()
+    config.optionxform = str
+    if not config.read(result_loc):
+        raise EnvError("Path job did not write results to '%s'" % result_loc)
+    result = {}
+    for key, val in config.items(RESULT_SEC):
+        if key in (BASIN_FWD_KEY, BASIN_BACK_KEY):
+            result[key] = val
+        else:
+            result[key] = float(val)
+    return result
 
 
 def init_dir(tgt_dir, coords_loc):
-    """Copies the coordinates location to x1 and x2."""
-    shutil.copy2(coords_loc, os.path.join(tgt_dir, XONE_RST))
-    shutil.copy2(coords_loc, os.path.join(tgt_dir, XTWO_RST))
+    """Stages the coordinates location as x1 and x2.  Neither is ever
+    written in place, so they may be links to the coordinates."""
+    stage_file(coords_loc, os.path.join(tgt_dir, XONE_RST), mutable=False)
+    stage_file(coords_loc, os.path.join(tgt_dir, XTWO_RST), mutable=False)
+
+
+class ReportTotals(object):
+    """The running totals shown at the end of the text report."""
+
+    def __init__(self):
+        self.total = 0
+        self.accepted = 0
+        self.both_a = 0
+        self.both_b = 0
+
+    def add(self, res):
+        "Counts the given path result."
+        self.total += 1
+        if ACC_KEY in res:
+            self.accepted += 1
+        if res[BASIN_FWD_KEY] == BRES.A and res[BASIN_BACK_KEY] == BRES.A:
+            self.both_a += 1
+        elif res[BASIN_FWD_KEY] == BRES.B and res[BASIN_BACK_KEY] == BRES.B:
+            self.both_b += 1
+
+    def write(self, tgt):
+        "Writes the totals to the given target."
+        tgt.write(SUM_FMT % ("Accepted", self.accepted, os.linesep))
+        tgt.write(SUM_FMT % ("Rejected", self.total - self.accepted,
+                             os.linesep))
+        tgt.write(SUM_FMT % ("Both A", self.both_a, os.linesep))
+        tgt.write(SUM_FMT % ("Both B", self.both_b, os.linesep))
 
 
 def write_text_report(pres, tgt=sys.stdout):
@@ -219,17 +479,9 @@ def write_text_report(pres, tgt=sys.stdout):
     Keyword arguments:
     tgt -- The target to write to (stdout by default)
     """
-    acc_count = 0
-    aa_count = 0
-    bb_count = 0
+    totals = ReportTotals()
     for path_id, res in pres.items():
-        if ACC_KEY in res:
-            acc_count += 1
-        if res[BASIN_FWD_KEY] == BRES.A and res[BASIN_BACK_KEY] == BRES.A:
-            aa_count += 1
-        elif res[BASIN_FWD_KEY] == BRES.B and res[BASIN_BACK_KEY] == BRES.B:
-            bb_count += 1
-
+        totals.add(res)
         tgt.write("%02d:%s" % (path_id, os.linesep))
         for dir_key in (BASIN_FWD_KEY, BASIN_BACK_KEY):
             tgt.write(RES_DIR_FMT % (dir_key,
@@ -238,10 +490,16 @@ def write_text_report(pres, tgt=sys.stdout):
                                  "Y" if ACC_KEY in res else "N",
                                  os.linesep))
     tgt.write(os.linesep)
-    tgt.write(SUM_FMT % ("Accepted", acc_count, os.linesep))
-    tgt.write(SUM_FMT % ("Rejected", len(pres) - acc_count, os.linesep))
-    tgt.write(SUM_FMT % ("Both A", aa_count, os.linesep))
-    tgt.write(SUM_FMT % ("Both B", bb_count, os.linesep))
+    totals.write(tgt)
+
+
+CSV_REPORT_HEADER = ["path", BASIN_FWD_KEY, BASIN_BACK_KEY, ACC_KEY]
+
+
+def csv_report_row(path_id, res):
+    "Returns the CSV report row for the given path result."
+    return [path_id, res[BASIN_FWD_KEY], res[BASIN_BACK_KEY],
+            "Y" if ACC_KEY in res else "N"]
 
 
 def write_csv_report(pres, tgt=sys.stdout, linesep=os.linesep):
@@ -253,10 +511,99 @@ def write_csv_report(pres, tgt=sys.stdout, linesep=os.linesep):
     tgt -- The target to write to (stdout by default)
     """
     csv_writer = csv.writer(tgt, lineterminator=linesep)
-    csv_writer.writerow(["path", BASIN_FWD_KEY, BASIN_BACK_KEY, ACC_KEY])
+    csv_writer.writerow(CSV_REPORT_HEADER)
     for path_id, res in pres.items():
-        csv_writer.writerow([path_id, res[BASIN_FWD_KEY], res[BASIN_BACK_KEY],
-                             "Y" if ACC_KEY in res else "N"])
+        csv_writer.writerow(csv_report_row(path_id, res))
+
+
+class CsvReportSink(object):
+    """Writes the CSV report a row at a time as each path finishes.  Every row
+    is synced to disk before add returns, so the report survives a crash."""
+
+    def __init__(self, loc, linesep=os.linesep):
+        """Sets up the initial state for this instance.
+
+        loc -- The location of the report.
+        linesep -- The line terminator (defaults to os.linesep).
+        """
+        self.loc = loc
+        self.linesep = linesep
+        self._lock = threading.Lock()
+
+    def _write(self, mode, rows):
+        with self._lock:
+            with open(self.loc, mode) as csv_tgt:
+                csv.writer(csv_tgt, lineterminator=self.linesep).writerows(
+                    rows)
+                csv_tgt.flush()
+                os.fsync(csv_tgt.fileno())
+
+    def start(self, pres):
+        """Starts the report over with the header and the results of the
+        paths already finished (e.g. recovered when resuming)."""
+        self._write('w', [CSV_REPORT_HEADER] +
+                    [csv_report_row(path_id, pres[path_id])
+                     for path_id in sorted(pres)])
+
+    def add(self, path_id, res):
+        "Appends the row for a finished path."
+        self._write('a', [csv_report_row(path_id, res)])
+
+
+class SummaryReportSink(object):
+    """Keeps the totals of the text report (accepted, rejected, both A, and
+    both B) in a small file that is rewritten atomically as each path
+    finishes."""
+
+    def __init__(self, loc):
+        """Sets up the initial state for this instance.
+
+        loc -- The location of the summary.
+        """
+        self.loc = loc
+        self.totals = ReportTotals()
+        self._lock = threading.Lock()
+
+    def _write(self):
+        tmp_loc = self.loc + ".tmp"
+        with open(tmp_loc, 'w') as sum_tgt:
+            self.totals.write(sum_tgt)
+            sum_tgt.flush()
+            os.fsync(sum_tgt.fileno())
+        os.rename(tmp_loc, self.loc)
+
+    def start(self, pres):
+        """Starts the totals over from the results of the paths already
+        finished (e.g. recovered when resuming)."""
+        with self._lock:
+            self.totals = ReportTotals()
+            for res in pres.values():
+                self.totals.add(res)
+            self._write()
+
+    def add(self, path_id, res):
+        "Counts a finished path."
+        with self._lock:
+            self.totals.add(res)
+            self._write()
+
+
+def start_sinks(sinks, pres):
+    """Starts each of the given report sinks with the results of the paths
+    already finished."""
+    for sink in sinks:
+        sink.start(pres)
+
+
+def feed_sinks(sinks, path_id, res):
+    """Hands a finished path's result to each of the given report sinks.  A
+    sink that can't be written to is logged rather than stopping the run."""
+    for sink in sinks:
+        try:
+            sink.add(path_id, res)
+        except (IOError, OSError), e:
+            logger.warn("Couldn't report path %d to '%s': %s" %
+                        (path_id, sink.loc, e))
 
 
 class AimlessShooter(object):
@@ -266,7 +613,10 @@ class AimlessShooter(object):
     """
 
     def __init__(self, tpl_dir, tgt_dir, topo_loc, job_params, basins_params,
-                 sub_handler=TorqueSubmissionHandler(), wait_secs=DEF_WAIT_SECS):
+                 sub_handler=TorqueSubmissionHandler(), wait_secs=DEF_WAIT_SECS,
+                 out_dir=None, stat_secs=DEF_STAT_SECS, job_mode=JMODES.STAGE,
+                 commit_dwell=None, journal=None, tpl_cache=TPL_CACHE,
+                 archiver=None):
         """Sets up the initial state for this instance.
 
         Positional Arguments:
@@ -282,45 +632,259 @@ class AimlessShooter(object):
         out -- The target for output (defaults to stdout)
         wait_secs -- The length of time to wait while polling jobs (defaults to
                      10 seconds).
+        out_dir -- The directory where finished paths are archived (defaults
+                   to 'output' in the target directory).
+        stat_secs -- The length of time to wait for completion sentinels
+                     before checking the queue as a safety net (defaults to
+                     300 seconds).
+        job_mode -- 'stage' to submit each stage once the previous one is
+                    finished, 'depend' to submit each path as a chain of
+                    dependent jobs, or 'path' to run each path in a single
+                    job (defaults to 'stage').
+        commit_dwell -- When set, the forward and backward jobs are watched
+                        while they run and cancelled once the reaction
+                        coordinates have stayed in basin A or B for this
+                        many steps (only in 'stage' mode; defaults to None,
+                        which runs every segment to the end).
+        journal -- The Journal recording the progress of this chain's paths
+                   (defaults to None, which keeps no journal).
+        tpl_cache -- The TemplateCache to read the job templates through
+                     (defaults to the shared TPL_CACHE).
+        archiver -- The Archiver that compresses the files of each path once
+                    it is archived (defaults to None, which leaves them as
+                    they are).
         """
-        self.tgt_dir = tgt_dir
+        self.tgt_dir = os.path.abspath(tgt_dir)
         self.tpl_dir = tpl_dir
+        self.tpl_cache = tpl_cache
+        self._base_params = None
+        self._base_job = None
+        self._natoms = None
         self.topo_loc = topo_loc
         self.job_params = job_params
         self.bp = basins_params
         self.sub_handler = sub_handler
         self.wait_secs = wait_secs
+        self.stat_secs = stat_secs
+        if job_mode not in (JMODES.STAGE, JMODES.DEPEND, JMODES.PATH):
+            raise CfgError("Unhandled job mode '%s'" % job_mode)
+        self.job_mode = job_mode
+        self.commit_dwell = commit_dwell
+        self.journal = journal
+        self.archiver = archiver
+        self.cur_path = None
+        # The working directory of the current path
+        self.path_dir = self.tgt_dir
+        # The path to continue and the jobs to re-adopt after recover()
+        self._resume = None
+        self._adopted = {}
+        self._done_stages = set()
+        self._commits = {}
+        # The timings of the current path and when each job was submitted
+        self.timings = None
+        self._submitted = {}
+        self.watcher = FileWatcher()
         self.x1_loc = self.tgtres(XONE_RST)
         self.x2_loc = self.tgtres(XTWO_RST)
+        if out_dir is None:
+            self.out_dir = self.tgtres(OUT_DIR)
+        else:
+            self.out_dir = out_dir
         self.logger = logging.getLogger(
             '.'.join((__name__, self.__class__.__name__)))
 
-    def run_calcs(self, num_paths):
+    @property
+    def topo_loc(self):
+        "The location of the topology file."
+        return self._topo_loc
+
+    @topo_loc.setter
+    def topo_loc(self, topo_loc):
+        self._topo_loc = topo_loc
+        self._base_params = None
+        self._natoms = None
+
+    @property
+    def job_params(self):
+        "The parameters used for filling in the Amber job templates."
+        return self._job_params
+
+    @job_params.setter
+    def job_params(self, job_params):
+        self._job_params = job_params
+        self._base_params = None
+
+    def _job_base(self):
+        """Returns the job template parameters and the TorqueJob settings
+        that are the same for every job, working them out from job_params
+        and topo_loc the first time they are needed."""
+        if self._base_params is None:
+            base_params = self.job_params.copy()
+            base_params[TOPO_KEY] = self.topo_loc
+            base_job = TorqueJob(**base_params)
+            self._base_params, self._base_job = base_params, base_job
+        return self._base_params, self._base_job
+
+    def close(self):
+        "Releases the file watcher's inotify descriptor."
+        self.watcher.close()
+
+    def open_trajectory(self, loc, tmp_dir=None):
+        """Returns an MdcrdReader for the given trajectory, taking the
+        number of atoms from the topology the first time it is needed.
+
+        Positional arguments:
+        loc -- The trajectory's location (its name before any compression).
+        Keyword arguments:
+        tmp_dir -- Where a compressed trajectory that cannot be read in
+                   place is decompressed.
+        """
+        if self._natoms is None:
+            self._natoms = read_natoms(self.topo_loc)
+        return MdcrdReader(loc, self._natoms, tmp_dir=tmp_dir)
+
+    def run_calcs(self, num_paths, resume=False, sinks=()):
         """Top-level runner for performing the aimless shooting calculations
         for the given number of paths, returning the results.
 
         Positional arguments:
         num_paths -- The number of paths to run.
+        Keyword arguments:
+        resume -- Whether to pick up where the journal leaves off rather
+                  than starting from the first path (default False).
+        sinks -- The report sinks (e.g. CsvReportSink) to hand each path's
+                 result to as it finishes.
         Returns:
         A nested dict keyed first by path, then by 'forward' and 'backward',
         with the values being the result of calc_basins for each path.
         """
         pres = {}
-        for pnum in range(1, num_paths + 1):
-            if random.randint(0, 1):
-                shooter = self.x1_loc
-            else:
-                shooter = self.x2_loc
-            self.logger.debug("Using '%s'\n" % shooter)
-            self.run_starter(pnum, shooter)
-            self.rev_vel()
-            self.run_dt()
-            self.run_fwd_and_back()
-            pres[pnum] = self.calc_basins()
-            self.proc_results(pres[pnum], shooter)
-            self.clean(pnum)
+        pnums = range(1, num_paths + 1)
+        if resume:
+            pres, inflight = self.recover()
+            pnums = [pnum for pnum in pnums if pnum not in pres]
+            if inflight is not None:
+                pnums = [inflight] + [pnum for pnum in pnums
+                                      if pnum != inflight]
+        start_sinks(sinks, pres)
+        for pnum in pnums:
+            pres[pnum] = self.run_path(pnum)
+            feed_sinks(sinks, pnum, pres[pnum])
         return pres
 
+    def recover(self):
+        """Rebuilds the results of the finished paths from the journal and
+        prepares the interrupted path, if any, to continue from the stage it
+        was on.  Jobs submitted for that path are re-adopted if they have
+        finished or are still queued or running; any others are resubmitted
+        when the path continues.
+
+        Returns:
+        A 2-tuple: a dict of the finished paths' results keyed by path
+        number, and the number of the interrupted path (or None).
+        """
+        pres = {}
+        last_done = None
+        inflight = None
+        for pnum, state in sorted(replay(self.journal.read()).items()):
+            if state.result is None:
+                inflight = state
+            else:
+                pres[pnum] = state.result
+                last_done = pnum
+        if inflight is None:
+            if (last_done is not None and
+                    os.path.isdir(self.path_dir_loc(last_done))):
+                # Interrupted between finishing a path and archiving it
+                self.clean(last_done)
+            return pres, None
+        pending = [(stage, job_id) for stage, job_id in inflight.jobs.items()
+                   if stage not in inflight.done]
+        jstats = {}
+        if pending:
+            jstats = self.sub_handler.stat_jobs([job_id for stage, job_id
+                                                 in pending])
+        adopted = {}
+        for stage, job_id in pending:
+            if stage == PATH_STAGE:
+                out_name = PATH_OUT_NAME
+            else:
+                out_name = STAGE_FILES[stage][3]
+            out_loc = os.path.join(self.path_dir_loc(inflight.pnum), out_name)
+            if (os.path.exists(done_loc(out_loc)) or
+                    is_running([job_id], jstats)):
+                adopted[stage] = job_id
+            else:
+                self.logger.warn("Job %s for the %s stage of path %d is gone "
+                                 "and will be resubmitted" %
+                                 (job_id, stage, inflight.pnum))
+        self.logger.info("Resuming path %d with finished stages %s and "
+                         "re-adopted jobs %s" %
+                         (inflight.pnum, sorted(inflight.done), adopted))
+        self._resume = inflight
+        self._adopted = adopted
+        return pres, inflight.pnum
+
+    def run_path(self, pnum):
+        """Runs all of the stages for a single path, returning the result of
+        calc_basins for the path.
+
+        Positional arguments:
+        pnum -- The path number to run.
+        """
+        self.open_path(pnum)
+        resume, self._resume = self._resume, None
+        if resume is not None and resume.pnum == pnum:
+            shooter = resume.shooter
+            self._done_stages = resume.done
+            self._commits = resume.commits
+        else:
+            shooter = self.choose_shooter()
+            self._adopted = {}
+            self._done_stages = set()
+            self._commits = {}
+            self._log_event(EVENTS.PATH_START, shooter=shooter)
+        self.logger.debug("Using '%s' for path %d\n" % (shooter, pnum))
+        self.timings = timings = PathTimings()
+        with timings.phase(PHASES.TOTAL):
+            if self.job_mode == JMODES.PATH:
+                with timings.phase(PHASES.PATH_JOB):
+                    result = self.run_path_job(pnum, shooter)
+            else:
+                commits = {}
+                if self.job_mode == JMODES.DEPEND:
+                    with timings.phase(PHASES.PATH_JOB):
+                        self.run_dep_chain(pnum, shooter)
+                else:
+                    with timings.phase(PHASES.STARTER):
+                        self.run_starter(pnum, shooter)
+                    with timings.phase(PHASES.REVVEL):
+                        self.rev_vel()
+                    with timings.phase(PHASES.DT):
+                        self.run_dt()
+                    with timings.phase(PHASES.FWD_BACK):
+                        commits = self.run_fwd_and_back()
+                with timings.phase(PHASES.BASINS):
+                    result = self.calc_basins()
+                result.update(commits)
+            with timings.phase(PHASES.RESULTS):
+                self.proc_results(result, shooter)
+            # The timings so far are journaled with the result; archiving
+            # and the total are filled in below
+            result[TIMINGS_KEY] = timings.times
+            self._log_event(EVENTS.PATH_DONE, result=result)
+            with timings.phase(PHASES.CLEAN):
+                self.clean(pnum)
+        self._submitted.clear()
+        return result
+
+    def choose_shooter(self):
+        "Randomly picks x1 or x2 as the shooter for the next path."
+        if random.randint(0, 1):
+            return self.x1_loc
+        else:
+            return self.x2_loc
+
     def run_starter(self, pnum, shooter):
         """Runs the starter job, backing up the generated forward file.
         Returns when the submitted job is finished.
@@ -328,46 +892,117 @@ class AimlessShooter(object):
         pnum -- The path number currently running.
         shooter -- The chosen shooter file for this path.
         """
+        if STAGES.STARTER in self._done_stages:
+            return
         self.logger.debug('running starter... generating velocities\n')
-        start_id = self._sub_job(shooter,
-                                 self.tgtres(FWD_IN_NAME),
-                                 self.tgtres(STARTER_IN_NAME),
-                                 self.tgtres(STARTER_OUT_NAME),
-                                 self.tgtres(STARTER_MDCRD_NAME))
-        self._wait_on_jobs([start_id])
-        # Back up fwd rst
-        path_out_dir = self.tgtres(OUT_DIR, str(pnum))
-        if not os.path.exists(path_out_dir):
-            os.makedirs(path_out_dir)
-        shutil.copy2(self.tgtres(FWD_RST_NAME), path_out_dir)
+        start_id = self._sub_stage(STAGES.STARTER, shooter)
+        self._wait_on_jobs([start_id], [self.pathres(STARTER_DONE_NAME)])
+        self._finish_stages([STAGES.STARTER])
+
+    def run_dep_chain(self, pnum, shooter):
+        """Submits the starter, dt, forward, and backward jobs for a path up
+        front, each depending on the successful completion of the previous
+        one.  The velocities are reversed at the start of the dt job, so no
+        work is needed here between the jobs.  Returns when the forward and
+        backward jobs are finished.
+
+        pnum -- The path number currently running.
+        shooter -- The chosen shooter file for this path.
+        """
+        if STAGES.BACK in self._done_stages:
+            return
+        if STAGES.BACK not in self._adopted:
+            # The dependencies of a partial chain can't be re-linked
+            self._adopted = {}
+        self.logger.debug('submitting dependency chain for path %d\n' % pnum)
+        start_id = self._sub_stage(STAGES.STARTER, shooter)
+        revvel_cmd = " ".join([REVVEL_CMD,
+                               pipes.quote(self.pathres(FWD_RST_NAME)),
+                               pipes.quote(self.pathres(BACK_RST_NAME))])
+        dt_id = self._sub_stage(STAGES.DT, depends=[start_id],
+                                pre_cmds=revvel_cmd)
+        fwd_id = self._sub_stage(STAGES.FWD, depends=[dt_id])
+        back_id = self._sub_stage(STAGES.BACK, depends=[fwd_id])
+        self._wait_on_jobs([fwd_id, back_id], [self.pathres(FWD_DONE_NAME),
+                                               self.pathres(BACK_DONE_NAME)])
+        self._check_chain([STAGES.STARTER, STAGES.DT, STAGES.FWD,
+                           STAGES.BACK])
+        self._finish_stages([STAGES.STARTER, STAGES.DT, STAGES.FWD,
+                             STAGES.BACK])
+
+    def _check_chain(self, stages):
+        """Raises an EnvError naming the first of the given chained stages
+        whose job did not finish successfully.  A failed job holds the jobs
+        that depend on it, so their sentinels are never written.
+
+        stages -- The stages of the chain, in order.
+        """
+        for stage in stages:
+            loc = done_loc(self.pathres(STAGE_FILES[stage][3]))
+            status = read_exit_status(loc)
+            if status is None:
+                raise EnvError("The %s job of path %d did not finish (no "
+                               "exit status in '%s')" %
+                               (stage, self.cur_path, loc))
+            if status:
+                raise EnvError("The %s job of path %d exited with status %d; "
+                               "the jobs after it were not run" %
+                               (stage, self.cur_path, status))
+
+    def run_path_job(self, pnum, shooter):
+        """Submits a single job that runs all of the stages for a path on
+        the compute node using the aimless_path runner.  Returns the basin
+        results written by the runner once the job is finished.
+
+        pnum -- The path number currently running.
+        shooter -- The chosen shooter file for this path.
+        """
+        if PATH_STAGE not in self._done_stages:
+            job_id = self._adopted.pop(PATH_STAGE, None)
+            if job_id is None:
+                job_id = self._sub_path_job(shooter)
+            self._wait_on_jobs([job_id], [self.pathres(PATH_DONE_NAME)])
+            self._finish_stages([PATH_STAGE])
+        return read_path_result(self.pathres(PATH_RESULT_NAME))
+
+    def _sub_path_job(self, shooter):
+        """Writes the path configuration and submits the whole-path job for
+        the given shooter, returning the job's ID."""
+        self.logger.debug('submitting whole-path job for path %d\n' %
+                          self.cur_path)
+        cfg_loc = self.pathres(PATH_CFG_NAME)
+        write_path_cfg(self, shooter, cfg_loc)
+        out_loc = self.pathres(PATH_OUT_NAME)
+        clear_done(out_loc)
+        job = self._tpl_job(PATH_JOB_TPL, {PATH_CFG_KEY: cfg_loc,
+                                           DONE_FILE_KEY: done_loc(out_loc),
+                                           PRE_CMDS_KEY: ''})
+        logger.info("Submitting:\n%s" % job.contents)
+        submitted = time.time()
+        job_id = self.sub_handler.submit(job)
+        self._submitted[job_id] = submitted
+        self._log_event(EVENTS.SUBMIT, stage=PATH_STAGE, job=job_id)
+        return job_id
+
+    def run_stages(self, shooter):
+        """Runs the starter, dt, forward, and backward stages back to back
+        and returns the result of calc_basins.  Used by the aimless_path
+        runner on the compute node.
+
+        shooter -- The chosen shooter file for this path.
+        """
+        start_id = self._sub_stage(STAGES.STARTER, shooter)
+        self._wait_on_jobs([start_id], [self.pathres(STARTER_DONE_NAME)])
+        self.rev_vel()
+        self.run_dt()
+        self.run_fwd_and_back()
+        return self.calc_basins()
 
     def rev_vel(self):
         """Generates the backward.rst file based on the contents of forward.rst.
         """
         self.logger.debug('reversing velocities\n')
-        fwd_loc = self.tgtres(FWD_RST_NAME)
-        back_loc = self.tgtres(BACK_RST_NAME)
-        with open(fwd_loc) as fwd_file:
-            fwd_lines = [line.rstrip('\n') for line in fwd_file]
-        with open(back_loc, 'w') as back_file:
-            back_file.write(fwd_lines[0].split()[0])
-            back_file.write(" Made by %s at %s\n" % (os.path.basename(__file__),
-                                                     datetime.datetime.now().
-                                                     strftime(TSTAMP_FMT)))
-            back_file.write(fwd_lines[1] + os.linesep)
-            num_atoms = float(fwd_lines[1].split()[0])
-            # Atom coordinates are two per line
-            coord_lines = int(math.ceil(num_atoms / 2.0))
-            # Don't touch the coordinates
-            for sameline in range(2, coord_lines + 2):
-                back_file.write(fwd_lines[sameline] + os.linesep)
-                #Reverse the velocities
-            for revline in range(2 + coord_lines, (coord_lines * 2) + 2):
-                fline = map(float, fwd_lines[revline].split())
-                back_file.write("".join(FLOAT_FMT % -num for num in fline))
-                back_file.write(os.linesep)
-                # Write out last line
-            back_file.write(fwd_lines[-1])
+        rev_vel(self.pathres(FWD_RST_NAME), self.pathres(BACK_RST_NAME))
 
     def calc_basins(self):
         """Performs the basin calculations for the current forward and bad
@@ -378,16 +1013,11 @@ class AimlessShooter(object):
         and 'RC2bw'.
         """
         results = {}
-        fwd_loc = self.tgtres(FWD_CONS_NAME)
-        back_loc = self.tgtres(BACK_CONS_NAME)
-        with open(fwd_loc) as fwd_file:
-            fwd_lines = [line.rstrip('\n') for line in fwd_file]
-        with open(back_loc) as back_file:
-            back_lines = [line.rstrip('\n') for line in back_file]
+        # The basins are judged from the final frame of each trajectory
         discard, results[RC1_FWD_KEY], results[RC2_FWD_KEY] = \
-            map(float, fwd_lines[1].split())
+            read_record(self.pathres(FWD_CONS_NAME))
         discard, results[RC1_BACK_KEY], results[RC2_BACK_KEY] = \
-            map(float, back_lines[1].split())
+            read_record(self.pathres(BACK_CONS_NAME))
         results[BASIN_FWD_KEY] = self.find_basin_dir(results[RC1_FWD_KEY],
                                                      results[RC2_FWD_KEY])
         results[BASIN_BACK_KEY] = self.find_basin_dir(results[RC1_BACK_KEY],
@@ -397,51 +1027,217 @@ class AimlessShooter(object):
     def run_dt(self):
         """Submits the DT job. Returns when the submitted job is finished.
         """
+        if STAGES.DT in self._done_stages:
+            return
         self.logger.debug('running dt\n')
-        start_id = self._sub_job(self.tgtres(FWD_RST_NAME),
-                                 self.tgtres(POSTDT_RST_NAME),
-                                 self.tgtres(DT_IN_NAME),
-                                 self.tgtres(DT_OUT_NAME),
-                                 self.tgtres(DT_MDCRD_NAME))
-        self._wait_on_jobs([start_id])
+        start_id = self._sub_stage(STAGES.DT)
+        self._wait_on_jobs([start_id], [self.pathres(DT_DONE_NAME)])
+        self._finish_stages([STAGES.DT])
 
     def run_fwd_and_back(self):
         """Submits the forward and backward jobs concurrently. Returns when
         the submitted jobs are finished.
+
+        When commit_dwell is set, a job is cancelled as soon as its reaction
+        coordinates commit to a basin.  Returns a dict of the steps at which
+        the cancelled jobs committed, keyed by 'commitfw' and 'commitbw'.
         """
-        self.logger.debug('running forward\n')
-        fwd_id = self._sub_job(self.tgtres(POSTDT_RST_NAME),
-                               self.tgtres(POSTFWD_RST_NAME),
-                               self.tgtres(FWD_IN_NAME),
-                               self.tgtres(FWD_OUT_NAME),
-                               self.tgtres(FWD_MDCRD_NAME))
-
-        self.logger.debug('running backward\n')
-        back_id = self._sub_job(self.tgtres(POSTFWD_RST_NAME),
-                                self.tgtres(POSTBACK_RST_NAME),
-                                self.tgtres(BACK_IN_NAME),
-                                self.tgtres(BACK_OUT_NAME),
-                                self.tgtres(BACK_MDCRD_NAME))
-        self._wait_on_jobs([fwd_id, back_id])
-
-    def _wait_on_jobs(self, job_ids):
-        """Polls the state of the given job IDs.  Returns when the IDs
+        segments = []
+        for stage, done_name, cons_name, commit_key in (
+                (STAGES.FWD, FWD_DONE_NAME, FWD_CONS_NAME, COMMIT_FWD_KEY),
+                (STAGES.BACK, BACK_DONE_NAME, BACK_CONS_NAME,
+                 COMMIT_BACK_KEY)):
+            if stage not in self._done_stages:
+                self.logger.debug('running %s\n' % stage)
+                segments.append((self._sub_stage(stage),
+                                 self.pathres(done_name),
+                                 self.pathres(cons_name), commit_key))
+        commits = dict(self._commits)
+        if not segments:
+            return commits
+        if self.commit_dwell is None:
+            self._wait_on_jobs([seg[0] for seg in segments],
+                               [seg[1] for seg in segments])
+        else:
+            new_commits = self._wait_committed(segments)
+            commits.update(new_commits)
+            self._commits.update(new_commits)
+        self._finish_stages([STAGES.FWD, STAGES.BACK], commits=commits)
+        return commits
+
+    def _wait_committed(self, segments):
+        """Waits for the given segment jobs to finish, tailing their DUMPAVE
+        files every wait_secs and cancelling each job once its reaction
+        coordinates have committed to a basin.  As in _wait_on_jobs, the
+        queue is only checked every stat_secs for jobs that die without
+        writing their sentinel.
+
+        segments -- A list of (job ID, sentinel, DUMPAVE file, commit key)
+                    tuples.
+        Returns:
+        A dict of the commit steps of the cancelled jobs by commit key.
+        """
+        commits = {}
+        pending = {}
+        for job_id, done_loc, cons_loc, commit_key in segments:
+            pending[job_id] = (done_loc, commit_key,
+                               BasinMonitor(cons_loc, self.find_basin_dir,
+                                            self.commit_dwell))
+        last_stat = time.time()
+        while pending:
+            for job_id, (done_loc, commit_key, monitor) in pending.items():
+                if os.path.exists(done_loc):
+                    del pending[job_id]
+                elif monitor.check() is not None:
+                    self.logger.info("Job %s committed to basin %s at step %d; "
+                                     "cancelling it\n" %
+                                     (job_id, monitor.basin,
+                                      monitor.commit_step))
+                    self.sub_handler.cancel(job_id)
+                    commits[commit_key] = monitor.commit_step
+                    del pending[job_id]
+            if pending and time.time() - last_stat >= self.stat_secs:
+                jstats = self.sub_handler.stat_jobs(pending.keys())
+                for job_id in pending.keys():
+                    if not is_running([job_id], jstats):
+                        del pending[job_id]
+                last_stat = time.time()
+            if pending:
+                self.watcher.wait([done_loc for done_loc, discard, discard
+                                   in pending.values()], self.wait_secs)
+        return commits
+
+    def _wait_on_jobs(self, job_ids, done_locs=None, timings=None):
+        """Waits for the given job IDs to finish.  Returns when the IDs
         disappear from the status dict or the job's status is 'complete'.
 
+        When completion sentinels are given, returns as soon as all of them
+        have been written.  The queue is then only checked every stat_secs
+        as a safety net for jobs that die without writing their sentinel.
+
         job_ids -- The list of IDs to wait for.
+        done_locs -- The completion sentinels written by the jobs.
+        timings -- The PathTimings to add each job to, in the same order as
+                   done_locs (defaults to the current path's timings).
         """
+        start = time.time()
+        # The last status seen for each job, for the timings
+        seen = {}
+        if done_locs and self.watcher.wait(done_locs, 0):
+            self._log_done(job_ids, done_locs, start, seen, timings)
+            return
         jstats = self.sub_handler.stat_jobs(job_ids)
+        seen.update(jstats)
         wait_count = 1
         while is_running(job_ids, jstats):
-            self.logger.debug("Waiting '%d' seconds for job IDs '%s'\n" %
-                              (wait_count * self.wait_secs, ",".join(map(str, job_ids))))
-            time.sleep(self.wait_secs)
+            if done_locs:
+                self.logger.debug("Waiting up to '%d' seconds for sentinels "
+                                  "'%s'\n" % (self.stat_secs,
+                                               ",".join(done_locs)))
+                if self.watcher.wait(done_locs, self.stat_secs):
+                    break
+            else:
+                self.logger.debug("Waiting '%d' seconds for job IDs '%s'\n" %
+                                  (wait_count * self.wait_secs, ",".join(map(str, job_ids))))
+                time.sleep(self.wait_secs)
             wait_count += 1
             jstats = self.sub_handler.stat_jobs(job_ids)
+            seen.update(jstats)
+        self._log_done(job_ids, done_locs, start, seen, timings)
+
+    def _log_done(self, job_ids, done_locs, start, seen=None, timings=None):
+        """Logs the completion of the given jobs, warning about any
+        sentinels that record a failed exit status.  The queue, run, and slack
+        times of each job are added to the current path's timings.
+
+        job_ids -- The finished job IDs.
+        done_locs -- The completion sentinels written by the jobs, in the
+                     same order as job_ids.
+        start -- When the wait on the jobs began.
+        seen -- The last JobStatus seen for each job, keyed by job ID.
+        timings -- The PathTimings to add each job to, in the same order as
+                   done_locs (defaults to the current path's timings).
+        """
+        noticed = time.time()
         self.logger.debug("Finished job IDs '%s' in '%d' seconds\n" %
-                          (",".join(map(str, job_ids)), (wait_count - 1) * self.wait_secs))
+                          (",".join(map(str, job_ids)), noticed - start))
+        for loc in done_locs or []:
+            status = read_exit_status(loc)
+            if status:
+                self.logger.warn("Job writing '%s' exited with status %d" %
+                                 (loc, status))
+        if not done_locs:
+            return
+        if timings is None:
+            if self.timings is None:
+                return
+            timings = [self.timings] * len(done_locs)
+        for job_id, loc, job_timings in zip(job_ids, done_locs, timings):
+            name = os.path.basename(loc)[:-len(DONE_EXT)]
+            job_timings.add_job(name, self._submitted.get(job_id, start),
+                                loc, stat=(seen or {}).get(job_id),
+                                noticed=noticed)
+
+    def _sub_stage(self, stage, shooter=None, depends=None, pre_cmds=''):
+        """Submits the job for the given stage, returning its ID.
 
-    def _sub_job(self, shooter_loc, dir_rst_loc, in_loc, out_loc, mdcrd_loc):
+        Positional arguments:
+        stage -- The stage to run (a STAGES value).
+        Keyword arguments:
+        shooter -- The shooter file (used by the starter stage).
+        depends -- IDs of jobs that must finish successfully before this job
+                   may start
+        pre_cmds -- Shell commands to run in the job before Amber
+        """
+        if stage in self._adopted:
+            job_id = self._adopted.pop(stage)
+            self.logger.info("Re-adopting job %s for the %s stage of path %d" %
+                             (job_id, stage, self.cur_path))
+            return job_id
+        shooter_name, rst_name, in_name, out_name, mdcrd_name = \
+            STAGE_FILES[stage]
+        if shooter_name:
+            shooter = self.pathres(shooter_name)
+        job_id = self._sub_job(shooter, self.pathres(rst_name),
+                               self.tgtres(in_name), self.pathres(out_name),
+                               self.pathres(mdcrd_name), depends=depends,
+                               pre_cmds=pre_cmds)
+        self._log_event(EVENTS.SUBMIT, stage=stage, job=job_id)
+        return job_id
+
+    def _finish_stages(self, stages, **fields):
+        """Records that the given stages of the current path are finished.
+
+        stages -- The finished stages.
+        fields -- Other values to journal with each stage.
+        """
+        for stage in stages:
+            if stage not in self._done_stages:
+                self._done_stages.add(stage)
+                self._log_event(EVENTS.STAGE_DONE, stage=stage, **fields)
+
+    def _log_event(self, event, **fields):
+        "Journals the given event for the current path if keeping a journal."
+        if self.journal is not None:
+            self.journal.append(event, self.cur_path, **fields)
+
+    def stage_job(self, stage, shooter, pre_cmds=''):
+        """Creates a job for the given stage that uses file names relative to
+        a path directory (which the job must change into) rather than
+        locations in this instance's current path directory.
+
+        stage -- The stage to run (a STAGES value).
+        shooter -- The shooter file name (used by the starter stage).
+        pre_cmds -- Shell commands to run in the job before Amber
+        """
+        shooter_name, rst_name, in_name, out_name, mdcrd_name = \
+            STAGE_FILES[stage]
+        return self._fill_job(shooter_name or shooter, rst_name,
+                              os.path.join(TGT_FROM_PATH, in_name),
+                              out_name, mdcrd_name, pre_cmds=pre_cmds)
+
+    def _sub_job(self, shooter_loc, dir_rst_loc, in_loc, out_loc, mdcrd_loc,
+                 depends=None, pre_cmds=''):
         """Fills the job template with the given parameters and submits the
         job, returning the ID assigned to the job.
 
@@ -451,25 +1247,52 @@ class AimlessShooter(object):
         in_loc -- The location of the input file
         out_loc -- The location of the output file
         mdcrd_loc -- The location of the mdcrd file
+        Keyword arguments:
+        depends -- IDs of jobs that must finish successfully before this job
+                   may start
+        pre_cmds -- Shell commands to run in the job before Amber
         Returns:
         The ID of the submitted job
         """
-        local_params = self.job_params.copy()
-        local_params[TOPO_KEY] = self.topo_loc
-        local_params[SHOOTER_KEY] = shooter_loc
-        local_params[DIR_RST_KEY] = dir_rst_loc
-        local_params[INFILE_KEY] = in_loc
-        local_params[OUTFILE_KEY] = out_loc
-        local_params[MDCRD_KEY] = mdcrd_loc
-
-        tpl_loc = os.path.join(self.tpl_dir, AMBER_JOB_TPL)
-        with open(tpl_loc, 'r') as tpl_file:
-            tpl = Template(tpl_file.read())
-            result = tpl.safe_substitute(local_params)
-        job = TorqueJob(**local_params)
-        logger.info("Submitting:\n%s" % result)
-        job.contents = result
-        return self.sub_handler.submit(job)
+        job = self._fill_job(shooter_loc, dir_rst_loc, in_loc, out_loc,
+                             mdcrd_loc, depends=depends, pre_cmds=pre_cmds)
+        # A sentinel left over from an earlier path would end the wait early
+        clear_done(out_loc)
+        logger.info("Submitting:\n%s" % job.contents)
+        submitted = time.time()
+        job_id = self.sub_handler.submit(job)
+        self._submitted[job_id] = submitted
+        return job_id
+
+    def _fill_job(self, shooter_loc, dir_rst_loc, in_loc, out_loc, mdcrd_loc,
+                  depends=None, pre_cmds=''):
+        """Fills the job template with the given parameters, returning the
+        resulting job.  See _sub_job for the arguments."""
+        stage_params = {SHOOTER_KEY: shooter_loc, DIR_RST_KEY: dir_rst_loc,
+                        INFILE_KEY: in_loc, OUTFILE_KEY: out_loc,
+                        MDCRD_KEY: mdcrd_loc,
+                        DONE_FILE_KEY: done_loc(out_loc),
+                        PRE_CMDS_KEY: pre_cmds}
+        return self._tpl_job(AMBER_JOB_TPL, stage_params, depends=depends)
+
+    def _tpl_job(self, tpl_name, stage_params, depends=None):
+        """Creates a job whose contents are the named job template filled
+        with the invariant job parameters and the given per-stage
+        parameters."""
+        tpl_loc = os.path.join(self.tpl_dir, tpl_name)
+        try:
+            tpl = self.tpl_cache.get(tpl_loc)
+        except (OSError, IOError) as e:
+            raise TemplateError("Couldn't read job template '%s': %s" %
+                                (tpl_loc, e))
+        base_params, base_job = self._job_base()
+        local_params = base_params.copy()
+        local_params.update(stage_params)
+        job = copy.copy(base_job)
+        job.contents = tpl.safe_substitute(local_params)
+        job.workdir = self.path_dir
+        job.depends = depends
+        return job
 
     def tgtres(self, *args):
         """Alias for resolving the given path segments against the target
@@ -477,6 +1300,32 @@ class AimlessShooter(object):
         """
         return os.path.join(self.tgt_dir, *args)
 
+    def pathres(self, *args):
+        """Alias for resolving the given path segments against the current
+        path's working directory.
+        """
+        return os.path.join(self.path_dir, *args)
+
+    def path_dir_loc(self, pnum):
+        "Returns the location of the working directory for the given path."
+        return self.tgtres(WORK_DIR, PATH_DIR_FMT % pnum)
+
+    def open_path(self, pnum):
+        """Makes the given path the current one, creating its working
+        directory if needed.  The Amber inputs name the restraints file
+        relative to the job's directory, so it is linked into the path's
+        directory.
+
+        pnum -- The path number to run.
+        """
+        self.cur_path = pnum
+        self.path_dir = self.path_dir_loc(pnum)
+        cmakedir(self.path_dir)
+        cons_loc = self.tgtres(CONS_RST_NAME)
+        if (os.path.exists(cons_loc) and
+                not os.path.exists(self.pathres(CONS_RST_NAME))):
+            stage_file(cons_loc, self.pathres(CONS_RST_NAME), mutable=False)
+
     def find_basin_dir(self, rc1, rc2):
         """Determines whether the given reaction coordinates are going toward
         A, B, or neither (inconclusive).
@@ -500,33 +1349,330 @@ class AimlessShooter(object):
         """
         Process the shooter results.  If there are conclusive results, accept
         it and move the shooter to x1 and the post-dt to x2.  Mark the result
-        as "accepted."
+        as "accepted."  The name of the shooter used is recorded in the
+        result as "shooter."
 
         result -- The basin calculation result.
         shooter -- The shooter file to potentially move.
         """
+        result[SHOOTER_KEY] = os.path.basename(shooter)
         if (result[BASIN_FWD_KEY] == BRES.A and result[BASIN_BACK_KEY] ==
             BRES.B) or (result[BASIN_FWD_KEY] == BRES.B
                         and result[BASIN_BACK_KEY] == BRES.A):
-            shutil.copy2(shooter, self.x1_loc)
-            shutil.copy2(self.tgtres(POSTDT_RST_NAME), self.x2_loc)
+            # The shooter may already be x1.  x1 and x2 are only ever
+            # replaced and postdt.rst is archived with the path, so they may
+            # share files.
+            if os.path.abspath(shooter) != self.x1_loc:
+                stage_file(shooter, self.x1_loc, mutable=False)
+            stage_file(self.pathres(POSTDT_RST_NAME), self.x2_loc,
+                       mutable=False)
             result[ACC_KEY] = True
 
     def clean(self, pnum):
-        """Moves artifacts from a path's calculation to an output directory
-        named for the given path number.
+        """Archives the working directory of the given path as the output
+        directory named for the path number with a single rename.  If that
+        output directory already exists (e.g. from an earlier calculation in
+        the same target directory), a numbered suffix is added.  The
+        archived files are then handed to the archiver, if any, to be
+        compressed in the background.
 
         pnum -- The path number of the finished calculation.
+        Returns:
+        The location of the archived directory.
+        """
+        path_dir = self.path_dir_loc(pnum)
+        cmakedir(self.out_dir)
+        path_out_dir = os.path.join(self.out_dir, PATH_DIR_FMT % pnum)
+        archive_loc = path_out_dir
+        suffix = 0
+        while os.path.exists(archive_loc):
+            suffix += 1
+            archive_loc = "%s.%d" % (path_out_dir, suffix)
+        if archive_loc != path_out_dir:
+            logger.warn("'%s' already exists; archiving path %d as '%s'" %
+                        (path_out_dir, pnum, archive_loc))
+        try:
+            os.rename(path_dir, archive_loc)
+        except OSError, e:
+            if e.errno != errno.EXDEV:
+                raise
+            # The output directory is on another filesystem
+            shutil.move(path_dir, archive_loc)
+        if self.path_dir == path_dir:
+            self.path_dir = self.tgt_dir
+        if self.archiver is not None:
+            self.archiver.submit(archive_loc)
+        return archive_loc
+
+
+class BasinMonitor(object):
+    """Watches the DUMPAVE output of a running forward or backward segment
+    for its reaction coordinates settling in basin A or B."""
+
+    def __init__(self, cons_loc, classify, dwell):
+        """Sets up the initial state for this instance.
+
+        cons_loc -- The DUMPAVE file written by the segment.
+        classify -- A function returning the BRES basin for an RC1 and RC2
+                    value (e.g. AimlessShooter.find_basin_dir).
+        dwell -- The number of steps the coordinates must stay in one basin
+                 before the segment is committed to it.
+        """
+        self.tail = RecordTail(cons_loc)
+        self.classify = classify
+        self.dwell = dwell
+        self.basin = BRES.INC
+        self.entered = None
+        self.commit_step = None
+
+    def check(self):
+        """Reads the records written since the last check.  Returns the step
+        at which the segment committed to a basin, or None if it hasn't."""
+        if self.commit_step is not None:
+            return self.commit_step
+        for record in self.tail.read_new():
+            step, rc1, rc2 = int(record[0]), record[1], record[2]
+            basin = self.classify(rc1, rc2)
+            if basin != self.basin:
+                self.basin = basin
+                self.entered = step
+            if basin != BRES.INC and step - self.entered >= self.dwell:
+                self.commit_step = step
+                break
+        return self.commit_step
+
+
+class ChainOrchestrator(object):
+    """Drives several independent shooting chains at once.  Each chain is an
+    AimlessShooter with its own target directory (and therefore its own x1/x2
+    shooter pair and working files).  Path numbers are handed out to the
+    chains as they become free, so up to one path per chain is in flight at
+    any time.
+    """
+
+    def __init__(self, shooters):
+        """Sets up the initial state for this instance.
+
+        shooters -- The AimlessShooter instances, one per chain.
+        """
+        self.shooters = shooters
+        self.logger = logging.getLogger(
+            '.'.join((__name__, self.__class__.__name__)))
+
+    def run_calcs(self, num_paths, resume=False, sinks=()):
+        """Runs the given number of paths across all of the chains, returning
+        the merged results in the same form as AimlessShooter.run_calcs.
+
+        Positional arguments:
+        num_paths -- The total number of paths to run.
+        Keyword arguments:
+        resume -- Whether to pick up where the chains' journals leave off
+                  (default False).  Each chain first finishes the path it was
+                  running, then the paths no chain has finished are handed
+                  out as usual.
+        sinks -- The report sinks to hand each path's result to as it
+                 finishes, whichever chain ran it.
         """
-        path_out_dir = self.tgtres(OUT_DIR, "%02d" % pnum)
-        if not os.path.exists(path_out_dir):
-            os.makedirs(path_out_dir)
-        for mvname in GEN_FILES:
-            tgt = self.tgtres(mvname)
+        self._pres = {}
+        self._sinks = sinks
+        self._errors = []
+        inflight = [None] * len(self.shooters)
+        if resume:
+            for cidx, shooter in enumerate(self.shooters):
+                pres, inflight[cidx] = shooter.recover()
+                self._pres.update(pres)
+        start_sinks(sinks, self._pres)
+        claimed = set(self._pres).union(inflight)
+        self._path_ids = iter([pnum for pnum in range(1, num_paths + 1)
+                               if pnum not in claimed])
+        self._lock = threading.Lock()
+        threads = []
+        for cidx, shooter in enumerate(self.shooters):
+            thread = threading.Thread(target=self._walk,
+                                      args=(shooter, inflight[cidx]),
+                                      name=CHAIN_DIR_FMT % (cidx + 1))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            exc_type, exc_val, exc_tb = self._errors[0]
+            raise exc_type, exc_val, exc_tb
+        return self._pres
+
+    def _walk(self, shooter, first_pnum=None):
+        """Runs paths on the given chain until there are none left or another
+        chain has failed.
+
+        shooter -- The AimlessShooter for this chain.
+        first_pnum -- A path to run before taking the next free one (used to
+                      finish a path interrupted in an earlier run).
+        """
+        pnum = first_pnum
+        while True:
+            if pnum is None:
+                with self._lock:
+                    if self._errors:
+                        return
+                    pnum = next(self._path_ids, None)
+                if pnum is None:
+                    return
+            self.logger.debug("Chain '%s' running path %d" %
+                              (shooter.tgt_dir, pnum))
             try:
-                shutil.move(tgt, path_out_dir)
-            except Exception, e:
-                logger.warn("Could not archive '%s': %s" % (path_out_dir, e))
+                result = shooter.run_path(pnum)
+            except Exception:
+                self.logger.exception("Chain '%s' failed on path %d" %
+                                      (shooter.tgt_dir, pnum))
+                with self._lock:
+                    self._errors.append(sys.exc_info())
+                return
+            with self._lock:
+                self._pres[pnum] = result
+            feed_sinks(self._sinks, pnum, result)
+            pnum = None
+
+
+class ArrayOrchestrator(object):
+    """Drives several shooting chains in lockstep, submitting each stage for
+    all of the chains as a single Torque job array.  The index of each job in
+    the array (PBS_ARRAYID) selects the chain's directory and the directory of
+    the path it is running, so a batch of N paths costs one qsub per stage
+    rather than N.
+
+    Each path's timings and journal events are recorded as in
+    AimlessShooter.run_path.  The phases that run for the whole batch (the
+    job arrays and the velocity reversals) are charged in full to every path
+    in it.  The forward and backward jobs always run to the end: commit_dwell
+    is not supported.
+    """
+
+    def __init__(self, shooters, top_dir):
+        """Sets up the initial state for this instance.
+
+        shooters -- The AimlessShooter instances, one per chain.  The chain
+                    directories must be named by CHAIN_DIR_FMT in top_dir.
+        top_dir -- The directory containing the chain directories.
+        """
+        self.shooters = shooters
+        self.top_dir = os.path.abspath(top_dir)
+        self.logger = logging.getLogger(
+            '.'.join((__name__, self.__class__.__name__)))
+
+    def run_calcs(self, num_paths, resume=False, sinks=()):
+        """Runs the given number of paths in batches of one path per chain,
+        returning the merged results in the same form as
+        AimlessShooter.run_calcs.
+
+        Positional arguments:
+        num_paths -- The total number of paths to run.
+        Keyword arguments:
+        resume -- Not supported for job arrays; raises CfgError if True.
+        sinks -- The report sinks to hand each path's result to once its
+                 batch finishes.
+        """
+        if resume:
+            raise CfgError("Resuming is not supported with array jobs")
+        pres = {}
+        start_sinks(sinks, pres)
+        next_pnum = 1
+        while next_pnum <= num_paths:
+            batch_size = min(len(self.shooters), num_paths - next_pnum + 1)
+            pnums = range(next_pnum, next_pnum + batch_size)
+            results = self.run_batch(pnums)
+            for pnum in pnums:
+                feed_sinks(sinks, pnum, results[pnum])
+            pres.update(results)
+            next_pnum += batch_size
+        return pres
+
+    def run_batch(self, pnums):
+        """Runs one path on each of the first len(pnums) chains, returning
+        the results keyed by path number.
+
+        pnums -- The consecutive path numbers to run.
+        """
+        batch = zip(self.shooters, pnums)
+        start = time.time()
+        shooter_files = {}
+        for aims, pnum in batch:
+            aims.open_path(pnum)
+            aims.timings = PathTimings()
+            aims._done_stages = set()
+            shooter_files[pnum] = aims.choose_shooter()
+            self.logger.debug("Using '%s' for path %d\n" %
+                              (shooter_files[pnum], pnum))
+            aims._log_event(EVENTS.PATH_START, shooter=shooter_files[pnum])
+            stage_file(shooter_files[pnum], aims.pathres(SHOOTER_RST),
+                       mutable=False)
+
+        with self._phase(batch, PHASES.STARTER):
+            self._run_arrays(batch, [STAGES.STARTER])
+        with self._phase(batch, PHASES.REVVEL):
+            for aims, pnum in batch:
+                aims.rev_vel()
+        with self._phase(batch, PHASES.DT):
+            self._run_arrays(batch, [STAGES.DT])
+        with self._phase(batch, PHASES.FWD_BACK):
+            self._run_arrays(batch, [STAGES.FWD, STAGES.BACK])
+
+        results = {}
+        for aims, pnum in batch:
+            timings = aims.timings
+            with timings.phase(PHASES.BASINS):
+                results[pnum] = aims.calc_basins()
+            with timings.phase(PHASES.RESULTS):
+                aims.proc_results(results[pnum], shooter_files[pnum])
+            results[pnum][TIMINGS_KEY] = timings.times
+            aims._log_event(EVENTS.PATH_DONE, result=results[pnum])
+            with timings.phase(PHASES.CLEAN):
+                aims.clean(pnum)
+            timings.add(PHASES.TOTAL, time.time() - start)
+        batch[0][0]._submitted.clear()
+        return results
+
+    @contextmanager
+    def _phase(self, batch, name):
+        """Records the wall time of the with block as the named phase of
+        every path in the batch."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            for aims, pnum in batch:
+                aims.timings.add(name, time.time() - start)
+
+    def _run_arrays(self, batch, stages):
+        """Submits a job array for each of the given stages covering the
+        chains in the batch, returning when all of the jobs are finished."""
+        lead, first_pnum = batch[0]
+        pre_cmds = "cd %s" % os.path.join(
+            pipes.quote(self.top_dir), CHAIN_ARRAY_DIR, WORK_DIR,
+            PATH_ARRAY_DIR_FMT % (first_pnum - 1))
+        job_ids = []
+        done_locs = []
+        timings = []
+        for stage in stages:
+            out_name = STAGE_FILES[stage][3]
+            for aims, pnum in batch:
+                clear_done(aims.pathres(out_name))
+                done_locs.append(done_loc(aims.pathres(out_name)))
+                timings.append(aims.timings)
+            job = lead.stage_job(stage, SHOOTER_RST, pre_cmds=pre_cmds)
+            job.array = "1-%d" % len(batch)
+            job.workdir = self.top_dir
+            self.logger.info("Submitting array:\n%s" % job.contents)
+            submitted = time.time()
+            array_id = lead.sub_handler.submit(job)
+            sub_ids = array_job_ids(array_id, range(1, len(batch) + 1))
+            for (aims, pnum), sub_id in zip(batch, sub_ids):
+                lead._submitted[sub_id] = submitted
+                aims._log_event(EVENTS.SUBMIT, stage=stage, job=sub_id)
+            job_ids.extend(sub_ids)
+        lead._wait_on_jobs(job_ids, done_locs, timings)
+        for aims, pnum in batch:
+            aims._finish_stages(stages)
 
 ### CLI ###
 DEF_CFG_NAME = 'aimless.ini'
@@ -536,10 +1682,16 @@ TPL_DIR_KEY = 'tpldir'
 TGT_DIR_KEY = 'tgtdir'
 TEXT_REPORT_KEY = 'text_report'
 CSV_REPORT_KEY = 'csv_report'
+TIMINGS_REPORT_KEY = 'timings_report'
+SUMMARY_REPORT_KEY = 'summary_report'
+RESULTS_STORE_KEY = 'results_store'
 
 # Reports #
 DEF_TEXT_REPORT = 'aimless_results.txt'
 DEF_CSV_REPORT = 'aimless_results.csv'
+DEF_TIMINGS_REPORT = 'aimless_timings.csv'
+DEF_SUMMARY_REPORT = 'aimless_summary.txt'
+DEF_RESULTS_STORE = 'aimless_results.rec'
 TEXT_FMT = 't'
 CSV_FMT = 'c'
 VALID_FMTS = [TEXT_FMT, CSV_FMT]
@@ -571,6 +1723,12 @@ def fetch_calc_params(config):
     """
     params = calc_params(config.getint(MAIN_SEC, TOTAL_STEPS_KEY))
     params[NUM_PATHS_KEY] = config.getint(MAIN_SEC, NUM_PATHS_KEY)
+    if config.has_option(MAIN_SEC, DUMP_STEPS_KEY):
+        # Dump the forward and backward coordinates more often than at the
+        # end so they can be watched while the jobs run
+        dump_steps = config.getint(MAIN_SEC, DUMP_STEPS_KEY)
+        params[FW_OUT_KEY] = min(dump_steps, params[FW_OUT_KEY])
+        params[BW_OUT_KEY] = min(dump_steps, params[BW_OUT_KEY])
     return params
 
 
@@ -592,7 +1750,7 @@ def write_cfg_tpls(config, params):
     write_tpl_files(tpl_dir, tgt_dir, params)
 
 
-def run(config, tgt_class=AimlessShooter):
+def run(config, tgt_class=AimlessShooter, resume=False, sinks=()):
     """
     Extracts configuration data for the AimlessShooting run, returning the
     results of the execution.
@@ -600,19 +1758,194 @@ def run(config, tgt_class=AimlessShooter):
     Arguments:
     config -- A ConfigParser-style object with the necessary sections and
     values.
+    tgt_class -- The class to create for each chain.
+    resume -- Whether to pick up an interrupted run from its journal rather
+              than starting over.
+    sinks -- The report sinks to hand each path's result to as it finishes.
     """
     num_paths = config.getint(MAIN_SEC, NUM_PATHS_KEY)
     tgt_dir = config.get(MAIN_SEC, TGT_DIR_KEY)
     tpl_dir = config.get(MAIN_SEC, TPL_DIR_KEY)
     coords_file = config.get(MAIN_SEC, COORDS_KEY)
-    init_dir(tgt_dir, coords_file)
+    if not (resume and os.path.exists(os.path.join(tgt_dir, XONE_RST))):
+        init_dir(tgt_dir, coords_file)
     bparams = dict()
     for bkey, bval in config.items(BASINS_SEC):
         bparams[bkey] = float(bval)
     topo_file = config.get(MAIN_SEC, TOPO_KEY)
-    aims = tgt_class(tpl_dir, tgt_dir, topo_file,
-                     dict(config.items(JOBS_SEC)), bparams)
-    return aims.run_calcs(num_paths)
+    num_chains = int(get(config, MAIN_SEC, NUM_CHAINS_KEY, 1))
+    # One archiver for every chain keeps the number of compressors bounded
+    archiver = create_archiver(config)
+    sub_handler = create_sub_handler(config)
+    shooters = []
+    finished = False
+    try:
+        if num_chains > 1:
+            # One shared status cache keeps qstat load flat as chains are
+            # added
+            stat_ttl = float(get(config, MAIN_SEC, STAT_TTL_KEY,
+                                 DEF_STAT_TTL))
+            sub_handler = CachedStatusHandler(sub_handler, ttl=stat_ttl)
+            array_jobs = (config.has_option(MAIN_SEC, ARRAY_JOBS_KEY) and
+                          config.getboolean(MAIN_SEC, ARRAY_JOBS_KEY))
+            if array_jobs and config.has_option(MAIN_SEC, COMMIT_DWELL_KEY):
+                raise CfgError("'%s' is not supported with '%s'" %
+                               (COMMIT_DWELL_KEY, ARRAY_JOBS_KEY))
+            shooters = init_chains(config, num_chains, tgt_class, bparams,
+                                   sub_handler, resume=resume,
+                                   archiver=archiver)
+            if array_jobs:
+                aims = ArrayOrchestrator(shooters, tgt_dir)
+            else:
+                aims = ChainOrchestrator(shooters)
+        else:
+            aims = tgt_class(tpl_dir, tgt_dir, topo_file,
+                             dict(config.items(JOBS_SEC)), bparams,
+                             sub_handler=sub_handler,
+                             journal=open_journal(tgt_dir, resume),
+                             archiver=archiver, **shooter_opts(config))
+            shooters = [aims]
+        calc_opts = {}
+        if resume:
+            calc_opts['resume'] = True
+        if sinks:
+            calc_opts['sinks'] = sinks
+        pres = aims.run_calcs(num_paths, **calc_opts)
+        finished = True
+        return pres
+    finally:
+        # Kill any local jobs left running (e.g. after Ctrl-C, which doesn't
+        # reach their process groups) and remove the handler's node files
+        shutdown_handler(sub_handler)
+        for shooter in shooters:
+            shooter.close()
+        if archiver is not None:
+            # Let the last paths finish compressing, unless the run failed
+            # or was interrupted: then leave the backlog rather than hang
+            archiver.shutdown(wait=finished, drain=not finished)
+
+
+def shutdown_handler(sub_handler):
+    """Shuts down the given submission handler if it has anything to shut
+    down (the local backend does; Torque's does not)."""
+    shutdown = getattr(sub_handler, 'shutdown', None)
+    if shutdown is not None:
+        shutdown()
+
+
+def create_sub_handler(config):
+    """
+    Returns the submission handler for the configured 'backend': 'torque'
+    (the default) submits jobs with qsub, and 'local' runs them on this
+    machine, at most 'maxjobs' at a time (defaults to the number of CPUs).
+
+    config -- A ConfigParser-style object with a 'main' section.
+    """
+    backend = get(config, MAIN_SEC, BACKEND_KEY, BACKENDS.TORQUE)
+    if backend == BACKENDS.TORQUE:
+        return TorqueSubmissionHandler()
+    if backend == BACKENDS.LOCAL:
+        max_jobs = None
+        if config.has_option(MAIN_SEC, MAX_JOBS_KEY):
+            max_jobs = config.getint(MAIN_SEC, MAX_JOBS_KEY)
+        return LocalSubmissionHandler(max_jobs)
+    raise CfgError("Unknown %s '%s'; expected one of: %s" %
+                   (BACKEND_KEY, backend, ", ".join(
+                       (BACKENDS.TORQUE, BACKENDS.LOCAL))))
+
+
+def create_archiver(config):
+    """
+    Returns the Archiver for the configured 'compress' codec: 'gzip' (the
+    default), 'xz', or 'zstd', compressing at most 'compressors' files at a
+    time.  Returns None when 'compress' is 'none'.
+
+    config -- A ConfigParser-style object with a 'main' section.
+    """
+    codec = get(config, MAIN_SEC, COMPRESS_KEY, CODECS.GZIP)
+    if codec == CODECS.NONE:
+        return None
+    max_workers = DEF_MAX_COMPRESSORS
+    if config.has_option(MAIN_SEC, COMPRESSORS_KEY):
+        max_workers = config.getint(MAIN_SEC, COMPRESSORS_KEY)
+    try:
+        return Archiver(codec, max_workers)
+    except ArchiveError, e:
+        raise CfgError("Bad archive settings: %s" % e)
+
+
+def open_journal(tgt_dir, resume):
+    """
+    Returns the journal for the chain in the given directory, emptying it
+    first unless the chain is resuming.
+
+    tgt_dir -- The chain's working directory.
+    resume -- Whether the chain is picking up from its journal.
+    """
+    journal = Journal(os.path.join(tgt_dir, JOURNAL_NAME))
+    if not resume:
+        journal.reset()
+    return journal
+
+
+def shooter_opts(config):
+    """
+    Returns the optional AimlessShooter keyword arguments that are set in the
+    given configuration.
+
+    config -- A ConfigParser-style object with a 'main' section.
+    """
+    opts = {}
+    if config.has_option(MAIN_SEC, JOB_MODE_KEY):
+        opts['job_mode'] = config.get(MAIN_SEC, JOB_MODE_KEY)
+    if config.has_option(MAIN_SEC, COMMIT_DWELL_KEY):
+        opts['commit_dwell'] = config.getint(MAIN_SEC, COMMIT_DWELL_KEY)
+        if not config.has_option(MAIN_SEC, DUMP_STEPS_KEY):
+            logger.warn("'%s' is set without '%s'; the basins will only be "
+                        "checked at the end of each segment" %
+                        (COMMIT_DWELL_KEY, DUMP_STEPS_KEY))
+    return opts
+
+
+def init_chains(config, num_chains, tgt_class, bparams, sub_handler,
+                resume=False, archiver=None):
+    """
+    Creates a working directory for each chain below the configured 'tgtdir',
+    filling it with the shooter pair and the filled templates.  Finished
+    paths from every chain are archived in the shared output directory.
+
+    Arguments:
+    config -- A ConfigParser-style object with the necessary sections and
+    values.
+    num_chains -- The number of chains to create.
+    tgt_class -- The class to create for each chain.
+    bparams -- The basin parameters.
+    sub_handler -- The submission handler shared by the chains.
+    resume -- Whether the chains are picking up from their journals, in
+              which case their shooter pairs are left as they are.
+    archiver -- The Archiver shared by the chains, if any.
+    Returns:
+    A list of tgt_class instances, one per chain.
+    """
+    tgt_dir = os.path.abspath(config.get(MAIN_SEC, TGT_DIR_KEY))
+    tpl_dir = config.get(MAIN_SEC, TPL_DIR_KEY)
+    coords_file = config.get(MAIN_SEC, COORDS_KEY)
+    topo_file = os.path.abspath(config.get(MAIN_SEC, TOPO_KEY))
+    params = fetch_calc_params(config)
+    shooters = []
+    for cnum in range(1, num_chains + 1):
+        chain_dir = os.path.join(tgt_dir, CHAIN_DIR_FMT % cnum)
+        cmakedir(chain_dir)
+        if not (resume and os.path.exists(os.path.join(chain_dir, XONE_RST))):
+            init_dir(chain_dir, coords_file)
+        write_tpl_files(tpl_dir, chain_dir, params)
+        shooters.append(tgt_class(tpl_dir, chain_dir, topo_file,
+                                  dict(config.items(JOBS_SEC)), bparams,
+                                  sub_handler=sub_handler,
+                                  out_dir=os.path.join(tgt_dir, OUT_DIR),
+                                  journal=open_journal(chain_dir, resume),
+                                  archiver=archiver, **shooter_opts(config)))
+    return shooters
 
 # Command-line processing and control #
 
@@ -675,6 +2008,9 @@ def parse_cmdline(argv):
     parser.add_option('-o', '--out_formats', default=DEF_OUT_FMTS,
                       help="Specify output formats (t and/or c).",
                       metavar="FMTS")
+    parser.add_option('-r', '--resume', action='store_true', default=False,
+                      help="Pick up an interrupted run from its journal, "
+                           "re-adopting any jobs that are still running.")
     parser.add_option('-h', '--help', action='help',
                       help='Show this help message and exit.')
 
@@ -712,8 +2048,57 @@ def print_reports(config, fmts, pres):
             csv_file = get(config, MAIN_SEC, CSV_REPORT_KEY, DEF_CSV_REPORT)
             with open(csv_file, 'w') as csv_tgt:
                 write_csv_report(pres, csv_tgt)
+            timings_file = get(config, MAIN_SEC, TIMINGS_REPORT_KEY,
+                               DEF_TIMINGS_REPORT)
+            with open(timings_file, 'w') as timings_tgt:
+                write_timings_csv(pres, timings_tgt)
+        else:
+            raise CfgError("Unhandled output format '%s'" % fmt)
+
+
+def create_report_sinks(config, fmts):
+    """
+    Returns the report sinks that keep the reports up to date while the
+    calculation runs: the columnar results store, the running totals for the
+    text format, and the CSV report, written a row at a time, for the CSV
+    format.
+
+    config -- The configuration instance to query.
+    fmts   -- A string where each character represents a report format.
+    """
+    sinks = [ResultStore(get(config, MAIN_SEC, RESULTS_STORE_KEY,
+                             DEF_RESULTS_STORE))]
+    for fmt in fmts:
+        if fmt.lower() == TEXT_FMT:
+            sinks.append(SummaryReportSink(get(config, MAIN_SEC,
+                                               SUMMARY_REPORT_KEY,
+                                               DEF_SUMMARY_REPORT)))
+        elif fmt.lower() == CSV_FMT:
+            sinks.append(CsvReportSink(get(config, MAIN_SEC, CSV_REPORT_KEY,
+                                           DEF_CSV_REPORT)))
         else:
             raise CfgError("Unhandled output format '%s'" % fmt)
+    return sinks
+
+
+def revvel_main(argv=None):
+    """
+    Entry point for reversing the velocities of a restart file.  Used from
+    within dependent jobs so that no work is needed on the login node between
+    the starter and dt jobs.
+
+    argv -- The CLI arguments to process.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage="%prog forward_rst backward_rst",
+        formatter=optparse.TitledHelpFormatter(width=78))
+    opts, args = parser.parse_args(argv)
+    if len(args) != 2:
+        parser.error('Please specify the forward and backward restart files')
+    rev_vel(args[0], args[1])
+    return 0        # success
 
 
 def main(argv=None):
@@ -728,7 +2113,8 @@ def main(argv=None):
     config = read_config(opts.cfg_file)
     params = fetch_calc_params(config)
     write_cfg_tpls(config, params)
-    pres = run(config)
+    sinks = create_report_sinks(config, opts.out_formats)
+    pres = run(config, resume=opts.resume, sinks=sinks)
 
     print_reports(config, opts.out_formats, pres)
     return 0        # success
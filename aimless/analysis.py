@@ -0,0 +1,355 @@
+"""
+Fits committor models to the shooting points of an aimless shooting
+campaign by likelihood maximization.
+
+Each shooting point is described by the values of some candidate collective
+variables (CVs) and by the basins its forward and backward trajectories
+ended in.  The probability of a trajectory from a point ending in B is
+modeled as
+
+    p_B(r) = (1 + erf(q(r))) / 2,  with q(r) = a0 + a1 * r1 + ... + aN * rN
+
+and the coefficients are chosen to maximize the log likelihood
+
+    ln L = sum(n_B * ln p_B(r) + n_A * ln(1 - p_B(r)))
+
+over the points, where n_A and n_B are the number of the point's two
+trajectories that ended in A and B (inconclusive trajectories are left out).
+The log likelihood, its gradient, and its Hessian are computed for all of
+the points at once with NumPy, and the model, being log-concave in the
+coefficients, is fitted with Newton's method.
+
+The log of erfc is computed directly (rather than as the log of a tiny
+difference), so points deep in either basin don't lose precision.
+
+The shooting points of an archived campaign are read with
+load_shooting_points: the CVs of a point are the reaction coordinates (all
+of the DUMPAVE columns) at the end of its dt segment, where the forward
+trajectory was launched, and its outcomes are the basins of the final
+reaction coordinates of the forward and backward trajectories.
+"""
+
+import logging
+import os
+import numpy as np
+from aimless import (BRES, DT_CONS_NAME, FWD_CONS_NAME, BACK_CONS_NAME,
+                     RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_LOW_A_KEY,
+                     RC2_HIGH_A_KEY, RC1_LOW_B_KEY, RC1_HIGH_B_KEY,
+                     RC2_LOW_B_KEY, RC2_HIGH_B_KEY)
+from common import InvalidDataError
+from dumpave import read_record
+from results import BASIN_COLS, BASIN_A, BASIN_B
+
+# The coefficients of the Chebyshev fit for erfc (fractional error below
+# 1.2e-7) from Numerical Recipes, highest order first
+ERFC_COEFS = (0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807,
+              -0.18628806, 0.09678418, 0.37409196, 1.00002368, -1.26551223)
+TWO_OVER_SQRT_PI = 2.0 / np.sqrt(np.pi)
+LN_TWO = np.log(2.0)
+DEF_TOL = 1e-9
+DEF_MAX_ITER = 100
+MAX_HALVINGS = 40
+RC_NAME_FMT = 'RC%d'
+BASIN_KEYS = (RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_LOW_A_KEY, RC2_HIGH_A_KEY,
+              RC1_LOW_B_KEY, RC1_HIGH_B_KEY, RC2_LOW_B_KEY, RC2_HIGH_B_KEY)
+
+logger = logging.getLogger(__name__)
+
+
+def log_erfc(x):
+    "Returns the natural log of erfc for each of the given values."
+    x = np.asarray(x, dtype=float)
+    t = 1.0 / (1.0 + 0.5 * np.abs(x))
+    poly = np.polyval(ERFC_COEFS, t)
+    # The log of erfc(|x|), which is at most 1
+    log_pos = np.log(t) - x * x + poly
+    return np.where(x >= 0, log_pos, np.log(2.0 - np.exp(log_pos)))
+
+
+def committor(q):
+    "Returns p_B = (1 + erf(q)) / 2 for each of the given values of q."
+    return 0.5 * np.exp(log_erfc(-np.asarray(q, dtype=float)))
+
+
+def log_likelihood(coefs, design, n_a, n_b, derivs=False):
+    """Returns the log likelihood of the given model coefficients for the
+    shooting points.
+
+    Positional arguments:
+    coefs -- The coefficients of q: the intercept, then one per CV.
+    design -- The design matrix: a column of ones, then a column per CV,
+              with a row per point.
+    n_a -- The number of each point's trajectories that ended in A.
+    n_b -- The number of each point's trajectories that ended in B.
+    Keyword arguments:
+    derivs -- Whether to also return the gradient and Hessian with respect
+              to the coefficients (default False).
+    Returns:
+    The log likelihood, or a 3-tuple of the log likelihood, gradient, and
+    Hessian when derivs is True.
+    """
+    q = design.dot(coefs)
+    log_pb = log_erfc(-q) - LN_TWO
+    log_pa = log_erfc(q) - LN_TWO
+    loglike = np.dot(n_b, log_pb) + np.dot(n_a, log_pa)
+    if not derivs:
+        return loglike
+    # d ln p / dq for each outcome, written to stay finite in the tails
+    gauss = -q * q
+    grad_b = TWO_OVER_SQRT_PI * np.exp(gauss - log_pb - LN_TWO)
+    grad_a = -TWO_OVER_SQRT_PI * np.exp(gauss - log_pa - LN_TWO)
+    dq = n_b * grad_b + n_a * grad_a
+    d2q = (n_b * (-2.0 * q * grad_b - grad_b * grad_b) +
+           n_a * (-2.0 * q * grad_a - grad_a * grad_a))
+    grad = design.T.dot(dq)
+    hess = (design * d2q[:, np.newaxis]).T.dot(design)
+    return loglike, grad, hess
+
+
+class CommittorFit(object):
+    """The maximum-likelihood committor model for a set of CVs."""
+
+    def __init__(self, names, coefs, loglike, num_points, iterations,
+                 converged):
+        self.names = list(names)
+        self.coefs = coefs
+        self.loglike = loglike
+        self.num_points = num_points
+        self.iterations = iterations
+        self.converged = converged
+
+    @property
+    def num_params(self):
+        "The number of fitted coefficients, including the intercept."
+        return len(self.coefs)
+
+    @property
+    def bic(self):
+        """The Bayesian information criterion of the fit; lower values are
+        better, with each added CV needing to raise ln L by ln(points) / 2."""
+        return self.num_params * np.log(self.num_points) - 2.0 * self.loglike
+
+    def q(self, cvs):
+        "Returns q for each row of the given CV values."
+        cvs = np.asarray(cvs, dtype=float)
+        return self.coefs[0] + cvs.dot(self.coefs[1:])
+
+    def committor(self, cvs):
+        "Returns p_B for each row of the given CV values."
+        return committor(self.q(cvs))
+
+    def __str__(self):
+        terms = ["%.6g" % self.coefs[0]] + [
+            "%+.6g*%s" % (coef, name)
+            for coef, name in zip(self.coefs[1:], self.names)]
+        return "q = %s (ln L = %.6g, %d points)" % (
+            " ".join(terms), self.loglike, self.num_points)
+
+
+def fit_committor(cvs, n_a, n_b, names=None, tol=DEF_TOL,
+                  max_iter=DEF_MAX_ITER):
+    """Returns the CommittorFit maximizing the likelihood of the given
+    outcomes, with q linear in the given CVs.
+
+    Positional arguments:
+    cvs -- The CV values: an array with a row per point and a column per CV.
+    n_a -- The number of each point's trajectories that ended in A.
+    n_b -- The number of each point's trajectories that ended in B.
+    Keyword arguments:
+    names -- The CV names (defaults to RC1, RC2, ...).
+    tol -- The change in the log likelihood, relative to its size, below
+           which the fit has converged.
+    max_iter -- The largest number of Newton steps to take.
+    """
+    cvs = np.asarray(cvs, dtype=float)
+    if cvs.ndim == 1:
+        cvs = cvs[:, np.newaxis]
+    n_a = np.asarray(n_a, dtype=float)
+    n_b = np.asarray(n_b, dtype=float)
+    num_points, num_cvs = cvs.shape
+    if names is None:
+        names = [RC_NAME_FMT % (col + 1) for col in range(num_cvs)]
+    if len(names) != num_cvs:
+        raise InvalidDataError("%d CV names for %d CVs" %
+                               (len(names), num_cvs))
+    if not (len(n_a) == len(n_b) == num_points):
+        raise InvalidDataError("The CVs and outcomes are for different "
+                               "numbers of points")
+    if not num_points:
+        raise InvalidDataError("There are no shooting points to fit")
+    # Fitting standardized CVs keeps the Hessian well conditioned
+    means = cvs.mean(axis=0)
+    scales = cvs.std(axis=0)
+    scales[scales == 0] = 1.0
+    design = np.empty((num_points, num_cvs + 1))
+    design[:, 0] = 1.0
+    design[:, 1:] = (cvs - means) / scales
+    coefs = np.zeros(num_cvs + 1)
+    loglike, grad, hess = log_likelihood(coefs, design, n_a, n_b, True)
+    converged = False
+    iterations = 0
+    while iterations < max_iter and not converged:
+        iterations += 1
+        try:
+            step = np.linalg.solve(-hess, grad)
+        except np.linalg.LinAlgError:
+            step = np.linalg.lstsq(-hess, grad, rcond=-1)[0]
+        for _ in range(MAX_HALVINGS):
+            new_loglike = log_likelihood(coefs + step, design, n_a, n_b)
+            if new_loglike >= loglike:
+                break
+            step *= 0.5
+        else:
+            # No step improves on the current coefficients
+            converged = True
+            break
+        coefs = coefs + step
+        converged = new_loglike - loglike <= tol * (1.0 + abs(new_loglike))
+        loglike, grad, hess = log_likelihood(coefs, design, n_a, n_b, True)
+    if not converged:
+        logger.warn("The committor fit for %s did not converge in %d steps; "
+                    "the outcomes may be separable by these CVs" %
+                    (", ".join(names), iterations))
+    # Back to the coefficients of the unscaled CVs
+    unscaled = np.empty_like(coefs)
+    unscaled[1:] = coefs[1:] / scales
+    unscaled[0] = coefs[0] - np.dot(unscaled[1:], means)
+    return CommittorFit(names, unscaled, loglike, num_points, iterations,
+                        converged)
+
+
+def basin_params(items):
+    """Returns the basin parameters in the given (key, value) pairs (e.g. the
+    items of a configuration's basins section) as floats keyed by
+    BASIN_KEYS.  The keys are matched without regard to case, since
+    ConfigParser lowercases them."""
+    found = dict((key.lower(), val) for key, val in items)
+    missing = [key for key in BASIN_KEYS if key.lower() not in found]
+    if missing:
+        raise InvalidDataError("Missing basin parameters: %s" %
+                               ", ".join(missing))
+    return dict((key, float(found[key.lower()])) for key in BASIN_KEYS)
+
+
+def classify_basins(rc1, rc2, bparams):
+    """Returns the BRES basin for each of the given pairs of reaction
+    coordinates, as AimlessShooter.find_basin_dir does for one pair.
+
+    Positional arguments:
+    rc1 -- The values of the first reaction coordinate.
+    rc2 -- The values of the second reaction coordinate.
+    bparams -- The basin parameters.
+    """
+    rc1 = np.asarray(rc1, dtype=float)
+    rc2 = np.asarray(rc2, dtype=float)
+    in_a = ((bparams[RC1_LOW_A_KEY] < rc1) & (rc1 < bparams[RC1_HIGH_A_KEY]) &
+            (bparams[RC2_LOW_A_KEY] < rc2) & (rc2 < bparams[RC2_HIGH_A_KEY]))
+    in_b = ((bparams[RC1_LOW_B_KEY] < rc1) & (rc1 < bparams[RC1_HIGH_B_KEY]) &
+            (bparams[RC2_LOW_B_KEY] < rc2) & (rc2 < bparams[RC2_HIGH_B_KEY]))
+    return np.where(in_a, BRES.A, np.where(in_b, BRES.B, BRES.INC))
+
+
+class ShootingPoints(object):
+    """The CV values and outcomes of a set of shooting points."""
+
+    def __init__(self, cvs, names, n_a, n_b, locs=None):
+        """Sets up the initial state for this instance.
+
+        Positional arguments:
+        cvs -- The CV values: an array with a row per point.
+        names -- The name of each CV column.
+        n_a -- The number of each point's trajectories that ended in A.
+        n_b -- The number of each point's trajectories that ended in B.
+        Keyword arguments:
+        locs -- The archived path directory of each point, if known.
+        """
+        self.cvs = np.asarray(cvs, dtype=float)
+        self.names = list(names)
+        self.n_a = np.asarray(n_a)
+        self.n_b = np.asarray(n_b)
+        self.locs = locs
+
+    def __len__(self):
+        return len(self.n_a)
+
+    def columns(self, names):
+        "Returns the values of the named CVs, a column per CV."
+        return self.cvs[:, [self.names.index(name) for name in names]]
+
+    def fit(self, names=None, **kwargs):
+        """Returns the CommittorFit for the named CVs (defaults to all of
+        them).  Any keyword arguments are passed to fit_committor."""
+        if names is None:
+            names = self.names
+        return fit_committor(self.columns(names), self.n_a, self.n_b,
+                             names=names, **kwargs)
+
+
+def load_shooting_points(out_dir, bparams):
+    """Returns the ShootingPoints of the paths archived in the given output
+    directory.  Paths that are missing a DUMPAVE file (e.g. ones that
+    failed) and paths with two inconclusive trajectories are left out.
+
+    Positional arguments:
+    out_dir -- The directory holding the archived path directories.
+    bparams -- The basin parameters.
+    """
+    locs = []
+    rows = []
+    ends = []
+    for name in sorted(os.listdir(out_dir)):
+        path_dir = os.path.join(out_dir, name)
+        if not os.path.isdir(path_dir):
+            continue
+        try:
+            point = read_record(os.path.join(path_dir, DT_CONS_NAME))[1:]
+            fwd = read_record(os.path.join(path_dir, FWD_CONS_NAME))[1:3]
+            back = read_record(os.path.join(path_dir, BACK_CONS_NAME))[1:3]
+        except (IOError, InvalidDataError), e:
+            logger.warn("Skipping '%s': %s" % (path_dir, e))
+            continue
+        if rows and len(point) != len(rows[0]):
+            raise InvalidDataError("'%s' has %d reaction coordinates; "
+                                   "expected %d" %
+                                   (path_dir, len(point), len(rows[0])))
+        locs.append(path_dir)
+        rows.append(point)
+        ends.append(fwd + back)
+    ends = np.array(ends, dtype=float).reshape(-1, 4)
+    fwd_basins = classify_basins(ends[:, 0], ends[:, 1], bparams)
+    back_basins = classify_basins(ends[:, 2], ends[:, 3], bparams)
+    n_a = (fwd_basins == BRES.A).astype(int) + (back_basins == BRES.A)
+    n_b = (fwd_basins == BRES.B).astype(int) + (back_basins == BRES.B)
+    keep = (n_a + n_b) > 0
+    num_cvs = len(rows[0]) if rows else 0
+    cvs = np.array(rows, dtype=float).reshape(len(rows), num_cvs)
+    return ShootingPoints(cvs[keep],
+                          [RC_NAME_FMT % (col + 1) for col in range(num_cvs)],
+                          n_a[keep], n_b[keep],
+                          [loc for loc, kept in zip(locs, keep) if kept])
+
+
+def points_from_records(records, names):
+    """Returns the ShootingPoints of the given result records (e.g. those of
+    a store written by aimless_cvs), taking the named columns as the CVs.
+    Records with two inconclusive trajectories or a missing CV are left
+    out.
+
+    Positional arguments:
+    records -- The result records (see results.ResultStore.records).
+    names -- The columns to take as the CVs.
+    """
+    if not names:
+        raise InvalidDataError("No CV columns were given")
+    missing = [name for name in names if name not in records.dtype.names]
+    if missing:
+        raise InvalidDataError("The results have no column for: %s" %
+                               ", ".join(missing))
+    fwd, back = records[BASIN_COLS[0]], records[BASIN_COLS[1]]
+    n_a = (fwd == BASIN_A).astype(int) + (back == BASIN_A)
+    n_b = (fwd == BASIN_B).astype(int) + (back == BASIN_B)
+    cvs = np.column_stack([np.asarray(records[name], dtype=float)
+                           for name in names]).reshape(len(records),
+                                                       len(names))
+    keep = ((n_a + n_b) > 0) & np.all(np.isfinite(cvs), axis=1)
+    return ShootingPoints(cvs[keep], names, n_a[keep], n_b[keep])
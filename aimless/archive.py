@@ -0,0 +1,473 @@
+"""
+Compresses the bulky files of finished paths (the trajectories and Amber
+output) once they have been archived, and reads them back transparently.
+
+An Archiver compresses the matching files of each directory handed to it in
+a bounded pool of background threads, so the next path never waits on it.
+Each file is written to a temporary name beside the original, renamed to the
+original's name plus the codec's extension (e.g. forward.mdcrd.gz), and only
+then is the original removed; an interrupted compression leaves the original
+in place.
+
+gzip is always available.  xz and zstd are used through the xz and zstd
+commands, when they are on the PATH.
+
+gzip output is written in blocks: each BLOCK_SIZE bytes of the original are
+compressed as a gzip member of their own, whose header records the member's
+size.  The result is still an ordinary gzip file, but BlockReader can find
+the members by hopping from header to header and decompress only the ones
+holding the bytes asked for, so archived trajectories stay random-access.
+xz and zstd output can only be read from the start.
+
+open_archived opens a file by its original name whether or not it has been
+compressed.
+"""
+
+import bisect
+import errno
+from distutils.spawn import find_executable
+from fnmatch import fnmatch
+import gzip
+import logging
+import os
+import Queue
+import shutil
+import signal
+import struct
+import subprocess
+import threading
+import zlib
+from common import enum, JobSlaveError
+
+CODECS = enum(GZIP='gzip', XZ='xz', ZSTD='zstd', NONE='none')
+# The extension added to the files compressed with each codec
+CODEC_EXTS = {CODECS.GZIP: '.gz', CODECS.XZ: '.xz', CODECS.ZSTD: '.zst'}
+# The commands used for the codecs that are not handled in-process
+CODEC_CMDS = {CODECS.XZ: 'xz', CODECS.ZSTD: 'zstd'}
+# The files compressed by default: trajectories and Amber output
+DEF_PATTERNS = ('*.mdcrd', '*.out')
+DEF_MAX_COMPRESSORS = 2
+DEF_GZIP_LEVEL = 6
+PART_SUFFIX = '.part'
+# The bytes of the original compressed into each gzip member
+BLOCK_SIZE = 1 << 20
+# The header of a gzip member written by write_blocks: the magic number,
+# method, flags, time, extra flags, OS, and one extra subfield (the id, its
+# length, and the member's size)
+BLOCK_HEADER = struct.Struct('<2sBBIBBH2sHI')
+BLOCK_TRAILER = struct.Struct('<II')
+GZIP_MAGIC = '\x1f\x8b'
+GZIP_DEFLATE = 8
+GZIP_FEXTRA = 4
+GZIP_OS_UNKNOWN = 255
+BLOCK_FIELD = 'AB'
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveError(JobSlaveError): pass
+
+
+def available_codecs():
+    "Returns the codecs that can be used on this machine."
+    return [CODECS.GZIP] + [codec for codec in (CODECS.XZ, CODECS.ZSTD)
+                            if find_executable(CODEC_CMDS[codec])]
+
+
+def resolve_codec(codec):
+    """Returns the given codec if it can be used on this machine, and gzip
+    (with a warning) if its command is not installed."""
+    if codec not in CODEC_EXTS:
+        raise ArchiveError("Unknown codec '%s'; expected one of: %s" %
+                           (codec, ", ".join(sorted(CODEC_EXTS))))
+    if codec not in available_codecs():
+        logger.warn("'%s' is not installed; compressing with %s instead" %
+                    (CODEC_CMDS[codec], CODECS.GZIP))
+        return CODECS.GZIP
+    return codec
+
+
+def _restore_sigpipe():
+    "Lets a child process die quietly when its reader goes away."
+    signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+
+
+def compress_file(loc, codec=CODECS.GZIP, level=None):
+    """Compresses the given file, replacing it with the compressed copy.
+
+    Positional arguments:
+    loc -- The file to compress.
+    Keyword arguments:
+    codec -- The codec to compress with (defaults to gzip).
+    level -- The compression level (defaults to the codec's own default,
+             or DEF_GZIP_LEVEL for gzip).
+    Returns:
+    The location of the compressed file.
+    """
+    tgt_loc = loc + CODEC_EXTS[codec]
+    part_loc = tgt_loc + PART_SUFFIX
+    try:
+        if codec == CODECS.GZIP:
+            with open(loc, 'rb') as src_file:
+                with open(part_loc, 'wb') as tgt_file:
+                    write_blocks(src_file, tgt_file, level)
+        else:
+            cmd = [CODEC_CMDS[codec], '-c', '-q']
+            if level is not None:
+                cmd.append('-%d' % level)
+            with open(part_loc, 'wb') as tgt_file:
+                status = subprocess.call(cmd + [loc], stdout=tgt_file,
+                                         preexec_fn=_restore_sigpipe)
+            if status:
+                raise ArchiveError("'%s' exited with status %d compressing "
+                                   "'%s'" % (cmd[0], status, loc))
+        shutil.copystat(loc, part_loc)
+        os.rename(part_loc, tgt_loc)
+    except:
+        if os.path.exists(part_loc):
+            os.remove(part_loc)
+        raise
+    os.remove(loc)
+    return tgt_loc
+
+
+def write_blocks(src_file, tgt_file, level=None, block_size=None):
+    """Writes the contents of one file to another as gzip members of
+    block_size bytes each (see BlockReader).
+
+    Positional arguments:
+    src_file -- The file to read.
+    tgt_file -- The file to write the compressed members to.
+    Keyword arguments:
+    level -- The compression level (defaults to DEF_GZIP_LEVEL).
+    block_size -- The bytes of the source in each member (defaults to
+                  BLOCK_SIZE).
+    """
+    level = level or DEF_GZIP_LEVEL
+    block_size = block_size or BLOCK_SIZE
+    written = False
+    while True:
+        data = src_file.read(block_size)
+        # An empty file still gets one (empty) member
+        if not data and written:
+            return
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        body = compressor.compress(data) + compressor.flush()
+        size = BLOCK_HEADER.size + len(body) + BLOCK_TRAILER.size
+        tgt_file.write(BLOCK_HEADER.pack(
+            GZIP_MAGIC, GZIP_DEFLATE, GZIP_FEXTRA, 0, 0, GZIP_OS_UNKNOWN,
+            BLOCK_HEADER.size - 12, BLOCK_FIELD, 4, size))
+        tgt_file.write(body)
+        tgt_file.write(BLOCK_TRAILER.pack(zlib.crc32(data) & 0xffffffff,
+                                          len(data)))
+        written = True
+
+
+def read_blocks(arc_file):
+    """Returns the offsets of the members of a gzip file written by
+    write_blocks, as (compressed, uncompressed) pairs followed by the sizes of
+    the whole file, or None if the file was not written in blocks.  Only the
+    members' headers and trailers are read."""
+    arc_file.seek(0, os.SEEK_END)
+    total = arc_file.tell()
+    blocks = [(0, 0)]
+    while blocks[-1][0] < total:
+        start, data_start = blocks[-1]
+        arc_file.seek(start)
+        header = arc_file.read(BLOCK_HEADER.size)
+        if len(header) < BLOCK_HEADER.size:
+            return None
+        (magic, method, flags, _, _, _, xlen, field, field_len,
+         size) = BLOCK_HEADER.unpack(header)
+        if (magic != GZIP_MAGIC or method != GZIP_DEFLATE or
+                flags != GZIP_FEXTRA or xlen != BLOCK_HEADER.size - 12 or
+                field != BLOCK_FIELD or field_len != 4 or
+                size < BLOCK_HEADER.size + BLOCK_TRAILER.size or
+                start + size > total):
+            return None
+        arc_file.seek(start + size - BLOCK_TRAILER.size)
+        data_size = BLOCK_TRAILER.unpack(
+            arc_file.read(BLOCK_TRAILER.size))[1]
+        blocks.append((start + size, data_start + data_size))
+    return blocks
+
+
+class BlockReader(object):
+    """Random access to the contents of a gzip file written by
+    write_blocks.  Only the members holding the bytes asked for are
+    decompressed, and the last one is kept for the next read."""
+
+    def __init__(self, loc, blocks=None):
+        """Opens the file and finds its members.
+
+        Positional arguments:
+        loc -- The compressed file.
+        Keyword arguments:
+        blocks -- The members' offsets, as returned by read_blocks (found
+                  from the file if not given).
+        Raises an ArchiveError if the file was not written in blocks.
+        """
+        self.name = loc
+        self._file = open(loc, 'rb')
+        try:
+            if blocks is None:
+                blocks = read_blocks(self._file)
+            if not blocks:
+                raise ArchiveError("'%s' was not compressed in blocks" % loc)
+        except:
+            self._file.close()
+            raise
+        self.blocks = blocks
+        self._starts = [data_start for _, data_start in blocks]
+        self.size = self._starts[-1]
+        self._cached = None, None
+
+    def __len__(self):
+        return self.size
+
+    def _block(self, num):
+        "Returns the contents of the given member."
+        if self._cached[0] == num:
+            return self._cached[1]
+        start, end = self.blocks[num][0], self.blocks[num + 1][0]
+        self._file.seek(start)
+        member = self._file.read(end - start)
+        data = zlib.decompress(
+            member[BLOCK_HEADER.size:-BLOCK_TRAILER.size], -zlib.MAX_WBITS)
+        crc, data_size = BLOCK_TRAILER.unpack(member[-BLOCK_TRAILER.size:])
+        if (len(data) != data_size or
+                zlib.crc32(data) & 0xffffffff != crc):
+            raise IOError("Corrupt block at %d in '%s'" % (start, self.name))
+        self._cached = num, data
+        return data
+
+    def _block_num(self, pos):
+        "Returns the member holding the given offset."
+        return bisect.bisect_right(self._starts, pos) - 1
+
+    def iter_blocks(self, start=0):
+        """Yields the contents from the given offset on, a member at a time,
+        as (offset, data) pairs."""
+        start = max(start, 0)
+        for num in xrange(self._block_num(start), len(self.blocks) - 1):
+            block_start = self._starts[num]
+            yield max(start, block_start), self._block(num)[
+                max(start - block_start, 0):]
+
+    def read(self, start, stop):
+        "Returns the contents from offset start up to stop."
+        stop = min(stop, self.size)
+        parts = []
+        for offset, data in self.iter_blocks(start):
+            if offset >= stop:
+                break
+            parts.append(data[:stop - offset])
+        return "".join(parts)
+
+    def __getitem__(self, key):
+        "Returns a slice of the contents (steps are not supported)."
+        start, stop, step = key.indices(self.size)
+        if step != 1:
+            raise ValueError("BlockReader slices cannot have a step")
+        return self.read(start, stop)
+
+    def find(self, sub, start=0):
+        """Returns the offset of the first sub (which must not straddle two
+        members, e.g. a single character) at or after start, or -1."""
+        for offset, data in self.iter_blocks(start):
+            found = data.find(sub)
+            if found >= 0:
+                return offset + found
+        return -1
+
+    def close(self):
+        self._cached = None, None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PipeReader(object):
+    """A read-only file over the output of a decompression command."""
+
+    def __init__(self, cmd, loc):
+        self.name = loc
+        self._proc = subprocess.Popen(cmd + [loc], stdout=subprocess.PIPE,
+                                      preexec_fn=_restore_sigpipe)
+        self._file = self._proc.stdout
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self):
+        """Closes the pipe.  A command that failed (rather than being cut off
+        by the close) raises an IOError."""
+        if self._file.closed:
+            return
+        self._file.close()
+        status = self._proc.wait()
+        if status > 0:
+            raise IOError("Could not decompress '%s' (status %d)" %
+                          (self.name, status))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def find_archived(loc):
+    """Returns the location and codec of the given file as it is currently
+    stored: the file itself (with a codec of None) or its compressed copy.
+    Raises an IOError if neither exists."""
+    if os.path.exists(loc):
+        return loc, None
+    for codec, ext in CODEC_EXTS.items():
+        if os.path.exists(loc + ext):
+            return loc + ext, codec
+    raise IOError(errno.ENOENT, "No such file or its compressed copy", loc)
+
+
+def open_archived(loc):
+    """Opens the given file for reading in binary mode, or its compressed copy
+    if the file has been compressed.
+
+    loc -- The file's original (uncompressed) location.
+    """
+    try:
+        return open(loc, 'rb')
+    except IOError, e:
+        if e.errno != errno.ENOENT:
+            raise
+    # The file may be compressed (or have just been compressed)
+    arc_loc, codec = find_archived(loc)
+    if codec is None:
+        return open(arc_loc, 'rb')
+    if codec == CODECS.GZIP:
+        return gzip.open(arc_loc, 'rb')
+    return PipeReader([CODEC_CMDS[codec], '-d', '-c', '-q'], arc_loc)
+
+
+class Archiver(object):
+    """Compresses the matching files of the directories handed to it in a
+    bounded pool of background threads.
+
+    Failures are logged and leave the original file in place.
+    """
+
+    def __init__(self, codec=CODECS.GZIP, max_workers=DEF_MAX_COMPRESSORS,
+                 patterns=DEF_PATTERNS, level=None):
+        """Sets up the initial state for this instance.
+
+        Keyword arguments:
+        codec -- The codec to compress with (defaults to gzip).  A codec
+                 whose command is not installed falls back to gzip.
+        max_workers -- The number of files to compress at once (defaults to
+                       DEF_MAX_COMPRESSORS).
+        patterns -- The shell-style patterns of the file names to compress
+                    (defaults to the trajectories and Amber output).
+        level -- The compression level (defaults to the codec's default).
+        """
+        if max_workers < 1:
+            raise ArchiveError("The compressor limit must be at least 1, "
+                               "not %d" % max_workers)
+        self.codec = resolve_codec(codec)
+        self.max_workers = max_workers
+        self.patterns = patterns
+        self.level = level
+        # Counts rather than lists, which would grow for the whole campaign
+        self.num_compressed = 0
+        self.num_failed = 0
+        self._queue = Queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def matches(self, dir_loc):
+        "Returns the files in the given directory that would be compressed."
+        return [os.path.join(dir_loc, name)
+                for name in sorted(os.listdir(dir_loc))
+                if any(fnmatch(name, pattern) for pattern in self.patterns)]
+
+    def submit(self, dir_loc):
+        """Queues the matching files in the given directory for compression
+        and returns them without waiting."""
+        locs = self.matches(dir_loc)
+        for loc in locs:
+            self._queue.put(loc)
+        with self._lock:
+            while len(self._workers) < min(self.max_workers,
+                                           self._queue.qsize()):
+                worker = threading.Thread(target=self._work,
+                                          name="archiver-%d" %
+                                          len(self._workers))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+        return locs
+
+    def _work(self):
+        "Compresses queued files until told to stop."
+        while True:
+            loc = self._queue.get()
+            try:
+                if loc is None:
+                    return
+                try:
+                    compress_file(loc, self.codec, self.level)
+                    with self._lock:
+                        self.num_compressed += 1
+                except (IOError, OSError, ArchiveError), e:
+                    logger.warn("Could not compress '%s': %s" % (loc, e))
+                    with self._lock:
+                        self.num_failed += 1
+            finally:
+                self._queue.task_done()
+
+    def wait(self):
+        "Blocks until every queued file has been handled."
+        self._queue.join()
+
+    def shutdown(self, wait=True, drain=False):
+        """Stops the workers once the queued files have been handled.
+
+        wait -- Whether to block until they have (defaults to True).
+        drain -- Whether to drop the files that are queued but not yet being
+                 compressed, leaving them as they are (defaults to False).
+                 Used when the run is ending early, so that it does not
+                 wait on a long backlog.
+        """
+        if drain:
+            dropped = self._drain()
+            if dropped:
+                logger.warn("Leaving %d queued files uncompressed" % dropped)
+        with self._lock:
+            workers = list(self._workers)
+            self._workers = []
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _drain(self):
+        "Removes the queued files, returning how many there were."
+        dropped = 0
+        while True:
+            try:
+                loc = self._queue.get_nowait()
+            except Queue.Empty:
+                return dropped
+            if loc is not None:
+                dropped += 1
+            self._queue.task_done()
@@ -2,8 +2,15 @@ from abc import ABCMeta, abstractmethod
 from datetime import datetime
 import inspect
 import logging
+import errno
 import os
+import tempfile
+import time
 from shutil import copy2, Error, copystat, WindowsError
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 class JobSlaveError(Exception): pass
@@ -73,6 +80,12 @@ def to_datetime(raw_val):
     except TypeError, e:
         raise InvalidDataError("Type %s can't be made a datetime: %s", (type(raw_val), e))
 
+def to_epoch(val):
+    "Returns the given datetime as seconds since the epoch (None passes)."
+    if val is None:
+        return None
+    return time.mktime(val.timetuple()) + val.microsecond / 1e6
+
 def as_not_falsy(val, msg="Object evaluates to False"):
     """Test that the value does not evaluate to false; raises InvalidDataError
     if the data is False."""
@@ -284,3 +297,98 @@ def copytree(src, dst, symlinks=False, ignore=None):
             errors.append((src, dst, str(why)))
     if errors:
         raise Error, errors
+
+# The Linux ioctl that shares one file's extents with another (FICLONE)
+FICLONE = 0x40049409
+STAGE_METHODS = enum(REFLINK='reflink', HARDLINK='hardlink', RENAME='rename',
+                     COPY='copy')
+
+
+def _tmp_beside(dst):
+    "Returns the location of a new empty file in dst's directory."
+    tmp_fd, tmp_loc = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(dst)),
+        prefix=".%s." % os.path.basename(dst))
+    os.close(tmp_fd)
+    return tmp_loc
+
+
+def _reflink(src, tmp_loc):
+    "Clones src's extents into tmp_loc, raising IOError if unsupported."
+    if fcntl is None:
+        raise IOError(errno.EOPNOTSUPP, "Reflinks are not supported")
+    with open(src, 'rb') as src_file:
+        with open(tmp_loc, 'wb') as tmp_file:
+            fcntl.ioctl(tmp_file.fileno(), FICLONE, src_file.fileno())
+    copystat(src, tmp_loc)
+
+
+def _hardlink(src, tmp_loc):
+    "Links src at tmp_loc."
+    os.remove(tmp_loc)
+    os.link(src, tmp_loc)
+
+
+def _copy(src, tmp_loc):
+    "Copies src and its metadata to tmp_loc."
+    copy2(src, tmp_loc)
+
+
+def stage_file(src, dst, mutable=True, keep_src=True):
+    """Puts the contents of src at dst using the cheapest method that is safe,
+    returning the STAGE_METHODS value used.  The methods are tried in order:
+
+    - reflink: dst shares src's blocks until either is written (copy on
+      write), so it is always safe where the filesystem supports it.
+    - hardlink: dst is the same file as src, so this is only used when
+      neither src nor dst is written in place later (mutable=False).
+    - rename: src is moved to dst, so this is only used when src is not
+      needed afterwards (keep_src=False).
+    - copy: a full copy with shutil.copy2.
+
+    An existing dst is replaced atomically rather than written through, so
+    files hardlinked to the old dst are left alone.
+
+    Positional arguments:
+    src -- The file to stage.
+    dst -- The target location (or directory, as with shutil.copy2).
+    Keyword arguments:
+    mutable -- Whether src or dst may be modified in place later (defaults
+               to True, which rules out hardlinks).
+    keep_src -- Whether src must still exist afterwards (defaults to True,
+                which rules out renaming).
+    Returns:
+    The STAGE_METHODS value of the method used.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    methods = [(STAGE_METHODS.REFLINK, _reflink)]
+    if not mutable:
+        methods.append((STAGE_METHODS.HARDLINK, _hardlink))
+    if not keep_src:
+        methods.append((STAGE_METHODS.RENAME, None))
+    methods.append((STAGE_METHODS.COPY, _copy))
+    for method, stage in methods:
+        if stage is None:
+            try:
+                os.rename(src, dst)
+                return method
+            except OSError as e:
+                logger.debug("Could not rename '%s' to '%s': %s" %
+                             (src, dst, e))
+                continue
+        tmp_loc = _tmp_beside(dst)
+        try:
+            stage(src, tmp_loc)
+            os.rename(tmp_loc, dst)
+        except (IOError, OSError) as e:
+            if os.path.exists(tmp_loc):
+                os.remove(tmp_loc)
+            if method == STAGE_METHODS.COPY:
+                raise
+            logger.debug("Could not %s '%s' to '%s': %s" %
+                         (method, src, dst, e))
+            continue
+        if not keep_src:
+            os.remove(src)
+        return method
@@ -0,0 +1,525 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Computes collective variables (CVs) from the coordinates of archived
+trajectories and restart files, so new CVs can be tried without running
+the MD again.
+
+The CVs are defined by atom indices (counted from one, as in the Amber
+&rst iat lists) in the cvs section of the configuration file, one per
+option, in the form "<name> = <kind> <args>":
+
+    [cvs]
+    d_attack = distance 5802 5392
+    d_leave = distance 5392 5428
+    a_inline = angle 5802 5392 5428
+    phi = dihedral 5380 5392 5428 5430
+    d_diff = combo 1.0 d_leave -1.0 d_attack
+
+A combo is a linear combination of earlier CVs, given as weight and name
+pairs.  Distances are in angstroms and angles and dihedrals in degrees.
+
+The CVs of every kind are computed for a whole stack of frames at once with
+NumPy, indexing all of the atoms of a kind with one array.  When the frames
+have a periodic box, each bond vector is replaced by its minimum image
+(using the box angles of restart files; trajectories only record the box
+lengths, so their boxes are taken to be rectangular).
+
+The aimless_cvs command adds the CVs of every archived path to the results
+store, rewriting it in place with the wider record layout: each CV at the
+shooting point (the end of the dt segment) under its own name, and at the
+ends of the forward and backward trajectories with FWD_SUFFIX and
+BACK_SUFFIX added.  Later runs keep appending to the widened store (see
+results.py), so there is one store to screen and report from.  Given
+trajectory or restart files, it writes the CVs of their frames as CSV
+instead.
+"""
+
+from ConfigParser import NoOptionError, NoSectionError
+import csv
+import logging
+import optparse
+import os
+import sys
+import numpy as np
+from aimless import (read_config, get, MAIN_SEC, TGT_DIR_KEY, TOPO_KEY,
+                     OUT_DIR, DEF_CFG_NAME, RESULTS_STORE_KEY,
+                     DEF_RESULTS_STORE, POSTDT_RST_NAME, POSTFWD_RST_NAME,
+                     POSTBACK_RST_NAME, DT_MDCRD_NAME, FWD_MDCRD_NAME,
+                     BACK_MDCRD_NAME)
+from common import enum, InvalidDataError, PersistenceError
+from mdcrd import MdcrdReader, read_natoms
+from restart import Restart
+from results import ResultStore, RESULT_DTYPE
+
+CV_KINDS = enum(DISTANCE='distance', ANGLE='angle', DIHEDRAL='dihedral',
+                COMBO='combo')
+# The number of atoms defining each kind of CV, in the order they are
+# computed
+KIND_ATOMS = ((CV_KINDS.DISTANCE, 2), (CV_KINDS.ANGLE, 3),
+              (CV_KINDS.DIHEDRAL, 4))
+CVS_SEC = 'cvs'
+FWD_SUFFIX = 'fw'
+BACK_SUFFIX = 'bw'
+# Where each point of a path is read from: its column suffix, its restart
+# file, and the trajectory whose last frame stands in for a missing restart
+PATH_POINTS = (('', POSTDT_RST_NAME, DT_MDCRD_NAME),
+               (FWD_SUFFIX, POSTFWD_RST_NAME, FWD_MDCRD_NAME),
+               (BACK_SUFFIX, POSTBACK_RST_NAME, BACK_MDCRD_NAME))
+RIGHT_ANGLE = 90.0
+# The trajectory frames read and computed at a time
+FRAME_CHUNK = 1024
+FRAME_COL = 'frame'
+
+logger = logging.getLogger(__name__)
+
+
+def _norms(vecs):
+    return np.sqrt(np.einsum('...i,...i', vecs, vecs))
+
+
+def box_cells(boxes):
+    """Returns the box lengths (a (frames, 3) array) and, for boxes that are
+    not rectangular, the box vectors as the rows of (frames, 3, 3) arrays
+    (None otherwise).
+
+    boxes -- The boxes of the frames: three lengths or three lengths and
+             three angles (in degrees) per frame.
+    """
+    boxes = np.atleast_2d(np.asarray(boxes, dtype=float))
+    lengths = boxes[:, :3]
+    if boxes.shape[1] < 6 or np.allclose(boxes[:, 3:6], RIGHT_ANGLE):
+        return lengths, None
+    cos_a, cos_b, cos_g = np.cos(np.radians(boxes[:, 3:6])).T
+    sin_g = np.sin(np.radians(boxes[:, 5]))
+    cells = np.zeros((len(boxes), 3, 3))
+    cells[:, 0, 0] = 1.0
+    cells[:, 1, 0] = cos_g
+    cells[:, 1, 1] = sin_g
+    cells[:, 2, 0] = cos_b
+    cells[:, 2, 1] = (cos_a - cos_b * cos_g) / sin_g
+    cells[:, 2, 2] = np.sqrt(1.0 - cos_b ** 2 - cells[:, 2, 1] ** 2)
+    return lengths, cells * lengths[:, :, np.newaxis]
+
+
+def minimum_image(vecs, lengths, cells=None):
+    """Returns the given vectors moved to their nearest periodic images.
+
+    Positional arguments:
+    vecs -- The vectors: a (frames, count, 3) array.
+    lengths -- The box lengths of each frame (see box_cells).
+    Keyword arguments:
+    cells -- The box vectors of each frame, for boxes that are not
+             rectangular.
+    """
+    if cells is None:
+        lengths = lengths[:, np.newaxis, :]
+        return vecs - lengths * np.round(vecs / lengths)
+    frac = np.einsum('fkj,fji->fki', vecs, np.linalg.inv(cells))
+    return vecs - np.einsum('fkj,fji->fki', np.round(frac), cells)
+
+
+class CvSet(object):
+    """A set of CV definitions, computed together."""
+
+    def __init__(self, defs):
+        """Parses the given definitions.
+
+        defs -- (name, definition) pairs, such as the items of the cvs
+                section of the configuration; see the module docstring.
+        """
+        self.names = []
+        # The atoms of each kind's CVs (counted from zero)
+        kind_atoms = dict((kind, []) for kind, _ in KIND_ATOMS)
+        # The weight of each (kind, position) base CV in each CV
+        weights = []
+        for name, text in defs:
+            if name in self.names:
+                raise InvalidDataError("CV '%s' is defined twice" % name)
+            weights.append(self._parse(name, text.split(), kind_atoms,
+                                       weights))
+            self.names.append(name)
+        if not self.names:
+            raise InvalidDataError("No CVs are defined")
+        offsets = {}
+        start = 0
+        for kind, num_atoms in KIND_ATOMS:
+            offsets[kind] = start
+            start += len(kind_atoms[kind])
+        self.weights = np.zeros((len(self.names), start))
+        for row, cv_weights in enumerate(weights):
+            for (kind, pos), weight in cv_weights.items():
+                self.weights[row, offsets[kind] + pos] = weight
+        used = sorted(set(atom for atoms in kind_atoms.values()
+                          for group in atoms for atom in group))
+        # The atoms read from each frame; the CVs index into this selection
+        self.atoms = np.array(used, dtype=int)
+        compact = dict((atom, pos) for pos, atom in enumerate(used))
+        self._indices = [
+            (kind, np.array([[compact[atom] for atom in group]
+                             for group in kind_atoms[kind]],
+                            dtype=int).reshape(-1, num_atoms))
+            for kind, num_atoms in KIND_ATOMS]
+
+    def _parse(self, name, fields, kind_atoms, weights):
+        """Returns the base CV weights of the given definition, adding its
+        atoms to kind_atoms."""
+        kinds = dict(KIND_ATOMS)
+        if not fields:
+            raise InvalidDataError("CV '%s' has no definition" % name)
+        kind, args = fields[0].lower(), fields[1:]
+        if kind == CV_KINDS.COMBO:
+            if not args or len(args) % 2:
+                raise InvalidDataError("CV '%s' needs weight and CV name "
+                                       "pairs" % name)
+            combined = {}
+            for weight, other in zip(args[::2], args[1::2]):
+                if other not in self.names:
+                    raise InvalidDataError("CV '%s' uses '%s', which is not "
+                                           "defined before it" %
+                                           (name, other))
+                try:
+                    weight = float(weight)
+                except ValueError:
+                    raise InvalidDataError("Bad weight '%s' in CV '%s'" %
+                                           (weight, name))
+                for key, base in weights[self.names.index(other)].items():
+                    combined[key] = combined.get(key, 0.0) + weight * base
+            return combined
+        if kind not in kinds:
+            raise InvalidDataError("CV '%s' has unknown kind '%s'" %
+                                   (name, kind))
+        if len(args) != kinds[kind]:
+            raise InvalidDataError("CV '%s' (%s) needs %d atoms but has %d" %
+                                   (name, kind, kinds[kind], len(args)))
+        try:
+            atoms = tuple(int(arg) - 1 for arg in args)
+        except ValueError:
+            raise InvalidDataError("Bad atom index in CV '%s'" % name)
+        if min(atoms) < 0:
+            raise InvalidDataError("Atom indices start at 1 in CV '%s'" %
+                                   name)
+        kind_atoms[kind].append(atoms)
+        return {(kind, len(kind_atoms[kind]) - 1): 1.0}
+
+    def columns(self):
+        """Returns the results columns of the CVs: each CV at the shooting
+        point and at the ends of the forward and backward trajectories."""
+        return [name + suffix for suffix, _, _ in PATH_POINTS
+                for name in self.names]
+
+    def select(self, coords):
+        """Returns the atoms used by the CVs from the given coordinates (one
+        frame or a stack of frames)."""
+        coords = np.asarray(coords, dtype=float)
+        if self.atoms.size and self.atoms[-1] >= coords.shape[-2]:
+            raise InvalidDataError("The CVs use atom %d, but the frames "
+                                   "have %d atoms" % (self.atoms[-1] + 1,
+                                                      coords.shape[-2]))
+        return coords[..., self.atoms, :]
+
+    def compute(self, frames, boxes=None, selected=False):
+        """Returns the CVs of the given frames as a (frames, CVs) array.
+
+        Positional arguments:
+        frames -- The coordinates: a (frames, atoms, 3) array, or the
+                  (atoms, 3) coordinates of one frame.
+        Keyword arguments:
+        boxes -- The periodic box of each frame or one box for all of them
+                 (see box_cells), or None if the frames are not periodic.
+        selected -- Whether the frames have already been passed through
+                    select.
+        """
+        frames = np.asarray(frames, dtype=float)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if not selected:
+            frames = self.select(frames)
+        lengths = cells = None
+        if boxes is not None:
+            lengths, cells = box_cells(boxes)
+            if len(lengths) == 1 and len(frames) > 1:
+                lengths = np.repeat(lengths, len(frames), axis=0)
+                if cells is not None:
+                    cells = np.repeat(cells, len(frames), axis=0)
+
+        def bonds(idx, start, end):
+            "The vectors from atom column start to atom column end."
+            vecs = frames[:, idx[:, end]] - frames[:, idx[:, start]]
+            if lengths is not None:
+                vecs = minimum_image(vecs, lengths, cells)
+            return vecs
+
+        base = []
+        for kind, idx in self._indices:
+            if not len(idx):
+                continue
+            if kind == CV_KINDS.DISTANCE:
+                base.append(_norms(bonds(idx, 0, 1)))
+            elif kind == CV_KINDS.ANGLE:
+                first, second = bonds(idx, 1, 0), bonds(idx, 1, 2)
+                cos = (np.einsum('fki,fki->fk', first, second) /
+                       (_norms(first) * _norms(second)))
+                base.append(np.degrees(np.arccos(np.clip(cos, -1.0, 1.0))))
+            else:
+                b1, b2, b3 = bonds(idx, 0, 1), bonds(idx, 1, 2), \
+                    bonds(idx, 2, 3)
+                n1, n2 = np.cross(b1, b2), np.cross(b2, b3)
+                y = _norms(b2) * np.einsum('fki,fki->fk', b1, n2)
+                x = np.einsum('fki,fki->fk', n1, n2)
+                base.append(np.degrees(np.arctan2(y, x)))
+        return np.concatenate(base, axis=1).dot(self.weights.T)
+
+
+def read_point(rst_loc, mdcrd_loc, natoms):
+    """Returns the coordinates and box (None if there is none) in the given
+    restart file, or if it is missing, in the last frame of the given
+    trajectory.  Raises an IOError if neither can be read."""
+    try:
+        rst = Restart.read(rst_loc)
+    except IOError:
+        with MdcrdReader(mdcrd_loc, natoms) as reader:
+            if not len(reader):
+                raise IOError("No frames in '%s'" % mdcrd_loc)
+            return reader.read(-1)
+    return rst.coords, rst.box
+
+
+def _stack_boxes(boxes, src):
+    """Returns the given boxes as one array with three lengths and three
+    angles per row, or None if none of them has a box."""
+    if all(box is None for box in boxes):
+        return None
+    if any(box is None for box in boxes):
+        raise InvalidDataError("Some of the frames in '%s' have a periodic "
+                               "box and some do not" % src)
+    return np.array([np.concatenate([box[:3], box[3:6],
+                                     [RIGHT_ANGLE] * (6 - len(box))])
+                     for box in boxes])
+
+
+def path_cvs(cvset, path_dirs, natoms):
+    """Returns the CV columns of the given archived path directories, one
+    dict per directory: each CV at the shooting point (the end of the dt
+    segment) and at the ends of the forward and backward trajectories (see
+    CvSet.columns).  Points whose files are missing are left out.  Each
+    point is computed for all of the paths at once.
+
+    Positional arguments:
+    cvset -- The CvSet to compute.
+    path_dirs -- The archived path directories.
+    natoms -- The number of atoms in the system (see mdcrd.read_natoms).
+    """
+    results = [{} for _ in path_dirs]
+    for suffix, rst_name, mdcrd_name in PATH_POINTS:
+        found = []
+        coords = []
+        boxes = []
+        for row, path_dir in enumerate(path_dirs):
+            try:
+                point, box = read_point(os.path.join(path_dir, rst_name),
+                                        os.path.join(path_dir, mdcrd_name),
+                                        natoms)
+                coords.append(cvset.select(point))
+            except (IOError, OSError, InvalidDataError), e:
+                logger.warn("Skipping the '%s' point of '%s': %s" %
+                            (rst_name, path_dir, e))
+                continue
+            found.append(row)
+            boxes.append(box)
+        if not found:
+            continue
+        vals = cvset.compute(np.array(coords), _stack_boxes(boxes, rst_name),
+                             selected=True)
+        for row, row_vals in zip(found, vals):
+            results[row].update((name + suffix, float(val))
+                                for name, val in zip(cvset.names, row_vals))
+    return results
+
+
+def trajectory_cvs(cvset, reader, start=0, stop=None, step=1):
+    """Returns the CVs of every step-th frame from start to stop of the
+    given MdcrdReader as a (frames, CVs) array, computing FRAME_CHUNK frames
+    at a time."""
+    indices = range(*slice(start, stop, step).indices(len(reader)))
+    vals = np.empty((len(indices), len(cvset.names)))
+    for chunk_start in range(0, len(indices), FRAME_CHUNK):
+        chunk = indices[chunk_start:chunk_start + FRAME_CHUNK]
+        frames = [reader.read(index) for index in chunk]
+        coords = np.array([cvset.select(frame) for frame, _ in frames])
+        boxes = _stack_boxes([box for _, box in frames], reader.loc)
+        vals[chunk_start:chunk_start + len(chunk)] = cvset.compute(
+            coords, boxes, selected=True)
+    return vals
+
+
+def cv_dtype(cvset, base=RESULT_DTYPE):
+    """Returns the given record layout with a float column added for each
+    CV column."""
+    clashes = [col for col in cvset.columns() if col in base.names]
+    if clashes:
+        raise InvalidDataError("CV columns clash with result columns: %s" %
+                               ", ".join(clashes))
+    return np.dtype(base.descr + [(col, '<f8') for col in cvset.columns()])
+
+
+def store_cv_names(dtype):
+    """Returns the names of the CVs with columns in the given record layout
+    (see cv_dtype), in the order they were defined."""
+    return [name for name in dtype.names if name not in RESULT_DTYPE.names
+            and all(name + suffix in dtype.names
+                    for suffix, _, _ in PATH_POINTS)]
+
+
+def archived_paths(out_dir):
+    """Returns the latest archived directory of each path in the given
+    output directory as a dict keyed by path number.  A path archived more
+    than once (e.g. '01' and '01.1') is represented by the one with the
+    highest suffix."""
+    latest = {}
+    for name in os.listdir(out_dir):
+        path_dir = os.path.join(out_dir, name)
+        base, _, suffix = name.partition('.')
+        if not os.path.isdir(path_dir):
+            continue
+        try:
+            key = (int(base), int(suffix or 0))
+        except ValueError:
+            continue
+        if key[0] not in latest or key[1] > latest[key[0]][0]:
+            latest[key[0]] = (key[1], path_dir)
+    return dict((path_id, path_dir)
+                for path_id, (_, path_dir) in latest.items())
+
+
+def add_path_cvs(cvset, out_dir, natoms, pres=None):
+    """Returns the results of the paths archived in the given output
+    directory with their CV columns added, keyed by path number.
+
+    Positional arguments:
+    cvset -- The CvSet to compute.
+    out_dir -- The directory holding the archived path directories.
+    natoms -- The number of atoms in the system.
+    Keyword arguments:
+    pres -- The results of the paths keyed by path number (e.g. from
+            ResultStore.as_pres).  Paths with no result get only their CV
+            columns, and results with no archived path are kept as they are.
+    """
+    combined = dict((path_id, dict(res))
+                    for path_id, res in (pres or {}).items())
+    paths = sorted(archived_paths(out_dir).items())
+    cv_cols = path_cvs(cvset, [path_dir for _, path_dir in paths], natoms)
+    for (path_id, _), cols in zip(paths, cv_cols):
+        combined.setdefault(path_id, {}).update(cols)
+    return combined
+
+
+def write_cvs_csv(cvset, locs, natoms, tgt, step=1, linesep=os.linesep):
+    """Writes the CVs of every step-th frame of the given trajectory files
+    (or the single frame of restart files) as CSV.
+
+    Positional arguments:
+    cvset -- The CvSet to compute.
+    locs -- The trajectory (.mdcrd) and restart files to read.
+    natoms -- The number of atoms in the system.
+    tgt -- The target to write to.
+    Keyword arguments:
+    step -- The stride through the trajectory frames.
+    """
+    csv_writer = csv.writer(tgt, lineterminator=linesep)
+    csv_writer.writerow(['file', FRAME_COL] + cvset.names)
+    for loc in locs:
+        try:
+            rst = Restart.read(loc)
+        except (IOError, InvalidDataError):
+            # Not a restart file (or a compressed trajectory)
+            rst = None
+        if rst is not None:
+            vals = cvset.compute(rst.coords, rst.box)
+            frames = [0]
+        else:
+            with MdcrdReader(loc, natoms) as reader:
+                vals = trajectory_cvs(cvset, reader, step=step)
+                frames = range(0, len(reader), step)
+        for frame, row in zip(frames, vals):
+            csv_writer.writerow([loc, frame] + ["%.6f" % val for val in row])
+
+
+def parse_cmdline(argv):
+    """
+    Return a 2-tuple: (opts object, args list).
+    `argv` is a list of arguments, or `None` for ``sys.argv[1:]``.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage="%prog [options] [trajectory_or_restart ...]",
+        formatter=optparse.TitledHelpFormatter(width=78),
+        add_help_option=None)
+    parser.add_option('-c', '--cfg_file', default=DEF_CFG_NAME,
+                      help="Specify config file location.", metavar="CFG")
+    parser.add_option('-d', '--out_dir', default=None,
+                      help="The directory of archived paths (defaults to "
+                           "'output' in the configured tgtdir).",
+                      metavar="DIR")
+    parser.add_option('-i', '--in_store', default=None,
+                      help="The results store to add the CVs to (defaults "
+                           "to the configured results_store).",
+                      metavar="FILE")
+    parser.add_option('-o', '--out_file', default=None,
+                      help="Where the results with CVs are written "
+                           "(defaults to the results store, in place), or "
+                           "the CSV when files are given (defaults to "
+                           "standard output).", metavar="FILE")
+    parser.add_option('-s', '--step', type='int', default=1,
+                      help="The stride through the frames of the given "
+                           "trajectories.")
+    parser.add_option('-h', '--help', action='help',
+                      help='Show this help message and exit.')
+
+    opts, args = parser.parse_args(argv)
+
+    if opts.step < 1:
+        parser.error('The step must be at least 1')
+
+    return opts, args
+
+
+def main(argv=None):
+    opts, args = parse_cmdline(argv)
+    config = read_config(opts.cfg_file)
+    try:
+        cvset = CvSet(config.items(CVS_SEC))
+        natoms = read_natoms(config.get(MAIN_SEC, TOPO_KEY))
+        if args:
+            if opts.out_file is None:
+                write_cvs_csv(cvset, args, natoms, sys.stdout,
+                              step=opts.step)
+            else:
+                with open(opts.out_file, 'w') as out_tgt:
+                    write_cvs_csv(cvset, args, natoms, out_tgt,
+                                  step=opts.step)
+            return 0
+        out_dir = opts.out_dir
+        if out_dir is None:
+            out_dir = os.path.join(get(config, MAIN_SEC, TGT_DIR_KEY, '.'),
+                                   OUT_DIR)
+        in_loc = opts.in_store or get(config, MAIN_SEC, RESULTS_STORE_KEY,
+                                      DEF_RESULTS_STORE)
+        out_loc = opts.out_file or in_loc
+        pres = ResultStore(in_loc).as_pres()
+        dtype = cv_dtype(cvset)
+        combined = add_path_cvs(cvset, out_dir, natoms, pres)
+        ResultStore(out_loc, dtype).start(combined)
+    except (NoSectionError, NoOptionError, InvalidDataError,
+            PersistenceError, IOError), e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    print "Wrote %d CV columns for %d paths to '%s'" % (
+        len(cvset.columns()), len(combined), out_loc)
+    return 0        # success
+
+if __name__ == '__main__':
+    status = main()
+    sys.exit(status)
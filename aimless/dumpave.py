@@ -0,0 +1,125 @@
+"""
+Reads AMBER DUMPAVE restraint output (e.g. cons_fwd.dat).  Each non-blank
+line is a record holding the step number followed by the value of each
+restraint coordinate.
+
+A single record can be read without parsing the whole file: records from
+the start are read line by line, and records counted from the end are found
+by reading the file backwards in blocks.  RecordTail follows a file that is
+still being written by a running job.  Files that have been compressed after
+their path was archived are read transparently, though only forwards.
+"""
+
+from collections import deque
+import errno
+import os
+from archive import open_archived
+from common import InvalidDataError
+
+BLOCK_SIZE = 8192
+
+
+def parse_record(line, src="<string>"):
+    """Returns the values on the given DUMPAVE line as a tuple of floats,
+    starting with the step."""
+    try:
+        return tuple(float(val) for val in line.split())
+    except ValueError:
+        raise InvalidDataError("Bad DUMPAVE record '%s' in '%s'" %
+                               (line.strip(), src))
+
+
+def iter_records(loc):
+    """Yields each record in the given DUMPAVE file in order as a tuple of
+    floats, starting with the step."""
+    with open_archived(loc) as dump_file:
+        for line in dump_file:
+            if line.strip():
+                yield parse_record(line, loc)
+
+
+def tail_lines(loc, count, block_size=BLOCK_SIZE):
+    """Returns up to the last count non-blank lines of the given file, reading
+    backwards from the end in blocks of block_size bytes.
+
+    Positional arguments:
+    loc -- The file to read.
+    count -- The number of lines to return.
+    Keyword arguments:
+    block_size -- The number of bytes to read at a time.
+    """
+    try:
+        in_file = open(loc, 'rb')
+    except IOError, e:
+        if e.errno != errno.ENOENT:
+            raise
+        # A compressed file can only be read from the start
+        with open_archived(loc) as dump_file:
+            found = deque((line.rstrip('\n') for line in dump_file
+                           if line.strip()), count)
+        return list(found)
+    found = []
+    tail = ''
+    with in_file:
+        in_file.seek(0, os.SEEK_END)
+        pos = in_file.tell()
+        while pos > 0 and len(found) < count:
+            size = min(block_size, pos)
+            pos -= size
+            in_file.seek(pos)
+            pieces = (in_file.read(size) + tail).split('\n')
+            # The first piece may be the end of a line in an earlier block
+            tail = pieces.pop(0)
+            found = [piece for piece in pieces if piece.strip()] + found
+    if pos == 0 and tail.strip():
+        found.insert(0, tail)
+    return found[-count:] if count else []
+
+
+def read_record(loc, index=-1):
+    """Returns a single record from the given DUMPAVE file as a tuple of
+    floats, starting with the step.
+
+    Positional arguments:
+    loc -- The file to read.
+    Keyword arguments:
+    index -- The record to read: 0 is the first, -1 (the default) the last.
+    """
+    if index < 0:
+        lines = tail_lines(loc, -index)
+        if len(lines) == -index:
+            return parse_record(lines[0], loc)
+    else:
+        for rnum, record in enumerate(iter_records(loc)):
+            if rnum == index:
+                return record
+    raise InvalidDataError("No record %d in DUMPAVE file '%s'" % (index, loc))
+
+
+class RecordTail(object):
+    """Follows a DUMPAVE file as it is written, returning the complete records
+    added since the last read.  A missing file has no records yet."""
+
+    def __init__(self, loc):
+        self.loc = loc
+        self.pos = 0
+
+    def read_new(self):
+        "Returns a list of the records written since the last call."
+        try:
+            with open(self.loc, 'rb') as dump_file:
+                dump_file.seek(0, os.SEEK_END)
+                if dump_file.tell() < self.pos:
+                    # The file was replaced; start over
+                    self.pos = 0
+                dump_file.seek(self.pos)
+                data = dump_file.read()
+        except IOError, e:
+            if e.errno == errno.ENOENT:
+                return []
+            raise
+        # Leave any partly-written last line for the next read
+        end = data.rfind('\n') + 1
+        self.pos += end
+        return [parse_record(line, self.loc)
+                for line in data[:end].split('\n') if line.strip()]
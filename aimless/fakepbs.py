@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+A stand-in for the Torque qsub, qstat -x, and qdel commands for measuring
+and testing the aimless orchestration without a cluster.  FakePbs.pipe_cmd
+replaces torque.pipe_cmd, so the real TorqueSubmissionHandler (and the
+command lines and XML parsing behind it) are exercised unchanged::
+
+    fake = FakePbs(queue_delay=.1, runtime=.5)
+    handler = TorqueSubmissionHandler(pipe_cmd=fake.pipe_cmd)
+
+Jobs wait in the queue for queue_delay seconds (and for any jobs they
+depend on), then run for runtime seconds.  When an Amber job (filled from
+amber_job.tpl) finishes, its effects are simulated: the directional
+restart is written from the shooter with velocities added if needed, the
+DUMPAVE file named in the job's input is filled with synthetic reaction
+coordinates ending in one of the basin_points, and the job's completion
+sentinel is written.  Other job scripts are not run.
+
+Every command is counted in calls, and the size of the qstat -x output can
+be padded out to match a busy production queue.
+"""
+
+from collections import Counter
+import getpass
+import logging
+import os
+import re
+import subprocess
+import threading
+import time
+import numpy as np
+from common import InvalidDataError
+from local import parse_array
+from restart import Restart
+from torque import TSTATES, array_job_ids
+
+DEF_HOST = "fakehost"
+DEF_QUEUE = "batch"
+# Reaction coordinates ending in basin A and basin B of the default
+# aimless.ini basins
+DEF_BASIN_POINTS = ((4.0, 1.0), (1.0, 4.0))
+# Where the synthetic reaction coordinates start out
+DEF_START_POINT = (2.5, 2.5)
+VEL_SCALE = 2.0
+
+DONE_RE = re.compile(r"trap\s+'echo \$\?[^>']*> (\S+)'\s+EXIT")
+ARG_RES = dict((flag, re.compile(r"(?:^|\s)-%s\s+(\S+)" % flag))
+               for flag in ('i', 'o', 'c', 'r'))
+CD_RE = re.compile(r"^\s*cd\s+(.+)$", re.M)
+DUMPAVE_RE = re.compile(r"DUMPAVE\s*=\s*(\S+)")
+NSTLIM_RE = re.compile(r"nstlim\s*=\s*(\d+)")
+ISTEP_RE = re.compile(r"istep1\s*=\s*(\d+)")
+
+# Job states as shown by qstat
+HELD, QUEUED, RUNNING, COMPLETED = (TSTATES.HELD, TSTATES.QUEUED,
+                                    TSTATES.RUNNING, TSTATES.COMPLETED)
+
+logger = logging.getLogger(__name__)
+
+
+def as_sampler(val):
+    """Returns a function of no arguments returning the given number of
+    seconds, or the given function if it is one already."""
+    if callable(val):
+        return val
+    return lambda: val
+
+
+class FakeProc(object):
+    """The Popen-like result of FakePbs.pipe_cmd.  The command is run when
+    communicate is called."""
+
+    def __init__(self, pbs, cmd, cwd):
+        self.pbs = pbs
+        self.cmd = cmd
+        self.cwd = cwd
+        self.returncode = None
+
+    def communicate(self, input=None):
+        "Runs the command, returning its (stdout, stderr) output."
+        out, err = self.pbs.run(self.cmd, self.cwd, input)
+        self.returncode = 1 if err and not out else 0
+        return out, err
+
+
+class FakeJob(object):
+    """A job (or one job in an array) held by the fake queue."""
+
+    def __init__(self, job_id, name, script, workdir, depends, depend_type,
+                 submitted, queued_until, array_index=None):
+        self.job_id = job_id
+        self.name = name
+        self.script = script
+        self.workdir = workdir
+        self.depends = depends
+        self.depend_type = depend_type
+        self.array_index = array_index
+        self.state = HELD if depends else QUEUED
+        self.submitted = submitted
+        # The earliest time the job may leave the queue
+        self.queued_until = queued_until
+        self.start_time = None
+        self.end_time = None
+        self.exit_status = None
+
+
+class FakePbs(object):
+    """A simulated Torque server driven through pipe_cmd."""
+
+    def __init__(self, queue_delay=0, runtime=0, xml_padding=0,
+                 keep_completed=0, basin_points=DEF_BASIN_POINTS, seed=None,
+                 host=DEF_HOST):
+        """Sets up the initial state for this instance and starts the thread
+        that moves jobs through the queue.
+
+        Keyword arguments:
+        queue_delay -- Seconds each job waits in the queue, or a function
+                       returning them (defaults to 0).
+        runtime -- Seconds each job runs, or a function returning them
+                   (defaults to 0).
+        xml_padding -- The number of bytes of environment padding in each
+                       job's qstat -x entry (defaults to 0).
+        keep_completed -- Seconds finished jobs are still listed by qstat
+                          (defaults to 0, like Torque).
+        basin_points -- The (RC1, RC2) values a forward or backward segment
+                        can end on; one is picked at random for each job.
+        seed -- The seed for the random choices (defaults to None).
+        host -- The server name used in job IDs.
+        """
+        self.queue_delay = as_sampler(queue_delay)
+        self.runtime = as_sampler(runtime)
+        self.xml_padding = xml_padding
+        self.keep_completed = keep_completed
+        self.basin_points = basin_points
+        self.rand = np.random.RandomState(seed)
+        self.host = host
+        self.owner = "%s@%s" % (getpass.getuser(), host)
+        self.calls = Counter()
+        self.last_id = 0
+        # Job ID string to FakeJob, and array ID (e.g. "12[]") to job IDs
+        self.jobs = {}
+        self.arrays = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run_queue)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def pipe_cmd(self, cmd, cwd=None):
+        "Drop-in for torque.pipe_cmd."
+        return FakeProc(self, cmd, cwd)
+
+    def run(self, cmd, cwd=None, input=None):
+        "Runs the given queue command, returning its (stdout, stderr)."
+        name = os.path.basename(cmd[0])
+        self.calls[name] += 1
+        if name == "qsub":
+            return self.qsub(cmd[1:], cwd, input)
+        elif name == "qstat":
+            return self.qstat(cmd[1:])
+        elif name == "qdel":
+            return self.qdel(cmd[1:])
+        return "", "%s: command not found\n" % name
+
+    def qsub(self, args, cwd, script):
+        "Queues the given script, returning its ID as qsub would print it."
+        opts = {}
+        args = list(args)
+        while args:
+            arg = args.pop(0)
+            if arg.startswith("-") and arg != "-V" and args:
+                opts.setdefault(arg, []).append(args.pop(0))
+        depends, depend_type = [], None
+        for opt in opts.get("-W", []):
+            if opt.startswith("depend="):
+                parts = opt[len("depend="):].split(":")
+                depend_type, depends = parts[0], parts[1:]
+        name = opts.get("-N", ["STDIN"])[0]
+        workdir = cwd or os.getcwd()
+        with self._cond:
+            self.last_id += 1
+            now = time.time()
+            if "-t" in opts:
+                job_id = "%d[]" % self.last_id
+                indices = parse_array(opts["-t"][0])
+                sub_ids = array_job_ids(job_id, indices)
+                self.arrays[job_id] = sub_ids
+                for sub_id, index in zip(sub_ids, indices):
+                    self.jobs[sub_id] = FakeJob(
+                        sub_id, name, script, workdir, depends, depend_type,
+                        now, now + self.queue_delay(), array_index=index)
+            else:
+                job_id = str(self.last_id)
+                self.jobs[job_id] = FakeJob(job_id, name, script, workdir,
+                                            depends, depend_type, now,
+                                            now + self.queue_delay())
+            self._cond.notify_all()
+        return "%s.%s\n" % (job_id, self.host), ""
+
+    def qstat(self, args):
+        """Returns the qstat -x entries for the given job IDs (or all
+        listed jobs), one Data element per job."""
+        ids = [arg for arg in args if not arg.startswith("-")]
+        with self._cond:
+            self._advance()
+            if not ids:
+                jobs = sorted(self._listed(), key=lambda job: job.submitted)
+                return "".join(self._xml(job) for job in jobs), ""
+            out, err = [], []
+            for jid in ids:
+                jobs = [job for job in self._lookup(jid) if self._is_listed(job)]
+                if not jobs:
+                    err.append("qstat: Unknown Job Id Error %s.%s\n" %
+                               (jid, self.host))
+                out.extend(self._xml(job) for job in jobs)
+            return "".join(out), "".join(err)
+
+    def qdel(self, args):
+        "Deletes the given jobs from the queue."
+        err = []
+        with self._cond:
+            self._advance()
+            for jid in args:
+                jobs = [job for job in self._lookup(jid)
+                        if job.state != COMPLETED]
+                if not jobs:
+                    err.append("qdel: Unknown Job Id %s.%s\n" %
+                               (jid, self.host))
+                for job in jobs:
+                    self._finish(job, None, time.time())
+            self._cond.notify_all()
+        return "", "".join(err)
+
+    def shutdown(self):
+        "Stops the queue thread."
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _lookup(self, job_id):
+        "Returns the jobs for the given job or array ID."
+        job_id = str(job_id).split(".")[0]
+        if job_id in self.arrays:
+            return [self.jobs[sub_id] for sub_id in self.arrays[job_id]]
+        if job_id in self.jobs:
+            return [self.jobs[job_id]]
+        return []
+
+    def _is_listed(self, job):
+        "Returns whether qstat still lists the given job."
+        return (job.state != COMPLETED or
+                time.time() - job.end_time < self.keep_completed)
+
+    def _listed(self):
+        "Returns the jobs qstat still lists."
+        return [job for job in self.jobs.values() if self._is_listed(job)]
+
+    def _xml(self, job):
+        "Returns the qstat -x entry for the given job."
+        fields = [("Job_Id", "%s.%s" % (job.job_id, self.host)),
+                  ("Job_Name", job.name), ("Job_Owner", self.owner),
+                  ("job_state", job.state), ("queue", DEF_QUEUE),
+                  ("ctime", "%d" % job.submitted),
+                  ("qtime", "%d" % job.submitted)]
+        if job.start_time is not None:
+            fields.append(("start_time", "%d" % job.start_time))
+            fields.append(("exec_host", "%s/0" % self.host))
+        if self.xml_padding:
+            fields.append(("Variable_List", "PBS_O_PAD=" +
+                           "x" * self.xml_padding))
+        return "<Data><Job>%s</Job></Data>" % "".join(
+            "<%s>%s</%s>" % (tag, val, tag) for tag, val in fields)
+
+    def _run_queue(self):
+        "Moves jobs through the queue as their times come up."
+        with self._cond:
+            while not self._stopped:
+                wake = self._advance()
+                timeout = None if wake is None else max(0, wake - time.time())
+                self._cond.wait(timeout)
+
+    def _advance(self):
+        """Starts and finishes the jobs whose times have come, returning the
+        time of the next scheduled change (or None).  Called with the lock
+        held."""
+        wake = None
+        changed = True
+        while changed:
+            changed = False
+            now = time.time()
+            for job in sorted(self.jobs.values(),
+                              key=lambda job: job.submitted):
+                if job.state in (HELD, QUEUED):
+                    ready = self._ready_time(job)
+                    if ready is None:
+                        continue
+                    if ready is False:
+                        # Torque deletes jobs whose dependencies failed
+                        self._finish(job, None, now)
+                        changed = True
+                    elif ready <= now:
+                        job.state = RUNNING
+                        job.start_time = now
+                        job.end_time = now + self.runtime()
+                        changed = True
+                    else:
+                        job.state = QUEUED
+                        wake = ready if wake is None else min(wake, ready)
+                if job.state == RUNNING:
+                    if job.end_time <= now:
+                        self._finish(job, self._run_job(job), now)
+                        changed = True
+                    else:
+                        wake = (job.end_time if wake is None
+                                else min(wake, job.end_time))
+        return wake
+
+    def _ready_time(self, job):
+        """Returns when the given job may start, None if its dependencies are
+        still pending, or False if they can never be met."""
+        ready = job.queued_until
+        for dep_id in job.depends:
+            for dep in self._lookup(dep_id):
+                if dep.state != COMPLETED:
+                    return None
+                if dep.exit_status != 0 and job.depend_type != "afterany":
+                    return False
+                ready = max(ready, dep.end_time)
+        return ready
+
+    def _finish(self, job, exit_status, now):
+        "Marks the given job as finished."
+        job.state = COMPLETED
+        job.exit_status = exit_status
+        job.end_time = now
+
+    def _run_job(self, job):
+        """Simulates the effects of the given job's script, returning its exit
+        status."""
+        try:
+            job_dir = self._job_dir(job)
+            args = dict((flag, arg_re.search(job.script))
+                        for flag, arg_re in ARG_RES.items())
+            if args['c'] and args['r']:
+                self._write_restart(os.path.join(job_dir, args['c'].group(1)),
+                                    os.path.join(job_dir, args['r'].group(1)))
+            if args['i']:
+                self._write_dumpave(job_dir,
+                                    os.path.join(job_dir, args['i'].group(1)))
+            if args['o']:
+                with open(os.path.join(job_dir, args['o'].group(1)),
+                          'w') as out_file:
+                    out_file.write("Fake sander run for job %s\n" %
+                                   job.job_id)
+            status = 0
+        except (IOError, OSError, InvalidDataError,
+                subprocess.CalledProcessError), e:
+            logger.warn("Fake job %s failed: %s" % (job.job_id, e))
+            job_dir, status = job.workdir, 1
+        done = DONE_RE.search(job.script)
+        if done:
+            with open(os.path.join(job_dir, done.group(1)), 'w') as done_file:
+                done_file.write("%d %d %d\n" % (status, job.start_time,
+                                                 time.time()))
+        return status
+
+    def _job_dir(self, job):
+        """Returns the directory the given job's script changes into.  Any cd
+        commands other than the one into PBS_O_WORKDIR are run by the shell
+        so that PBS_ARRAYID is expanded."""
+        cds = [cmd for cmd in CD_RE.findall(job.script)
+               if "PBS_O_WORKDIR" not in cmd]
+        if not cds:
+            return job.workdir
+        env = dict(os.environ, PBS_O_WORKDIR=job.workdir)
+        if job.array_index is not None:
+            env['PBS_ARRAYID'] = str(job.array_index)
+        script = "".join("cd %s\n" % cmd for cmd in cds) + "pwd\n"
+        return subprocess.check_output(["bash", "-c", script], env=env,
+                                       cwd=job.workdir).strip()
+
+    def _write_restart(self, src_loc, tgt_loc):
+        "Writes the job's restart from its shooter, adding any missing vels."
+        rst = Restart.read(src_loc)
+        if rst.vels is None:
+            rst.vels = self.rand.uniform(-VEL_SCALE, VEL_SCALE,
+                                         (rst.num_atoms, 3))
+        rst.write(tgt_loc)
+
+    def _write_dumpave(self, job_dir, in_loc):
+        """Writes the DUMPAVE file named in the given Amber input, with one
+        record every istep1 steps moving from DEF_START_POINT to a randomly
+        chosen basin point."""
+        with open(in_loc) as in_file:
+            contents = in_file.read()
+        dump = DUMPAVE_RE.search(contents)
+        if not dump:
+            return
+        nstlim = NSTLIM_RE.search(contents)
+        steps = int(nstlim.group(1)) if nstlim else 1
+        istep = ISTEP_RE.search(contents)
+        every = max(1, int(istep.group(1)) if istep else steps)
+        end = np.array(self.basin_points[
+            self.rand.randint(len(self.basin_points))], dtype=float)
+        start = np.array(DEF_START_POINT, dtype=float)
+        rec_steps = np.arange(every, max(steps, every) + 1, every)
+        frac = (rec_steps / float(rec_steps[-1]))[:, np.newaxis]
+        vals = start + (end - start) * frac
+        with open(os.path.join(job_dir, dump.group(1)), 'w') as dump_file:
+            for step, (rc1, rc2) in zip(rec_steps, vals):
+                dump_file.write("%8d %12.6f %12.6f\n" % (step, rc1, rc2))
+
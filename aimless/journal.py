@@ -0,0 +1,113 @@
+"""
+An append-only journal of the progress of the paths in a shooting chain.
+Each entry is a JSON object on its own line, flushed and fsync'd to disk
+before the append returns, so a campaign can be picked up from the journal
+if the aimless script dies part way through.
+
+The journal records when a path starts (with its shooter), when each of its
+stage jobs is submitted (with the job ID), when each stage finishes, and the
+path's result when it is done.
+"""
+
+import json
+import logging
+import os
+import threading
+from common import enum
+
+EVENTS = enum(PATH_START='path_start', SUBMIT='submit',
+              STAGE_DONE='stage_done', PATH_DONE='path_done')
+
+logger = logging.getLogger(__name__)
+
+
+class Journal(object):
+    """Appends entries to a journal file.  Safe to share between threads."""
+
+    def __init__(self, loc):
+        self.loc = loc
+        self._lock = threading.Lock()
+
+    def append(self, event, pnum, **fields):
+        """Writes an entry for the given event and path to the journal,
+        returning once it is on disk.
+
+        Positional arguments:
+        event -- The event being recorded (an EVENTS value).
+        pnum -- The path number the event is for.
+        Keyword arguments:
+        Any other JSON-serializable values to record with the event.
+        """
+        entry = dict(fields, event=event, path=pnum)
+        line = json.dumps(entry, sort_keys=True) + "\n"
+        with self._lock:
+            with open(self.loc, 'a') as journal_file:
+                journal_file.write(line)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+    def reset(self):
+        "Empties the journal for a new campaign."
+        with self._lock:
+            with open(self.loc, 'w') as journal_file:
+                os.fsync(journal_file.fileno())
+
+    def read(self):
+        """Returns the entries in the journal in order.  A missing journal has
+        no entries.  A partly-written last entry (from a crash during an
+        append) is skipped."""
+        try:
+            with open(self.loc) as journal_file:
+                lines = journal_file.readlines()
+        except IOError:
+            return []
+        entries = []
+        for lnum, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                if lnum != len(lines) - 1:
+                    raise
+                logger.warn("Skipping incomplete last entry in journal "
+                            "'%s'" % self.loc)
+        return entries
+
+
+class PathState(object):
+    """The progress of a single path as recorded in a journal."""
+
+    def __init__(self, pnum, shooter):
+        self.pnum = pnum
+        self.shooter = shooter
+        # Stage name to the ID of the job submitted for it
+        self.jobs = {}
+        self.done = set()
+        # Commit steps recorded for segments cancelled early
+        self.commits = {}
+        self.result = None
+
+
+def replay(entries):
+    """Returns the state of each path recorded in the given journal entries
+    as a dict of PathState instances keyed by path number.  A path that is
+    started again replaces any earlier record of it."""
+    paths = {}
+    for entry in entries:
+        event, pnum = entry['event'], entry['path']
+        if event == EVENTS.PATH_START:
+            paths[pnum] = PathState(pnum, entry['shooter'])
+            continue
+        state = paths.get(pnum)
+        if state is None:
+            logger.warn("Ignoring '%s' entry for path %d, which was never "
+                        "started" % (event, pnum))
+        elif event == EVENTS.SUBMIT:
+            state.jobs[entry['stage']] = entry['job']
+        elif event == EVENTS.STAGE_DONE:
+            state.done.add(entry['stage'])
+            state.commits.update(entry.get('commits', {}))
+        elif event == EVENTS.PATH_DONE:
+            state.result = entry['result']
+    return paths
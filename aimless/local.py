@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runs jobs on the local machine instead of submitting them to Torque.  The
+LocalSubmissionHandler keeps the submit/stat_jobs/cancel contract of
+TorqueSubmissionHandler, so it can be handed to AimlessShooter on machines
+without a batch system.  Job scripts are run with bash in a bounded pool of
+processes; jobs beyond the limit wait in the queue.
+
+The PBS environment variables used by the job templates (PBS_O_WORKDIR,
+PBS_JOBID, PBS_JOBNAME, PBS_NODEFILE, and PBS_ARRAYID) are set for each job.
+Job dependencies (afterok and afterany) and job arrays (e.g. "1-4") are
+handled the way Torque handles them, using the same job ID forms.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+import getpass
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import tempfile
+import threading
+from common import STATES, SubmissionError
+from torque import JobStatus, array_job_ids
+
+AFTER_OK = 'afterok'
+AFTER_ANY = 'afterany'
+
+logger = logging.getLogger(__name__)
+
+
+class LocalSubmissionError(SubmissionError): pass
+
+
+def default_max_jobs():
+    "Returns the default number of jobs to run at once: one per CPU."
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def parse_array(spec):
+    """Returns the indices in the given job array specification, which
+    is a comma-separated list of indices and ranges (e.g. "1-4,7")."""
+    indices = []
+    for part in str(spec).split(","):
+        try:
+            if "-" in part:
+                first, last = part.split("-")
+                indices.extend(range(int(first), int(last) + 1))
+            else:
+                indices.append(int(part))
+        except ValueError:
+            raise LocalSubmissionError("Bad job array specification '%s'" %
+                                       spec)
+    return indices
+
+
+class LocalJob(object):
+    """The record of a single job (or one job in an array) run locally."""
+
+    def __init__(self, job_id, job, array_index=None):
+        self.job_id = job_id
+        self.job = job
+        self.array_index = array_index
+        self.depends = [str(dep) for dep in job.depends or []]
+        self.state = STATES.HELD if self.depends else STATES.QUEUED
+        self.ctime = datetime.now()
+        self.start_time = None
+        self.proc = None
+        self.exit_code = None
+        self.cancelled = False
+
+    def is_done(self):
+        "Returns whether the job has finished, one way or another."
+        return self.state == STATES.COMPLETED
+
+    def succeeded(self):
+        "Returns whether the job ran to completion with a zero exit status."
+        return self.is_done() and self.exit_code == 0
+
+
+class LocalSubmissionHandler(object):
+    """Runs submitted job scripts in a bounded pool of local processes.
+
+    Jobs are started in the order they become ready (on submission, or
+    once their dependencies finish) as slots free up.  Only the unfinished
+    jobs are looked at when deciding what to start next.  Finished jobs are
+    reported as completed by stat_jobs for the life of the handler.
+    """
+
+    def __init__(self, max_jobs=None, shell="bash"):
+        """Sets up the initial state for this instance.
+
+        Keyword arguments:
+        max_jobs -- The number of jobs to run at once (defaults to the
+                    number of CPUs).
+        shell -- The shell used to run the job scripts.
+        """
+        if max_jobs is None:
+            max_jobs = default_max_jobs()
+        if max_jobs < 1:
+            raise LocalSubmissionError("The job limit must be at least 1, "
+                                       "not %d" % max_jobs)
+        self.max_jobs = max_jobs
+        self.shell = shell
+        self.owner = getpass.getuser()
+        self.host = socket.gethostname()
+        self.last_id = 0
+        self.exit_codes = {}
+        # Job ID (as a string) to its LocalJob, for every job submitted
+        self._jobs = {}
+        # The unfinished jobs by state, keyed by job ID (as a string); the
+        # held and queued jobs are in the order they got there
+        self._held = OrderedDict()
+        self._queued = OrderedDict()
+        self._running = {}
+        # Array ID (e.g. "12[]") to the IDs of its jobs
+        self._arrays = {}
+        self._cond = threading.Condition(threading.RLock())
+        self._node_dir = tempfile.mkdtemp(prefix="aimless_nodes")
+
+    def submit(self, job):
+        """Queues the given job to run, returning its ID: an int, or an ID of
+        the form id[] for a job array."""
+        with self._cond:
+            self.last_id += 1
+            if job.array:
+                job_id = "%d[]" % self.last_id
+                indices = parse_array(job.array)
+                sub_ids = array_job_ids(job_id, indices)
+                self._arrays[job_id] = sub_ids
+                for sub_id, index in zip(sub_ids, indices):
+                    self._add(LocalJob(sub_id, job, index))
+            else:
+                job_id = self.last_id
+                self._add(LocalJob(job_id, job))
+            logger.debug("Queued local job %s (%s)" % (job_id, job.name))
+            self._dispatch()
+            return job_id
+
+    def cancel(self, job_id):
+        """Cancels the given job (or every job in the given array), killing
+        it if it is running.  Unknown and finished jobs are ignored."""
+        with self._cond:
+            for ljob in self._lookup(job_id):
+                if ljob.is_done():
+                    continue
+                ljob.cancelled = True
+                if ljob.proc is None:
+                    self._finish(ljob, None)
+                else:
+                    logger.debug("Killing local job %s" % ljob.job_id)
+                    try:
+                        os.killpg(ljob.proc.pid, signal.SIGTERM)
+                    except OSError, e:
+                        logger.warn("Could not kill local job %s: %s" %
+                                    (ljob.job_id, e))
+            self._dispatch()
+
+    def stat_jobs(self, ids=None):
+        """Returns a dict of JobStatus instances keyed by job ID for the given
+        job IDs (or all jobs if ids is None).  Unknown IDs are left out."""
+        with self._cond:
+            if ids is None:
+                ids = [ljob.job_id for ljob in self._jobs.values()]
+            jobs_by_id = {}
+            for jid in ids:
+                ljobs = self._lookup(jid)
+                if ljobs:
+                    jobs_by_id[jid] = self._status(jid, ljobs)
+            return jobs_by_id
+
+    def wait_all(self, timeout=None):
+        """Blocks until every submitted job has finished or the timeout (in
+        seconds) passes.  Returns whether all of the jobs finished."""
+        with self._cond:
+            if not self._pending():
+                return True
+            start = datetime.now()
+            while self._pending():
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (datetime.now() -
+                                           start).total_seconds()
+                    if remaining <= 0:
+                        return False
+                self._cond.wait(remaining)
+            return True
+
+    def shutdown(self):
+        "Cancels any unfinished jobs and removes the handler's node files."
+        with self._cond:
+            for ljob in self._unfinished():
+                self.cancel(ljob.job_id)
+        self.wait_all()
+        shutil.rmtree(self._node_dir, ignore_errors=True)
+
+    def _add(self, ljob):
+        "Records a newly queued job."
+        key = str(ljob.job_id)
+        self._jobs[key] = ljob
+        if ljob.state == STATES.HELD:
+            self._held[key] = ljob
+        else:
+            self._queued[key] = ljob
+
+    def _unfinished(self):
+        "Returns the jobs that have not finished."
+        return (self._held.values() + self._queued.values() +
+                self._running.values())
+
+    def _lookup(self, job_id):
+        "Returns the LocalJobs for the given job or array ID."
+        job_id = str(job_id)
+        if job_id in self._arrays:
+            return [self._jobs[sub_id] for sub_id in self._arrays[job_id]]
+        if job_id in self._jobs:
+            return [self._jobs[job_id]]
+        return []
+
+    def _pending(self):
+        "Returns whether any job has not finished."
+        return bool(self._held or self._queued or self._running)
+
+    def _status(self, job_id, ljobs):
+        "Returns the JobStatus for the given job or array of jobs."
+        states = set(ljob.state for ljob in ljobs)
+        for state in (STATES.RUNNING, STATES.QUEUED, STATES.HELD):
+            if state in states:
+                break
+        else:
+            state = STATES.COMPLETED
+        starts = [ljob.start_time for ljob in ljobs if ljob.start_time]
+        return JobStatus(job_id=job_id, name=ljobs[0].job.name,
+                         owner=self.owner, job_state=state,
+                         ctime=ljobs[0].ctime, qtime=ljobs[0].ctime,
+                         start_time=min(starts) if starts else None,
+                         exec_host=self.host if starts else None)
+
+    def _deps_state(self, ljob):
+        """Returns whether the given job's dependencies are met, are still
+        pending, or can never be met: True, None, or False."""
+        deps = []
+        for dep_id in ljob.depends:
+            dep_jobs = self._lookup(dep_id)
+            if not dep_jobs:
+                # Unknown jobs (e.g. from an earlier handler) are finished
+                continue
+            deps.extend(dep_jobs)
+        if not all(dep.is_done() for dep in deps):
+            return None
+        if (ljob.job.depend_type or AFTER_OK) == AFTER_ANY:
+            return True
+        return all(dep.succeeded() for dep in deps)
+
+    def _dispatch(self):
+        """Releases held jobs whose dependencies have finished, drops those
+        whose dependencies failed, and starts queued jobs while there are
+        free slots.  Only unfinished jobs are looked at.  Called with the
+        lock held."""
+        dropped = True
+        # Dropping a job can decide the jobs that depend on it
+        while dropped:
+            dropped = False
+            for key, ljob in self._held.items():
+                deps_met = self._deps_state(ljob)
+                if deps_met is None:
+                    continue
+                if deps_met:
+                    del self._held[key]
+                    ljob.state = STATES.QUEUED
+                    self._queued[key] = ljob
+                else:
+                    logger.warn("Dropping local job %s (%s): a job it "
+                                "depends on failed" % (ljob.job_id,
+                                                       ljob.job.name))
+                    self._finish(ljob, None)
+                    dropped = True
+        while self._queued and len(self._running) < self.max_jobs:
+            key, ljob = self._queued.popitem(last=False)
+            self._start(ljob)
+
+    def _start(self, ljob):
+        "Starts the given job's script, watching it from a new thread."
+        job = ljob.job
+        env = dict(os.environ)
+        env['PBS_JOBID'] = "%s.%s" % (ljob.job_id, self.host)
+        env['PBS_JOBNAME'] = job.name
+        env['PBS_O_WORKDIR'] = job.workdir or os.getcwd()
+        env['PBS_NODEFILE'] = self._node_file(job)
+        if ljob.array_index is not None:
+            env['PBS_ARRAYID'] = str(ljob.array_index)
+        logger.debug("Starting local job %s (%s)" % (ljob.job_id, job.name))
+        out = open(job.stdout, 'a')
+        err = open(job.stderr, 'a')
+        try:
+            # A new session lets cancel kill the script and its children
+            ljob.proc = subprocess.Popen([self.shell, "-s"],
+                                         stdin=subprocess.PIPE, stdout=out,
+                                         stderr=err, cwd=job.workdir, env=env,
+                                         preexec_fn=os.setsid)
+        except OSError, e:
+            out.close()
+            err.close()
+            logger.warn("Could not start local job %s: %s" % (ljob.job_id, e))
+            self._finish(ljob, None)
+            return
+        ljob.state = STATES.RUNNING
+        ljob.start_time = datetime.now()
+        self._running[str(ljob.job_id)] = ljob
+        watcher = threading.Thread(target=self._watch,
+                                   args=(ljob, out, err))
+        watcher.daemon = True
+        watcher.start()
+
+    def _watch(self, ljob, out, err):
+        "Feeds the job its script and waits for it to exit."
+        try:
+            ljob.proc.communicate(ljob.job.contents)
+        finally:
+            out.close()
+            err.close()
+        with self._cond:
+            if ljob.proc.returncode and not ljob.cancelled:
+                logger.warn("Local job %s (%s) exited with status %d" %
+                            (ljob.job_id, ljob.job.name,
+                             ljob.proc.returncode))
+            self._finish(ljob, ljob.proc.returncode)
+            self._dispatch()
+
+    def _finish(self, ljob, exit_code):
+        "Marks the given job as finished.  Called with the lock held."
+        key = str(ljob.job_id)
+        for jobs in (self._held, self._queued, self._running):
+            jobs.pop(key, None)
+        ljob.state = STATES.COMPLETED
+        ljob.exit_code = exit_code
+        self.exit_codes[ljob.job_id] = exit_code
+        self._cond.notify_all()
+
+    def _node_file(self, job):
+        """Returns a PBS_NODEFILE for the given job, listing this host once
+        per requested CPU."""
+        slots = int(job.numcpus or 1)
+        loc = os.path.join(self._node_dir, "nodes%d" % slots)
+        if not os.path.exists(loc):
+            with open(loc, 'w') as node_file:
+                node_file.write((self.host + "\n") * slots)
+        return loc
@@ -0,0 +1,352 @@
+"""
+Reads frames from AMBER ASCII trajectory (mdcrd) files without parsing the
+whole file.
+
+An mdcrd file is a title line followed by one frame after another.  Each
+frame holds the x, y, and z coordinates of every atom in fields of 8
+characters, ten to a line, optionally followed by a line with the three box
+lengths (written for periodic systems).  The atom count is not recorded in
+the file, so it is read from the POINTERS section of the topology (prmtop).
+
+MdcrdReader memory-maps the file and finds the byte offset of every frame
+once.  When every frame is the same size (the usual case) the offsets are
+worked out from the first frame; otherwise the file is scanned for line
+ends in blocks.  The offsets are cached in a sidecar file (the trajectory's
+name plus INDEX_SUFFIX) that is rebuilt if the trajectory's size or
+modification time changes, so later readers start straight away.  Reading
+any frame then costs the same, however far into the file it is.
+
+Trajectories that were gzipped after their path was archived are read in
+place: the archiver writes them in independently compressed blocks (see
+archive.BlockReader), the sidecar also records where the blocks start, and
+reading a frame decompresses only the block or two holding it.  Opening one
+checks the ends of the first and last frames rather than every frame, and
+each frame is checked as it is read.  Trajectories compressed any other way
+(with xz or zstd, or by plain gzip) are decompressed to a temporary file,
+which is removed when the reader is closed.
+"""
+
+import errno
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+import numpy as np
+from archive import (ArchiveError, BlockReader, CODECS, find_archived,
+                     open_archived)
+from common import InvalidDataError
+
+FIELD_WIDTH = 8
+FIELDS_PER_LINE = 10
+INDEX_SUFFIX = '.idx.npz'
+POINTERS_FLAG = '%FLAG POINTERS'
+# The bytes scanned for line ends at a time
+SCAN_BLOCK = 1 << 24
+NEWLINE = ord('\n')
+
+logger = logging.getLogger(__name__)
+
+
+def read_natoms(prmtop_loc):
+    """Returns the number of atoms (NATOM, the first of the POINTERS) in the
+    given AMBER topology file."""
+    with open(prmtop_loc) as prmtop:
+        for line in prmtop:
+            if line.startswith(POINTERS_FLAG):
+                break
+        else:
+            raise InvalidDataError("No POINTERS section in topology '%s'" %
+                                   prmtop_loc)
+        for line in prmtop:
+            if line.startswith('%FORMAT') or line.startswith('%COMMENT'):
+                continue
+            try:
+                return int(line[:FIELD_WIDTH])
+            except ValueError:
+                break
+    raise InvalidDataError("Bad POINTERS section in topology '%s'" %
+                           prmtop_loc)
+
+
+def _num_lines(num_vals):
+    "Returns the number of lines holding the given number of fields."
+    return -(-num_vals // FIELDS_PER_LINE)
+
+
+def parse_fields(data, count, src="<string>"):
+    """Returns the first count fixed-width fields in the given text as an
+    array of floats."""
+    packed = data.replace('\r', '').replace('\n', '')
+    if len(packed) < count * FIELD_WIDTH:
+        raise InvalidDataError("Short frame in '%s'" % src)
+    fields = np.frombuffer(packed, dtype='S%d' % FIELD_WIDTH, count=count)
+    try:
+        return fields.astype(float)
+    except ValueError:
+        raise InvalidDataError("Bad coordinates in '%s'" % src)
+
+
+class MdcrdReader(object):
+    """Random access to the frames of an ASCII mdcrd trajectory."""
+
+    def __init__(self, loc, natoms, tmp_dir=None, use_index=True):
+        """Opens the trajectory and finds its frames.
+
+        Positional arguments:
+        loc -- The trajectory's location (its name before any compression).
+        natoms -- The number of atoms in each frame (see read_natoms).
+        Keyword arguments:
+        tmp_dir -- Where a compressed trajectory that cannot be read in
+                   place is decompressed (defaults to the system's temporary
+                   directory).
+        use_index -- Whether to read and write the sidecar index file
+                     (default True).
+        """
+        self.loc = loc
+        self.natoms = natoms
+        self._tmp_loc = None
+        self._file = None
+        self._map = None
+        self._blocks = None
+        self._data = None
+        stored_loc, codec = find_archived(loc)
+        stat = os.stat(stored_loc)
+        # The sidecar is checked against the file as it is stored
+        self._stamp = np.array([stat.st_size, stat.st_mtime])
+        index = self._read_index() if use_index else None
+        try:
+            if codec == CODECS.GZIP:
+                self._open_blocks(stored_loc, index)
+            if self._blocks is not None:
+                self._data = self._blocks
+            else:
+                if codec is not None:
+                    stored_loc = self._decompress(tmp_dir)
+                self._data = self._map_file(stored_loc)
+            self.size = len(self._data)
+            if not self.size:
+                raise InvalidDataError("Empty trajectory '%s'" % loc)
+            if index is None:
+                offsets, has_box = self._build_index()
+                index = dict(offsets=offsets, has_box=has_box)
+                if use_index:
+                    self._save_index(index)
+            self.offsets, self.has_box = index['offsets'], index['has_box']
+        except:
+            self.close()
+            raise
+
+    def _open_blocks(self, stored_loc, index):
+        """Opens a gzipped trajectory for random access if it was written in
+        blocks, using the block offsets in the index if it has them."""
+        blocks = None
+        if index is not None and 'blocks' in index:
+            blocks = [tuple(block) for block in index['blocks'].tolist()]
+        try:
+            self._blocks = BlockReader(stored_loc, blocks)
+        except ArchiveError, e:
+            logger.debug("Decompressing '%s' in full: %s" % (stored_loc, e))
+
+    def _map_file(self, data_loc):
+        "Memory-maps the given (uncompressed) file, returning the map."
+        self._file = open(data_loc, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            return self._map
+        return ''
+
+    def _decompress(self, tmp_dir):
+        "Decompresses the trajectory to a temporary file, returning it."
+        tmp_fd, self._tmp_loc = tempfile.mkstemp(
+            dir=tmp_dir, prefix="%s." % os.path.basename(self.loc))
+        with os.fdopen(tmp_fd, 'wb') as tmp_file:
+            with open_archived(self.loc) as arc_file:
+                shutil.copyfileobj(arc_file, tmp_file)
+        return self._tmp_loc
+
+    def _index_loc(self):
+        return self.loc + INDEX_SUFFIX
+
+    def _read_index(self):
+        """Returns the sidecar index (the frame offsets, whether the frames
+        have a box line, and any block offsets) as a dict if it is current,
+        or None."""
+        try:
+            with open(self._index_loc(), 'rb') as idx_file:
+                stored = np.load(idx_file)
+                try:
+                    if (int(stored['natoms']) != self.natoms or
+                            not np.array_equal(stored['stamp'],
+                                               self._stamp)):
+                        return None
+                    index = dict(offsets=stored['offsets'],
+                                 has_box=bool(stored['has_box']))
+                    if 'blocks' in stored.files:
+                        index['blocks'] = stored['blocks']
+                    return index
+                finally:
+                    stored.close()
+        except (IOError, OSError, KeyError, ValueError):
+            return None
+
+    def _save_index(self, index):
+        "Writes the sidecar index, if the trajectory's directory allows it."
+        idx_loc = self._index_loc()
+        tmp_loc = idx_loc + ".tmp"
+        arrays = dict(index, natoms=self.natoms, stamp=self._stamp)
+        if self._blocks is not None:
+            arrays['blocks'] = np.array(self._blocks.blocks, dtype=np.int64)
+        try:
+            with open(tmp_loc, 'wb') as idx_file:
+                np.savez(idx_file, **arrays)
+            os.rename(tmp_loc, idx_loc)
+        except (IOError, OSError), e:
+            logger.debug("Couldn't write the index '%s': %s" % (idx_loc, e))
+            if os.path.exists(tmp_loc):
+                os.remove(tmp_loc)
+
+    def _line_end(self, pos):
+        "Returns the offset just past the line starting at pos."
+        end = self._data.find('\n', pos)
+        return self.size if end < 0 else end + 1
+
+    def _build_index(self):
+        """Returns the offsets of the frame starts followed by the end of the
+        last complete frame, and whether each frame has a box line."""
+        start = self._line_end(0)
+        coord_lines = _num_lines(3 * self.natoms)
+        pos = start
+        for _ in range(coord_lines):
+            pos = self._line_end(pos)
+        # A box line holds three fields; a frame's first line holds more
+        next_line = self._data[pos:self._line_end(pos)].strip()
+        has_box = (bool(next_line) and 3 * self.natoms > 3 and
+                   len(next_line) <= 3 * FIELD_WIDTH)
+        if has_box:
+            pos = self._line_end(pos)
+        frame_size = pos - start
+        lines_per_frame = coord_lines + (1 if has_box else 0)
+        count = (self.size - start) // frame_size
+        offsets = start + np.arange(count + 1, dtype=np.int64) * frame_size
+        if (self.size - start) % frame_size == 0 and self._ends_lines(
+                offsets[1:]):
+            return offsets, has_box
+        return self._scan_offsets(start, lines_per_frame), has_box
+
+    def _ends_lines(self, ends):
+        "Returns whether each of the given offsets follows a line end."
+        if self._blocks is not None:
+            # Checking every frame would decompress the whole trajectory, so
+            # only the first and last are; _frame_data checks the rest
+            ends = np.unique(ends[[0, -1]]) if len(ends) else ends
+            return all(self._data[end - 1:end] == '\n' for end in ends)
+        buf = np.frombuffer(self._map, dtype=np.uint8)
+        return bool(np.all(buf[ends - 1] == NEWLINE))
+
+    def _chunks(self, start):
+        """Yields the trajectory's bytes from start on as (offset, array)
+        pairs: a block at a time if compressed, SCAN_BLOCK bytes at a time
+        otherwise."""
+        if self._blocks is not None:
+            for offset, data in self._blocks.iter_blocks(start):
+                yield offset, np.frombuffer(data, dtype=np.uint8)
+        else:
+            buf = np.frombuffer(self._map, dtype=np.uint8)
+            for block_start in xrange(start, self.size, SCAN_BLOCK):
+                yield block_start, buf[block_start:block_start + SCAN_BLOCK]
+
+    def _scan_offsets(self, start, lines_per_frame):
+        """Returns the frame offsets found by counting line ends from start,
+        lines_per_frame at a time."""
+        ends = [np.array([start], dtype=np.int64)]
+        seen = 0
+        for block_start, block in self._chunks(start):
+            line_ends = np.flatnonzero(block == NEWLINE) + block_start + 1
+            nums = seen + np.arange(1, len(line_ends) + 1)
+            ends.append(line_ends[nums % lines_per_frame == 0])
+            seen += len(line_ends)
+        return np.concatenate(ends)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def _frame_data(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("No frame %d in '%s' (%d frames)" %
+                             (index, self.loc, len(self)))
+        start, end = self.offsets[index], self.offsets[index + 1]
+        if self._blocks is None:
+            return self._data[start:end]
+        # The frame offsets of a compressed trajectory were not all checked
+        # when it was opened
+        data = self._data[start - 1:end]
+        if data[:1] != '\n' or data[-1:] != '\n':
+            raise InvalidDataError("Frame %d of '%s' is not where expected" %
+                                   (index, self.loc))
+        return data[1:]
+
+    def read(self, index):
+        """Returns the coordinates in the given frame as a (natoms, 3) array
+        and its box lengths (None if the box is not written)."""
+        count = 3 * self.natoms
+        vals = parse_fields(self._frame_data(index),
+                            count + (3 if self.has_box else 0), self.loc)
+        box = vals[count:] if self.has_box else None
+        return vals[:count].reshape(self.natoms, 3), box
+
+    def frame(self, index):
+        "Returns the coordinates in the given frame as a (natoms, 3) array."
+        return parse_fields(self._frame_data(index), 3 * self.natoms,
+                            self.loc).reshape(self.natoms, 3)
+
+    def box(self, index):
+        "Returns the box lengths of the given frame, or None if not written."
+        if not self.has_box:
+            return None
+        return self.read(index)[1]
+
+    def iter_frames(self, start=0, stop=None, step=1):
+        "Yields the coordinates of every step-th frame from start to stop."
+        for index in xrange(*slice(start, stop, step).indices(len(self))):
+            yield self.frame(index)
+
+    def __getitem__(self, key):
+        """Returns a frame's coordinates, or for a slice, the selected frames
+        as a (frames, natoms, 3) array."""
+        if isinstance(key, slice):
+            frames = list(self.iter_frames(key.start, key.stop, key.step))
+            return np.array(frames).reshape(len(frames), self.natoms, 3)
+        return self.frame(key)
+
+    def __iter__(self):
+        return self.iter_frames()
+
+    def close(self):
+        "Releases the file and removes any decompressed copy."
+        self._data = None
+        if self._blocks is not None:
+            self._blocks.close()
+            self._blocks = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._tmp_loc is not None:
+            try:
+                os.remove(self._tmp_loc)
+            except OSError, e:
+                if e.errno != errno.ENOENT:
+                    raise
+            self._tmp_loc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,271 @@
+"""
+Reads and writes AMBER restart (.rst/inpcrd) files.
+
+The format is a title line, an atom count line (with an optional time), the
+coordinates and the optional velocities in fixed-width 6F12.7 blocks (two
+atoms to a line), and an optional box line.  Blocks are parsed by field
+width rather than by whitespace, so values wide enough to touch their
+neighbors are still read correctly.
+
+Large files are memory-mapped.  The coordinate and velocity blocks are only
+parsed when they are first accessed; an untouched block is written back out
+byte-for-byte, so e.g. reversing the velocities never reformats the
+coordinates.
+"""
+
+import mmap
+import os
+import numpy as np
+from common import InvalidDataError
+
+FIELD_WIDTH = 12
+FIELD_FMT = "%12.7f"
+FIELDS_PER_LINE = 6
+COUNT_FMT = "%5d%15s"
+COUNT_NO_TIME_FMT = "%5d"
+TIME_DIGITS = 7
+MMAP_MIN_BYTES = 1 << 20
+NEWLINE = ord('\n')
+
+
+class Restart(object):
+    """The contents of an AMBER restart file.  The coordinates and velocities
+    are (num_atoms, 3) float64 arrays; vels and box are None when the file
+    does not have them."""
+
+    def __init__(self, title, coords, vels=None, box=None, time=None):
+        """Sets up the initial state for this instance.
+
+        Positional arguments:
+        title -- The title line (without a line ending).
+        coords -- The atom coordinates (reshaped to (num_atoms, 3)).
+        Keyword arguments:
+        vels -- The atom velocities, if any.
+        box -- The box dimensions and angles, if any.
+        time -- The simulation time in picoseconds, if any.
+        """
+        self.title = title
+        self.coords = coords
+        self.vels = vels
+        self.box = box
+        self.time = time
+        # The original atom count line, reused while it is still accurate
+        self._count_text = None
+        self._count_key = None
+
+    @classmethod
+    def read(cls, loc, use_mmap=None):
+        """Reads the given restart file.
+
+        Positional arguments:
+        loc -- The file to read.
+        Keyword arguments:
+        use_mmap -- Whether to memory-map the file (defaults to doing so for
+                    files of MMAP_MIN_BYTES and up).
+        """
+        with open(loc, 'rb') as rst_file:
+            size = os.fstat(rst_file.fileno()).st_size
+            if use_mmap is None:
+                use_mmap = size >= MMAP_MIN_BYTES
+            if not (use_mmap and size):
+                return cls.parse(rst_file.read(), loc)
+            buf = mmap.mmap(rst_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                return cls.parse(buf, loc)
+            finally:
+                buf.close()
+
+    @classmethod
+    def parse(cls, buf, src="<string>"):
+        """Parses the contents of a restart file.
+
+        Positional arguments:
+        buf -- The file contents (a string or a buffer such as an mmap).
+        Keyword arguments:
+        src -- The name of the source for error messages.
+        """
+        offsets = line_offsets(buf)
+        num_lines = len(offsets) - 1
+        if num_lines < 2:
+            raise InvalidDataError("No atom count line in '%s'" % src)
+        count_text = buf[offsets[1]:offsets[2]].rstrip('\r\n')
+        count_fields = count_text.split()
+        try:
+            num_atoms = int(count_fields[0])
+            time = float(count_fields[1]) if len(count_fields) > 1 else None
+        except (IndexError, ValueError):
+            raise InvalidDataError("Bad atom count line '%s' in '%s'" %
+                                   (count_text, src))
+        block_lines = (num_atoms + 1) // 2
+        rest = num_lines - 2 - block_lines
+        if rest < 0:
+            raise InvalidDataError("Expected %d coordinate lines in '%s' but "
+                                   "found %d" % (block_lines, src,
+                                                 num_lines - 2))
+
+        rst = cls(buf[offsets[0]:offsets[1]].rstrip('\r\n'), None, time=time)
+        rst._count_text = count_text
+        rst._count_key = (num_atoms, time)
+        start = 2
+        rst._coords = LazyBlock(
+            buf[offsets[start]:offsets[start + block_lines]], num_atoms, src)
+        start += block_lines
+        if rest >= block_lines and block_lines:
+            rst._vels = LazyBlock(
+                buf[offsets[start]:offsets[start + block_lines]], num_atoms,
+                src)
+            start += block_lines
+        extra = [buf[offsets[lnum]:offsets[lnum + 1]].rstrip()
+                 for lnum in range(start, num_lines)]
+        extra = [line for line in extra if line.strip()]
+        if len(extra) > 1:
+            raise InvalidDataError("Expected at most a box line after the "
+                                   "atom blocks in '%s' but found %d lines" %
+                                   (src, len(extra)))
+        if extra:
+            rst.box = parse_fixed(extra[0], len(extra[0]) // FIELD_WIDTH, src)
+        return rst
+
+    @property
+    def coords(self):
+        "The atom coordinates, parsed on first access."
+        if isinstance(self._coords, LazyBlock):
+            self._coords = self._coords.parse()
+        return self._coords
+
+    @coords.setter
+    def coords(self, coords):
+        self._coords = as_atom_array(coords)
+
+    @property
+    def vels(self):
+        "The atom velocities (None if absent), parsed on first access."
+        if isinstance(self._vels, LazyBlock):
+            self._vels = self._vels.parse()
+        return self._vels
+
+    @vels.setter
+    def vels(self, vels):
+        self._vels = as_atom_array(vels)
+
+    @property
+    def num_atoms(self):
+        "The number of atoms in this restart."
+        return len(self._coords)
+
+    def write(self, loc):
+        """Writes this restart to the given location."""
+        with open(loc, 'wb') as rst_file:
+            rst_file.write(self.format())
+
+    def format(self):
+        "Returns the contents of the restart file for this instance."
+        num_atoms = self.num_atoms
+        if self._vels is not None and len(self._vels) != num_atoms:
+            raise InvalidDataError("Restart has %d atoms but %d velocities" %
+                                   (num_atoms, len(self._vels)))
+        if self._count_key == (num_atoms, self.time):
+            count_text = self._count_text
+        elif self.time is None:
+            count_text = COUNT_NO_TIME_FMT % num_atoms
+        else:
+            count_text = COUNT_FMT % (num_atoms, fortran_exp(self.time))
+        parts = [self.title, "\n", count_text, "\n", block_text(self._coords)]
+        if self._vels is not None:
+            parts.append(block_text(self._vels))
+        if self.box is not None:
+            parts.append(format_fixed(np.asarray(self.box, dtype=np.float64)))
+        return "".join(parts)
+
+
+class LazyBlock(object):
+    """The unparsed text of an atom block in a restart file."""
+
+    def __init__(self, text, num_atoms, src):
+        self.text = text
+        self.num_atoms = num_atoms
+        self.src = src
+
+    def __len__(self):
+        return self.num_atoms
+
+    def parse(self):
+        "Returns the block as a (num_atoms, 3) array."
+        return parse_fixed(self.text, self.num_atoms * 3,
+                           self.src).reshape(-1, 3)
+
+
+def as_atom_array(vals):
+    """Returns the given values as a (num_atoms, 3) float64 array, passing
+    None and unparsed blocks through."""
+    if vals is None or isinstance(vals, LazyBlock):
+        return vals
+    return np.asarray(vals, dtype=np.float64).reshape(-1, 3)
+
+
+def block_text(block):
+    "Returns the restart file text for the given atom block."
+    if isinstance(block, LazyBlock):
+        if block.text.endswith('\n'):
+            return block.text
+        return block.text + "\n"
+    return format_fixed(block.ravel())
+
+
+def line_offsets(buf):
+    """Returns the offset of the start of each line in the given buffer,
+    followed by the buffer's length."""
+    size = len(buf)
+    if not size:
+        return np.zeros(1, dtype=np.intp)
+    breaks = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == NEWLINE)
+    offsets = [np.zeros(1, dtype=np.intp), breaks + 1]
+    if not len(breaks) or breaks[-1] != size - 1:
+        offsets.append(np.array([size], dtype=np.intp))
+    return np.concatenate(offsets)
+
+
+def parse_fixed(text, count, src="<string>"):
+    """Parses count FIELD_WIDTH-wide values from the given lines of text.
+
+    Positional arguments:
+    text -- The lines holding the values.
+    count -- The number of values to read.
+    Keyword arguments:
+    src -- The name of the source for error messages.
+    """
+    flat = text.translate(None, '\r\n')
+    if len(flat) < count * FIELD_WIDTH:
+        raise InvalidDataError("Expected %d values in '%s' but found %d" %
+                               (count, src, len(flat) // FIELD_WIDTH))
+    try:
+        return np.frombuffer(flat, dtype='S%d' % FIELD_WIDTH,
+                             count=count).astype(np.float64)
+    except ValueError, e:
+        raise InvalidDataError("Bad value in '%s': %s" % (src, e))
+
+
+def fortran_exp(val, digits=TIME_DIGITS):
+    """Formats the given value like a Fortran E edit descriptor, with a
+    leading zero before the given number of mantissa digits (e.g.
+    0.2005000E+03)."""
+    sign, mantissa, exp = "", "0" * digits, 0
+    if val:
+        sci = "%.*E" % (digits - 1, val)
+        if sci.startswith('-'):
+            sign, sci = "-", sci[1:]
+        mantissa, exp = sci.replace('.', '').split('E')
+        exp = int(exp) + 1
+    return "%s0.%sE%+03d" % (sign, mantissa, exp)
+
+
+def format_fixed(vals, per_line=FIELDS_PER_LINE):
+    """Formats the given array of values with FIELD_FMT, per_line values to a
+    line, in one formatting operation.  A partial last line is written if the
+    number of values isn't a multiple of per_line.
+    """
+    full_lines, remainder = divmod(len(vals), per_line)
+    fmt = (FIELD_FMT * per_line + "\n") * full_lines
+    if remainder:
+        fmt += FIELD_FMT * remainder + "\n"
+    return fmt % tuple(vals.tolist())
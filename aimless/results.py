@@ -0,0 +1,305 @@
+"""
+A compact columnar store of aimless shooting path results.
+
+Each finished path is appended as one fixed-size record to a binary file, so
+the results of a campaign can be read back as a NumPy structured array and
+queried with vectorized operations rather than by re-parsing the reports.
+The array is memory-mapped, so only the columns a query touches are read.
+
+The file starts with a header holding MAGIC and the record layout (the
+NumPy dtype description as JSON), padded to a multiple of HEADER_ALIGN
+bytes, followed by the records.  A partly-written last record (from a crash
+during an append) is ignored when reading and dropped before the next
+append.
+
+Values missing from a result are stored as NaN (floats), -1 (integers), or
+an empty string.  Timings other than those in timing.TIMING_COLS are not
+stored.
+
+aimless_cvs widens a store in place with CV columns (see cvs.py).  A store
+whose file holds every field of its own layout and more keeps to the file's
+layout: new paths get missing values in the extra columns, and starting the
+store over keeps the extra columns of the paths it is given.
+
+A ResultStore is also a report sink: run_calcs starts it with the results
+recovered from the journal and adds each path as it finishes.  Because it
+has an items method, write_text_report and write_csv_report can render
+straight from it.
+"""
+
+import json
+import os
+import struct
+import threading
+import numpy as np
+from common import PersistenceError
+from timing import TIMING_COLS, TIMINGS_KEY
+
+MAGIC = '\x93AIMRES'
+# The header length follows MAGIC as a little-endian unsigned int
+LEN_FMT = '<I'
+HEADER_ALIGN = 64
+MISSING_INT = -1
+
+# The field names match the keys of the path results
+PATH_COL = 'path'
+SHOOTER_COL = 'shooter'
+ACC_COL = 'accepted'
+BASIN_COLS = ('forward', 'backward')
+RC_COLS = ('RC1fw', 'RC2fw', 'RC1bw', 'RC2bw')
+COMMIT_COLS = ('commitfw', 'commitbw')
+BASIN_A = 'A'
+BASIN_B = 'B'
+
+RESULT_DTYPE = np.dtype(
+    [(PATH_COL, '<i4'), (SHOOTER_COL, 'S16')] +
+    [(col, 'S1') for col in BASIN_COLS] + [(ACC_COL, '?')] +
+    [(col, '<f8') for col in RC_COLS] +
+    [(col, '<i8') for col in COMMIT_COLS] +
+    [(col, '<f8') for col in TIMING_COLS])
+
+
+def _missing(kind):
+    "Returns the value stored for a missing value of the given dtype kind."
+    if kind == 'f':
+        return np.nan
+    if kind in 'iu':
+        return MISSING_INT
+    if kind == 'b':
+        return False
+    return ''
+
+
+def to_record(path_id, res, dtype=RESULT_DTYPE):
+    """Returns the given path result as a tuple in the field order of dtype.
+
+    Positional arguments:
+    path_id -- The path number.
+    res -- The path result (as returned by AimlessShooter.run_path).
+    Keyword arguments:
+    dtype -- The record layout (defaults to RESULT_DTYPE).
+    """
+    timings = res.get(TIMINGS_KEY, {})
+    vals = []
+    for name in dtype.names:
+        kind = dtype.fields[name][0].kind
+        if name == PATH_COL:
+            val = path_id
+        elif name in TIMING_COLS:
+            val = timings.get(name)
+        else:
+            val = res.get(name)
+        if val is None:
+            val = _missing(kind)
+        elif kind == 'S':
+            val = str(val)
+        vals.append(val)
+    return tuple(vals)
+
+
+def from_record(record):
+    """Returns the path number and result dict for the given record, leaving
+    out the missing values."""
+    res = {}
+    timings = {}
+    for name in record.dtype.names:
+        if name == PATH_COL:
+            continue
+        val = record[name]
+        kind = record.dtype.fields[name][0].kind
+        if kind == 'f':
+            if np.isnan(val):
+                continue
+            val = float(val)
+        elif kind in 'iu':
+            if val == MISSING_INT:
+                continue
+            val = int(val)
+        elif kind == 'b':
+            if not val:
+                continue
+            val = True
+        elif not val:
+            continue
+        if name in TIMING_COLS:
+            timings[name] = val
+        else:
+            res[name] = val
+    if timings:
+        res[TIMINGS_KEY] = timings
+    return int(record[PATH_COL]), res
+
+
+def _header(dtype):
+    "Returns the file header describing records of the given dtype."
+    descr = json.dumps(dtype.descr)
+    used = len(MAGIC) + struct.calcsize(LEN_FMT)
+    size = used + len(descr) + 1
+    size += -size % HEADER_ALIGN
+    descr = descr.ljust(size - used - 1) + '\n'
+    return MAGIC + struct.pack(LEN_FMT, size) + descr
+
+
+def read_header(loc):
+    """Returns the record dtype and the offset of the first record in the
+    given store file."""
+    with open(loc, 'rb') as store_file:
+        prefix = store_file.read(len(MAGIC) + struct.calcsize(LEN_FMT))
+        if len(prefix) < len(MAGIC) or not prefix.startswith(MAGIC):
+            raise PersistenceError("'%s' is not a results store" % loc)
+        size = struct.unpack(LEN_FMT, prefix[len(MAGIC):])[0]
+        descr = store_file.read(size - len(prefix))
+    try:
+        fields = [tuple(str(part) for part in field)
+                  for field in json.loads(descr)]
+        return np.dtype(fields), size
+    except (ValueError, TypeError):
+        raise PersistenceError("Bad record layout in results store '%s'" %
+                               loc)
+
+
+class ResultStore(object):
+    """Path results stored as fixed-size records in a single file."""
+
+    def __init__(self, loc, dtype=RESULT_DTYPE):
+        """Sets up the initial state for this instance.  The file is created
+        when the first results are written.
+
+        loc -- The location of the store file.
+        dtype -- The record layout for new files (defaults to RESULT_DTYPE).
+        """
+        self.loc = loc
+        self.dtype = dtype
+        self._lock = threading.Lock()
+
+    def _layout(self):
+        """Returns the dtype and record offset of the existing file, or None
+        if there is no file yet."""
+        if not os.path.exists(self.loc):
+            return None
+        return read_header(self.loc)
+
+    def _extends(self, dtype):
+        """Returns whether the given layout holds every field of this store's
+        (as one widened by aimless_cvs does)."""
+        return all(name in dtype.names and
+                   dtype.fields[name][0] == self.dtype.fields[name][0]
+                   for name in self.dtype.names)
+
+    def start(self, pres):
+        """Starts the store over with the given results (e.g. those recovered
+        when resuming), replacing the file in one step.  If the file has
+        been widened, its extra columns are kept for the given paths."""
+        with self._lock:
+            dtype = self.dtype
+            try:
+                layout = self._layout()
+            except PersistenceError:
+                layout = None
+            kept = {}
+            if layout is not None and self._extends(layout[0]):
+                dtype = layout[0]
+                extra = [name for name in dtype.names
+                         if name not in self.dtype.names]
+                for path_id, res in self.as_pres().items():
+                    kept[path_id] = dict((name, res[name]) for name in extra
+                                         if name in res)
+            records = []
+            for path_id in sorted(pres):
+                res = kept.get(path_id, {})
+                res.update(pres[path_id])
+                records.append(to_record(path_id, res, dtype))
+            records = np.array(records, dtype=dtype)
+            tmp_loc = self.loc + ".tmp"
+            with open(tmp_loc, 'wb') as store_file:
+                store_file.write(_header(dtype))
+                store_file.write(records.tostring())
+                store_file.flush()
+                os.fsync(store_file.fileno())
+            os.rename(tmp_loc, self.loc)
+
+    def add(self, path_id, res):
+        "Appends the record for a finished path and syncs it to disk."
+        with self._lock:
+            layout = self._layout()
+            if layout is None:
+                with open(self.loc, 'wb') as store_file:
+                    store_file.write(_header(self.dtype))
+                layout = self.dtype, os.path.getsize(self.loc)
+            dtype, offset = layout
+            if not self._extends(dtype):
+                raise PersistenceError(
+                    "Results store '%s' has a different record layout; "
+                    "start a new store" % self.loc)
+            record = np.array([to_record(path_id, res, dtype)], dtype=dtype)
+            with open(self.loc, 'r+b') as store_file:
+                store_file.seek(0, os.SEEK_END)
+                size = store_file.tell()
+                # Drop a record left partly written by a crash
+                whole = offset + (size - offset) // dtype.itemsize * \
+                    dtype.itemsize
+                if whole != size:
+                    store_file.truncate(whole)
+                    store_file.seek(whole)
+                store_file.write(record.tostring())
+                store_file.flush()
+                os.fsync(store_file.fileno())
+
+    def records(self):
+        """Returns the stored records as a read-only, memory-mapped structured
+        array (an empty array if nothing has been stored)."""
+        layout = self._layout()
+        if layout is None:
+            return np.empty(0, dtype=self.dtype)
+        dtype, offset = layout
+        count = (os.path.getsize(self.loc) - offset) // dtype.itemsize
+        if not count:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.loc, dtype=dtype, mode='r', offset=offset,
+                         shape=(count,))
+
+    def __len__(self):
+        return len(self.records())
+
+    def items(self):
+        """Returns (path number, result dict) pairs for the stored paths in
+        path order, as in the dict returned by run_calcs."""
+        return sorted(self.as_pres().items())
+
+    def as_pres(self):
+        """Returns the stored results as a dict keyed by path number.  If a
+        path was stored more than once, the last record wins."""
+        return dict(from_record(record) for record in self.records())
+
+
+def load_records(locs):
+    """Returns the records of the given stores (e.g. every campaign in a
+    study) as one structured array.  Only the fields common to all of the
+    stores are kept."""
+    arrays = [ResultStore(loc).records() for loc in locs]
+    if not arrays:
+        return np.empty(0, dtype=RESULT_DTYPE)
+    names = [name for name in arrays[0].dtype.names
+             if all(name in arr.dtype.names for arr in arrays[1:])]
+    dtype = np.dtype([(name, arrays[0].dtype.fields[name][0])
+                      for name in names])
+    combined = np.empty(sum(len(arr) for arr in arrays), dtype=dtype)
+    start = 0
+    for arr in arrays:
+        for name in names:
+            combined[name][start:start + len(arr)] = arr[name]
+        start += len(arr)
+    return combined
+
+
+def basin_totals(records):
+    """Returns the totals of the text report for the given records as a dict
+    with 'accepted', 'rejected', 'both_a', and 'both_b' counts."""
+    fwd, back = records[BASIN_COLS[0]], records[BASIN_COLS[1]]
+    accepted = int(np.count_nonzero(records[ACC_COL]))
+    return {'accepted': accepted,
+            'rejected': len(records) - accepted,
+            'both_a': int(np.count_nonzero((fwd == BASIN_A) &
+                                           (back == BASIN_A))),
+            'both_b': int(np.count_nonzero((fwd == BASIN_B) &
+                                           (back == BASIN_B)))}
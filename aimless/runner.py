@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Runs a whole aimless shooting path on a compute node.  The starter, dt,
+forward, and backward Amber jobs are run back to back inside the current
+allocation, with the velocities reversed in between, and the basin results
+are written to a small result file for the aimless script to pick up.
+
+The aimless script writes the path configuration and submits a job (from
+the path_job.tpl template) that calls this runner when the 'path' job mode
+is selected.
+"""
+
+import logging
+import os
+import subprocess
+import sys
+import optparse
+from aimless import (AimlessShooter, read_path_cfg, write_path_result,
+                     MAIN_SEC, JOBS_SEC, BASINS_SEC, TGT_DIR_KEY, TPL_DIR_KEY,
+                     TOPO_KEY, SHOOTER_KEY, PATH_NUM_KEY, PATH_RESULT_NAME)
+from common import STATES
+from torque import JobStatus
+
+logger = logging.getLogger(__name__)
+
+
+class InlineSubmissionHandler(object):
+    """Runs each submitted job script to completion with bash in the current
+    process's allocation.  Jobs are finished by the time submit returns."""
+
+    def __init__(self, shell="bash"):
+        self.shell = shell
+        self.last_id = 0
+        self.exit_codes = {}
+
+    def submit(self, job):
+        """Runs the given job, returning an ID for it.  The job sees its
+        workdir as PBS_O_WORKDIR."""
+        self.last_id += 1
+        env = dict(os.environ)
+        if job.workdir:
+            env['PBS_O_WORKDIR'] = job.workdir
+        logger.debug("Running job %d (%s)" % (self.last_id, job.name))
+        with open(job.stdout, 'a') as out, open(job.stderr, 'a') as err:
+            proc = subprocess.Popen([self.shell, "-s"], stdin=subprocess.PIPE,
+                                    stdout=out, stderr=err, cwd=job.workdir,
+                                    env=env)
+            proc.communicate(job.contents)
+        self.exit_codes[self.last_id] = proc.returncode
+        if proc.returncode:
+            logger.warn("Job %d (%s) exited with status %d" %
+                        (self.last_id, job.name, proc.returncode))
+        return self.last_id
+
+    def cancel(self, job_id):
+        "Does nothing; jobs are already finished when submit returns."
+        pass
+
+    def stat_jobs(self, ids=None):
+        "Returns the completed status for each of the given job IDs."
+        if ids is None:
+            ids = self.exit_codes.keys()
+        return dict((jid, JobStatus(job_id=jid, job_state=STATES.COMPLETED))
+                    for jid in ids)
+
+
+def run_path_cfg(cfg_loc, sub_handler=None):
+    """Runs the path described by the given configuration file, writing the
+    basin results to the path's working directory and returning them.
+
+    Positional arguments:
+    cfg_loc -- The location of a file written by write_path_cfg.
+    Keyword arguments:
+    sub_handler -- The handler for the Amber jobs (defaults to
+                   InlineSubmissionHandler).
+    """
+    if sub_handler is None:
+        sub_handler = InlineSubmissionHandler()
+    config = read_path_cfg(cfg_loc)
+    bparams = dict((key, float(val)) for key, val in
+                   config.items(BASINS_SEC))
+    aims = AimlessShooter(config.get(MAIN_SEC, TPL_DIR_KEY),
+                          config.get(MAIN_SEC, TGT_DIR_KEY),
+                          config.get(MAIN_SEC, TOPO_KEY),
+                          dict(config.items(JOBS_SEC)), bparams,
+                          sub_handler=sub_handler, wait_secs=0, stat_secs=0)
+    try:
+        aims.open_path(config.getint(MAIN_SEC, PATH_NUM_KEY))
+        result = aims.run_stages(config.get(MAIN_SEC, SHOOTER_KEY))
+    finally:
+        aims.close()
+    write_path_result(result, aims.pathres(PATH_RESULT_NAME))
+    return result
+
+
+def parse_cmdline(argv):
+    """
+    Return a 2-tuple: (opts object, args list).
+    `argv` is a list of arguments, or `None` for ``sys.argv[1:]``.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage="%prog path_cfg",
+        formatter=optparse.TitledHelpFormatter(width=78),
+        add_help_option=None)
+    parser.add_option('-h', '--help', action='help',
+                      help='Show this help message and exit.')
+
+    opts, args = parser.parse_args(argv)
+
+    if len(args) != 1:
+        parser.error('Please specify the path configuration file')
+
+    return opts, args
+
+
+def main(argv=None):
+    opts, args = parse_cmdline(argv)
+    run_path_cfg(args[0])
+    return 0        # success
+
+if __name__ == '__main__':
+    status = main()
+    sys.exit(status)
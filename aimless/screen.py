@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Screens combinations of candidate collective variables (CVs) as reaction
+coordinates.  Every subset of one to max_cvs of the CVs of the archived
+shooting points is fitted with analysis.fit_committor in a pool of worker
+processes, and the fits are ranked by their Bayesian information criterion
+(BIC) and log likelihood.
+
+The CV columns and outcomes are loaded once and placed in shared memory
+before the workers start, so each fit only reads the columns it needs.
+Each fit is written to the results file as soon as it finishes, so an
+interrupted screen keeps the fits it has done.  The ranked fits are written
+to a second file at the end.
+
+With --store, the CVs screened are the shooting point columns of a results
+store widened by aimless_cvs (see cvs.py) rather than the DUMPAVE reaction
+coordinates.
+"""
+
+import csv
+import itertools
+import logging
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import optparse
+import os
+import sys
+import numpy as np
+from aimless import (read_config, get, MAIN_SEC, BASINS_SEC, TGT_DIR_KEY,
+                     OUT_DIR, DEF_CFG_NAME)
+from analysis import (fit_committor, load_shooting_points, basin_params,
+                      points_from_records)
+from common import InvalidDataError, PersistenceError
+from cvs import store_cv_names
+from local import default_max_jobs
+from results import ResultStore
+
+DEF_MAX_CVS = 3
+DEF_SCREEN_OUT = 'aimless_screen.csv'
+DEF_RANKED_OUT = 'aimless_screen_ranked.csv'
+DEF_TOP = 10
+# The number of subsets handed to a worker at a time
+CHUNK_SIZE = 8
+CV_SEP = '+'
+SCREEN_COLS = ['cvs', 'num_cvs', 'loglike', 'bic', 'converged', 'coefs']
+RANKED_COLS = ['bic_rank', 'loglike_rank'] + SCREEN_COLS
+
+logger = logging.getLogger(__name__)
+
+# The shooting points shared with the workers: (cvs, n_a, n_b, names)
+_shared = None
+
+
+def cv_subsets(num_cvs, max_cvs=DEF_MAX_CVS):
+    """Returns every subset of one to max_cvs of the given number of CVs as
+    a tuple of column indices, smallest subsets first."""
+    return [subset for size in range(1, min(max_cvs, num_cvs) + 1)
+            for subset in itertools.combinations(range(num_cvs), size)]
+
+
+def _share(arr):
+    "Returns a shared-memory copy of the given array and its shape."
+    arr = np.ascontiguousarray(arr, dtype=float)
+    shared = RawArray('d', arr.size)
+    np.frombuffer(shared, dtype=float)[:] = arr.ravel()
+    return shared, arr.shape
+
+
+def _init_worker(cvs, n_a, n_b, names):
+    """Points this process at the shared shooting points.  Each argument
+    but names is a (shared array, shape) pair."""
+    global _shared
+    _shared = tuple(np.frombuffer(shared, dtype=float).reshape(shape)
+                    for shared, shape in (cvs, n_a, n_b)) + (names,)
+
+
+def _fit_subset(subset):
+    "Fits the given subset of the shared CV columns."
+    cvs, n_a, n_b, names = _shared
+    return fit_committor(cvs[:, subset], n_a, n_b,
+                         names=[names[idx] for idx in subset])
+
+
+def fit_row(fit):
+    "Returns the results file row for the given CommittorFit."
+    return [CV_SEP.join(fit.names), len(fit.names), "%.6f" % fit.loglike,
+            "%.6f" % fit.bic, "Y" if fit.converged else "N",
+            " ".join("%.8g" % coef for coef in fit.coefs)]
+
+
+def rank_fits(fits):
+    """Returns the given fits ordered by BIC (best first), each with its BIC
+    and log likelihood ranks as a 3-tuple: (bic_rank, loglike_rank, fit)."""
+    by_loglike = sorted(fits, key=lambda fit: -fit.loglike)
+    loglike_ranks = dict((id(fit), rank + 1)
+                         for rank, fit in enumerate(by_loglike))
+    return [(rank + 1, loglike_ranks[id(fit)], fit) for rank, fit in
+            enumerate(sorted(fits, key=lambda fit: fit.bic))]
+
+
+def screen(points, max_cvs=DEF_MAX_CVS, processes=None, tgt=None):
+    """Fits every subset of one to max_cvs of the CVs of the given shooting
+    points, returning the CommittorFits in the order they finished.
+
+    Positional arguments:
+    points -- The analysis.ShootingPoints to screen.
+    Keyword arguments:
+    max_cvs -- The largest number of CVs in a subset (defaults to 3).
+    processes -- The number of worker processes (defaults to one per CPU);
+                 1 fits the subsets in this process.
+    tgt -- A file to write each fit to, as a CSV row, as it finishes.
+    """
+    if processes is None:
+        processes = default_max_jobs()
+    subsets = cv_subsets(len(points.names), max_cvs)
+    logger.info("Screening %d CV subsets of %d points with %d processes" %
+                (len(subsets), len(points), processes))
+    shared = (_share(points.cvs), _share(points.n_a), _share(points.n_b),
+              points.names)
+    csv_writer = None
+    if tgt is not None:
+        csv_writer = csv.writer(tgt, lineterminator=os.linesep)
+        csv_writer.writerow(SCREEN_COLS)
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, _init_worker, shared)
+        fit_iter = pool.imap_unordered(_fit_subset, subsets, CHUNK_SIZE)
+    else:
+        _init_worker(*shared)
+        fit_iter = itertools.imap(_fit_subset, subsets)
+    fits = []
+    try:
+        for fit in fit_iter:
+            fits.append(fit)
+            if csv_writer is not None:
+                csv_writer.writerow(fit_row(fit))
+                tgt.flush()
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return fits
+
+
+def write_ranked(fits, tgt, linesep=os.linesep):
+    """Writes the given fits ranked by BIC as CSV.
+
+    Positional arguments:
+    fits -- The CommittorFits to rank.
+    tgt -- The target to write to.
+    """
+    csv_writer = csv.writer(tgt, lineterminator=linesep)
+    csv_writer.writerow(RANKED_COLS)
+    for bic_rank, loglike_rank, fit in rank_fits(fits):
+        csv_writer.writerow([bic_rank, loglike_rank] + fit_row(fit))
+
+
+def parse_cmdline(argv):
+    """
+    Return a 2-tuple: (opts object, args list).
+    `argv` is a list of arguments, or `None` for ``sys.argv[1:]``.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = optparse.OptionParser(
+        formatter=optparse.TitledHelpFormatter(width=78),
+        add_help_option=None)
+    parser.add_option('-c', '--cfg_file', default=DEF_CFG_NAME,
+                      help="Specify config file location.", metavar="CFG")
+    parser.add_option('-d', '--out_dir', default=None,
+                      help="The directory of archived paths (defaults to "
+                           "'output' in the configured tgtdir).",
+                      metavar="DIR")
+    parser.add_option('-s', '--store', default=None,
+                      help="Screen the CVs in a results store widened by "
+                           "aimless_cvs instead of the reaction coordinates "
+                           "of the archived paths.", metavar="FILE")
+    parser.add_option('-m', '--max_cvs', type='int', default=DEF_MAX_CVS,
+                      help="The largest number of CVs in a combination.")
+    parser.add_option('-p', '--processes', type='int', default=None,
+                      help="The number of worker processes (defaults to "
+                           "one per CPU).")
+    parser.add_option('-o', '--out_file', default=DEF_SCREEN_OUT,
+                      help="Where each fit is written as it finishes.",
+                      metavar="FILE")
+    parser.add_option('-r', '--ranked_file', default=DEF_RANKED_OUT,
+                      help="Where the ranked fits are written.",
+                      metavar="FILE")
+    parser.add_option('-t', '--top', type='int', default=DEF_TOP,
+                      help="The number of best fits to print.")
+    parser.add_option('-h', '--help', action='help',
+                      help='Show this help message and exit.')
+
+    opts, args = parser.parse_args(argv)
+
+    if args:
+        parser.error('program takes no command-line arguments; '
+                     '"%s" ignored.' % (args,))
+    if opts.max_cvs < 1:
+        parser.error('The maximum number of CVs must be at least 1')
+    if opts.processes is not None and opts.processes < 1:
+        parser.error('The number of processes must be at least 1')
+
+    return opts, args
+
+
+def main(argv=None):
+    opts, args = parse_cmdline(argv)
+    config = read_config(opts.cfg_file)
+    out_dir = opts.out_dir
+    if out_dir is None:
+        out_dir = os.path.join(get(config, MAIN_SEC, TGT_DIR_KEY, '.'),
+                               OUT_DIR)
+    try:
+        if opts.store is None:
+            points = load_shooting_points(
+                out_dir, basin_params(config.items(BASINS_SEC)))
+        else:
+            records = ResultStore(opts.store).records()
+            points = points_from_records(records,
+                                         store_cv_names(records.dtype))
+            out_dir = opts.store
+    except (InvalidDataError, PersistenceError), e:
+        sys.stderr.write("%s\n" % e)
+        return 1
+    if not len(points):
+        sys.stderr.write("No shooting points with a conclusive outcome in "
+                         "'%s'\n" % out_dir)
+        return 1
+    with open(opts.out_file, 'w') as out_tgt:
+        fits = screen(points, opts.max_cvs, opts.processes, out_tgt)
+    with open(opts.ranked_file, 'w') as ranked_tgt:
+        write_ranked(fits, ranked_tgt)
+    print "%4s %12s %12s  %s" % ("rank", "BIC", "ln L", "CVs")
+    for bic_rank, loglike_rank, fit in rank_fits(fits)[:opts.top]:
+        print "%4d %12.4f %12.4f  %s" % (bic_rank, fit.bic, fit.loglike,
+                                         CV_SEP.join(fit.names))
+    return 0        # success
+
+if __name__ == '__main__':
+    status = main()
+    sys.exit(status)
@@ -1,13 +1,25 @@
 #!/bin/bash
 
+# Record the exit status and the job's start and end times (in seconds
+# since the epoch) for the aimless script when the job ends
+aimless_start=$$(date +%s)
+trap 'echo $$? $$aimless_start $$(date +%s) > $donefile' EXIT
+
 #executable statement
 echo Working directory is $$PBS_O_WORKDIR
+# The job fails (holding any jobs that depend on it) if it can't get to the
+# working directory or a command run before Amber fails
+set -e
 cd $$PBS_O_WORKDIR
+$pre_cmds
+set +e
 
 mpdboot -f $$PBS_NODEFILE -n 1
 
-mpiexec -machinefile $$PBS_NODEFILE -n $numcpus $$AMBERHOME/bin/sander.MPI -O
+mpiexec -machinefile $$PBS_NODEFILE -n $numcpus $$AMBERHOME/bin/sander.MPI -O \
 -i $infile -o $outfile -p $topology -c $shooter -r $dir_rst -ref $shooter -x $mdcrd
+aimless_status=$$?
 mpdallexit
 
-echo execution finished
\ No newline at end of file
+echo execution finished
+exit $$aimless_status
@@ -0,0 +1,22 @@
+#!/bin/bash
+
+# Record the exit status and the job's start and end times (in seconds
+# since the epoch) for the aimless script when the job ends
+aimless_start=$$(date +%s)
+trap 'echo $$? $$aimless_start $$(date +%s) > $donefile' EXIT
+
+#executable statement
+echo Working directory is $$PBS_O_WORKDIR
+# The job fails if it can't get to the working directory or a command run
+# before the path fails
+set -e
+cd $$PBS_O_WORKDIR
+$pre_cmds
+set +e
+
+# Run the starter, dt, forward, and backward jobs in this allocation
+aimless_path $pathcfg
+aimless_status=$$?
+
+echo execution finished
+exit $$aimless_status
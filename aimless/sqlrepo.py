@@ -0,0 +1,250 @@
+"""
+An SQLite-backed job repository for torque.JobWatcher.
+
+Jobs are saved with save_jobs, submitted by JobWatcher.submit_saved, and
+tracked through update_statuses until they complete.  The queue ID
+column is indexed, and a partial index holds only the active jobs (those
+neither saved nor completed), so active-job lookups cost time in proportion
+to the number of active jobs rather than the size of the campaign's
+history.  SQLite only uses a partial index when the query's WHERE clause
+matches the index's with the same literal values, so both are built from
+ACTIVE_COND.  Status updates are written in a single transaction
+and only for jobs whose state or ID has changed.
+
+Each row carries a version that is bumped on every write.  An update made
+from a stale status (one whose version no longer matches the row) is
+skipped and logged.
+"""
+
+import logging
+import sqlite3
+from common import STATES, PersistenceError, to_datetime, to_epoch
+from torque import TorqueJob, JobStatus
+
+# The largest number of IDs bound in a single IN clause
+MAX_BATCH = 500
+INITIAL_VERSION = 1
+INACTIVE_STATES = (STATES.SAVED, STATES.COMPLETED)
+ACTIVE_COND = "job_state NOT IN (%s)" % ", ".join("'%s'" % state
+                                                  for state in INACTIVE_STATES)
+
+JOB_COLS = ('name', 'contents', 'stdout', 'stderr', 'numnodes', 'numcpus',
+            'queue', 'walltime', 'mail', 'workdir', 'depends', 'depend_type',
+            'array')
+# Columns read into JobStatus instances
+STATUS_COLS = ('sub_id', 'name', 'queue', 'created', 'updated', 'version')
+# Columns written from JobStatus instances
+STAT_COLS = ('job_id', 'job_state', 'owner', 'ctime', 'qtime', 'start_time',
+             'exec_host', 'remaining')
+TIME_COLS = frozenset(['ctime', 'qtime', 'start_time', 'created', 'updated'])
+
+STATUS_SQL = "SELECT %s FROM jobs" % ", ".join(STATUS_COLS + STAT_COLS)
+ACTIVE_SQL = "%s WHERE %s ORDER BY sub_id" % (STATUS_SQL, ACTIVE_COND)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    sub_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT, contents TEXT, stdout TEXT, stderr TEXT, numnodes INTEGER,
+    numcpus INTEGER, queue TEXT, walltime TEXT, mail TEXT, workdir TEXT,
+    depends TEXT, depend_type TEXT, array TEXT,
+    job_id TEXT, job_state TEXT NOT NULL, owner TEXT, ctime REAL, qtime REAL,
+    start_time REAL, exec_host TEXT, remaining INTEGER,
+    created REAL, updated REAL, version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (job_state);
+CREATE INDEX IF NOT EXISTS jobs_job_id ON jobs (job_id);
+CREATE INDEX IF NOT EXISTS jobs_active ON jobs (sub_id) WHERE %s;
+""" % ACTIVE_COND
+
+logger = logging.getLogger(__name__)
+
+
+def from_epoch(val):
+    "Returns the given seconds since the epoch as a datetime (None passes)."
+    if val is None:
+        return None
+    return to_datetime(val)
+
+
+def to_job_id(val):
+    """Returns the stored job ID in the form the submission handlers use:
+    an int for plain jobs and a string for array jobs."""
+    if val is not None and val.isdigit():
+        return int(val)
+    return val
+
+
+def batches(vals, size=MAX_BATCH):
+    "Yields the given list in slices of at most size values."
+    for start in range(0, len(vals), size):
+        yield vals[start:start + size]
+
+
+class SqliteJobRepo(object):
+    """Stores jobs and their statuses in an SQLite database."""
+
+    def __init__(self, db_loc=':memory:', now=None):
+        """Opens (and if needed creates) the job database.
+
+        Keyword arguments:
+        db_loc -- The database file (defaults to an in-memory database).
+        now -- The function returning the current datetime, used for the
+               created and updated stamps (defaults to datetime.now).
+        """
+        if now is None:
+            from datetime import datetime
+            now = datetime.now
+        self.now = now
+        try:
+            self.conn = sqlite3.connect(db_loc)
+            self.conn.executescript(SCHEMA)
+        except sqlite3.Error, e:
+            raise PersistenceError("Could not open job database '%s': %s" %
+                                   (db_loc, e))
+
+    def close(self):
+        "Closes the database connection."
+        self.conn.close()
+
+    def save_jobs(self, jobs):
+        """Saves the given TorqueJobs for submission, setting each job's
+        sub_id, created, and updated fields.  All of the jobs are written in
+        one transaction."""
+        stamp = self.now()
+        cols = JOB_COLS + ('job_state', 'created', 'updated', 'version')
+        sql = "INSERT INTO jobs (%s) VALUES (%s)" % (
+            ", ".join(cols), ", ".join("?" * len(cols)))
+        with self._transaction():
+            for job in jobs:
+                job.created = job.updated = stamp
+                row = [getattr(job, col) for col in JOB_COLS]
+                if job.depends:
+                    row[JOB_COLS.index('depends')] = ":".join(
+                        map(str, job.depends))
+                row += [STATES.SAVED, to_epoch(stamp), to_epoch(stamp),
+                        INITIAL_VERSION]
+                job.sub_id = self.conn.execute(sql, row).lastrowid
+
+    def get_saved_jobs(self):
+        "Returns the saved jobs that have not been submitted as TorqueJobs."
+        cursor = self.conn.execute(
+            "SELECT sub_id, created, updated, %s FROM jobs "
+            "WHERE job_state = ? ORDER BY sub_id" % ", ".join(JOB_COLS),
+            (STATES.SAVED,))
+        jobs = []
+        for row in cursor:
+            job = TorqueJob(**dict(zip(JOB_COLS, row[3:])))
+            job.sub_id = row[0]
+            job.created = from_epoch(row[1])
+            job.updated = from_epoch(row[2])
+            if job.depends:
+                job.depends = [to_job_id(jid)
+                               for jid in job.depends.split(":")]
+            jobs.append(job)
+        return jobs
+
+    def get_active_statuses(self):
+        """Returns a JobStatus for each job that has been submitted and has
+        not completed."""
+        cursor = self.conn.execute(ACTIVE_SQL)
+        return [self._to_status(STATUS_COLS + STAT_COLS, row)
+                for row in cursor]
+
+    def get_statuses(self, job_ids):
+        "Returns the stored JobStatus for each of the given queue job IDs."
+        cols = STATUS_COLS + STAT_COLS
+        stats = []
+        for batch in batches(map(str, job_ids)):
+            cursor = self.conn.execute(
+                "%s WHERE job_id IN (%s)" %
+                (STATUS_SQL, ", ".join("?" * len(batch))), batch)
+            stats.extend(self._to_status(cols, row) for row in cursor)
+        return stats
+
+    def update_statuses(self, stats):
+        """Writes the given statuses in one transaction.  A status is only
+        written when its state or queue ID differs from the stored row, and
+        only if its version matches the row's; the version of each written
+        status is then bumped to match the row.
+
+        Returns:
+        The number of statuses written.
+        """
+        stats = [stat for stat in stats if stat.sub_id is not None]
+        stored = {}
+        for batch in batches([stat.sub_id for stat in stats]):
+            cursor = self.conn.execute(
+                "SELECT sub_id, job_id, job_state, version FROM jobs "
+                "WHERE sub_id IN (%s)" % ", ".join("?" * len(batch)), batch)
+            for sub_id, job_id, job_state, version in cursor:
+                stored[sub_id] = (job_id, job_state, version)
+        changed = []
+        for stat in stats:
+            if stat.sub_id not in stored:
+                logger.warn("No saved job with sub_id %s" % stat.sub_id)
+                continue
+            job_id, job_state, version = stored[stat.sub_id]
+            new_id = None if stat.job_id is None else str(stat.job_id)
+            if (new_id, stat.job_state) == (job_id, job_state):
+                continue
+            if stat.version is not None and stat.version != version:
+                logger.warn("Skipping stale update of job %s (version %s, "
+                            "stored version %s)" % (stat.sub_id, stat.version,
+                                                    version))
+                continue
+            changed.append(stat)
+        if not changed:
+            return 0
+        stamp = self.now()
+        sql = ("UPDATE jobs SET %s, updated = ?, version = version + 1 "
+               "WHERE sub_id = ?" % ", ".join("%s = ?" % col
+                                              for col in STAT_COLS))
+        rows = []
+        for stat in changed:
+            row = []
+            for col in STAT_COLS:
+                val = getattr(stat, col)
+                if col in TIME_COLS:
+                    val = to_epoch(val)
+                elif col == 'job_id' and val is not None:
+                    val = str(val)
+                row.append(val)
+            rows.append(row + [to_epoch(stamp), stat.sub_id])
+        with self._transaction():
+            self.conn.executemany(sql, rows)
+        for stat in changed:
+            stat.version = stored[stat.sub_id][2] + 1
+            stat.updated = stamp
+        return len(changed)
+
+    def _to_status(self, cols, row):
+        "Creates a JobStatus from a row with the given columns."
+        vals = dict(zip(cols, row))
+        for col in TIME_COLS:
+            vals[col] = from_epoch(vals.get(col))
+        vals['job_id'] = to_job_id(vals['job_id'])
+        return JobStatus(**vals)
+
+    def _transaction(self):
+        "Returns a context manager committing or rolling back a transaction."
+        return Transaction(self.conn)
+
+
+class Transaction(object):
+    """Commits the connection's changes when the block succeeds and rolls
+    them back otherwise, raising sqlite errors as PersistenceErrors."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.conn.commit()
+            return False
+        self.conn.rollback()
+        if issubclass(exc_type, sqlite3.Error):
+            raise PersistenceError("Job database update failed: %s" % exc_val)
+        return False
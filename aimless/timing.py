@@ -0,0 +1,132 @@
+"""
+Records where the wall time of each aimless shooting path goes.
+
+Each phase of a path (the starter job, the velocity reversal, the dt job,
+the forward and backward jobs, the basin calculations, processing the
+results, and archiving the path) records its wall time on the login node.
+The time spent waiting on each Amber job is further split into:
+
+- queue: from submission (or the queue's qtime) until the job started,
+- run: from the job's start until it ended,
+- slack: from the job's end until the aimless script noticed.
+
+The job start and end times come from the job's completion sentinel, which
+the job template writes as "status start end" (seconds since the epoch).
+The queue's start_time is used for jobs whose sentinel has no times.
+"""
+
+from contextlib import contextmanager
+import csv
+import os
+import time
+from common import enum, to_epoch
+
+PHASES = enum(STARTER='starter', REVVEL='revvel', DT='dt',
+              FWD_BACK='fwdback', PATH_JOB='pathjob', BASINS='basins',
+              RESULTS='results', CLEAN='clean', TOTAL='total')
+PHASE_ORDER = (PHASES.TOTAL, PHASES.STARTER, PHASES.REVVEL, PHASES.DT,
+               PHASES.FWD_BACK, PHASES.PATH_JOB, PHASES.BASINS,
+               PHASES.RESULTS, PHASES.CLEAN)
+JOB_ORDER = ('starter', 'dt', 'forward', 'backward', 'path')
+JOB_SPLITS = ('queue', 'run', 'slack')
+WALL_SUFFIX = 'wall'
+TIMINGS_KEY = 'timings'
+
+TIMING_COLS = (["%s_%s" % (phase, WALL_SUFFIX) for phase in PHASE_ORDER] +
+               ["%s_%s" % (job, split) for job in JOB_ORDER
+                for split in JOB_SPLITS])
+
+
+def read_sentinel_times(loc):
+    """Returns the (start, end) times in seconds since the epoch recorded in
+    the given completion sentinel.  Either is None if it is not recorded."""
+    try:
+        with open(loc) as done_file:
+            fields = done_file.read().split()
+    except (IOError, OSError):
+        return None, None
+    times = []
+    for field in fields[1:3]:
+        try:
+            times.append(float(field))
+        except ValueError:
+            times.append(None)
+    times += [None] * (2 - len(times))
+    return tuple(times)
+
+
+class PathTimings(object):
+    """The timings of a single path as a flat dict of seconds keyed by
+    "<phase>_wall" and "<job>_<queue|run|slack>"."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.times = {}
+
+    @contextmanager
+    def phase(self, name):
+        "Records the wall time of the with block as the named phase."
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add(name, self.clock() - start)
+
+    def add(self, name, secs):
+        "Adds the given number of seconds to the named phase's wall time."
+        key = "%s_%s" % (name, WALL_SUFFIX)
+        self.times[key] = self.times.get(key, 0) + secs
+
+    def add_job(self, name, submitted, done_loc, stat=None, noticed=None):
+        """Splits the wait on a finished job into its queue, run, and slack
+        times.  Times that cannot be worked out are left out.
+
+        Positional arguments:
+        name -- The job's name in the timings (e.g. 'forward').
+        submitted -- When the job was submitted (seconds since the epoch).
+        done_loc -- The job's completion sentinel.
+        Keyword arguments:
+        stat -- The last JobStatus seen for the job, if any.
+        noticed -- When the job was seen to be finished (defaults to now).
+        """
+        if noticed is None:
+            noticed = self.clock()
+        start, end = read_sentinel_times(done_loc)
+        queued = submitted
+        if stat is not None:
+            queued = to_epoch(stat.qtime) or queued
+            if start is None:
+                start = to_epoch(stat.start_time)
+        if end is None and os.path.exists(done_loc):
+            end = os.path.getmtime(done_loc)
+        splits = {'queue': (queued, start), 'run': (start, end),
+                  'slack': (end, noticed)}
+        for split, (first, last) in splits.items():
+            if first is not None and last is not None:
+                # Clocks on different hosts can disagree by a little
+                self.times["%s_%s" % (name, split)] = max(0.0, last - first)
+
+    def as_dict(self):
+        "Returns a copy of the recorded timings."
+        return dict(self.times)
+
+
+def write_timings_csv(pres, tgt, linesep=os.linesep):
+    """Writes a CSV report of the timings stored with the given path results,
+    one row per path.  Timings missing for a path are left blank.
+
+    Positional arguments:
+    pres -- The path results.
+    tgt -- The target to write to.
+    """
+    extra = sorted(set(key for res in pres.values()
+                       for key in res.get(TIMINGS_KEY, {})
+                       if key not in TIMING_COLS))
+    cols = TIMING_COLS + extra
+    csv_writer = csv.writer(tgt, lineterminator=linesep)
+    csv_writer.writerow(["path"] + cols)
+    for path_id in sorted(pres):
+        timings = pres[path_id].get(TIMINGS_KEY, {})
+        csv_writer.writerow([path_id] + ["%.3f" % timings[col]
+                                         if col in timings else ""
+                                         for col in cols])
@@ -3,6 +3,8 @@ from common import (SubmissionError, StatusError, OutputParsingError,
 from datetime import datetime, timedelta
 import logging
 from subprocess import PIPE, Popen
+import threading
+import time
 import xml.etree.ElementTree as et
 import re
 
@@ -11,6 +13,8 @@ DEF_TGT = '/dev/null'
 DEF_NODES = 1
 DEF_QUEUE = 'batch'
 DEF_WALLTIME = '999:00:00'
+DEF_STAT_TTL = 10
+DEF_DEPEND_TYPE = 'afterok'
 
 TSTATES = enum(COMPLETED='C', EXITING='E', HELD='H', QUEUED='Q', RUNNING='R',
       MOVED='T', WAITING='W', SUSPENDED='S')
@@ -20,10 +24,16 @@ class TorqueStatusError(StatusError): pass
 
 logger = logging.getLogger(__name__)
 
+ARRAY_ID_RE = re.compile(r"^\d+\[\d*\]$")
+
 def parse_id(raw_str):
-    "Parses the numeric ID from a string of the form id.host"
+    """Parses the numeric ID from a string of the form id.host.  Job array
+    IDs (id[].host for a whole array, id[index].host for one of its jobs) are
+    returned as strings of the form id[] or id[index]."""
     split_str = raw_str.split(".")
     if len(split_str) == 2:
+        if ARRAY_ID_RE.match(split_str[0]):
+            return split_str[0]
         try:
             return int(split_str[0])
         except ValueError as e:
@@ -31,6 +41,20 @@ def parse_id(raw_str):
     else:
         raise OutputParsingError("Could not properly split output %s" % raw_str)
 
+def array_job_ids(array_id, indices):
+    """Returns the IDs of the jobs with the given indices in the job array
+    with the given ID.
+
+    array_id -- The job array ID as returned by parse_id (e.g. 123[]).
+    indices -- The array indices.
+    """
+    base_id = str(array_id).split("[")[0]
+    return ["%s[%d]" % (base_id, index) for index in indices]
+
+def is_array_id(job_id):
+    "Returns whether the given ID is for a job array or one of its jobs."
+    return "[" in str(job_id)
+
 def is_running(ids, tgt):
     """Returns whether any jobs with the given IDs are running.
     """
@@ -57,6 +81,10 @@ class TorqueJob(StructEq, AutoRepr):
         self.created=None
         self.updated=None
         self.mail=None
+        self.workdir=None
+        self.depends=None
+        self.depend_type=DEF_DEPEND_TYPE
+        self.array=None
         for key in self.__dict__:
             if key in kwargs:
                 setattr(self, key, scalarize(kwargs[key]))
@@ -142,14 +170,16 @@ class JobStatus(StructEq, AutoRepr):
         return cls(sub_id = job.sub_id, created=job.created, updated=job.updated, 
               name=job.name)
 
-def pipe_cmd(cmd):
+def pipe_cmd(cmd, cwd=None):
     """Executes the given command in a subprocess.  Creates pipes
     for stdin, stdout, and stderr.
     
     Arguments:
     cmd -- The command to run in a subprocess.     
+    cwd -- The working directory for the subprocess (default: the current
+           directory).
     """
-    return Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    return Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=PIPE, cwd=cwd)
 
 def fix_torque_name(name):
     """Makes sure the given name complies with qsub's requirements: A name 
@@ -184,30 +214,50 @@ class TorqueSubmissionHandler(object):
         if job.mail:
             cmd += ["-m", 'a']
             cmd += ["-M", job.mail]
+        if job.array:
+            cmd += ["-t", str(job.array)]
+        if job.depends:
+            cmd += ["-W", 'depend=%s:%s' % (job.depend_type,
+                                            ":".join(map(str, job.depends)))]
         return cmd
     
-    def run(self, cmd):
+    def run(self, cmd, cwd=None):
         "Creates a handle to a subprocess running the given command"
-        return self.pipe_cmd(cmd)
+        return self.pipe_cmd(cmd, cwd=cwd)
     
     def submit(self, job):
-        "Submits the given job, returning the numeric job ID."
+        """Submits the given job, returning the numeric job ID.  The job is
+        submitted from its workdir (if set) so that PBS_O_WORKDIR points
+        there."""
         logger.debug("Running queue command '%s'" % self.create_submit_cmd(job))
-        proc = self.run(self.create_submit_cmd(job))
+        proc = self.run(self.create_submit_cmd(job), cwd=job.workdir)
         out, err = proc.communicate(job.contents)
         if len(out) == 0:
             raise TorqueSubmissionError("No output for %s with contents %s.  Errors: %s" % (job.name, job.contents, err))
         logger.debug("Output from job %s: %s" % (job.name, out))
         return parse_id(out)
     
+    def cancel(self, job_id):
+        """Deletes the given job from the queue with qdel.  Failures (e.g. the
+        job has already finished) are logged rather than raised."""
+        proc = self.run(["qdel", str(job_id)])
+        out, err = proc.communicate()
+        if len(err) > 0:
+            logger.warn("Error output for qdel on job %s: %s" % (job_id, err))
+
     def stat_jobs(self, ids=None):
         """Runs a qstat and collects the results in a dict mapped by ID for 
         the given job IDs (or all jobs if ids is None)"""
         if ids == None:
+            strids = []
             proc = self.run(["qstat", "-x"])
         else:
             strids = map(str, ids)
-            proc = self.run(["qstat", "-x"] + strids)
+            cmd = ["qstat", "-x"]
+            # Array jobs are only listed individually with -t
+            if any(is_array_id(jid) for jid in strids):
+                cmd.append("-t")
+            proc = self.run(cmd + strids)
         out, err = proc.communicate()
         logger.debug("Stat: " + out)
         if len(err) > 0:
@@ -224,6 +274,83 @@ class TorqueSubmissionHandler(object):
             jobs_by_id[statln.job_id] = statln
         return jobs_by_id
 
+class CachedStatusHandler(object):
+    """Wraps a submission handler so that any number of waiters share one
+    batched status query.  Each refresh stats the union of all outstanding job
+    IDs in a single call, and the results are reused until they are older
+    than the TTL.  Results keep the stat_jobs contract: a dict of JobStatus
+    instances keyed by job ID, with finished jobs absent.
+    """
+
+    def __init__(self, handler, ttl=DEF_STAT_TTL, clock=time.time):
+        """Sets up the initial state for this instance.
+
+        Positional arguments:
+        handler -- The wrapped submission handler.
+        Keyword arguments:
+        ttl -- The number of seconds a status result is reused (default 10).
+        clock -- The function used to get the current time in seconds.
+        """
+        self.handler = handler
+        self.ttl = ttl
+        self.clock = clock
+        self.refreshes = 0
+        self._lock = threading.Lock()
+        self._outstanding = set()
+        self._covered = set()
+        self._stats = {}
+        self._refreshed = None
+
+    def submit(self, job):
+        "Submits the given job using the wrapped handler."
+        return self.handler.submit(job)
+
+    def shutdown(self):
+        "Shuts down the wrapped handler, if it has a shutdown method."
+        shutdown = getattr(self.handler, 'shutdown', None)
+        if shutdown is not None:
+            shutdown()
+
+    def cancel(self, job_id):
+        "Cancels the given job using the wrapped handler."
+        return self.handler.cancel(job_id)
+
+    def stat_jobs(self, ids=None):
+        """Returns the cached statuses for the given job IDs, refreshing the
+        cache for all outstanding IDs if it is stale or does not cover the
+        requested IDs.  Passing None stats all jobs without caching."""
+        if ids is None:
+            return self.handler.stat_jobs()
+        ids = list(ids)
+        with self._lock:
+            self._outstanding.update(ids)
+            if self._is_stale() or not self._covered.issuperset(ids):
+                self._refresh()
+            results = {}
+            for jid in ids:
+                stat = self._stats.get(jid)
+                if stat:
+                    results[jid] = stat
+                if not stat or stat.job_state == STATES.COMPLETED:
+                    # Finished; later requests for this ID will refresh
+                    self._outstanding.discard(jid)
+            return results
+
+    def _is_stale(self):
+        "Returns whether the cached results are older than the TTL."
+        return (self._refreshed is None or
+                self.clock() - self._refreshed >= self.ttl)
+
+    def _refresh(self):
+        "Runs one status query for all outstanding IDs."
+        query_ids = sorted(self._outstanding)
+        logger.debug("Refreshing status for %d outstanding jobs" %
+                     len(query_ids))
+        self._stats = self.handler.stat_jobs(query_ids)
+        self._covered = set(query_ids)
+        self._refreshed = self.clock()
+        self.refreshes += 1
+
 class JobWatcher(object):
     def __init__(self, repo, handler):
         self.repo = repo
@@ -252,8 +379,8 @@ class JobWatcher(object):
         for orig_stat in stats:
             nstat = nstats.get(orig_stat.job_id, None)
             if nstat:
-                # TODO: Consider adding an update gate that only updates
-                # when state changes or n calls (or time, or whatever) have happened
+                # Repositories may skip writes for statuses whose state has
+                # not changed (see sqlrepo.SqliteJobRepo.update_statuses)
                 orig_stat.job_state = nstat.job_state
                 orig_stat.owner = nstat.owner
                 orig_stat.ctime = nstat.ctime
@@ -0,0 +1,194 @@
+"""
+Waits for files to appear on disk.  Used to notice job completion sentinels
+written by the job scripts without polling the queue server.
+
+On Linux, inotify is used to wake up as soon as a watched directory changes.
+Changes made by other hosts on network filesystems (e.g. a compute node
+writing to an NFS home directory) do not generate inotify events, so the
+watcher always falls back to a cheap stat of the expected files at a fixed
+interval.
+
+A watch lasts only as long as the wait that added it, so a long campaign
+does not pile up watches on archived path directories, and a directory
+that is removed and made again is watched afresh.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import time
+
+DEF_POLL_SECS = 1.0
+READ_SIZE = 4096
+
+# inotify constants from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+logger = logging.getLogger(__name__)
+
+
+class Inotify(object):
+    """Minimal ctypes wrapper around the Linux inotify API.  Use create() to
+    get an instance; it returns None where inotify is not available."""
+
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        # Watch descriptors keyed by directory
+        self.watched = {}
+
+    @classmethod
+    def create(cls):
+        "Returns a new Inotify instance or None if inotify is unavailable."
+        libc_name = ctypes.util.find_library('c')
+        if not libc_name:
+            return None
+        try:
+            libc = ctypes.CDLL(libc_name, use_errno=True)
+            init = libc.inotify_init1
+        except (OSError, AttributeError):
+            return None
+        fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.debug("inotify_init1 failed: %s" %
+                         os.strerror(ctypes.get_errno()))
+            return None
+        return cls(libc, fd)
+
+    def watch(self, dir_loc):
+        """Adds a watch on the given directory if it is not already watched,
+        returning whether it is now watched."""
+        if dir_loc in self.watched:
+            return True
+        wd = self.libc.inotify_add_watch(self.fd, dir_loc, WATCH_MASK)
+        if wd < 0:
+            logger.debug("Could not watch '%s': %s" %
+                         (dir_loc, os.strerror(ctypes.get_errno())))
+            return False
+        self.watched[dir_loc] = wd
+        return True
+
+    def unwatch(self, dir_loc):
+        """Removes the watch on the given directory, discarding any events
+        still queued for it.  The kernel drops the watch by itself if the
+        directory was deleted, so a failure to remove it is ignored."""
+        wd = self.watched.pop(dir_loc, None)
+        if wd is None:
+            return
+        if self.libc.inotify_rm_watch(self.fd, wd) < 0:
+            logger.debug("Could not remove the watch on '%s': %s" %
+                         (dir_loc, os.strerror(ctypes.get_errno())))
+        self._drain()
+
+    def wait(self, timeout):
+        """Waits up to timeout seconds for any event on the watched
+        directories, discarding the event data."""
+        try:
+            ready, discard, discard = select.select([self.fd], [], [], timeout)
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return
+            raise
+        if ready:
+            self._drain()
+
+    def _drain(self):
+        "Discards any queued events."
+        try:
+            while os.read(self.fd, READ_SIZE):
+                pass
+        except OSError, e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def close(self):
+        "Closes the inotify file descriptor."
+        os.close(self.fd)
+        self.watched.clear()
+
+
+class FileWatcher(object):
+    """Waits for a set of files to exist."""
+
+    def __init__(self, poll_secs=DEF_POLL_SECS, use_inotify=True):
+        """Sets up the initial state for this instance.
+
+        Keyword arguments:
+        poll_secs -- The longest time to go between stat checks (defaults to
+                     1 second).
+        use_inotify -- Whether to use inotify where available (default True).
+        """
+        self.poll_secs = poll_secs
+        if use_inotify:
+            self.inotify = Inotify.create()
+        else:
+            self.inotify = None
+
+    def wait(self, locs, timeout):
+        """Waits until all of the given files exist or the timeout passes.
+        The directories watched for the wait are unwatched when it ends.
+
+        Positional arguments:
+        locs -- The file locations to wait for.
+        timeout -- The maximum number of seconds to wait.
+        Returns:
+        True if all of the files exist, False if the timeout was reached.
+        """
+        deadline = time.time() + timeout
+        if all_exist(locs):
+            return True
+        added = []
+        if self.inotify:
+            for dir_loc in set(os.path.dirname(os.path.abspath(loc))
+                               for loc in locs):
+                if (dir_loc not in self.inotify.watched and
+                        self.inotify.watch(dir_loc)):
+                    added.append(dir_loc)
+        try:
+            while True:
+                if all_exist(locs):
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                nap = min(self.poll_secs, remaining)
+                if self.inotify:
+                    self.inotify.wait(nap)
+                else:
+                    time.sleep(nap)
+        finally:
+            for dir_loc in added:
+                self.inotify.unwatch(dir_loc)
+
+    def close(self):
+        "Releases any resources held by the watcher."
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+
+
+def all_exist(locs):
+    "Returns whether all of the given files exist."
+    for loc in locs:
+        if not os.path.exists(loc):
+            return False
+    return True
+
+
+def read_exit_status(loc):
+    """Returns the exit status recorded in the given sentinel file, or None if
+    the file is missing or does not hold a status."""
+    try:
+        with open(loc) as done_file:
+            return int(done_file.read().split()[0])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the wall-clock time the aimless orchestration adds to each path.
+Shooting chains are run against aimless.fakepbs.FakePbs, which stands in
+for qsub/qstat with fixed queue delays and job runtimes, so any time a path
+takes beyond the queue delays and runtimes of its jobs is overhead.
+
+For each number of concurrent paths (one chain per path) the benchmark
+reports the mean per-path overhead, the percentiles of the path latency,
+and the number of scheduler commands run per path.
+
+Usage: python benchmarks/bench_orchestration.py [options] [num_paths ...]
+"""
+
+import logging
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from aimless.aimless import (AimlessShooter, ChainOrchestrator, init_dir,
+                             write_tpl_files, calc_params, CHAIN_DIR_FMT,
+                             RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_LOW_A_KEY,
+                             RC2_HIGH_A_KEY, RC1_LOW_B_KEY, RC1_HIGH_B_KEY,
+                             RC2_LOW_B_KEY, RC2_HIGH_B_KEY)
+from aimless.fakepbs import FakePbs
+from aimless.restart import Restart
+from aimless.torque import TorqueSubmissionHandler, CachedStatusHandler
+
+DEF_SIZES = (1, 10, 100)
+TPL_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'aimless', 'skel',
+                       'tpl')
+# The basins of the default aimless.ini, which FakePbs's default basin
+# points fall in
+BASINS = {RC1_LOW_A_KEY: 2.75, RC1_HIGH_A_KEY: 10.0, RC2_LOW_A_KEY: 0.0,
+          RC2_HIGH_A_KEY: 1.9, RC1_LOW_B_KEY: 0.0, RC1_HIGH_B_KEY: 2.0,
+          RC2_LOW_B_KEY: 3.0, RC2_HIGH_B_KEY: 10.0}
+# The starter and dt jobs run in turn, then forward and backward together
+SEQUENTIAL_JOBS = 3
+PERCENTILES = (50, 90, 99)
+
+
+class TimedShooter(AimlessShooter):
+    "Records how long each path takes."
+
+    def __init__(self, *args, **kwargs):
+        self.latencies = kwargs.pop('latencies')
+        super(TimedShooter, self).__init__(*args, **kwargs)
+
+    def run_path(self, pnum):
+        start = time.time()
+        try:
+            return super(TimedShooter, self).run_path(pnum)
+        finally:
+            self.latencies.append(time.time() - start)
+
+
+def setup_chains(num_chains, tmp_dir, opts, handler, latencies):
+    "Returns a TimedShooter for each of the given number of chains."
+    coords_loc = os.path.join(tmp_dir, "coords.rst")
+    Restart("bench", np.zeros((opts.atoms, 3))).write(coords_loc)
+    params = calc_params(opts.steps)
+    shooters = []
+    for cnum in range(1, num_chains + 1):
+        chain_dir = os.path.join(tmp_dir, CHAIN_DIR_FMT % cnum)
+        os.makedirs(chain_dir)
+        init_dir(chain_dir, coords_loc)
+        write_tpl_files(TPL_DIR, chain_dir, params)
+        shooters.append(TimedShooter(TPL_DIR, chain_dir, "topo", {}, BASINS,
+                                     sub_handler=handler,
+                                     wait_secs=opts.stat_secs,
+                                     stat_secs=opts.stat_secs,
+                                     latencies=latencies))
+    return shooters
+
+
+def bench_paths(num_chains, opts):
+    """Runs opts.rounds paths on each of num_chains concurrent chains,
+    returning a row of results."""
+    tmp_dir = tempfile.mkdtemp()
+    fake = FakePbs(queue_delay=opts.queue_delay, runtime=opts.runtime,
+                   xml_padding=opts.xml_bytes, seed=num_chains)
+    handler = TorqueSubmissionHandler(pipe_cmd=fake.pipe_cmd)
+    if num_chains > 1:
+        handler = CachedStatusHandler(handler, ttl=opts.stat_ttl)
+    latencies = []
+    try:
+        shooters = setup_chains(num_chains, tmp_dir, opts, handler, latencies)
+        num_paths = num_chains * opts.rounds
+        start = time.time()
+        ChainOrchestrator(shooters).run_calcs(num_paths)
+        elapsed = time.time() - start
+    finally:
+        fake.shutdown()
+        shutil.rmtree(tmp_dir)
+    lats = np.array(latencies)
+    ideal = SEQUENTIAL_JOBS * (opts.queue_delay + opts.runtime)
+    calls = sum(fake.calls.values())
+    return ((num_chains, num_paths, elapsed, (lats - ideal).mean()) +
+            tuple(np.percentile(lats, PERCENTILES)) +
+            (fake.calls['qsub'] / float(num_paths),
+             fake.calls['qstat'] / float(num_paths),
+             calls / float(num_paths)))
+
+
+def parse_cmdline(argv):
+    """
+    Return a 2-tuple: (opts object, args list).
+    `argv` is a list of arguments, or `None` for ``sys.argv[1:]``.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    parser = optparse.OptionParser(
+        usage="%prog [options] [num_paths ...]",
+        formatter=optparse.TitledHelpFormatter(width=78),
+        add_help_option=None)
+    parser.add_option('-q', '--queue-delay', type='float', default=.05,
+                      help='Seconds each job waits in the queue.')
+    parser.add_option('-t', '--runtime', type='float', default=.1,
+                      help='Seconds each job runs.')
+    parser.add_option('-x', '--xml-bytes', type='int', default=0,
+                      help='Padding bytes in each qstat -x entry.')
+    parser.add_option('-r', '--rounds', type='int', default=3,
+                      help='Paths run by each chain.')
+    parser.add_option('-s', '--stat-secs', type='float', default=5,
+                      help='Seconds between safety-net qstat calls.')
+    parser.add_option('--stat-ttl', type='float', default=1,
+                      help='Seconds a shared qstat result is reused.')
+    parser.add_option('--atoms', type='int', default=1000,
+                      help='Atoms in the synthetic restart files.')
+    parser.add_option('--steps', type='int', default=2500,
+                      help='Total steps per path (sets the DUMPAVE size).')
+    parser.add_option('-h', '--help', action='help',
+                      help='Show this help message and exit.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    opts, args = parse_cmdline(argv)
+    sizes = [int(arg) for arg in args] or DEF_SIZES
+    logging.basicConfig(level=logging.ERROR)
+    print "%6s %6s %9s %10s %9s %9s %9s %9s %9s %9s" % (
+        "chains", "paths", "wall", "overhead", "p50", "p90", "p99",
+        "qsub/p", "qstat/p", "calls/p")
+    for size in sizes:
+        print ("%6d %6d %8.3fs %9.4fs %8.3fs %8.3fs %8.3fs %9.2f %9.2f "
+               "%9.2f" % bench_paths(size, opts))
+        sys.stdout.flush()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
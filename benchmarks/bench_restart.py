@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measures the cost of reading, parsing, and formatting AMBER restart files of
+increasing size with aimless.restart.Restart.  Synthetic restarts with
+random coordinates and velocities are written to a temporary directory.
+
+Usage: python benchmarks/bench_restart.py [num_atoms ...]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from aimless.restart import Restart
+
+DEF_SIZES = (10000, 100000, 1000000)
+REPEATS = 3
+
+
+def best(func):
+    "Returns the best time in seconds of REPEATS runs of func."
+    return min(timeit.repeat(func, number=1, repeat=REPEATS))
+
+
+def bench_size(num_atoms, tmp_dir):
+    "Returns a row of timings for a synthetic restart of num_atoms atoms."
+    rand = np.random.RandomState(num_atoms)
+    rst_loc = os.path.join(tmp_dir, "bench.rst")
+    out_loc = os.path.join(tmp_dir, "out.rst")
+    Restart("bench", rand.uniform(-99, 99, (num_atoms, 3)),
+            vels=rand.uniform(-2, 2, (num_atoms, 3)),
+            box=[80.0, 80.0, 80.0, 90.0, 90.0, 90.0],
+            time=100.0).write(rst_loc)
+
+    def parse_all(use_mmap):
+        rst = Restart.read(rst_loc, use_mmap=use_mmap)
+        return rst.coords, rst.vels
+
+    parsed = Restart.read(rst_loc)
+    parsed.coords, parsed.vels
+    lazy = Restart.read(rst_loc)
+    return (num_atoms, os.path.getsize(rst_loc),
+            best(lambda: parse_all(False)),
+            best(lambda: parse_all(True)),
+            best(lambda: parsed.write(out_loc)),
+            best(lambda: lazy.write(out_loc)))
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    sizes = [int(arg) for arg in argv] or DEF_SIZES
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print "%9s %12s %10s %10s %10s %10s" % ("atoms", "bytes", "read",
+                                                "read_mmap", "format",
+                                                "copy_lazy")
+        for size in sizes:
+            print "%9d %12d %9.4fs %9.4fs %9.4fs %9.4fs" % bench_size(
+                size, tmp_dir)
+    finally:
+        shutil.rmtree(tmp_dir)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
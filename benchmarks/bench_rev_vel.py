@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Compares the NumPy-backed rev_vel with the original line-by-line
+implementation.  Both are run against the same forward restart file (the
+~43k-atom test file by default) and the outputs are checked to be identical
+apart from the timestamped title line and the final line ending.
+
+Usage: python benchmarks/bench_rev_vel.py [forward_rst] [repeats]
+"""
+
+import datetime
+import math
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from aimless.aimless import rev_vel, TSTAMP_FMT
+
+DEF_FWD_LOC = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                           'test_data', 'even_forward.rst')
+DEF_REPEATS = 5
+LEGACY_FLOAT_FMT = " % 11.7f"
+
+
+def legacy_rev_vel(fwd_loc, back_loc):
+    "The original implementation of rev_vel, kept as the baseline."
+    with open(fwd_loc) as fwd_file:
+        fwd_lines = [line.rstrip('\n') for line in fwd_file]
+    with open(back_loc, 'w') as back_file:
+        back_file.write(fwd_lines[0].split()[0])
+        back_file.write(" Made by %s at %s\n" % (os.path.basename(__file__),
+                                                 datetime.datetime.now().
+                                                 strftime(TSTAMP_FMT)))
+        back_file.write(fwd_lines[1] + os.linesep)
+        num_atoms = float(fwd_lines[1].split()[0])
+        coord_lines = int(math.ceil(num_atoms / 2.0))
+        for sameline in range(2, coord_lines + 2):
+            back_file.write(fwd_lines[sameline] + os.linesep)
+        for revline in range(2 + coord_lines, (coord_lines * 2) + 2):
+            fline = map(float, fwd_lines[revline].split())
+            back_file.write("".join(LEGACY_FLOAT_FMT % -num for num in fline))
+            back_file.write(os.linesep)
+        back_file.write(fwd_lines[-1])
+
+
+def body(loc):
+    """Returns the lines of the given file without its title line.  The
+    legacy code drops the final line ending, so line endings are ignored."""
+    with open(loc, 'rb') as rst_file:
+        return rst_file.read().splitlines()[1:]
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    fwd_loc = argv[0] if argv else DEF_FWD_LOC
+    repeats = int(argv[1]) if len(argv) > 1 else DEF_REPEATS
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        legacy_loc = os.path.join(tmp_dir, "legacy.rst")
+        new_loc = os.path.join(tmp_dir, "new.rst")
+        legacy_secs = min(timeit.repeat(
+            lambda: legacy_rev_vel(fwd_loc, legacy_loc), number=1,
+            repeat=repeats))
+        new_secs = min(timeit.repeat(
+            lambda: rev_vel(fwd_loc, new_loc), number=1, repeat=repeats))
+        identical = body(legacy_loc) == body(new_loc)
+    finally:
+        shutil.rmtree(tmp_dir)
+    print "File:      %s (%d bytes)" % (fwd_loc, os.path.getsize(fwd_loc))
+    print "Legacy:    %8.4f s" % legacy_secs
+    print "NumPy:     %8.4f s" % new_secs
+    print "Speedup:   %8.1fx" % (legacy_secs / new_secs)
+    print "Identical: %s" % identical
+    return 0 if identical else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
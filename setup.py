@@ -33,6 +33,10 @@ setup(
         'console_scripts': [
             'aimless = aimless.aimless:main',
             'aimless_init = aimless.init_loc:main',
+            'aimless_revvel = aimless.aimless:revvel_main',
+            'aimless_path = aimless.runner:main',
+            'aimless_screen = aimless.screen:main',
+            'aimless_cvs = aimless.cvs:main',
         ],
     },
     package_dir={'aimless': 'aimless'},
@@ -41,7 +45,8 @@ setup(
     },
     include_package_data=True,
     install_requires=[
-    'mock',],
+    'mock',
+    'numpy',],
     license="BSD",
     zip_safe=False,
     keywords='aimless',
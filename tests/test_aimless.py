@@ -15,7 +15,8 @@ import io
 import os
 import shutil
 import tempfile
-from mock import MagicMock
+import threading
+from mock import MagicMock, patch
 
 import unittest
 from aimless import aimless
@@ -23,11 +24,35 @@ from aimless import aimless
 from aimless.aimless import (calc_params, TOTAL_STEPS_KEY, BW_STEPS_KEY,
                              FW_STEPS_KEY, DT_STEPS_KEY, BW_OUT_KEY,
                              FW_OUT_KEY, DT_OUT_KEY, write_tpl_files,
-                             TPL_LIST, AimlessShooter, init_dir, FWD_RST_NAME, OUT_DIR, BACK_RST_NAME, FWD_CONS_NAME, BACK_CONS_NAME, DT_CONS_NAME, RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_HIGH_A_KEY, RC2_LOW_A_KEY, RC1_LOW_B_KEY, RC1_HIGH_B_KEY, RC2_LOW_B_KEY, RC2_HIGH_B_KEY, BASIN_FWD_KEY, BASIN_BACK_KEY, BRES, ACC_KEY, write_text_report, write_csv_report, POSTDT_RST_NAME, GEN_FILES, fetch_calc_params, MAIN_SEC, NUM_PATHS_KEY, TGT_DIR_KEY, TPL_DIR_KEY, write_cfg_tpls, run, BASINS_SEC, JOBS_SEC, COORDS_KEY, XTWO_RST, XONE_RST, TOPO_KEY, DEF_OUT_FMTS, TEXT_REPORT_KEY, CSV_REPORT_KEY, CfgError)
-from aimless.common import STATES
+                             TPL_LIST, AimlessShooter, init_dir, FWD_RST_NAME, OUT_DIR, BACK_RST_NAME, FWD_CONS_NAME, BACK_CONS_NAME, DT_CONS_NAME, RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_HIGH_A_KEY, RC2_LOW_A_KEY, RC1_LOW_B_KEY, RC1_HIGH_B_KEY, RC2_LOW_B_KEY, RC2_HIGH_B_KEY, BASIN_FWD_KEY, BASIN_BACK_KEY, BRES, ACC_KEY, write_text_report, write_csv_report, POSTDT_RST_NAME, GEN_FILES, fetch_calc_params, MAIN_SEC, NUM_PATHS_KEY, TGT_DIR_KEY, TPL_DIR_KEY, write_cfg_tpls, run, BASINS_SEC, JOBS_SEC, COORDS_KEY, XTWO_RST, XONE_RST, TOPO_KEY, DEF_OUT_FMTS, TEXT_REPORT_KEY, CSV_REPORT_KEY, TIMINGS_REPORT_KEY, CfgError)
+from aimless.aimless import (write_path_result, PATH_RESULT_NAME, PATH_CFG_NAME,
+                             RC1_FWD_KEY, RC2_BACK_KEY, BasinMonitor,
+                             COMMIT_FWD_KEY, COMMIT_BACK_KEY, DUMP_STEPS_KEY,
+                             COMMIT_DWELL_KEY, JOURNAL_NAME, STAGES,
+                             FWD_IN_NAME, STARTER_DONE_NAME, BACKEND_KEY,
+                             BACKENDS, MAX_JOBS_KEY, create_sub_handler,
+                             TemplateCache, WORK_DIR, COMPRESS_KEY,
+                             COMPRESSORS_KEY, create_archiver,
+                             CsvReportSink, SummaryReportSink,
+                             SUMMARY_REPORT_KEY, create_report_sinks)
+from aimless.archive import Archiver, CODECS
+from aimless.fakepbs import DONE_RE
+from aimless.results import ResultStore
+from aimless.timing import TIMINGS_KEY
+from aimless.local import LocalSubmissionHandler
+from aimless.watch import read_exit_status
+from aimless.journal import Journal, EVENTS, replay
+from aimless.aimless import (ChainOrchestrator, ArrayOrchestrator, EnvError, JMODES, REVVEL_CMD, NUM_CHAINS_KEY, CHAIN_DIR_FMT,
+                             TOTAL_STEPS_KEY)
+from aimless.aimless import (STAGE_FILES, PATH_JOB_TPL, PATH_OUT_NAME,
+                             PATH_CFG_KEY, DONE_FILE_KEY, PRE_CMDS_KEY,
+                             done_loc)
+from aimless.aimless import ARRAY_JOBS_KEY
+from aimless.common import STATES, InvalidDataError
 
 # Test Constants #
-from aimless.torque import JobStatus
+from aimless.torque import (JobStatus, CachedStatusHandler,
+                            TorqueSubmissionHandler)
 
 TEST_ID = 11
 TEST_ID2 = 22
@@ -66,6 +91,12 @@ BASIN_VALS = {RC1_LOW_A_KEY: TEST_ID, RC1_HIGH_A_KEY: TEST_ID2,
               RC1_LOW_B_KEY: TEST_ID5, RC1_HIGH_B_KEY: TEST_ID6,
               RC2_LOW_B_KEY: TEST_ID7, RC2_HIGH_B_KEY: TEST_ID8}
 
+# Stand-ins for the MPI commands run by the Amber job template; mpiexec
+# skips its options and runs the program
+FAKE_MPI_CMDS = {'mpdboot': "exit 0\n", 'mpdallexit': "exit 0\n",
+                 'mpiexec': 'while [ $# -gt 0 ] && [ ! -x "$1" ]; do shift; '
+                            'done\nexec "$@"\n'}
+
 
 def file_cmp(new_tgt, ref_tgt):
     if not filecmp.cmp(new_tgt, ref_tgt):
@@ -185,6 +216,53 @@ class TestWriteTpls(unittest.TestCase):
             self.assertFalse(os.path.exists(tgt_tpl))
 
 
+class TestTemplateCache(unittest.TestCase):
+    """
+    Checks that templates are only read again once they change.
+    """
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.tpl_loc = os.path.join(self.tgt_dir, "test.tpl")
+        self._write_tpl("first $val", 100)
+        self.cache = TemplateCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _write_tpl(self, contents, mtime):
+        with open(self.tpl_loc, 'w') as tpl_file:
+            tpl_file.write(contents)
+        os.utime(self.tpl_loc, (mtime, mtime))
+
+    def test_cached(self):
+        tpl = self.cache.get(self.tpl_loc)
+        self.assertEqual("first 1", tpl.substitute(val=1))
+        self.assertIs(tpl, self.cache.get(self.tpl_loc))
+
+    def test_changed(self):
+        tpl = self.cache.get(self.tpl_loc)
+        self._write_tpl("second $val", 200)
+        changed = self.cache.get(self.tpl_loc)
+        self.assertIsNot(tpl, changed)
+        self.assertEqual("second 1", changed.substitute(val=1))
+
+    def test_missing(self):
+        with self.assertRaises(OSError):
+            self.cache.get(os.path.join(self.tgt_dir, "missing.tpl"))
+
+    def test_sub_reads_once(self):
+        aims = AimlessShooter(TPL_DIR, self.tgt_dir, TOPO_LOC, dict(),
+                              BASIN_VALS, sub_handler=MagicMock(),
+                              tpl_cache=self.cache)
+        with patch.object(aimless, 'Template',
+                          side_effect=aimless.Template) as tpl_cls:
+            for _ in range(4):
+                aims._sub_job(SHOOTER_LOC_VAL, DIR_RST_LOC, IN_LOC, OUT_LOC,
+                              MDCRD_LOC)
+        self.assertEqual(1, tpl_cls.call_count)
+
+
 class TestAimlessShooter(unittest.TestCase):
     """
     Check behavior of the AimlessShooter class.
@@ -196,8 +274,13 @@ class TestAimlessShooter(unittest.TestCase):
         self.aimless = AimlessShooter(TPL_DIR, self.tgt_dir,
                                       TOPO_LOC, dict(), BASIN_VALS,
                                       sub_handler=self.handler,
-                                      wait_secs=.001)
-        self.fwd_name = os.path.join(self.tgt_dir, FWD_RST_NAME)
+                                      wait_secs=.001, stat_secs=.001)
+        self.path_dir = self.aimless.path_dir_loc(1)
+        self.fwd_name = os.path.join(self.path_dir, FWD_RST_NAME)
+
+    def test_close(self):
+        self.aimless.close()
+        self.assertIsNone(self.aimless.watcher.inotify)
 
     def test_sub(self):
         self.aimless.topo_loc = 'test_topo.file'
@@ -221,6 +304,20 @@ class TestAimlessShooter(unittest.TestCase):
         self.aimless._wait_on_jobs([TEST_ID, TEST_ID2])
         self.assertEqual(1, self.handler.stat_jobs.call_count)
 
+    def test_wait_sentinel(self):
+        done_loc = os.path.join(self.tgt_dir, "test.done")
+        with open(done_loc, 'w') as done_file:
+            done_file.write("0\n")
+        self.aimless._wait_on_jobs([TEST_ID], [done_loc])
+        self.assertEqual(0, self.handler.stat_jobs.call_count)
+
+    def test_wait_sentinel_missing(self):
+        stat = JobStatus(job_state=STATES.RUNNING)
+        self.handler.stat_jobs.side_effect = [{TEST_ID: stat}, {}]
+        self.aimless._wait_on_jobs([TEST_ID], [os.path.join(self.tgt_dir,
+                                                            "test.done")])
+        self.assertEqual(2, self.handler.stat_jobs.call_count)
+
     def test_calcs_single_path(self):
         init_dir(self.tgt_dir, COORDS_LOC)
         self.handler.submit.side_effect = [TEST_ID, TEST_ID2, TEST_ID3, TEST_ID4]
@@ -229,11 +326,177 @@ class TestAimlessShooter(unittest.TestCase):
         self.handler.stat_jobs.side_effect = [{TEST_ID: stat}, {}, {TEST_ID2: stat},
                                               {TEST_ID2: statc},
                                               {TEST_ID3: statc, TEST_ID4: statc}]
-        self._write_test_files(self.tgt_dir)
+        self._write_test_files()
         self.aimless.run_calcs(1)
         self.assertEqual(5, self.handler.stat_jobs.call_count)
         self._chk_bak(1)
-        self.assertTrue(os.path.exists(os.path.join(self.tgt_dir, BACK_RST_NAME)))
+        self.assertTrue(os.path.exists(os.path.join(self.tgt_dir, OUT_DIR, "01",
+                                                    BACK_RST_NAME)))
+        self.assertFalse(os.path.exists(self.path_dir))
+
+    def test_calcs_dep_chain(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        self.aimless.job_mode = JMODES.DEPEND
+        self.handler.submit.side_effect = self._succeed_jobs(
+            [TEST_ID, TEST_ID2, TEST_ID3, TEST_ID4])
+        self._write_test_files()
+        self.aimless.run_calcs(1)
+        # The sentinels were written, so the queue was never checked
+        self.assertEqual(0, self.handler.stat_jobs.call_count)
+        jobs = [call[0][0] for call in self.handler.submit.call_args_list]
+        self.assertEqual([None, [TEST_ID], [TEST_ID2], [TEST_ID3]],
+                         [job.depends for job in jobs])
+        self.assertTrue(REVVEL_CMD in jobs[1].contents)
+        self.assertFalse(REVVEL_CMD in jobs[0].contents)
+        self._chk_bak(1)
+
+    def test_calcs_path_mode(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        self.aimless.job_mode = JMODES.PATH
+        result = {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.B,
+                  RC1_FWD_KEY: 4.1}
+
+        def run_path_job(job):
+            shutil.copy2(self.fwd_name, os.path.join(self.path_dir,
+                                                     POSTDT_RST_NAME))
+            write_path_result(result, os.path.join(self.path_dir,
+                                                   PATH_RESULT_NAME))
+            return TEST_ID
+        self.handler.submit.side_effect = run_path_job
+        self.handler.stat_jobs.side_effect = [{}]
+        self._write_test_files()
+        pres = self.aimless.run_calcs(1)
+        self.assertEqual(1, self.handler.submit.call_count)
+        job = self.handler.submit.call_args[0][0]
+        self.assertTrue("aimless_path %s" %
+                        os.path.join(self.path_dir, PATH_CFG_NAME) in job.contents)
+        self.assertEqual(self.path_dir, job.workdir)
+        self.assertTrue(pres[1][ACC_KEY])
+        self.assertEqual(4.1, pres[1][RC1_FWD_KEY])
+        self._chk_bak(1)
+        path_out_dir = os.path.join(self.tgt_dir, OUT_DIR, "01")
+        for name in (PATH_CFG_NAME, PATH_RESULT_NAME):
+            self.assertTrue(os.path.exists(os.path.join(path_out_dir, name)))
+
+    def _journal(self):
+        journal = Journal(os.path.join(self.tgt_dir, JOURNAL_NAME))
+        self.aimless.journal = journal
+        return journal
+
+    def test_journal(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        journal = self._journal()
+        self.handler.submit.side_effect = [TEST_ID, TEST_ID2, TEST_ID3, TEST_ID4]
+        self.handler.stat_jobs.return_value = {}
+        self._write_test_files()
+        pres = self.aimless.run_calcs(1)
+        entries = journal.read()
+        self.assertEqual([EVENTS.PATH_START, EVENTS.SUBMIT, EVENTS.STAGE_DONE,
+                          EVENTS.SUBMIT, EVENTS.STAGE_DONE, EVENTS.SUBMIT,
+                          EVENTS.SUBMIT, EVENTS.STAGE_DONE, EVENTS.STAGE_DONE,
+                          EVENTS.PATH_DONE],
+                         [entry['event'] for entry in entries])
+        self.assertEqual([TEST_ID, TEST_ID2, TEST_ID3, TEST_ID4],
+                         [entry['job'] for entry in entries
+                          if entry['event'] == EVENTS.SUBMIT])
+        journaled = entries[-1]['result']
+        # Archiving happens after the result is journaled
+        timings = pres[1].pop(TIMINGS_KEY)
+        self.assertTrue('clean_wall' in timings)
+        self.assertFalse('clean_wall' in journaled.pop(TIMINGS_KEY))
+        self.assertEqual(pres[1], journaled)
+
+    def test_timings(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        job_ids = [TEST_ID, TEST_ID2, TEST_ID3, TEST_ID4]
+
+        def submit(job):
+            if len(job_ids) == 4:
+                # The starter records when it ran in its sentinel
+                with open(os.path.join(self.path_dir, STARTER_DONE_NAME),
+                          'w') as done_file:
+                    done_file.write("0 100 160\n")
+            return job_ids.pop(0)
+        self.handler.submit.side_effect = submit
+        self.handler.stat_jobs.return_value = {}
+        self._write_test_files()
+        timings = self.aimless.run_calcs(1)[1][TIMINGS_KEY]
+        for phase in ('total', 'starter', 'revvel', 'dt', 'fwdback', 'basins',
+                      'results', 'clean'):
+            self.assertTrue(timings[phase + '_wall'] >= 0)
+        self.assertEqual(60, timings['starter_run'])
+        self.assertTrue(timings['starter_slack'] > 0)
+        # No sentinel or queue status to split the forward job's wait with
+        self.assertFalse('forward_run' in timings)
+
+    def test_resume_adopts_running(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        journal = self._journal()
+        done_result = {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.A}
+        journal.append(EVENTS.PATH_START, 1, shooter=self.aimless.x1_loc)
+        journal.append(EVENTS.PATH_DONE, 1, result=done_result)
+        journal.append(EVENTS.PATH_START, 2, shooter=self.aimless.x2_loc)
+        journal.append(EVENTS.SUBMIT, 2, stage=STAGES.STARTER, job=TEST_ID)
+        journal.append(EVENTS.STAGE_DONE, 2, stage=STAGES.STARTER)
+        journal.append(EVENTS.SUBMIT, 2, stage=STAGES.DT, job=TEST_ID2)
+        self._write_test_files(2)
+        running = JobStatus(job_state=STATES.RUNNING)
+        self.handler.stat_jobs.side_effect = [{TEST_ID2: running}, {}, {}]
+        self.handler.submit.side_effect = [TEST_ID3, TEST_ID4]
+        pres = self.aimless.run_calcs(2, resume=True)
+        self.assertEqual(done_result, pres[1])
+        self.assertTrue(2 in pres)
+        self.assertEqual([TEST_ID2], self.handler.stat_jobs.call_args_list[1][0][0])
+        jobs = [call[0][0] for call in self.handler.submit.call_args_list]
+        self.assertEqual(2, len(jobs))
+        self.assertTrue(FWD_IN_NAME in jobs[0].contents)
+        self.assertEqual(EVENTS.PATH_DONE, journal.read()[-1]['event'])
+
+    def test_resume_resubmits_lost(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        journal = self._journal()
+        journal.append(EVENTS.PATH_START, 1, shooter=self.aimless.x1_loc)
+        journal.append(EVENTS.SUBMIT, 1, stage=STAGES.STARTER, job=TEST_ID)
+        self._write_test_files()
+        self.handler.stat_jobs.return_value = {}
+        self.handler.submit.side_effect = [TEST_ID2, TEST_ID3, TEST_ID4,
+                                           TEST_ID5]
+        self.aimless.run_calcs(1, resume=True)
+        self.assertEqual(4, self.handler.submit.call_count)
+        submits = [(entry['stage'], entry['job']) for entry in journal.read()
+                   if entry['event'] == EVENTS.SUBMIT]
+        self.assertEqual((STAGES.STARTER, TEST_ID2), submits[1])
+        self._chk_bak(1)
+
+    def test_resume_sentinel(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        journal = self._journal()
+        journal.append(EVENTS.PATH_START, 1, shooter=self.aimless.x1_loc)
+        journal.append(EVENTS.SUBMIT, 1, stage=STAGES.STARTER, job=TEST_ID)
+        self._write_test_files()
+        with open(os.path.join(self.path_dir, STARTER_DONE_NAME), 'w') as done:
+            done.write("0\n")
+        self.handler.stat_jobs.return_value = {}
+        self.handler.submit.side_effect = [TEST_ID2, TEST_ID3, TEST_ID4]
+        self.aimless.run_calcs(1, resume=True)
+        self.assertEqual(3, self.handler.submit.call_count)
+        self._chk_bak(1)
+
+    def test_resume_archives_done(self):
+        init_dir(self.tgt_dir, COORDS_LOC)
+        journal = self._journal()
+        done_result = {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.A}
+        journal.append(EVENTS.PATH_START, 1, shooter=self.aimless.x1_loc)
+        journal.append(EVENTS.PATH_DONE, 1, result=done_result)
+        self._write_test_files()
+        self.assertEqual(({1: done_result}, None), self.aimless.recover())
+        self.assertFalse(os.path.exists(self.path_dir))
+        self._chk_bak(1)
+
+    def test_bad_mode(self):
+        with self.assertRaises(CfgError):
+            AimlessShooter(TPL_DIR, self.tgt_dir, TOPO_LOC, {}, {},
+                           job_mode="ghost")
 
     # TODO: If we get further on real data, consider a shim to re-init test files per path.
     # def test_calcs_three_paths(self):
@@ -247,25 +510,135 @@ class TestAimlessShooter(unittest.TestCase):
     #                                           {TEST_ID2: stat}, {TEST_ID2: stat}, {},
     #         {}, {TEST_ID5: stat}, {}, {TEST_ID6: statc}, {},
     #                                           {TEST_ID9: statc}, {TEST_ID10: statc}, {}, ]
-    #     self._write_test_files(self.tgt_dir)
+    #     self._write_test_files()
     #     self.aimless.run_calcs(3)
     #     self.assertEqual(13, self.handler.stat_jobs.call_count)
     #     for pnum in range(1, 4):
     #         self._chk_bak(pnum)
 
-    def _write_test_files(self, tgt_dir):
+    def _succeed_jobs(self, job_ids):
+        """Returns a submit stand-in that writes a successful completion
+        sentinel for each job and returns the given IDs in turn."""
+        job_ids = list(job_ids)
+
+        def submit(job):
+            done = DONE_RE.search(job.contents).group(1)
+            with open(done, 'w') as done_file:
+                done_file.write("0 0 0\n")
+            return job_ids.pop(0)
+        return submit
+
+    def _write_test_files(self, pnum=1):
+        "Writes the job results for the given path to its directory."
+        path_dir = self.aimless.path_dir_loc(pnum)
+        os.makedirs(path_dir)
         shutil.copy2(os.path.join(TEST_DATA_DIR, "even_forward.rst"),
-                     self.fwd_name)
+                     os.path.join(path_dir, FWD_RST_NAME))
         ofdir = os.path.join(TEST_DATA_DIR, "out")
         for cpname in os.listdir(ofdir):
             shutil.copy2(os.path.join(ofdir, cpname), os.path.join(
-                tgt_dir, cpname))
+                path_dir, cpname))
 
     def _chk_bak(self, pnum):
-        path_out_dir = os.path.join(self.tgt_dir, OUT_DIR, str(pnum))
+        path_out_dir = os.path.join(self.tgt_dir, OUT_DIR, "%02d" % pnum)
         self.assertTrue(os.path.exists(os.path.join(path_out_dir, FWD_RST_NAME)))
 
     def tearDown(self):
+        self.aimless.close()
+        shutil.rmtree(self.tgt_dir)
+
+
+class TestJobScripts(unittest.TestCase):
+    """
+    Run the filled job templates with the local backend, using stand-ins for
+    MPI, Amber, and the path runner.
+    """
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        bin_dir = os.path.join(self.tgt_dir, "bin")
+        amber_dir = os.path.join(self.tgt_dir, "amber")
+        os.makedirs(bin_dir)
+        os.makedirs(os.path.join(amber_dir, "bin"))
+        for name, body in FAKE_MPI_CMDS.items():
+            self._write_script(os.path.join(bin_dir, name), body)
+        self._write_script(os.path.join(amber_dir, "bin", "sander.MPI"),
+                           "exit ${FAKE_SANDER_STATUS:-0}\n")
+        self._write_script(os.path.join(bin_dir, "aimless_path"),
+                           "exit ${FAKE_PATH_STATUS:-0}\n")
+        self._write_script(os.path.join(bin_dir, REVVEL_CMD),
+                           "exit ${FAKE_REVVEL_STATUS:-0}\n")
+        self.env = patch.dict(os.environ, {
+            'PATH': os.pathsep.join([bin_dir, os.environ.get('PATH', '')]),
+            'AMBERHOME': amber_dir})
+        self.env.start()
+        self.handler = LocalSubmissionHandler(max_jobs=2)
+        self.aimless = AimlessShooter(TPL_DIR, self.tgt_dir, TOPO_LOC, {},
+                                      BASIN_VALS, sub_handler=self.handler,
+                                      wait_secs=.01, stat_secs=.1)
+        self.aimless.open_path(1)
+
+    def _write_script(self, loc, body):
+        with open(loc, 'w') as script:
+            script.write("#!/bin/bash\n" + body)
+        os.chmod(loc, 0755)
+
+    def _run_stage(self, stage):
+        "Runs the job for the given stage, returning its recorded status."
+        job_id = self.aimless._sub_stage(stage)
+        self.assertTrue(self.handler.wait_all(10))
+        status = read_exit_status(done_loc(self.aimless.pathres(
+            STAGE_FILES[stage][3])))
+        self.assertEqual(self.handler.exit_codes[job_id], status)
+        return status
+
+    def test_amber(self):
+        self.assertEqual(0, self._run_stage(STAGES.DT))
+
+    def test_amber_failed(self):
+        with patch.dict(os.environ, {'FAKE_SANDER_STATUS': '3'}):
+            self.assertEqual(3, self._run_stage(STAGES.DT))
+
+    def test_path_failed(self):
+        out_loc = self.aimless.pathres(PATH_OUT_NAME)
+        job = self.aimless._tpl_job(PATH_JOB_TPL, {
+            PATH_CFG_KEY: self.aimless.pathres(PATH_CFG_NAME),
+            DONE_FILE_KEY: done_loc(out_loc), PRE_CMDS_KEY: ''})
+        with patch.dict(os.environ, {'FAKE_PATH_STATUS': '2'}):
+            self.handler.submit(job)
+            self.assertTrue(self.handler.wait_all(10))
+        self.assertEqual(2, read_exit_status(done_loc(out_loc)))
+
+    def _run_chain(self):
+        """Runs the dependency chain of the current path, returning the
+        EnvError it raises and the exit codes of its jobs."""
+        with self.assertRaises(EnvError) as raised:
+            self.aimless.run_dep_chain(1, self.aimless.x1_loc)
+        return raised.exception, [self.handler.exit_codes[job_id] for job_id
+                                  in sorted(self.handler.exit_codes)]
+
+    def test_chain_failed(self):
+        with patch.dict(os.environ, {'FAKE_SANDER_STATUS': '4'}):
+            error, codes = self._run_chain()
+        self.assertTrue("starter job of path 1 exited with status 4" in
+                        str(error))
+        # The jobs after the failed starter were dropped, not run
+        self.assertEqual([4, None, None, None], codes)
+        for stage in (STAGES.DT, STAGES.FWD, STAGES.BACK):
+            self.assertFalse(os.path.exists(done_loc(self.aimless.pathres(
+                STAGE_FILES[stage][3]))))
+
+    def test_chain_revvel_failed(self):
+        with patch.dict(os.environ, {'FAKE_REVVEL_STATUS': '1'}):
+            error, codes = self._run_chain()
+        self.assertTrue("dt job of path 1 exited with status 1" in
+                        str(error))
+        self.assertEqual([0, 1, None, None], codes)
+
+    def tearDown(self):
+        self.aimless.close()
+        self.handler.shutdown()
+        self.env.stop()
         shutil.rmtree(self.tgt_dir)
 
 
@@ -290,7 +663,7 @@ class TestReverse(unittest.TestCase):
         self.aimless.rev_vel()
         cmp_not_first(self.back_name, ref_name, self)
 
-    def test_even(self):
+    def test_odd(self):
         ref_name = os.path.join(TEST_DATA_DIR, "odd_backward.rst")
         shutil.copy2(os.path.join(TEST_DATA_DIR, "odd_forward.rst"), self.fwd_name)
         self.aimless.rev_vel()
@@ -302,7 +675,26 @@ class TestReverse(unittest.TestCase):
         self.aimless.rev_vel()
         cmp_not_first(self.back_name, ref_name, self)
 
+    def test_truncated(self):
+        with open(os.path.join(TEST_DATA_DIR, "even_small_fwd.rst")) as fwd:
+            lines = fwd.readlines()
+        with open(self.fwd_name, 'w') as trunc:
+            trunc.writelines(lines[:-3])
+        with self.assertRaises(InvalidDataError):
+            self.aimless.rev_vel()
+
+    def test_main(self):
+        ref_name = os.path.join(TEST_DATA_DIR, "even_small_back.rst")
+        shutil.copy2(os.path.join(TEST_DATA_DIR, "even_small_fwd.rst"), self.fwd_name)
+        self.assertEqual(0, aimless.revvel_main([self.fwd_name, self.back_name]))
+        cmp_not_first(self.back_name, ref_name, self)
+
+    def test_main_no_args(self):
+        with self.assertRaises(SystemExit):
+            aimless.revvel_main([self.fwd_name])
+
     def tearDown(self):
+        self.aimless.close()
         shutil.rmtree(self.tgt_dir)
 
 
@@ -326,6 +718,55 @@ class TestReports(unittest.TestCase):
             self.assertEqual(ref_rep.read(), tgt.getvalue())
 
 
+class TestReportSinks(unittest.TestCase):
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_csv(self):
+        csv_loc = os.path.join(self.tgt_dir, "report.csv")
+        sink = CsvReportSink(csv_loc, linesep='\n')
+        sink.start({1: tpres[1]})
+        for path_id in (2, 3, 4):
+            sink.add(path_id, tpres[path_id])
+        file_cmp(csv_loc, os.path.join(TEST_DATA_DIR, "test_report.csv"))
+
+    def test_csv_restart(self):
+        csv_loc = os.path.join(self.tgt_dir, "report.csv")
+        sink = CsvReportSink(csv_loc, linesep='\n')
+        sink.start({})
+        sink.add(9, tpres[1])
+        sink.start(dict((path_id, tpres[path_id]) for path_id in (1, 2)))
+        sink.add(3, tpres[3])
+        sink.add(4, tpres[4])
+        file_cmp(csv_loc, os.path.join(TEST_DATA_DIR, "test_report.csv"))
+
+    def test_summary(self):
+        sum_loc = os.path.join(self.tgt_dir, "summary.txt")
+        sink = SummaryReportSink(sum_loc)
+        sink.start({})
+        for path_id, res in sorted(tpres.items()):
+            sink.add(path_id, res)
+        with open(os.path.join(TEST_DATA_DIR, "test_report.txt")) as ref_rep:
+            totals = ref_rep.read().split(os.linesep * 2)[-1]
+        with open(sum_loc) as sum_file:
+            self.assertEqual(totals, sum_file.read())
+        self.assertEqual(["summary.txt"], os.listdir(self.tgt_dir))
+
+    def test_create(self):
+        cfg = ConfigParser.ConfigParser()
+        cfg.add_section(MAIN_SEC)
+        cfg.set(MAIN_SEC, SUMMARY_REPORT_KEY, "sum.txt")
+        store, text_sink, csv_sink = create_report_sinks(cfg, "tc")
+        self.assertIsInstance(store, ResultStore)
+        self.assertEqual("sum.txt", text_sink.loc)
+        self.assertIsInstance(csv_sink, CsvReportSink)
+        with self.assertRaises(CfgError):
+            create_report_sinks(cfg, "z")
+
+
 bparams = {RC1_LOW_A_KEY: 2.75, RC1_HIGH_A_KEY: 10.0, RC2_LOW_A_KEY: 0.0,
            RC2_HIGH_A_KEY: 1.9, RC1_LOW_B_KEY: 0.0, RC1_HIGH_B_KEY: 2.0,
            RC2_LOW_B_KEY: 3.0, RC2_HIGH_B_KEY: 10.0}
@@ -343,6 +784,7 @@ class TestFindBasin(unittest.TestCase):
                                       wait_secs=.001)
 
     def tearDown(self):
+        self.aimless.close()
         shutil.rmtree(self.tgt_dir)
 
     def test_a(self):
@@ -357,6 +799,83 @@ class TestFindBasin(unittest.TestCase):
     def test_i2(self):
         self.assertEqual(BRES.INC, self.aimless.find_basin_dir(4.1, 8.6))
 
+    def test_calc_basins_last_frame(self):
+        with open(os.path.join(self.tgt_dir, FWD_CONS_NAME), 'w') as cons:
+            cons.write("0 2.5 2.5\n50 3.0 3.0\n99 4.1 0.7\n")
+        with open(os.path.join(self.tgt_dir, BACK_CONS_NAME), 'w') as cons:
+            cons.write("0 2.5 2.5\n99 1.2 9.2\n\n")
+        results = self.aimless.calc_basins()
+        self.assertEqual(BRES.A, results[BASIN_FWD_KEY])
+        self.assertEqual(BRES.B, results[BASIN_BACK_KEY])
+        self.assertEqual(4.1, results[RC1_FWD_KEY])
+        self.assertEqual(9.2, results[RC2_BACK_KEY])
+
+
+class TestBasinMonitor(unittest.TestCase):
+    """
+    Verify early termination of segments that commit to a basin.
+    """
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.handler = MagicMock()
+        self.aimless = AimlessShooter(TPL_DIR, self.tgt_dir,
+                                      TOPO_LOC, {}, bparams,
+                                      sub_handler=self.handler,
+                                      wait_secs=.001, stat_secs=.001,
+                                      commit_dwell=20)
+        self.fwd_cons = os.path.join(self.tgt_dir, FWD_CONS_NAME)
+
+    def tearDown(self):
+        self.aimless.close()
+        shutil.rmtree(self.tgt_dir)
+
+    def _write_cons(self, loc, lines):
+        with open(loc, 'a') as cons:
+            cons.write("".join(line + "\n" for line in lines))
+
+    def test_dwell(self):
+        monitor = BasinMonitor(self.fwd_cons, self.aimless.find_basin_dir, 20)
+        self.assertIsNone(monitor.check())
+        self._write_cons(self.fwd_cons, ["0 2.5 2.5", "10 4.1 0.7",
+                                         "20 2.5 2.5", "30 4.1 0.7"])
+        self.assertIsNone(monitor.check())
+        self._write_cons(self.fwd_cons, ["40 4.2 0.6", "50 4.3 0.5",
+                                         "60 4.4 0.4"])
+        self.assertEqual(50, monitor.check())
+        self.assertEqual(BRES.A, monitor.basin)
+
+    def test_partial_line(self):
+        monitor = BasinMonitor(self.fwd_cons, self.aimless.find_basin_dir, 0)
+        with open(self.fwd_cons, 'w') as cons:
+            cons.write("0 2.5 2.5\n10 1.2 9")
+        self.assertIsNone(monitor.check())
+        self._write_cons(self.fwd_cons, [".2"])
+        self.assertEqual(10, monitor.check())
+        self.assertEqual(BRES.B, monitor.basin)
+
+    def test_cancel_committed(self):
+        self._write_cons(self.fwd_cons, ["0 2.5 2.5", "10 4.1 0.7",
+                                         "30 4.1 0.7"])
+        back_done = os.path.join(self.tgt_dir, "backward.done")
+        with open(back_done, 'w') as done_file:
+            done_file.write("0\n")
+        commits = self.aimless._wait_committed([
+            (TEST_ID, os.path.join(self.tgt_dir, "forward.done"),
+             self.fwd_cons, COMMIT_FWD_KEY),
+            (TEST_ID2, back_done, os.path.join(self.tgt_dir, BACK_CONS_NAME),
+             COMMIT_BACK_KEY)])
+        self.assertEqual({COMMIT_FWD_KEY: 30}, commits)
+        self.handler.cancel.assert_called_once_with(TEST_ID)
+
+    def test_job_gone(self):
+        self.handler.stat_jobs.return_value = {}
+        commits = self.aimless._wait_committed([
+            (TEST_ID, os.path.join(self.tgt_dir, "forward.done"),
+             self.fwd_cons, COMMIT_FWD_KEY)])
+        self.assertEqual({}, commits)
+        self.assertFalse(self.handler.cancel.called)
+
 
 class TestProcResults(unittest.TestCase):
     """
@@ -372,6 +891,7 @@ class TestProcResults(unittest.TestCase):
         self.shooter = self._create_shooter()
 
     def tearDown(self):
+        self.aimless.close()
         shutil.rmtree(self.tgt_dir)
 
     def test_reject(self):
@@ -389,6 +909,11 @@ class TestProcResults(unittest.TestCase):
         self.aimless.proc_results(result, self.shooter)
         self.assertTrue(self._check_results())
 
+    def test_shooter(self):
+        result = {BASIN_FWD_KEY: BRES.INC, BASIN_BACK_KEY: BRES.B}
+        self.aimless.proc_results(result, self.shooter)
+        self.assertEqual(SHOOTER_LOC_VAL, result['shooter'])
+
     def _create_shooter(self):
         test_shooter = self.aimless.tgtres(SHOOTER_LOC_VAL)
         with open(test_shooter, 'w') as tfile:
@@ -430,23 +955,54 @@ class TestClean(unittest.TestCase):
         self.path_id = 5
 
     def tearDown(self):
+        self.aimless.close()
         shutil.rmtree(self.tgt_dir)
 
-    def test_clean(self):
-        path_out_dir = self.aimless.tgtres(OUT_DIR, "%02d" % self.path_id)
+    def _create_files(self):
+        self.aimless.open_path(self.path_id)
         for create_me in GEN_FILES:
-            old_loc = self.aimless.tgtres(create_me)
+            old_loc = self.aimless.pathres(create_me)
             with open(old_loc, 'w') as tfile:
                 tfile.write("Move me.")
+
+    def test_clean(self):
+        path_out_dir = self.aimless.tgtres(OUT_DIR, "%02d" % self.path_id)
+        self._create_files()
+        path_dir = self.aimless.path_dir
         self.aimless.clean(self.path_id)
+        self.assertFalse(os.path.exists(path_dir))
+        self.assertEqual(self.tgt_dir, self.aimless.path_dir)
         for verify_me in GEN_FILES:
-            old_loc = self.aimless.tgtres(verify_me)
-            self.assertFalse(os.path.exists(old_loc))
             new_loc = os.path.join(path_out_dir, verify_me)
             self.assertTrue(os.path.exists(new_loc))
             with open(new_loc, 'r') as tfile:
                 self.assertEqual("Move me.", tfile.read())
 
+    def test_clean_existing(self):
+        path_out_dir = self.aimless.tgtres(OUT_DIR, "%02d" % self.path_id)
+        os.makedirs(path_out_dir)
+        self._create_files()
+        self.aimless.clean(self.path_id)
+        self.assertEqual([], os.listdir(path_out_dir))
+        self.assertTrue(os.path.exists(os.path.join(path_out_dir + ".1",
+                                                    GEN_FILES[0])))
+
+    def test_clean_compress(self):
+        self.aimless.archiver = Archiver(max_workers=1)
+        self._create_files()
+        archive_loc = self.aimless.clean(self.path_id)
+        self.aimless.archiver.shutdown()
+        self.assertEqual(self.aimless.tgtres(OUT_DIR, "%02d" % self.path_id),
+                         archive_loc)
+        names = os.listdir(archive_loc)
+        for name in GEN_FILES:
+            if name.endswith((".out", ".mdcrd")):
+                self.assertEqual([name + ".gz"],
+                                 [found for found in names
+                                  if found.startswith(name)])
+            else:
+                self.assertTrue(name in names)
+
 
 param_cfg = ConfigParser.ConfigParser()
 param_cfg.add_section(MAIN_SEC)
@@ -468,6 +1024,19 @@ class TestCalcParams(unittest.TestCase):
 
         self.assertEqual(params, fetch_calc_params(param_cfg))
 
+    def test_dump_steps(self):
+        dump_cfg = ConfigParser.ConfigParser()
+        dump_cfg.add_section(MAIN_SEC)
+        dump_cfg.set(MAIN_SEC, TOTAL_STEPS_KEY, "1000")
+        dump_cfg.set(MAIN_SEC, NUM_PATHS_KEY, "10")
+        dump_cfg.set(MAIN_SEC, DUMP_STEPS_KEY, "25")
+        params = fetch_calc_params(dump_cfg)
+        self.assertEqual(25, params[FW_OUT_KEY])
+        self.assertEqual(25, params[BW_OUT_KEY])
+        self.assertEqual(9, params[DT_OUT_KEY])
+        dump_cfg.set(MAIN_SEC, COMMIT_DWELL_KEY, "100")
+        self.assertEqual({'commit_dwell': 100}, aimless.shooter_opts(dump_cfg))
+
 
 class TestRun(unittest.TestCase):
     """
@@ -494,13 +1063,267 @@ class TestRun(unittest.TestCase):
         run(self.cfg, tgt_class=self.aimless)
         file_cmp(os.path.join(self.tgt_dir, XONE_RST), COORDS_LOC)
         file_cmp(os.path.join(self.tgt_dir, XTWO_RST), COORDS_LOC)
-        self.assertEqual(((TPL_DIR_KEY, self.tgt_dir, TOPO_LOC, {BW_STEPS_KEY: "some_val"},
-                           {ACC_KEY: 19.1}),), self.aimless.call_args)
+        args, kwargs = self.aimless.call_args
+        self.assertEqual((TPL_DIR_KEY, self.tgt_dir, TOPO_LOC, {BW_STEPS_KEY: "some_val"},
+                          {ACC_KEY: 19.1}), args)
+        self.assertEqual(os.path.join(self.tgt_dir, JOURNAL_NAME),
+                         kwargs['journal'].loc)
         self.assertEqual(((10,),), self.aimless_inst.run_calcs.call_args)
+        self.assertEqual(1, self.aimless_inst.close.call_count)
+
+    def test_run_resume(self):
+        with open(os.path.join(self.tgt_dir, XONE_RST), 'w') as x1_file:
+            x1_file.write("evolved")
+        run(self.cfg, tgt_class=self.aimless, resume=True)
+        with open(os.path.join(self.tgt_dir, XONE_RST)) as x1_file:
+            self.assertEqual("evolved", x1_file.read())
+        self.assertEqual(((10,), {'resume': True}),
+                         self.aimless_inst.run_calcs.call_args)
+
+    def test_run_torque(self):
+        run(self.cfg, tgt_class=self.aimless)
+        self.assertIsInstance(self.aimless.call_args[1]['sub_handler'],
+                              TorqueSubmissionHandler)
+
+    def test_run_local(self):
+        self.cfg.set(MAIN_SEC, BACKEND_KEY, BACKENDS.LOCAL)
+        self.cfg.set(MAIN_SEC, MAX_JOBS_KEY, "3")
+        run(self.cfg, tgt_class=self.aimless)
+        handler = self.aimless.call_args[1]['sub_handler']
+        self.assertIsInstance(handler, LocalSubmissionHandler)
+        self.assertEqual(3, handler.max_jobs)
+        # The handler was shut down, removing its node files
+        self.assertFalse(os.path.exists(handler._node_dir))
+
+    def test_run_failed(self):
+        self.cfg.set(MAIN_SEC, NUM_CHAINS_KEY, "2")
+        self.cfg.set(MAIN_SEC, TOTAL_STEPS_KEY, "1000")
+        self.cfg.set(MAIN_SEC, TPL_DIR_KEY, TPL_DIR)
+        self.aimless_inst.run_path.side_effect = EnvError("Chain failed")
+        handler = MagicMock()
+        archiver = MagicMock()
+        with patch.object(aimless, 'create_sub_handler',
+                          return_value=handler):
+            with patch.object(aimless, 'create_archiver',
+                              return_value=archiver):
+                with self.assertRaises(EnvError):
+                    run(self.cfg, tgt_class=self.aimless)
+        # The compression backlog is dropped rather than waited on
+        archiver.shutdown.assert_called_once_with(wait=False, drain=True)
+        # Shut down through the chains' shared status cache
+        self.assertEqual(1, handler.shutdown.call_count)
+        # Both chains' shooters were closed
+        self.assertEqual(2, self.aimless_inst.close.call_count)
+
+    def test_run_array_dwell(self):
+        self.cfg.set(MAIN_SEC, NUM_CHAINS_KEY, "2")
+        self.cfg.set(MAIN_SEC, ARRAY_JOBS_KEY, "true")
+        self.cfg.set(MAIN_SEC, COMMIT_DWELL_KEY, "100")
+        with self.assertRaises(CfgError):
+            run(self.cfg, tgt_class=self.aimless)
+        self.assertFalse(self.aimless.called)
+
+    def test_run_archiver(self):
+        self.cfg.set(MAIN_SEC, COMPRESSORS_KEY, "3")
+        run(self.cfg, tgt_class=self.aimless)
+        archiver = self.aimless.call_args[1]['archiver']
+        self.assertEqual(CODECS.GZIP, archiver.codec)
+        self.assertEqual(3, archiver.max_workers)
+        # A finished run waits for the last paths to be compressed
+        with patch.object(aimless, 'create_archiver',
+                          return_value=MagicMock()) as create:
+            run(self.cfg, tgt_class=self.aimless)
+        create.return_value.shutdown.assert_called_once_with(wait=True,
+                                                             drain=False)
+
+    def test_no_archiver(self):
+        self.cfg.set(MAIN_SEC, COMPRESS_KEY, CODECS.NONE)
+        run(self.cfg, tgt_class=self.aimless)
+        self.assertIsNone(self.aimless.call_args[1]['archiver'])
+
+    def test_bad_archiver(self):
+        self.cfg.set(MAIN_SEC, COMPRESS_KEY, "rar")
+        with self.assertRaises(CfgError):
+            create_archiver(self.cfg)
+
+    def test_bad_backend(self):
+        self.cfg.set(MAIN_SEC, BACKEND_KEY, "slurm")
+        with self.assertRaises(CfgError):
+            create_sub_handler(self.cfg)
+
+    def test_run_chains(self):
+        self.cfg.set(MAIN_SEC, NUM_CHAINS_KEY, "3")
+        self.cfg.set(MAIN_SEC, TOTAL_STEPS_KEY, "1000")
+        self.cfg.set(MAIN_SEC, TPL_DIR_KEY, TPL_DIR)
+        self.aimless_inst.run_path.return_value = {ACC_KEY: True}
+        pres = run(self.cfg, tgt_class=self.aimless)
+        self.assertEqual(range(1, 11), sorted(pres.keys()))
+        self.assertEqual(3, self.aimless.call_count)
+        self.assertEqual(10, self.aimless_inst.run_path.call_count)
+        out_dir = os.path.join(self.tgt_dir, OUT_DIR)
+        for cnum in range(1, 4):
+            chain_dir = os.path.join(self.tgt_dir, CHAIN_DIR_FMT % cnum)
+            self.assertTrue(os.path.exists(os.path.join(chain_dir, XONE_RST)))
+            self.assertTrue(os.path.exists(os.path.join(chain_dir, XTWO_RST)))
+            for tpl_name, tgt_name, tpl_desc in TPL_LIST:
+                self.assertTrue(os.path.exists(os.path.join(chain_dir,
+                                                            tgt_name)))
+            args, kwargs = self.aimless.call_args_list[cnum - 1]
+            self.assertEqual((TPL_DIR, chain_dir, os.path.abspath(TOPO_LOC),
+                              {BW_STEPS_KEY: "some_val"}, {ACC_KEY: 19.1}),
+                             args)
+            self.assertEqual(out_dir, kwargs['out_dir'])
+            self.assertIsInstance(kwargs['sub_handler'], CachedStatusHandler)
 
     def tearDown(self):
         shutil.rmtree(self.tgt_dir)
 
+
+class RecordingSink(object):
+    """A report sink that records what it is given.  The chain threads add
+    to it at the same time, which MagicMock's call recording doesn't
+    survive."""
+
+    loc = "<recording>"
+
+    def __init__(self):
+        self.starts = 0
+        self.added = []
+        self._lock = threading.Lock()
+
+    def start(self, pres):
+        self.starts += 1
+
+    def add(self, path_id, res):
+        with self._lock:
+            self.added.append((path_id, res))
+
+
+class TestChainOrchestrator(unittest.TestCase):
+    """
+    Verify results for ChainOrchestrator.
+    """
+
+    def setUp(self):
+        self.shooters = [MagicMock(), MagicMock()]
+        for shooter in self.shooters:
+            shooter.run_path.side_effect = lambda pnum: {BASIN_FWD_KEY: pnum}
+
+    def test_merge(self):
+        pres = ChainOrchestrator(self.shooters).run_calcs(7)
+        self.assertEqual(range(1, 8), sorted(pres.keys()))
+        for pnum, res in pres.items():
+            self.assertEqual(pnum, res[BASIN_FWD_KEY])
+        self.assertEqual(7, sum(shooter.run_path.call_count
+                                for shooter in self.shooters))
+
+    def test_sinks(self):
+        sink = RecordingSink()
+        pres = ChainOrchestrator(self.shooters).run_calcs(5, sinks=[sink])
+        self.assertEqual(1, sink.starts)
+        self.assertEqual(sorted(pres.items()), sorted(sink.added))
+
+    def test_error(self):
+        for shooter in self.shooters:
+            shooter.run_path.side_effect = EnvError("Chain failed")
+        with self.assertRaises(EnvError):
+            ChainOrchestrator(self.shooters).run_calcs(5)
+
+    def test_resume(self):
+        self.shooters[0].recover.return_value = ({1: {BASIN_FWD_KEY: 1}}, 4)
+        self.shooters[1].recover.return_value = ({2: {BASIN_FWD_KEY: 2}}, None)
+        pres = ChainOrchestrator(self.shooters).run_calcs(5, resume=True)
+        self.assertEqual(range(1, 6), sorted(pres.keys()))
+        self.assertEqual(4, self.shooters[0].run_path.call_args_list[0][0][0])
+        run_pnums = sorted(call[0][0] for shooter in self.shooters
+                           for call in shooter.run_path.call_args_list)
+        self.assertEqual([3, 4, 5], run_pnums)
+
+
+class TestArrayOrchestrator(unittest.TestCase):
+    """
+    Verify results for ArrayOrchestrator.
+    """
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.handler = MagicMock()
+        self.handler.submit.side_effect = ["%d[]" % jid for jid in
+                                           (TEST_ID, TEST_ID2, TEST_ID3,
+                                            TEST_ID4)]
+        self.handler.stat_jobs.return_value = {}
+        self.shooters = []
+        for cnum in range(1, 3):
+            chain_dir = os.path.join(self.tgt_dir, CHAIN_DIR_FMT % cnum)
+            os.makedirs(chain_dir)
+            init_dir(chain_dir, COORDS_LOC)
+            # Chain N runs path N in the first batch
+            path_dir = os.path.join(chain_dir, WORK_DIR, "%02d" % cnum)
+            os.makedirs(path_dir)
+            shutil.copy2(os.path.join(TEST_DATA_DIR, "even_small_fwd.rst"),
+                         os.path.join(path_dir, FWD_RST_NAME))
+            ofdir = os.path.join(TEST_DATA_DIR, "out")
+            for cpname in os.listdir(ofdir):
+                shutil.copy2(os.path.join(ofdir, cpname),
+                             os.path.join(path_dir, cpname))
+            self.shooters.append(AimlessShooter(
+                TPL_DIR, chain_dir, TOPO_LOC, {}, BASIN_VALS,
+                sub_handler=self.handler, wait_secs=.001, stat_secs=.001,
+                out_dir=os.path.join(self.tgt_dir, OUT_DIR)))
+
+    def tearDown(self):
+        for shooter in self.shooters:
+            shooter.close()
+        shutil.rmtree(self.tgt_dir)
+
+    def test_no_resume(self):
+        with self.assertRaises(CfgError):
+            ArrayOrchestrator(self.shooters, self.tgt_dir).run_calcs(
+                2, resume=True)
+
+    def test_batch(self):
+        pres = ArrayOrchestrator(self.shooters, self.tgt_dir).run_calcs(2)
+        self.assertEqual([1, 2], sorted(pres.keys()))
+        jobs = [call[0][0] for call in self.handler.submit.call_args_list]
+        self.assertEqual(4, len(jobs))
+        for job in jobs:
+            self.assertEqual("1-2", job.array)
+            self.assertEqual(self.tgt_dir, job.workdir)
+            self.assertTrue("chain$(printf %02d $PBS_ARRAYID)/work/"
+                            "$(printf %02d $((PBS_ARRAYID + 0)))"
+                            in job.contents)
+        self.assertTrue("-c shooter.rst" in jobs[0].contents)
+        self.assertTrue("-i ../../instarter.in" in jobs[0].contents)
+        self.assertEqual(["%d[1]" % TEST_ID3, "%d[2]" % TEST_ID3,
+                          "%d[1]" % TEST_ID4, "%d[2]" % TEST_ID4],
+                         self.handler.stat_jobs.call_args[0][0])
+        for pnum in (1, 2):
+            self.assertTrue(os.path.exists(os.path.join(
+                self.tgt_dir, OUT_DIR, "%02d" % pnum, FWD_CONS_NAME)))
+
+    def test_timings_journal(self):
+        journals = []
+        for cnum, shooter in enumerate(self.shooters, 1):
+            shooter.journal = Journal(os.path.join(
+                self.tgt_dir, CHAIN_DIR_FMT % cnum, JOURNAL_NAME))
+            journals.append(shooter.journal)
+        pres = ArrayOrchestrator(self.shooters, self.tgt_dir).run_calcs(2)
+        for pnum in (1, 2):
+            times = pres[pnum][TIMINGS_KEY]
+            for phase in ('total', 'starter', 'revvel', 'dt', 'fwdback',
+                          'basins', 'results', 'clean'):
+                self.assertTrue("%s_wall" % phase in times)
+            self.assertTrue(times['total_wall'] >= times['fwdback_wall'])
+            # Each chain's journal records its own path
+            state = replay(journals[pnum - 1].read())[pnum]
+            self.assertEqual(pres[pnum][BASIN_FWD_KEY],
+                             state.result[BASIN_FWD_KEY])
+            self.assertEqual(set([STAGES.STARTER, STAGES.DT, STAGES.FWD,
+                                  STAGES.BACK]), state.done)
+            self.assertEqual("%d[%d]" % (TEST_ID4, pnum),
+                             state.jobs[STAGES.BACK])
+
+
 class TestGet(unittest.TestCase):
     """
     Verify results for get.
@@ -555,6 +1378,10 @@ class TestParseCmdline(unittest.TestCase):
         with self.assertRaises(SystemExit):
             aimless.parse_cmdline(["some_arg"])
 
+    def test_resume(self):
+        self.assertFalse(aimless.parse_cmdline([])[0].resume)
+        self.assertTrue(aimless.parse_cmdline(["--resume"])[0].resume)
+
 class TestPrintReports(unittest.TestCase):
     """
     Verify results for parse_cmdline.
@@ -568,6 +1395,8 @@ class TestPrintReports(unittest.TestCase):
         self.csv = os.path.join(self.tgt_dir, "test_report.csv")
         self.cfg.set(MAIN_SEC, CSV_REPORT_KEY, self.csv)
         self.cfg.set(MAIN_SEC, TEXT_REPORT_KEY, self.txt)
+        self.timings = os.path.join(self.tgt_dir, "test_timings.csv")
+        self.cfg.set(MAIN_SEC, TIMINGS_REPORT_KEY, self.timings)
 
     def tearDown(self):
         shutil.rmtree(self.tgt_dir)
@@ -575,6 +1404,7 @@ class TestPrintReports(unittest.TestCase):
     def test_csv(self):
         aimless.print_reports(self.cfg, "c", tpres)
         file_cmp(self.csv, os.path.join(TEST_DATA_DIR, "test_report.csv"))
+        self.assertTrue(os.path.exists(self.timings))
 
     def test_txt(self):
         aimless.print_reports(self.cfg, "t", tpres)
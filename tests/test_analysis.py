@@ -0,0 +1,141 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from aimless.aimless import (BRES, DT_CONS_NAME, FWD_CONS_NAME,
+                             BACK_CONS_NAME, RC1_LOW_A_KEY, RC1_HIGH_A_KEY,
+                             RC2_LOW_A_KEY, RC2_HIGH_A_KEY, RC1_LOW_B_KEY,
+                             RC1_HIGH_B_KEY, RC2_LOW_B_KEY, RC2_HIGH_B_KEY)
+from aimless.analysis import (log_erfc, committor, log_likelihood,
+                              fit_committor, classify_basins,
+                              load_shooting_points)
+from aimless.common import InvalidDataError
+
+BASINS = {RC1_LOW_A_KEY: 2.75, RC1_HIGH_A_KEY: 10.0, RC2_LOW_A_KEY: 0.0,
+          RC2_HIGH_A_KEY: 1.9, RC1_LOW_B_KEY: 0.0, RC1_HIGH_B_KEY: 2.0,
+          RC2_LOW_B_KEY: 3.0, RC2_HIGH_B_KEY: 10.0}
+
+
+def sample_outcomes(cvs, coefs, seed=1):
+    "Returns n_a and n_b for two trajectories from each point."
+    rng = np.random.RandomState(seed)
+    p_b = committor(coefs[0] + cvs.dot(coefs[1:]))
+    n_b = rng.binomial(2, p_b)
+    return 2 - n_b, n_b
+
+
+class TestErf(unittest.TestCase):
+    def test_log_erfc(self):
+        vals = np.linspace(-5, 25, 61)
+        expected = [math.log(math.erfc(val)) for val in vals]
+        np.testing.assert_allclose(expected, log_erfc(vals), rtol=1e-6,
+                                   atol=1e-7)
+
+    def test_deep_tail(self):
+        # erfc(40) underflows, but its log does not
+        self.assertAlmostEqual(-1600 - math.log(40 * math.sqrt(math.pi)),
+                               float(log_erfc(40.0)), places=3)
+
+    def test_committor(self):
+        self.assertAlmostEqual(0.5, float(committor(0.0)))
+        self.assertAlmostEqual((1 + math.erf(0.7)) / 2,
+                               float(committor(0.7)), places=6)
+
+
+class TestLikelihood(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(3)
+        cvs = rng.normal(size=(200, 2))
+        self.design = np.column_stack([np.ones(200), cvs])
+        self.n_a, self.n_b = sample_outcomes(cvs, np.array([.2, 1.5, -.5]))
+
+    def test_gradient(self):
+        coefs = np.array([.1, .8, -.3])
+        loglike, grad, hess = log_likelihood(coefs, self.design, self.n_a,
+                                             self.n_b, derivs=True)
+        self.assertEqual(loglike, log_likelihood(coefs, self.design,
+                                                 self.n_a, self.n_b))
+        step = 1e-6
+        for idx in range(3):
+            moved = coefs.copy()
+            moved[idx] += step
+            up, up_grad, _ = log_likelihood(moved, self.design, self.n_a,
+                                            self.n_b, derivs=True)
+            self.assertAlmostEqual((up - loglike) / step, grad[idx],
+                                   places=3)
+            np.testing.assert_allclose((up_grad - grad) / step, hess[idx],
+                                       rtol=1e-3, atol=1e-3)
+
+
+class TestFit(unittest.TestCase):
+    def test_recovers(self):
+        rng = np.random.RandomState(5)
+        cvs = rng.normal(loc=[3.0, -1.0, 0.0], scale=[.5, 2.0, 1.0],
+                         size=(20000, 3))
+        coefs = np.array([-6.0, 2.0, .5, 0.0])
+        n_a, n_b = sample_outcomes(cvs, coefs)
+        fit = fit_committor(cvs, n_a, n_b, names=["d1", "d2", "noise"])
+        self.assertTrue(fit.converged)
+        np.testing.assert_allclose(coefs, fit.coefs, atol=.15)
+        self.assertEqual(20000, fit.num_points)
+        self.assertEqual(4, fit.num_params)
+        self.assertTrue(str(fit).startswith("q = "))
+        worse = log_likelihood(coefs, np.column_stack([np.ones(20000), cvs]),
+                               n_a, n_b)
+        self.assertTrue(fit.loglike >= worse)
+
+    def test_separable(self):
+        cvs = np.array([-2.0, -1.0, 1.0, 2.0])
+        fit = fit_committor(cvs, [2, 2, 0, 0], [0, 0, 2, 2], max_iter=20)
+        self.assertFalse(fit.converged)
+        self.assertTrue(fit.coefs[1] > 0)
+
+    def test_bad_input(self):
+        with self.assertRaises(InvalidDataError):
+            fit_committor(np.zeros((3, 2)), [1, 1], [1, 1])
+        with self.assertRaises(InvalidDataError):
+            fit_committor(np.zeros((0, 2)), [], [])
+        with self.assertRaises(InvalidDataError):
+            fit_committor(np.zeros((2, 2)), [1, 1], [1, 1], names=["x"])
+
+
+class TestShootingPoints(unittest.TestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out_dir)
+
+    def _write_path(self, name, point, fwd, back):
+        path_dir = os.path.join(self.out_dir, name)
+        os.makedirs(path_dir)
+        for cons_name, rcs in ((DT_CONS_NAME, point), (FWD_CONS_NAME, fwd),
+                               (BACK_CONS_NAME, back)):
+            with open(os.path.join(path_dir, cons_name), 'w') as cons_file:
+                cons_file.write("9 %s\n" % " ".join(str(rc) for rc in rcs))
+
+    def test_classify(self):
+        self.assertEqual([BRES.A, BRES.B, BRES.INC],
+                         list(classify_basins([4.0, 1.0, 2.5],
+                                              [1.0, 4.0, 2.5], BASINS)))
+
+    def test_load(self):
+        self._write_path("01", (2.1, 2.2), (4.0, 1.0), (1.0, 4.0))
+        self._write_path("02", (2.3, 2.4), (1.0, 4.0), (1.0, 4.0))
+        self._write_path("03", (2.5, 2.6), (2.5, 2.5), (2.5, 2.5))
+        os.makedirs(os.path.join(self.out_dir, "04"))
+        points = load_shooting_points(self.out_dir, BASINS)
+        self.assertEqual(2, len(points))
+        self.assertEqual(["RC1", "RC2"], points.names)
+        np.testing.assert_allclose([[2.1, 2.2], [2.3, 2.4]], points.cvs)
+        self.assertEqual([1, 0], list(points.n_a))
+        self.assertEqual([1, 2], list(points.n_b))
+        self.assertEqual([os.path.join(self.out_dir, "01"),
+                          os.path.join(self.out_dir, "02")], points.locs)
+        np.testing.assert_allclose([[2.2], [2.4]], points.columns(["RC2"]))
+        self.assertEqual(["RC1"], points.fit(["RC1"]).names)
+
+    def test_load_empty(self):
+        self.assertEqual(0, len(load_shooting_points(self.out_dir, BASINS)))
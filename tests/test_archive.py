@@ -0,0 +1,176 @@
+import StringIO
+import gzip
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from mock import patch
+from aimless.archive import (Archiver, ArchiveError, BlockReader, CODECS,
+                             CODEC_EXTS, PART_SUFFIX, available_codecs,
+                             compress_file, open_archived, read_blocks,
+                             resolve_codec, write_blocks)
+
+WAIT_SECS = 10
+CONTENTS = "".join("%8d %12.4f\n" % (step, step / 10.0)
+                   for step in range(2000))
+
+
+class TestCompress(unittest.TestCase):
+    "Tests compressing single files and reading them back."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.loc = os.path.join(self.tgt_dir, "forward.mdcrd")
+        with open(self.loc, 'w') as tgt_file:
+            tgt_file.write(CONTENTS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _check_codec(self, codec):
+        tgt_loc = compress_file(self.loc, codec)
+        self.assertEqual(self.loc + CODEC_EXTS[codec], tgt_loc)
+        self.assertEqual([os.path.basename(tgt_loc)],
+                         os.listdir(self.tgt_dir))
+        self.assertTrue(os.path.getsize(tgt_loc) < len(CONTENTS))
+        with open_archived(self.loc) as arc_file:
+            self.assertEqual(CONTENTS, arc_file.read())
+        with open_archived(self.loc) as arc_file:
+            self.assertEqual(CONTENTS.splitlines(True), list(arc_file))
+
+    def test_gzip(self):
+        self._check_codec(CODECS.GZIP)
+
+    def test_blocks(self):
+        arc_loc = self.loc + ".gz"
+        with open(arc_loc, 'wb') as arc_file:
+            write_blocks(StringIO.StringIO(CONTENTS), arc_file,
+                         block_size=1000)
+        # Still an ordinary gzip file
+        with gzip.open(arc_loc, 'rb') as arc_file:
+            self.assertEqual(CONTENTS, arc_file.read())
+        with BlockReader(arc_loc) as reader:
+            self.assertEqual(len(CONTENTS), len(reader))
+            self.assertEqual(-(-len(CONTENTS) // 1000) + 1,
+                             len(reader.blocks))
+            for start, stop in ((0, 10), (995, 2010), (25000, 40000),
+                                (len(CONTENTS) - 5, len(CONTENTS) + 5)):
+                self.assertEqual(CONTENTS[start:stop], reader[start:stop])
+            self.assertEqual(CONTENTS.find('\n', 990),
+                             reader.find('\n', 990))
+            self.assertEqual(-1, reader.find('x'))
+            blocks = reader.blocks
+        with BlockReader(arc_loc, blocks) as reader:
+            self.assertEqual(CONTENTS[-100:], reader[-100:])
+
+    def test_not_blocks(self):
+        with gzip.open(self.loc + ".gz", 'wb') as arc_file:
+            arc_file.write(CONTENTS)
+        with open(self.loc + ".gz", 'rb') as arc_file:
+            self.assertIsNone(read_blocks(arc_file))
+        with self.assertRaises(ArchiveError):
+            BlockReader(self.loc + ".gz")
+
+    def test_xz(self):
+        if CODECS.XZ not in available_codecs():
+            self.skipTest("xz is not installed")
+        self._check_codec(CODECS.XZ)
+
+    def test_zstd(self):
+        if CODECS.ZSTD not in available_codecs():
+            self.skipTest("zstd is not installed")
+        self._check_codec(CODECS.ZSTD)
+
+    def test_plain(self):
+        with open_archived(self.loc) as arc_file:
+            self.assertEqual(CONTENTS, arc_file.read())
+
+    def test_missing(self):
+        os.remove(self.loc)
+        with self.assertRaises(IOError):
+            open_archived(self.loc)
+
+    def test_failed(self):
+        with patch('aimless.archive.write_blocks',
+                   side_effect=IOError("Disk full")):
+            with self.assertRaises(IOError):
+                compress_file(self.loc)
+        self.assertEqual([os.path.basename(self.loc)],
+                         os.listdir(self.tgt_dir))
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ArchiveError):
+            resolve_codec("rar")
+
+    def test_fallback(self):
+        with patch('aimless.archive.find_executable', return_value=None):
+            self.assertEqual(CODECS.GZIP, resolve_codec(CODECS.ZSTD))
+
+
+class TestArchiver(unittest.TestCase):
+    "Tests compressing directories in the background."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        for name in ("forward.mdcrd", "backward.mdcrd", "forward.out",
+                     "cons_fwd.dat", "postforward.rst"):
+            with open(os.path.join(self.tgt_dir, name), 'w') as tgt_file:
+                tgt_file.write(CONTENTS)
+        self.archiver = Archiver(max_workers=2)
+
+    def tearDown(self):
+        self.archiver.shutdown()
+        shutil.rmtree(self.tgt_dir)
+
+    def test_submit(self):
+        locs = self.archiver.submit(self.tgt_dir)
+        self.assertEqual(["backward.mdcrd", "forward.mdcrd", "forward.out"],
+                         [os.path.basename(loc) for loc in locs])
+        self.archiver.wait()
+        self.assertEqual(["backward.mdcrd.gz", "cons_fwd.dat",
+                          "forward.mdcrd.gz", "forward.out.gz",
+                          "postforward.rst"], sorted(os.listdir(self.tgt_dir)))
+        self.assertEqual(3, self.archiver.num_compressed)
+        self.assertEqual(0, self.archiver.num_failed)
+        self.assertTrue(len(self.archiver._workers) <= 2)
+
+    def test_failure(self):
+        with patch('aimless.archive.compress_file',
+                   side_effect=OSError("Disk full")):
+            self.archiver.submit(self.tgt_dir)
+            self.archiver.wait()
+        self.assertEqual(3, self.archiver.num_failed)
+        self.assertFalse(any(name.endswith((".gz", PART_SUFFIX))
+                             for name in os.listdir(self.tgt_dir)))
+
+    def test_shutdown(self):
+        self.archiver.submit(self.tgt_dir)
+        self.archiver.shutdown()
+        self.assertEqual(3, self.archiver.num_compressed)
+        self.assertEqual([], self.archiver._workers)
+
+    def test_shutdown_drain(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def compress(loc, codec, level):
+            started.set()
+            release.wait(WAIT_SECS)
+        archiver = Archiver(max_workers=1)
+        with patch('aimless.archive.compress_file', side_effect=compress):
+            archiver.submit(self.tgt_dir)
+            self.assertTrue(started.wait(WAIT_SECS))
+            workers = list(archiver._workers)
+            # Returns at once, dropping the two files still queued
+            archiver.shutdown(wait=False, drain=True)
+            self.assertFalse(release.is_set())
+            release.set()
+            for worker in workers:
+                worker.join(WAIT_SECS)
+        self.assertEqual(1, archiver.num_compressed)
+        self.assertEqual(0, archiver._queue.qsize())
+
+    def test_bad_limit(self):
+        with self.assertRaises(ArchiveError):
+            Archiver(max_workers=0)
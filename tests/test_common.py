@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mock import patch
+from aimless import common
+from aimless.common import stage_file, STAGE_METHODS
+
+
+class TestStageFile(unittest.TestCase):
+    "Tests staging files by reflink, hardlink, rename, or copy."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tgt_dir, "src.rst")
+        self.dst = os.path.join(self.tgt_dir, "dst.rst")
+        with open(self.src, 'w') as src_file:
+            src_file.write("contents")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _read(self, loc):
+        with open(loc) as in_file:
+            return in_file.read()
+
+    def _no_reflink(self):
+        return patch.object(common, '_reflink',
+                            side_effect=IOError("unsupported"))
+
+    def test_hardlink(self):
+        with self._no_reflink():
+            method = stage_file(self.src, self.dst, mutable=False)
+        self.assertEqual(STAGE_METHODS.HARDLINK, method)
+        self.assertTrue(os.path.samefile(self.src, self.dst))
+
+    def test_mutable(self):
+        with self._no_reflink():
+            method = stage_file(self.src, self.dst)
+        self.assertEqual(STAGE_METHODS.COPY, method)
+        self.assertFalse(os.path.samefile(self.src, self.dst))
+        self.assertEqual("contents", self._read(self.dst))
+
+    def test_rename(self):
+        with self._no_reflink():
+            method = stage_file(self.src, self.dst, keep_src=False)
+        self.assertEqual(STAGE_METHODS.RENAME, method)
+        self.assertFalse(os.path.exists(self.src))
+        self.assertEqual("contents", self._read(self.dst))
+
+    def test_reflink(self):
+        with patch.object(common, '_reflink') as reflink:
+            method = stage_file(self.src, self.dst)
+        self.assertEqual(STAGE_METHODS.REFLINK, method)
+        self.assertEqual(self.src, reflink.call_args[0][0])
+
+    def test_dir(self):
+        stage_file(self.src, self.dst, mutable=False)
+        sub_dir = os.path.join(self.tgt_dir, "sub")
+        os.makedirs(sub_dir)
+        stage_file(self.src, sub_dir)
+        self.assertEqual("contents",
+                         self._read(os.path.join(sub_dir, "src.rst")))
+
+    def test_replace_link(self):
+        "An existing hardlinked target is replaced, not written through."
+        with self._no_reflink():
+            stage_file(self.src, self.dst, mutable=False)
+            other = os.path.join(self.tgt_dir, "other.rst")
+            with open(other, 'w') as other_file:
+                other_file.write("other")
+            stage_file(other, self.dst)
+        self.assertEqual("contents", self._read(self.src))
+        self.assertEqual("other", self._read(self.dst))
+        self.assertEqual(["dst.rst", "other.rst", "src.rst"],
+                         sorted(os.listdir(self.tgt_dir)))
+
+    def test_missing(self):
+        with self.assertRaises(IOError):
+            stage_file(os.path.join(self.tgt_dir, "missing"), self.dst)
+        self.assertEqual(["src.rst"], os.listdir(self.tgt_dir))
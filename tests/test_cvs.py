@@ -0,0 +1,219 @@
+import StringIO
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from mock import patch
+from aimless.aimless import (POSTDT_RST_NAME, POSTFWD_RST_NAME,
+                             POSTBACK_RST_NAME, DT_MDCRD_NAME,
+                             FWD_MDCRD_NAME, BACK_MDCRD_NAME, BASIN_FWD_KEY,
+                             BASIN_BACK_KEY, BRES)
+from aimless.analysis import points_from_records
+from aimless.common import InvalidDataError
+from aimless.cvs import (CvSet, minimum_image, box_cells, path_cvs,
+                         trajectory_cvs, add_path_cvs, archived_paths,
+                         cv_dtype, store_cv_names, write_cvs_csv, main)
+from aimless.mdcrd import MdcrdReader
+from aimless.restart import Restart
+from aimless.results import ResultStore
+
+NATOMS = 5
+# A trans chain of four atoms and a fifth atom off to the side
+COORDS = np.array([[0.0, 1.0, 0.0], [0.0, 0.0, 0.0], [1.0, 0.0, 0.0],
+                   [1.0, -1.0, 0.0], [0.0, 0.0, 2.0]])
+DEFS = [('d12', 'distance 1 2'), ('d15', 'distance 2 5'),
+        ('a123', 'angle 1 2 3'), ('phi', 'dihedral 1 2 3 4'),
+        ('ddiff', 'combo 1.0 d15 -2 d12')]
+EXPECTED = [1.0, 2.0, 90.0, 180.0, 0.0]
+PRMTOP = """%FLAG POINTERS
+%FORMAT(10I8)
+       5       2       3       0       0       0       0       0       0       0
+"""
+
+
+def write_mdcrd(loc, frames, box=None):
+    "Writes the given frames as Amber does."
+    with open(loc, 'w') as mdcrd:
+        mdcrd.write("test trajectory\n")
+        for frame in frames:
+            vals = np.ravel(frame)
+            for start in range(0, len(vals), 10):
+                mdcrd.write("".join("%8.3f" % val
+                                    for val in vals[start:start + 10]) + "\n")
+            if box is not None:
+                mdcrd.write("".join("%8.3f" % val for val in box) + "\n")
+
+
+def rotate_last(coords, degrees):
+    "Returns the coordinates with the fourth atom turned about the 2-3 bond."
+    rad = np.radians(degrees)
+    moved = coords.copy()
+    moved[3] = [1.0, -np.cos(rad), -np.sin(rad)]
+    return moved
+
+
+class TestCvSet(unittest.TestCase):
+    def setUp(self):
+        self.cvset = CvSet(DEFS)
+
+    def test_compute(self):
+        self.assertEqual(['d12', 'd15', 'a123', 'phi', 'ddiff'],
+                         self.cvset.names)
+        np.testing.assert_allclose([EXPECTED], self.cvset.compute(COORDS),
+                                   atol=1e-9)
+
+    def test_dihedral_sign(self):
+        frames = [rotate_last(COORDS, angle) for angle in (60, -60, 120)]
+        phis = CvSet([('phi', 'dihedral 1 2 3 4')]).compute(frames)[:, 0]
+        np.testing.assert_allclose([-120.0, 120.0, -60.0], phis, atol=1e-9)
+
+    def test_frames(self):
+        rng = np.random.RandomState(2)
+        frames = rng.normal(scale=3.0, size=(50, NATOMS, 3))
+        stacked = self.cvset.compute(frames)
+        self.assertEqual((50, 5), stacked.shape)
+        for frame, row in zip(frames[::7], stacked[::7]):
+            np.testing.assert_allclose(self.cvset.compute(frame)[0], row)
+
+    def test_periodic(self):
+        wrapped = COORDS.copy()
+        wrapped[4, 2] -= 30.0
+        box = [30.0, 30.0, 30.0]
+        np.testing.assert_allclose([EXPECTED],
+                                   self.cvset.compute(wrapped, box),
+                                   atol=1e-9)
+        self.assertAlmostEqual(28.0, self.cvset.compute(wrapped)[0, 1])
+
+    def test_triclinic(self):
+        box = [30.0, 30.0, 30.0, 109.4712190, 109.4712190, 109.4712190]
+        lengths, cells = box_cells(box)
+        np.testing.assert_allclose([30.0] * 3,
+                                   np.sqrt((cells[0] ** 2).sum(axis=1)))
+        vec = np.array([[[0.5, -0.25, 1.0]]])
+        moved = vec + cells[0, 1] - cells[0, 2]
+        np.testing.assert_allclose(vec, minimum_image(moved, lengths, cells),
+                                   atol=1e-9)
+        self.assertIsNone(box_cells(box[:3] + [90.0] * 3)[1])
+
+    def test_bad_defs(self):
+        for defs in ([], [('d', 'distance 1')], [('d', 'distance 0 1')],
+                     [('d', 'ring 1 2')], [('d', 'distance a b')],
+                     [('c', 'combo 1.0 x')], [('d', 'distance 1 2'),
+                                              ('c', 'combo d 1.0')],
+                     [('d', '')], [('d', 'distance 1 2'),
+                                   ('d', 'distance 1 3')]):
+            with self.assertRaises(InvalidDataError):
+                CvSet(defs)
+        with self.assertRaises(InvalidDataError):
+            CvSet([('d', 'distance 1 9')]).compute(COORDS)
+
+
+class TestPathCvs(unittest.TestCase):
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.out_dir = os.path.join(self.tgt_dir, "output")
+        self.cvset = CvSet(DEFS)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _path_dir(self, name):
+        path_dir = os.path.join(self.out_dir, name)
+        os.makedirs(path_dir)
+        return path_dir
+
+    def test_trajectory(self):
+        loc = os.path.join(self.tgt_dir, "dt.mdcrd")
+        frames = [rotate_last(COORDS, angle) for angle in range(0, 180, 20)]
+        write_mdcrd(loc, frames, box=[30.0] * 3)
+        with MdcrdReader(loc, NATOMS) as reader:
+            vals = trajectory_cvs(self.cvset, reader, step=3)
+        self.assertEqual((3, 5), vals.shape)
+        np.testing.assert_allclose(self.cvset.compute(frames[::3]), vals,
+                                   atol=1e-3)
+        tgt = StringIO.StringIO()
+        write_cvs_csv(self.cvset, [loc], NATOMS, tgt, step=3, linesep='\n')
+        rows = list(csv.reader(StringIO.StringIO(tgt.getvalue())))
+        self.assertEqual(['file', 'frame'] + self.cvset.names, rows[0])
+        self.assertEqual(['0', '3', '6'], [row[1] for row in rows[1:]])
+
+    def test_paths(self):
+        # Path 1 has restarts, path 2 only trajectories
+        first = self._path_dir("01")
+        shifted = COORDS.copy()
+        shifted[4, 2] += 30.0
+        box = [30.0, 30.0, 30.0, 90.0, 90.0, 90.0]
+        for name in (POSTDT_RST_NAME, POSTFWD_RST_NAME, POSTBACK_RST_NAME):
+            Restart("test", shifted, box=box).write(os.path.join(first, name))
+        second = self._path_dir("02")
+        frames = [COORDS, rotate_last(COORDS, 60)]
+        for name in (DT_MDCRD_NAME, FWD_MDCRD_NAME):
+            write_mdcrd(os.path.join(second, name), frames, box=box[:3])
+        cols = path_cvs(self.cvset, [first, second], NATOMS)
+        self.assertEqual(15, len(cols[0]))
+        self.assertAlmostEqual(2.0, cols[0]['d15'])
+        self.assertAlmostEqual(180.0, cols[0]['phibw'])
+        self.assertEqual(10, len(cols[1]))
+        self.assertAlmostEqual(-120.0, cols[1]['phifw'], places=2)
+        self.assertNotIn('phibw', cols[1])
+
+    def test_store(self):
+        Restart("test", COORDS).write(
+            os.path.join(self._path_dir("01"), POSTDT_RST_NAME))
+        Restart("test", rotate_last(COORDS, 60)).write(
+            os.path.join(self._path_dir("01.1"), POSTDT_RST_NAME))
+        self._path_dir("02")
+        self._path_dir("misc")
+        paths = archived_paths(self.out_dir)
+        self.assertEqual({1: os.path.join(self.out_dir, "01.1"),
+                          2: os.path.join(self.out_dir, "02")}, paths)
+        pres = {1: {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.B},
+                3: {BASIN_FWD_KEY: BRES.B, BASIN_BACK_KEY: BRES.B}}
+        combined = add_path_cvs(self.cvset, self.out_dir, NATOMS, pres)
+        self.assertEqual([1, 2, 3], sorted(combined))
+        self.assertAlmostEqual(-120.0, combined[1]['phi'], places=4)
+        self.assertEqual({}, combined[2])
+        self.assertNotIn('phi', combined[3])
+
+        loc = os.path.join(self.tgt_dir, "cvs.rec")
+        ResultStore(loc, cv_dtype(self.cvset)).start(combined)
+        records = ResultStore(loc).records()
+        self.assertEqual(self.cvset.names, store_cv_names(records.dtype))
+        points = points_from_records(records, ['phi', 'd12'])
+        self.assertEqual(1, len(points))
+        self.assertEqual([1], list(points.n_a))
+        np.testing.assert_allclose([[-120.0, 1.0]], points.cvs)
+        with self.assertRaises(InvalidDataError):
+            points_from_records(records, ['nope'])
+        with self.assertRaises(InvalidDataError):
+            cv_dtype(CvSet([('path', 'distance 1 2')]))
+
+    def test_main(self):
+        Restart("test", COORDS).write(
+            os.path.join(self._path_dir("01"), POSTDT_RST_NAME))
+        topo_loc = os.path.join(self.tgt_dir, "test.prmtop")
+        with open(topo_loc, 'w') as prmtop:
+            prmtop.write(PRMTOP)
+        cfg_loc = os.path.join(self.tgt_dir, "aimless.ini")
+        store_loc = os.path.join(self.tgt_dir, "results.rec")
+        res = {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.B}
+        ResultStore(store_loc).add(1, res)
+        with open(cfg_loc, 'w') as cfg:
+            cfg.write("[main]\ntopology = %s\ntgtdir = %s\n"
+                      "results_store = %s\n\n[cvs]\n%s\n" %
+                      (topo_loc, self.tgt_dir, store_loc,
+                       "\n".join("%s = %s" % cv_def for cv_def in DEFS)))
+        with patch('sys.stdout', StringIO.StringIO()):
+            self.assertEqual(0, main(["-c", cfg_loc]))
+        # The CVs are added to the results store itself
+        expected = dict(res, **dict(zip(self.cvset.names, EXPECTED)))
+        self.assertEqual({1: expected}, ResultStore(store_loc).as_pres())
+        self.assertEqual(["aimless.ini", "output", "results.rec",
+                          "test.prmtop"],
+                         sorted(os.listdir(self.tgt_dir)))
+        # Later paths are still added to it
+        ResultStore(store_loc).add(2, res)
+        self.assertEqual(cv_dtype(self.cvset),
+                         ResultStore(store_loc).records().dtype)
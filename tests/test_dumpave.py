@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+import unittest
+from aimless.archive import compress_file
+from aimless.common import InvalidDataError
+from aimless.dumpave import iter_records, read_record, tail_lines, RecordTail
+
+RECORDS = [(float(step), step / 10.0, -step / 100.0) for step in range(0, 500)]
+
+
+class TestDumpave(unittest.TestCase):
+    "Tests reading DUMPAVE records."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.dump_loc = os.path.join(self.tgt_dir, "cons_fwd.dat")
+        with open(self.dump_loc, 'w') as dump_file:
+            for record in RECORDS:
+                dump_file.write("%8d %12.4f %12.4f\n" % record)
+            dump_file.write("\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_last(self):
+        self.assertEqual(RECORDS[-1], read_record(self.dump_loc))
+
+    def test_first(self):
+        self.assertEqual(RECORDS[0], read_record(self.dump_loc, 0))
+
+    def test_nth(self):
+        self.assertEqual(RECORDS[123], read_record(self.dump_loc, 123))
+        self.assertEqual(RECORDS[-200], read_record(self.dump_loc, -200))
+
+    def test_missing(self):
+        with self.assertRaises(InvalidDataError):
+            read_record(self.dump_loc, len(RECORDS))
+        with self.assertRaises(InvalidDataError):
+            read_record(self.dump_loc, -len(RECORDS) - 1)
+
+    def test_empty(self):
+        open(self.dump_loc, 'w').close()
+        with self.assertRaises(InvalidDataError):
+            read_record(self.dump_loc)
+
+    def test_bad_record(self):
+        with open(self.dump_loc, 'a') as dump_file:
+            dump_file.write("junk\n")
+        with self.assertRaises(InvalidDataError):
+            read_record(self.dump_loc)
+
+    def test_tail_small_blocks(self):
+        with open(self.dump_loc) as dump_file:
+            lines = [line.rstrip('\n') for line in dump_file if line.strip()]
+        self.assertEqual(lines[-7:], tail_lines(self.dump_loc, 7, block_size=5))
+        self.assertEqual(lines, tail_lines(self.dump_loc, 1000, block_size=64))
+
+    def test_iter(self):
+        self.assertEqual(RECORDS, list(iter_records(self.dump_loc)))
+
+    def test_compressed(self):
+        compress_file(self.dump_loc)
+        self.assertFalse(os.path.exists(self.dump_loc))
+        self.assertEqual(RECORDS, list(iter_records(self.dump_loc)))
+        self.assertEqual(RECORDS[-1], read_record(self.dump_loc))
+        self.assertEqual(RECORDS[-200], read_record(self.dump_loc, -200))
+
+
+class TestRecordTail(unittest.TestCase):
+    "Tests following a growing DUMPAVE file."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.dump_loc = os.path.join(self.tgt_dir, "cons_fwd.dat")
+        self.tail = RecordTail(self.dump_loc)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _append(self, text):
+        with open(self.dump_loc, 'a') as dump_file:
+            dump_file.write(text)
+
+    def test_growing(self):
+        self.assertEqual([], self.tail.read_new())
+        self._append("0 1.0 2.0\n10 1.5")
+        self.assertEqual([(0.0, 1.0, 2.0)], self.tail.read_new())
+        self._append(" 2.5\n")
+        self.assertEqual([(10.0, 1.5, 2.5)], self.tail.read_new())
+        self.assertEqual([], self.tail.read_new())
+
+    def test_replaced(self):
+        self._append("0 1.0 2.0\n10 1.5 2.5\n")
+        self.tail.read_new()
+        with open(self.dump_loc, 'w') as dump_file:
+            dump_file.write("0 3.0 4.0\n")
+        self.assertEqual([(0.0, 3.0, 4.0)], self.tail.read_new())
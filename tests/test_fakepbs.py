@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from aimless.aimless import (AimlessShooter, init_dir, write_tpl_files,
+                             calc_params, BASIN_FWD_KEY,
+                             BASIN_BACK_KEY, RC1_LOW_A_KEY, RC1_HIGH_A_KEY,
+                             RC2_LOW_A_KEY, RC2_HIGH_A_KEY, RC1_LOW_B_KEY,
+                             RC1_HIGH_B_KEY, RC2_LOW_B_KEY, RC2_HIGH_B_KEY,
+                             BRES, OUT_DIR)
+from aimless.common import STATES
+from aimless.dumpave import read_record
+from aimless.fakepbs import FakePbs
+from aimless.restart import Restart
+from aimless.torque import TorqueJob, TorqueSubmissionHandler
+
+TPL_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'aimless', 'skel',
+                       'tpl')
+WAIT_SECS = 10
+BASINS = {RC1_LOW_A_KEY: 2.75, RC1_HIGH_A_KEY: 10.0, RC2_LOW_A_KEY: 0.0,
+          RC2_HIGH_A_KEY: 1.9, RC1_LOW_B_KEY: 0.0, RC1_HIGH_B_KEY: 2.0,
+          RC2_LOW_B_KEY: 3.0, RC2_HIGH_B_KEY: 10.0}
+
+
+def write_coords(loc, num_atoms=10):
+    "Writes a restart file without velocities."
+    Restart("test", np.arange(num_atoms * 3.0).reshape(num_atoms, 3)).write(loc)
+
+
+class TestFakePbs(unittest.TestCase):
+    "Tests the fake queue through TorqueSubmissionHandler."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.fake = FakePbs(queue_delay=.05, xml_padding=100, seed=1)
+        self.handler = TorqueSubmissionHandler(pipe_cmd=self.fake.pipe_cmd)
+
+    def tearDown(self):
+        self.fake.shutdown()
+        shutil.rmtree(self.tgt_dir)
+
+    def _job(self, contents="echo", **kwargs):
+        return TorqueJob(contents=contents, workdir=self.tgt_dir, **kwargs)
+
+    def _wait_gone(self, job_id):
+        for _ in range(WAIT_SECS * 100):
+            if not self.handler.stat_jobs([job_id]):
+                return
+            self.fake._thread.join(.01)
+        self.fail("Job %s never finished" % job_id)
+
+    def test_submit_stat(self):
+        jid = self.handler.submit(self._job(name="fake"))
+        self.assertEqual(1, jid)
+        stat = self.handler.stat_jobs([jid])[jid]
+        self.assertEqual(STATES.QUEUED, stat.job_state)
+        self.assertEqual("fake", stat.name)
+        self._wait_gone(jid)
+        self.assertEqual(1, self.fake.calls['qsub'])
+        self.assertTrue(self.fake.calls['qstat'] >= 2)
+
+    def test_stat_all(self):
+        self.handler.submit(self._job())
+        self.handler.submit(self._job())
+        self.assertEqual([1, 2], sorted(self.handler.stat_jobs().keys()))
+
+    def test_depends(self):
+        first = self.handler.submit(self._job())
+        job = self._job()
+        job.depends = [first]
+        second = self.handler.submit(job)
+        self.assertEqual(STATES.HELD,
+                         self.handler.stat_jobs([second])[second].job_state)
+        self._wait_gone(second)
+        self.assertEqual(0, self.fake.jobs[str(second)].exit_status)
+
+    def test_cancel(self):
+        jid = self.handler.submit(self._job())
+        self.handler.cancel(jid)
+        self.assertEqual({}, self.handler.stat_jobs([jid]))
+        self.assertIsNone(self.fake.jobs[str(jid)].exit_status)
+
+    def test_array(self):
+        jid = self.handler.submit(self._job(array="1-2"))
+        self.assertEqual("1[]", jid)
+        stats = self.handler.stat_jobs(["1[1]", "1[2]"])
+        self.assertEqual(["1[1]", "1[2]"], sorted(stats.keys()))
+
+    def test_amber_job(self):
+        write_coords(os.path.join(self.tgt_dir, "shooter.rst"))
+        write_tpl_files(TPL_DIR, self.tgt_dir, calc_params(1000))
+        aims = AimlessShooter(TPL_DIR, self.tgt_dir, "topo", {}, BASINS,
+                              sub_handler=self.handler)
+        jid = aims._sub_job(aims.tgtres("shooter.rst"), aims.tgtres("out.rst"),
+                            aims.tgtres("inforward.in"),
+                            aims.tgtres("forward.out"),
+                            aims.tgtres("forward.mdcrd"))
+        self._wait_gone(jid)
+        self.assertEqual(10, Restart.read(aims.tgtres("out.rst")).vels.shape[0])
+        record = read_record(aims.tgtres("cons_fwd.dat"))
+        self.assertEqual(499, record[0])
+        self.assertTrue(record[1:] in [(4.0, 1.0), (1.0, 4.0)])
+        with open(aims.tgtres("forward.done")) as done_file:
+            self.assertEqual("0", done_file.read().split()[0])
+
+
+class TestFakeOrchestration(unittest.TestCase):
+    "Runs whole shooting paths against the fake queue."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.fake = FakePbs(seed=2)
+        coords_loc = os.path.join(self.tgt_dir, "coords.rst")
+        write_coords(coords_loc)
+        init_dir(self.tgt_dir, coords_loc)
+        write_tpl_files(TPL_DIR, self.tgt_dir, calc_params(1000))
+
+    def tearDown(self):
+        self.fake.shutdown()
+        shutil.rmtree(self.tgt_dir)
+
+    def test_stage(self):
+        aims = AimlessShooter(
+            TPL_DIR, self.tgt_dir, "topo", {}, BASINS,
+            sub_handler=TorqueSubmissionHandler(pipe_cmd=self.fake.pipe_cmd),
+            wait_secs=.01, stat_secs=.05)
+        pres = aims.run_calcs(2)
+        self.assertEqual([1, 2], sorted(pres.keys()))
+        for res in pres.values():
+            self.assertTrue(res[BASIN_FWD_KEY] in (BRES.A, BRES.B))
+            self.assertTrue(res[BASIN_BACK_KEY] in (BRES.A, BRES.B))
+        self.assertTrue(os.path.isdir(os.path.join(self.tgt_dir, OUT_DIR,
+                                                   "02")))
+        self.assertEqual(8, self.fake.calls['qsub'])
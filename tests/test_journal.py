@@ -0,0 +1,71 @@
+import os
+import shutil
+import tempfile
+import unittest
+from aimless.journal import Journal, EVENTS, replay
+
+
+class TestJournal(unittest.TestCase):
+    "Tests writing, reading, and replaying the path journal."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.journal = Journal(os.path.join(self.tgt_dir, "journal.jsonl"))
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_missing(self):
+        self.assertEqual([], self.journal.read())
+
+    def test_round_trip(self):
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        self.journal.append(EVENTS.SUBMIT, 1, stage="starter", job=11)
+        self.assertEqual([{'event': EVENTS.PATH_START, 'path': 1,
+                           'shooter': "x1.rst"},
+                          {'event': EVENTS.SUBMIT, 'path': 1,
+                           'stage': "starter", 'job': 11}],
+                         self.journal.read())
+
+    def test_reset(self):
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        self.journal.reset()
+        self.assertEqual([], self.journal.read())
+
+    def test_partial_last(self):
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        with open(self.journal.loc, 'a') as journal_file:
+            journal_file.write('{"event": "sub')
+        self.assertEqual(1, len(self.journal.read()))
+
+    def test_corrupt_middle(self):
+        with open(self.journal.loc, 'w') as journal_file:
+            journal_file.write('{"event": "sub\n')
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        with self.assertRaises(ValueError):
+            self.journal.read()
+
+    def test_replay(self):
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        self.journal.append(EVENTS.PATH_DONE, 1, result={'forward': 'A'})
+        self.journal.append(EVENTS.PATH_START, 2, shooter="x2.rst")
+        self.journal.append(EVENTS.SUBMIT, 2, stage="starter", job=11)
+        self.journal.append(EVENTS.STAGE_DONE, 2, stage="starter")
+        self.journal.append(EVENTS.SUBMIT, 2, stage="forward", job=22)
+        self.journal.append(EVENTS.STAGE_DONE, 2, stage="forward",
+                            commits={'commitfw': 300})
+        paths = replay(self.journal.read())
+        self.assertEqual({'forward': 'A'}, paths[1].result)
+        self.assertEqual("x2.rst", paths[2].shooter)
+        self.assertIsNone(paths[2].result)
+        self.assertEqual({"starter": 11, "forward": 22}, paths[2].jobs)
+        self.assertEqual(set(["starter", "forward"]), paths[2].done)
+        self.assertEqual({'commitfw': 300}, paths[2].commits)
+
+    def test_replay_restart(self):
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x1.rst")
+        self.journal.append(EVENTS.SUBMIT, 1, stage="starter", job=11)
+        self.journal.append(EVENTS.PATH_START, 1, shooter="x2.rst")
+        paths = replay(self.journal.read())
+        self.assertEqual("x2.rst", paths[1].shooter)
+        self.assertEqual({}, paths[1].jobs)
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+from aimless.common import STATES
+from aimless.local import (LocalSubmissionHandler, LocalSubmissionError,
+                           parse_array)
+from aimless.torque import TorqueJob
+
+WAIT_SECS = 10
+
+
+class TestLocalSubmissionHandler(unittest.TestCase):
+    "Tests running jobs in a local process pool."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.handler = LocalSubmissionHandler(max_jobs=2)
+
+    def tearDown(self):
+        self.handler.shutdown()
+        shutil.rmtree(self.tgt_dir)
+
+    def _job(self, contents, depends=None, **kwargs):
+        job = TorqueJob(contents=contents, workdir=self.tgt_dir,
+                        stdout=self._loc("out.log"), **kwargs)
+        # TorqueJob's constructor keeps only the first of a list value
+        job.depends = depends
+        return job
+
+    def _loc(self, name):
+        return os.path.join(self.tgt_dir, name)
+
+    def _read(self, name):
+        with open(self._loc(name)) as in_file:
+            return in_file.read()
+
+    def test_run(self):
+        jid = self.handler.submit(self._job(
+            "cd $PBS_O_WORKDIR\necho $PBS_JOBNAME > name.txt\n",
+            name="local"))
+        self.assertEqual(1, jid)
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertEqual("local\n", self._read("name.txt"))
+        self.assertEqual(STATES.COMPLETED,
+                         self.handler.stat_jobs([jid])[jid].job_state)
+        self.assertEqual(0, self.handler.exit_codes[jid])
+
+    def test_unknown(self):
+        self.assertEqual({}, self.handler.stat_jobs([99]))
+
+    def test_limit(self):
+        jids = [self.handler.submit(self._job("sleep 5")) for _ in range(3)]
+        stats = self.handler.stat_jobs(jids)
+        self.assertEqual([STATES.RUNNING, STATES.RUNNING, STATES.QUEUED],
+                         [stats[jid].job_state for jid in jids])
+
+    def test_depends(self):
+        first = self.handler.submit(self._job("sleep .2; echo a > order"))
+        second = self.handler.submit(self._job("echo b >> order",
+                                               depends=[first]))
+        self.assertEqual(STATES.HELD,
+                         self.handler.stat_jobs([second])[second].job_state)
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertEqual("a\nb\n", self._read("order"))
+
+    def test_depends_failed(self):
+        first = self.handler.submit(self._job("exit 3"))
+        second = self.handler.submit(self._job("touch ran",
+                                               depends=[first]))
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertEqual(3, self.handler.exit_codes[first])
+        self.assertIsNone(self.handler.exit_codes[second])
+        self.assertFalse(os.path.exists(self._loc("ran")))
+
+    def test_depends_any(self):
+        first = self.handler.submit(self._job("exit 3"))
+        self.handler.submit(self._job("touch ran", depends=[first],
+                                      depend_type="afterany"))
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertTrue(os.path.exists(self._loc("ran")))
+
+    def test_array(self):
+        jid = self.handler.submit(self._job("touch idx$PBS_ARRAYID",
+                                            array="1-3"))
+        self.assertEqual("1[]", jid)
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        for idx in range(1, 4):
+            self.assertTrue(os.path.exists(self._loc("idx%d" % idx)))
+        stats = self.handler.stat_jobs([jid, "1[2]"])
+        self.assertEqual(STATES.COMPLETED, stats[jid].job_state)
+        self.assertEqual(STATES.COMPLETED, stats["1[2]"].job_state)
+
+    def test_cancel(self):
+        first = self.handler.submit(self._job("sleep 30"))
+        queued = [self.handler.submit(self._job("sleep 30"))
+                  for _ in range(2)]
+        self.handler.cancel(queued[-1])
+        self.handler.cancel(first)
+        self.handler.cancel(queued[0])
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertIsNone(self.handler.exit_codes[queued[-1]])
+        self.assertNotEqual(0, self.handler.exit_codes[first])
+
+    def test_active_only(self):
+        done = [self.handler.submit(self._job("true")) for _ in range(5)]
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        # Finished jobs are only kept for stat_jobs
+        self.assertEqual([], self.handler._unfinished())
+        jids = [self.handler.submit(self._job("sleep 5")) for _ in range(3)]
+        self.handler.submit(self._job("true", depends=[jids[0]]))
+        self.assertEqual((2, 1, 1), (len(self.handler._running),
+                                     len(self.handler._queued),
+                                     len(self.handler._held)))
+        self.assertEqual(len(done) + 4, len(self.handler.stat_jobs()))
+
+    def test_nodefile(self):
+        self.handler.submit(self._job("cp $PBS_NODEFILE nodes", numcpus=3))
+        self.assertTrue(self.handler.wait_all(WAIT_SECS))
+        self.assertEqual(3, len(self._read("nodes").split()))
+
+    def test_bad_limit(self):
+        self.assertRaises(LocalSubmissionError, LocalSubmissionHandler, 0)
+
+
+class TestParseArray(unittest.TestCase):
+    def test_range(self):
+        self.assertEqual([1, 2, 3, 7], parse_array("1-3,7"))
+
+    def test_bad(self):
+        self.assertRaises(LocalSubmissionError, parse_array, "1-x")
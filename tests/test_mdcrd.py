@@ -0,0 +1,197 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+import zlib
+import numpy as np
+from mock import patch
+from aimless import archive
+from aimless.aimless import AimlessShooter
+from aimless.archive import compress_file, CODECS
+from aimless.common import InvalidDataError
+from aimless.mdcrd import MdcrdReader, read_natoms, INDEX_SUFFIX
+
+NATOMS = 5
+BOX = [30.0, 31.5, 32.25]
+PRMTOP = """%VERSION  VERSION_STAMP = V0001.000  DATE = 01/26/14  12:00:00
+%FLAG TITLE
+%FORMAT(20a4)
+test
+%FLAG POINTERS
+%FORMAT(10I8)
+       5       2       3       0       0       0       0       0       0       0
+"""
+
+
+def make_frames(num_frames, natoms=NATOMS):
+    "Returns distinct coordinates for the given number of frames."
+    vals = np.arange(num_frames * natoms * 3, dtype=float) * .125 - 20
+    return vals.reshape(num_frames, natoms, 3)
+
+
+def write_mdcrd(loc, frames, box=None):
+    "Writes the given frames as Amber does."
+    with open(loc, 'w') as mdcrd:
+        mdcrd.write("test trajectory\n")
+        for frame in frames:
+            vals = frame.ravel()
+            for start in range(0, len(vals), 10):
+                mdcrd.write("".join("%8.3f" % val
+                                    for val in vals[start:start + 10]))
+                mdcrd.write("\n")
+            if box is not None:
+                mdcrd.write("".join("%8.3f" % val for val in box) + "\n")
+
+
+class TestMdcrdReader(unittest.TestCase):
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.loc = os.path.join(self.tgt_dir, "forward.mdcrd")
+        self.frames = make_frames(7)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_frames(self):
+        write_mdcrd(self.loc, self.frames)
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            self.assertEqual(7, len(reader))
+            self.assertFalse(reader.has_box)
+            self.assertIsNone(reader.box(0))
+            self.assertEqual((NATOMS, 3), reader.frame(3).shape)
+            np.testing.assert_allclose(self.frames[3], reader.frame(3))
+            np.testing.assert_allclose(self.frames[-1], reader[-1])
+            with self.assertRaises(IndexError):
+                reader.frame(7)
+
+    def test_box(self):
+        write_mdcrd(self.loc, self.frames, box=BOX)
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            self.assertEqual(7, len(reader))
+            self.assertTrue(reader.has_box)
+            np.testing.assert_allclose(BOX, reader.box(6))
+            np.testing.assert_allclose(self.frames[6], reader.frame(6))
+
+    def test_stride(self):
+        write_mdcrd(self.loc, self.frames, box=BOX)
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            np.testing.assert_allclose(self.frames[1::3], reader[1::3])
+            strided = list(reader.iter_frames(step=2))
+            self.assertEqual(4, len(strided))
+            np.testing.assert_allclose(self.frames[::2], strided)
+
+    def test_partial_frame(self):
+        write_mdcrd(self.loc, self.frames)
+        with open(self.loc, 'a') as mdcrd:
+            mdcrd.write("   1.000   2.000\n")
+        with MdcrdReader(self.loc, NATOMS, use_index=False) as reader:
+            self.assertEqual(7, len(reader))
+            np.testing.assert_allclose(self.frames[6], reader.frame(6))
+
+    def test_index(self):
+        write_mdcrd(self.loc, self.frames)
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            offsets = reader.offsets
+        self.assertTrue(os.path.exists(self.loc + INDEX_SUFFIX))
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            np.testing.assert_array_equal(offsets, reader.offsets)
+        # A changed trajectory is indexed again
+        write_mdcrd(self.loc, self.frames[:2])
+        os.utime(self.loc, (1, 1))
+        with MdcrdReader(self.loc, NATOMS) as reader:
+            self.assertEqual(2, len(reader))
+
+    def test_compressed(self):
+        frames = make_frames(40)
+        write_mdcrd(self.loc, frames, box=BOX)
+        # Small blocks, so that frames straddle them
+        with patch.object(archive, 'BLOCK_SIZE', 100):
+            compress_file(self.loc, CODECS.GZIP)
+        with open(self.loc + ".gz", 'rb') as arc_file:
+            num_blocks = len(archive.read_blocks(arc_file)) - 1
+        self.assertTrue(num_blocks > 50)
+        with patch.object(MdcrdReader, '_decompress') as decompress_all:
+            with patch('aimless.archive.zlib.decompress',
+                       side_effect=zlib.decompress) as decompress:
+                with MdcrdReader(self.loc, NATOMS) as reader:
+                    np.testing.assert_allclose(frames[5], reader.frame(5))
+                    np.testing.assert_allclose(BOX, reader.box(5))
+                # Only the blocks at the start and end and around frame 5
+                self.assertTrue(decompress.call_count < num_blocks // 2)
+                with MdcrdReader(self.loc, NATOMS) as reader:
+                    np.testing.assert_allclose(frames, reader[:])
+        self.assertFalse(decompress_all.called)
+        self.assertEqual(sorted(["forward.mdcrd.gz",
+                                 "forward.mdcrd" + INDEX_SUFFIX]),
+                         sorted(os.listdir(self.tgt_dir)))
+        # The block offsets are kept in the sidecar
+        with patch('aimless.archive.read_blocks') as read_blocks:
+            with MdcrdReader(self.loc, NATOMS) as reader:
+                np.testing.assert_allclose(frames[39], reader.frame(39))
+        self.assertFalse(read_blocks.called)
+
+    def test_compressed_scan(self):
+        write_mdcrd(self.loc, self.frames)
+        with open(self.loc, 'a') as mdcrd:
+            mdcrd.write("   1.000   2.000\n")
+        with patch.object(archive, 'BLOCK_SIZE', 100):
+            compress_file(self.loc, CODECS.GZIP)
+        with MdcrdReader(self.loc, NATOMS, use_index=False) as reader:
+            self.assertEqual(7, len(reader))
+            np.testing.assert_allclose(self.frames[6], reader.frame(6))
+
+    def test_compressed_copy(self):
+        # Files not written in blocks are decompressed to a temporary copy
+        write_mdcrd(self.loc, self.frames, box=BOX)
+        with open(self.loc, 'rb') as src_file:
+            with gzip.open(self.loc + ".gz", 'wb') as tgt_file:
+                tgt_file.write(src_file.read())
+        os.remove(self.loc)
+        with MdcrdReader(self.loc, NATOMS, tmp_dir=self.tgt_dir) as reader:
+            np.testing.assert_allclose(self.frames[5], reader.frame(5))
+            self.assertEqual(3, len(os.listdir(self.tgt_dir)))
+        self.assertEqual(sorted(["forward.mdcrd.gz",
+                                 "forward.mdcrd" + INDEX_SUFFIX]),
+                         sorted(os.listdir(self.tgt_dir)))
+
+    def test_bad(self):
+        with open(self.loc, 'w') as mdcrd:
+            mdcrd.write("title\n" + "   x.xxx" * 10 + "\n" + "   1.000" * 5
+                        + "\n")
+        with MdcrdReader(self.loc, NATOMS, use_index=False) as reader:
+            with self.assertRaises(InvalidDataError):
+                reader.frame(0)
+        with self.assertRaises(IOError):
+            MdcrdReader(os.path.join(self.tgt_dir, "missing.mdcrd"), NATOMS)
+
+
+class TestNatoms(unittest.TestCase):
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.topo_loc = os.path.join(self.tgt_dir, "test.prmtop")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_read(self):
+        with open(self.topo_loc, 'w') as prmtop:
+            prmtop.write(PRMTOP)
+        self.assertEqual(5, read_natoms(self.topo_loc))
+
+    def test_no_pointers(self):
+        with open(self.topo_loc, 'w') as prmtop:
+            prmtop.write(PRMTOP.split("%FLAG POINTERS")[0])
+        with self.assertRaises(InvalidDataError):
+            read_natoms(self.topo_loc)
+
+    def test_shooter(self):
+        with open(self.topo_loc, 'w') as prmtop:
+            prmtop.write(PRMTOP)
+        loc = os.path.join(self.tgt_dir, "dt.mdcrd")
+        frames = make_frames(3)
+        write_mdcrd(loc, frames, box=BOX)
+        aims = AimlessShooter(self.tgt_dir, self.tgt_dir, self.topo_loc, {},
+                              {})
+        with aims.open_trajectory(loc) as reader:
+            np.testing.assert_allclose(frames[2], reader.frame(2))
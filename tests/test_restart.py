@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from aimless.common import InvalidDataError
+from aimless.restart import Restart, parse_fixed, format_fixed, fortran_exp
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'test_data')
+SMALL_FWD = os.path.join(TEST_DATA_DIR, "even_small_fwd.rst")
+ODD_FWD = os.path.join(TEST_DATA_DIR, "odd_forward.rst")
+
+
+def read_lines(loc):
+    with open(loc) as rst_file:
+        return rst_file.read().splitlines()
+
+
+class TestRestart(unittest.TestCase):
+    "Tests reading and writing restart files."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.out_loc = os.path.join(self.tgt_dir, "out.rst")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_read_small(self):
+        rst = Restart.read(SMALL_FWD)
+        self.assertEqual("*NAME: SOLVENT-BOX.STR", rst.title)
+        self.assertEqual(6, rst.num_atoms)
+        self.assertAlmostEqual(200.5, rst.time)
+        self.assertEqual((6, 3), rst.coords.shape)
+        self.assertEqual((6, 3), rst.vels.shape)
+        self.assertEqual([-24.3255076, -9.3809998, 9.0063948],
+                         rst.coords[0].tolist())
+        self.assertEqual([0.0335055, 0.0088134, 0.0405872],
+                         rst.vels[-1].tolist())
+        self.assertEqual([75.1725245] * 3 + [90.0] * 3, rst.box.tolist())
+
+    def test_read_odd_mmap(self):
+        rst = Restart.read(ODD_FWD, use_mmap=True)
+        plain = Restart.read(ODD_FWD, use_mmap=False)
+        self.assertEqual(42883, rst.num_atoms)
+        self.assertEqual((42883, 3), rst.vels.shape)
+        self.assertEqual([-0.0714141, 0.2263583, 0.1662817],
+                         rst.vels[-1].tolist())
+        self.assertTrue(np.array_equal(plain.coords, rst.coords))
+        self.assertTrue(np.array_equal(plain.vels, rst.vels))
+
+    def test_round_trip_untouched(self):
+        Restart.read(ODD_FWD).write(self.out_loc)
+        self.assertEqual(read_lines(ODD_FWD), read_lines(self.out_loc))
+
+    def test_round_trip_formatted(self):
+        rst = Restart.read(SMALL_FWD)
+        rst.coords = rst.coords.copy()
+        rst.vels = rst.vels.copy()
+        rst.write(self.out_loc)
+        self.assertEqual(read_lines(SMALL_FWD), read_lines(self.out_loc))
+
+    def test_new(self):
+        rst = Restart("title", np.arange(9.0), time=1.5)
+        rst.write(self.out_loc)
+        self.assertEqual(["title", "    3  0.1500000E+01",
+                          "   0.0000000   1.0000000   2.0000000"
+                          "   3.0000000   4.0000000   5.0000000",
+                          "   6.0000000   7.0000000   8.0000000"],
+                         read_lines(self.out_loc))
+        rst = Restart.read(self.out_loc)
+        self.assertIsNone(rst.vels)
+        self.assertIsNone(rst.box)
+        self.assertEqual((3, 3), rst.coords.shape)
+
+    def test_changed_atoms(self):
+        rst = Restart.read(SMALL_FWD)
+        rst.coords = rst.coords[:2]
+        rst.vels = None
+        rst.write(self.out_loc)
+        self.assertEqual("    2  0.2005000E+03", read_lines(self.out_loc)[1])
+
+    def test_vel_mismatch(self):
+        rst = Restart.read(SMALL_FWD)
+        rst.vels = rst.vels[:2]
+        with self.assertRaises(InvalidDataError):
+            rst.format()
+
+    def test_truncated_coords(self):
+        with open(self.out_loc, 'w') as rst_file:
+            rst_file.write("title\n   10\n   1.0   2.0\n")
+        with self.assertRaises(InvalidDataError):
+            Restart.read(self.out_loc)
+
+    def test_truncated_vels(self):
+        lines = read_lines(SMALL_FWD)
+        with open(self.out_loc, 'w') as rst_file:
+            rst_file.write("\n".join(lines[:-2]))
+        with self.assertRaises(InvalidDataError):
+            Restart.read(self.out_loc)
+
+    def test_bad_count(self):
+        with self.assertRaises(InvalidDataError):
+            Restart.parse("title\nnope\n")
+
+
+class TestFixedWidth(unittest.TestCase):
+    "Tests the fixed-width field helpers."
+
+    def test_touching_fields(self):
+        self.assertEqual([-100.1234567, -200.7654321, 1.0],
+                         parse_fixed("-100.1234567-200.7654321   1.0000000\n",
+                                     3).tolist())
+
+    def test_short(self):
+        with self.assertRaises(InvalidDataError):
+            parse_fixed("   1.0000000\n", 2)
+
+    def test_bad_value(self):
+        with self.assertRaises(InvalidDataError):
+            parse_fixed("   1.0000000  not-a-num!\n", 2)
+
+    def test_format(self):
+        self.assertEqual("   1.0000000  -2.5000000\n",
+                         format_fixed(np.array([1.0, -2.5])))
+        self.assertEqual(("   1.0000000" * 6 + "\n") * 2,
+                         format_fixed(np.ones(12)))
+
+    def test_fortran_exp(self):
+        self.assertEqual("0.2005000E+03", fortran_exp(200.5))
+        self.assertEqual("-0.1000000E-02", fortran_exp(-0.001))
+        self.assertEqual("0.0000000E+00", fortran_exp(0.0))
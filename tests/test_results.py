@@ -0,0 +1,122 @@
+import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from aimless.aimless import (write_text_report, write_csv_report,
+                             BASIN_FWD_KEY, BASIN_BACK_KEY, RC1_FWD_KEY,
+                             RC2_FWD_KEY, RC1_BACK_KEY, RC2_BACK_KEY,
+                             COMMIT_FWD_KEY, ACC_KEY, SHOOTER_KEY, BRES)
+from aimless.common import PersistenceError
+from aimless.results import (ResultStore, RESULT_DTYPE, basin_totals,
+                             load_records)
+from aimless.timing import TIMINGS_KEY
+
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'test_data')
+
+PRES = {1: {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.B, ACC_KEY: True},
+        2: {BASIN_FWD_KEY: BRES.INC, BASIN_BACK_KEY: BRES.B},
+        3: {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.A},
+        4: {BASIN_FWD_KEY: BRES.B, BASIN_BACK_KEY: BRES.B}}
+FULL_RES = {BASIN_FWD_KEY: BRES.A, BASIN_BACK_KEY: BRES.B, ACC_KEY: True,
+            SHOOTER_KEY: "x1.rst", RC1_FWD_KEY: 4.0, RC2_FWD_KEY: 1.0,
+            RC1_BACK_KEY: 1.0, RC2_BACK_KEY: 4.5, COMMIT_FWD_KEY: 120,
+            TIMINGS_KEY: {'total_wall': 12.5, 'forward_run': 3.0}}
+
+
+class TestResultStore(unittest.TestCase):
+    "Tests storing path results as records."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.loc = os.path.join(self.tgt_dir, "results.rec")
+        self.store = ResultStore(self.loc)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_empty(self):
+        self.assertEqual(0, len(self.store))
+        self.assertEqual({}, self.store.as_pres())
+
+    def test_round_trip(self):
+        self.store.add(7, FULL_RES)
+        self.assertEqual({7: FULL_RES}, self.store.as_pres())
+        records = self.store.records()
+        self.assertEqual(RESULT_DTYPE, records.dtype)
+        self.assertEqual(-1, records['commitbw'][0])
+        self.assertTrue(np.isnan(records['dt_wall'][0]))
+
+    def test_start(self):
+        self.store.add(9, FULL_RES)
+        self.store.start({1: PRES[1], 2: PRES[2]})
+        self.store.add(3, PRES[3])
+        self.assertEqual([1, 2, 3], list(self.store.records()['path']))
+        self.assertEqual(["results.rec"], os.listdir(self.tgt_dir))
+
+    def test_partial_record(self):
+        self.store.add(1, PRES[1])
+        with open(self.loc, 'ab') as store_file:
+            store_file.write("\0" * 10)
+        self.assertEqual(1, len(self.store))
+        self.store.add(2, PRES[2])
+        self.assertEqual({1: PRES[1], 2: PRES[2]}, self.store.as_pres())
+
+    def test_other_layout(self):
+        ResultStore(self.loc, np.dtype([('path', '<i4')])).add(1, {})
+        self.assertEqual({1: {}}, self.store.as_pres())
+        with self.assertRaises(PersistenceError):
+            self.store.add(2, PRES[2])
+
+    def test_widened(self):
+        wide = np.dtype(RESULT_DTYPE.descr + [('cv1', '<f8')])
+        ResultStore(self.loc, wide).start({1: dict(PRES[1], cv1=2.5),
+                                           2: dict(PRES[2], cv1=0.5)})
+        # Later paths are appended in the widened layout, and starting over
+        # (as when resuming) keeps the extra columns
+        self.store.add(3, PRES[3])
+        self.assertEqual(wide, self.store.records().dtype)
+        self.store.start({1: PRES[1], 3: PRES[3]})
+        self.assertEqual({1: dict(PRES[1], cv1=2.5), 3: PRES[3]},
+                         self.store.as_pres())
+
+    def test_not_store(self):
+        with open(self.loc, 'w') as store_file:
+            store_file.write("path,forward\n")
+        with self.assertRaises(PersistenceError):
+            self.store.records()
+
+    def test_reports(self):
+        self.store.start(PRES)
+        tgt = StringIO.StringIO()
+        write_text_report(self.store, tgt)
+        with open(os.path.join(TEST_DATA_DIR, "test_report.txt")) as ref_rep:
+            self.assertEqual(ref_rep.read(), tgt.getvalue())
+        tgt = StringIO.StringIO()
+        write_csv_report(self.store, tgt, linesep='\n')
+        with open(os.path.join(TEST_DATA_DIR, "test_report.csv")) as ref_rep:
+            self.assertEqual(ref_rep.read(), tgt.getvalue())
+
+
+class TestQueries(unittest.TestCase):
+    "Tests campaign-wide queries."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.locs = [os.path.join(self.tgt_dir, name)
+                     for name in ("one.rec", "two.rec")]
+        ResultStore(self.locs[0]).start(PRES)
+        ResultStore(self.locs[1]).start({1: FULL_RES})
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_load(self):
+        records = load_records(self.locs)
+        self.assertEqual([1, 2, 3, 4, 1], list(records['path']))
+        self.assertEqual(12.5, np.nanmax(records['total_wall']))
+
+    def test_totals(self):
+        self.assertEqual({'accepted': 2, 'rejected': 3, 'both_a': 1,
+                          'both_b': 1}, basin_totals(load_records(self.locs)))
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mock import MagicMock
+from aimless.aimless import (AimlessShooter, init_dir, write_path_cfg,
+                             read_path_result, PATH_CFG_NAME, PATH_RESULT_NAME,
+                             FWD_RST_NAME, BACK_RST_NAME, STARTER_DONE_NAME,
+                             BACK_DONE_NAME, BASIN_FWD_KEY, BASIN_BACK_KEY,
+                             RC1_FWD_KEY, BRES)
+from aimless.runner import InlineSubmissionHandler, run_path_cfg, main
+from aimless.common import STATES
+from aimless.torque import TorqueJob
+from test_aimless import (TPL_DIR, TEST_DATA_DIR, COORDS_LOC, TOPO_LOC,
+                          BASIN_VALS)
+
+
+class TestInlineSubmissionHandler(unittest.TestCase):
+    "Tests running job scripts in the current allocation."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.handler = InlineSubmissionHandler()
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_submit(self):
+        job = TorqueJob(contents="cd $PBS_O_WORKDIR\necho hi > out.txt\n")
+        job.workdir = self.tgt_dir
+        jid = self.handler.submit(job)
+        with open(os.path.join(self.tgt_dir, "out.txt")) as out_file:
+            self.assertEqual("hi\n", out_file.read())
+        self.assertEqual(STATES.COMPLETED,
+                         self.handler.stat_jobs([jid])[jid].job_state)
+
+    def test_exit_code(self):
+        job = TorqueJob(contents="exit 3\n")
+        jid = self.handler.submit(job)
+        self.assertEqual(3, self.handler.exit_codes[jid])
+
+
+class TestRunPathCfg(unittest.TestCase):
+    "Tests running a whole path from its configuration file."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        init_dir(self.tgt_dir, COORDS_LOC)
+        self.aimless = AimlessShooter(TPL_DIR, self.tgt_dir, TOPO_LOC, {},
+                                      BASIN_VALS, sub_handler=MagicMock())
+        self.aimless.open_path(1)
+        self.path_dir = self.aimless.path_dir
+        shutil.copy2(os.path.join(TEST_DATA_DIR, "even_small_fwd.rst"),
+                     os.path.join(self.path_dir, FWD_RST_NAME))
+        ofdir = os.path.join(TEST_DATA_DIR, "out")
+        for cpname in os.listdir(ofdir):
+            shutil.copy2(os.path.join(ofdir, cpname),
+                         os.path.join(self.path_dir, cpname))
+        self.cfg_loc = os.path.join(self.path_dir, PATH_CFG_NAME)
+        write_path_cfg(self.aimless, self.aimless.x1_loc, self.cfg_loc)
+
+    def tearDown(self):
+        self.aimless.close()
+        shutil.rmtree(self.tgt_dir)
+
+    def test_run(self):
+        result = run_path_cfg(self.cfg_loc)
+        self.assertEqual(BRES.INC, result[BASIN_FWD_KEY])
+        self.assertEqual(2.0, result[RC1_FWD_KEY])
+        self.assertEqual(result, read_path_result(
+            os.path.join(self.path_dir, PATH_RESULT_NAME)))
+        for name in (BACK_RST_NAME, STARTER_DONE_NAME, BACK_DONE_NAME):
+            self.assertTrue(os.path.exists(os.path.join(self.path_dir, name)))
+
+    def test_main(self):
+        self.assertEqual(0, main([self.cfg_loc]))
+        self.assertTrue(os.path.exists(os.path.join(self.path_dir,
+                                                    PATH_RESULT_NAME)))
+
+    def test_main_no_args(self):
+        with self.assertRaises(SystemExit):
+            main([])
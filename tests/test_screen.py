@@ -0,0 +1,149 @@
+import StringIO
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from mock import patch
+from aimless.aimless import (RC1_LOW_A_KEY, RC1_HIGH_A_KEY, RC2_LOW_A_KEY,
+                             RC2_HIGH_A_KEY, RC1_LOW_B_KEY, RC1_HIGH_B_KEY,
+                             RC2_LOW_B_KEY, RC2_HIGH_B_KEY, BASIN_FWD_KEY,
+                             BASIN_BACK_KEY, BRES)
+from aimless.analysis import ShootingPoints, committor, fit_committor
+from aimless.cvs import CvSet, cv_dtype
+from aimless.results import ResultStore
+from aimless.screen import (cv_subsets, screen, rank_fits, write_ranked,
+                            SCREEN_COLS, RANKED_COLS)
+from aimless import screen as screen_mod
+
+BASINS = {RC1_LOW_A_KEY: 2.75, RC1_HIGH_A_KEY: 10.0, RC2_LOW_A_KEY: 0.0,
+          RC2_HIGH_A_KEY: 1.9, RC1_LOW_B_KEY: 0.0, RC1_HIGH_B_KEY: 2.0,
+          RC2_LOW_B_KEY: 3.0, RC2_HIGH_B_KEY: 10.0}
+
+
+def make_points(num_points=2000, seed=7):
+    "Returns points whose outcomes depend on the first two of four CVs."
+    rng = np.random.RandomState(seed)
+    cvs = rng.normal(size=(num_points, 4))
+    p_b = committor(0.3 + 1.5 * cvs[:, 0] - 0.8 * cvs[:, 1])
+    n_b = rng.binomial(2, p_b)
+    return ShootingPoints(cvs, ["d1", "d2", "n1", "n2"], 2 - n_b, n_b)
+
+
+class TestScreen(unittest.TestCase):
+    def setUp(self):
+        self.points = make_points()
+
+    def test_subsets(self):
+        subsets = cv_subsets(4, 3)
+        self.assertEqual(4 + 6 + 4, len(subsets))
+        self.assertEqual((0,), subsets[0])
+        self.assertEqual((1, 2, 3), subsets[-1])
+        self.assertEqual(3, len(cv_subsets(3, 1)))
+        self.assertEqual(7, len(cv_subsets(3, 5)))
+
+    def test_serial(self):
+        tgt = StringIO.StringIO()
+        fits = screen(self.points, max_cvs=2, processes=1, tgt=tgt)
+        self.assertEqual(10, len(fits))
+        rows = list(csv.reader(StringIO.StringIO(tgt.getvalue())))
+        self.assertEqual(SCREEN_COLS, rows[0])
+        self.assertEqual(11, len(rows))
+        best = rank_fits(fits)[0]
+        self.assertEqual(1, best[0])
+        self.assertEqual(["d1", "d2"], best[2].names)
+
+    def test_pool(self):
+        fits = screen(self.points, max_cvs=3, processes=2)
+        self.assertEqual(14, len(fits))
+        expected = fit_committor(self.points.columns(["d1", "n2"]),
+                                 self.points.n_a, self.points.n_b)
+        found = [fit for fit in fits if fit.names == ["d1", "n2"]][0]
+        self.assertAlmostEqual(expected.loglike, found.loglike)
+        ranked = rank_fits(fits)
+        self.assertEqual(["d1", "d2"], ranked[0][2].names)
+        # Adding a CV never lowers ln L, so BIC is needed to pick two
+        self.assertEqual(3, len(max(fits, key=lambda fit: fit.loglike).names))
+
+    def test_write_ranked(self):
+        tgt = StringIO.StringIO()
+        write_ranked(screen(self.points, max_cvs=1, processes=1), tgt,
+                     linesep='\n')
+        rows = list(csv.reader(StringIO.StringIO(tgt.getvalue())))
+        self.assertEqual(RANKED_COLS, rows[0])
+        self.assertEqual(["1", "1", "d1"], rows[1][:3])
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _write_cfg(self, basins):
+        cfg_loc = os.path.join(self.tgt_dir, "aimless.ini")
+        with open(cfg_loc, 'w') as cfg_file:
+            cfg_file.write("[main]\ntgtdir = %s\n[basins]\n" % self.tgt_dir)
+            for key, val in sorted(basins.items()):
+                cfg_file.write("%s = %s\n" % (key, val))
+        return cfg_loc
+
+    def test_main(self):
+        out_dir = os.path.join(self.tgt_dir, "output")
+        for pnum, (point, end) in enumerate([((2.0, 5.0), (4.0, 1.0)),
+                                             ((2.2, 5.0), (4.0, 1.0)),
+                                             ((2.4, 5.0), (1.0, 4.0)),
+                                             ((2.6, 5.0), (1.0, 4.0))]):
+            path_dir = os.path.join(out_dir, "%02d" % (pnum + 1))
+            os.makedirs(path_dir)
+            for cons_name, rcs in (("cons_dt.dat", point),
+                                   ("cons_fwd.dat", end),
+                                   ("cons_back.dat", (2.5, 2.5))):
+                with open(os.path.join(path_dir, cons_name), 'w') as cons:
+                    cons.write("9 %s %s\n" % rcs)
+        out_file = os.path.join(self.tgt_dir, "screen.csv")
+        ranked_file = os.path.join(self.tgt_dir, "ranked.csv")
+        stdout = StringIO.StringIO()
+        with patch('sys.stdout', stdout):
+            self.assertEqual(0, screen_mod.main(
+                ["-c", self._write_cfg(BASINS), "-p", "1", "-o", out_file,
+                 "-r", ranked_file]))
+        with open(ranked_file) as ranked:
+            rows = list(csv.reader(ranked))
+        self.assertEqual(4, len(rows))
+        self.assertTrue(os.path.exists(out_file))
+        self.assertTrue("RC1+RC2" in stdout.getvalue())
+
+    def test_store(self):
+        cvset = CvSet([('d1', 'distance 1 2'), ('d2', 'distance 1 3')])
+        pres = {}
+        for pnum, (d1, basin) in enumerate([(1.0, BRES.A), (1.5, BRES.A),
+                                            (2.0, BRES.B), (2.5, BRES.B)]):
+            pres[pnum + 1] = {BASIN_FWD_KEY: basin, BASIN_BACK_KEY: basin,
+                              'd1': d1, 'd2': 3.0 - d1 / 2}
+        store_loc = os.path.join(self.tgt_dir, "cvs.rec")
+        ResultStore(store_loc, cv_dtype(cvset)).start(pres)
+        ranked_file = os.path.join(self.tgt_dir, "ranked.csv")
+        stdout = StringIO.StringIO()
+        with patch('sys.stdout', stdout):
+            self.assertEqual(0, screen_mod.main(
+                ["-c", self._write_cfg({}), "-s", store_loc, "-p", "1",
+                 "-o", os.path.join(self.tgt_dir, "screen.csv"),
+                 "-r", ranked_file]))
+        self.assertTrue("d1+d2" in stdout.getvalue())
+
+    def test_no_points(self):
+        out_dir = os.path.join(self.tgt_dir, "output")
+        os.makedirs(out_dir)
+        self.assertEqual(1, screen_mod.main(
+            ["-c", self._write_cfg(BASINS), "-d", out_dir]))
+
+    def test_no_basins(self):
+        self.assertEqual(1, screen_mod.main(
+            ["-c", self._write_cfg({}), "-d", self.tgt_dir]))
+
+    def test_bad_args(self):
+        with self.assertRaises(SystemExit):
+            screen_mod.parse_cmdline(["-m", "0"])
@@ -0,0 +1,174 @@
+import os
+import shutil
+import tempfile
+import unittest
+from mock import Mock
+from aimless.common import STATES
+from aimless.sqlrepo import SqliteJobRepo, batches, ACTIVE_SQL
+from aimless.torque import TorqueJob, JobStatus, JobWatcher
+
+
+def make_jobs(count):
+    return [TorqueJob(name="job%d" % num, contents="echo %d" % num)
+            for num in range(count)]
+
+
+class TestSqliteJobRepo(unittest.TestCase):
+    "Tests saving jobs and tracking their statuses."
+
+    def setUp(self):
+        self.repo = SqliteJobRepo()
+
+    def tearDown(self):
+        self.repo.close()
+
+    def _submit(self, job, job_id):
+        stat = JobStatus.from_job(job)
+        stat.job_id = job_id
+        stat.job_state = STATES.SUBMITTED
+        stat.version = 1
+        return self.repo.update_statuses([stat])
+
+    def test_save(self):
+        jobs = make_jobs(3)
+        jobs[1].depends = [11, 12]
+        self.repo.save_jobs(jobs)
+        self.assertEqual([1, 2, 3], [job.sub_id for job in jobs])
+        saved = self.repo.get_saved_jobs()
+        self.assertEqual(jobs, saved)
+        self.assertEqual([11, 12], saved[1].depends)
+        self.assertEqual([], self.repo.get_active_statuses())
+
+    def test_submit(self):
+        jobs = make_jobs(2)
+        self.repo.save_jobs(jobs)
+        self.assertEqual(1, self._submit(jobs[0], 101))
+        self.assertEqual([jobs[1]], self.repo.get_saved_jobs())
+        stats = self.repo.get_active_statuses()
+        self.assertEqual(1, len(stats))
+        self.assertEqual(101, stats[0].job_id)
+        self.assertEqual(STATES.SUBMITTED, stats[0].job_state)
+        self.assertEqual("job0", stats[0].name)
+        self.assertEqual(2, stats[0].version)
+
+    def test_array_id(self):
+        jobs = make_jobs(1)
+        self.repo.save_jobs(jobs)
+        self._submit(jobs[0], "101[]")
+        self.assertEqual("101[]", self.repo.get_active_statuses()[0].job_id)
+
+    def test_unchanged_skipped(self):
+        jobs = make_jobs(1)
+        self.repo.save_jobs(jobs)
+        self._submit(jobs[0], 101)
+        stats = self.repo.get_active_statuses()
+        self.assertEqual(0, self.repo.update_statuses(stats))
+        self.assertEqual(2, self.repo.get_active_statuses()[0].version)
+
+    def test_stale_skipped(self):
+        jobs = make_jobs(1)
+        self.repo.save_jobs(jobs)
+        self._submit(jobs[0], 101)
+        first = self.repo.get_active_statuses()[0]
+        second = self.repo.get_active_statuses()[0]
+        first.job_state = STATES.RUNNING
+        self.assertEqual(1, self.repo.update_statuses([first]))
+        self.assertEqual(3, first.version)
+        second.job_state = STATES.COMPLETED
+        self.assertEqual(0, self.repo.update_statuses([second]))
+        self.assertEqual(STATES.RUNNING,
+                         self.repo.get_active_statuses()[0].job_state)
+
+    def test_completed_inactive(self):
+        jobs = make_jobs(2)
+        self.repo.save_jobs(jobs)
+        self._submit(jobs[0], 101)
+        self._submit(jobs[1], 102)
+        stats = self.repo.get_active_statuses()
+        stats[0].job_state = STATES.COMPLETED
+        self.repo.update_statuses(stats)
+        self.assertEqual([102], [stat.job_id for stat in
+                                 self.repo.get_active_statuses()])
+        self.assertEqual([101], [stat.job_id for stat in
+                                 self.repo.get_statuses([101])])
+
+    def test_many(self):
+        jobs = make_jobs(1200)
+        self.repo.save_jobs(jobs)
+        stats = []
+        for job in jobs:
+            stat = JobStatus.from_job(job)
+            stat.job_id = job.sub_id + 1000
+            stat.job_state = STATES.QUEUED
+            stat.version = 1
+            stats.append(stat)
+        self.assertEqual(1200, self.repo.update_statuses(stats))
+        self.assertEqual(1200, len(self.repo.get_active_statuses()))
+        self.assertEqual(1200, len(self.repo.get_statuses(
+            [stat.job_id for stat in stats])))
+
+    def test_active_uses_index(self):
+        jobs = make_jobs(50)
+        self.repo.save_jobs(jobs)
+        self._submit(jobs[0], 101)
+        for analyzed in (False, True):
+            if analyzed:
+                self.repo.conn.execute("ANALYZE")
+            plan = " ".join(row[-1] for row in self.repo.conn.execute(
+                "EXPLAIN QUERY PLAN " + ACTIVE_SQL))
+            # Only the partial index of active jobs is walked
+            self.assertIn("USING INDEX jobs_active", plan)
+        self.assertEqual([101], [stat.job_id for stat in
+                                 self.repo.get_active_statuses()])
+
+    def test_batches(self):
+        self.assertEqual([[1, 2], [3]], list(batches([1, 2, 3], 2)))
+
+
+class TestSqliteJobRepoFile(unittest.TestCase):
+    "Tests that jobs persist in a database file."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.db_loc = os.path.join(self.tgt_dir, "jobs.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def test_reopen(self):
+        repo = SqliteJobRepo(self.db_loc)
+        jobs = make_jobs(2)
+        repo.save_jobs(jobs)
+        repo.close()
+        repo = SqliteJobRepo(self.db_loc)
+        try:
+            self.assertEqual(jobs, repo.get_saved_jobs())
+        finally:
+            repo.close()
+
+
+class TestJobWatcher(unittest.TestCase):
+    "Tests JobWatcher running against the SQLite repository."
+
+    def setUp(self):
+        self.repo = SqliteJobRepo()
+        self.handler = Mock()
+        self.handler.submit.side_effect = [101, 102]
+        self.watcher = JobWatcher(self.repo, self.handler)
+
+    def tearDown(self):
+        self.repo.close()
+
+    def test_lifecycle(self):
+        self.repo.save_jobs(make_jobs(2))
+        self.watcher.submit_saved()
+        self.assertEqual([], self.repo.get_saved_jobs())
+        self.handler.stat_jobs.return_value = {
+            101: JobStatus(job_id=101, job_state=STATES.RUNNING)}
+        self.watcher.update_incomplete()
+        stats = self.repo.get_active_statuses()
+        self.assertEqual([(101, STATES.RUNNING)],
+                         [(stat.job_id, stat.job_state) for stat in stats])
+        self.handler.stat_jobs.return_value = {}
+        self.watcher.update_incomplete()
+        self.assertEqual([], self.repo.get_active_statuses())
@@ -0,0 +1,81 @@
+import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from aimless.timing import (PathTimings, read_sentinel_times,
+                            write_timings_csv, TIMINGS_KEY)
+from aimless.torque import JobStatus
+
+
+class FakeClock(object):
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestPathTimings(unittest.TestCase):
+    "Tests recording phase and job timings."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.done_loc = os.path.join(self.tgt_dir, "forward.done")
+        self.clock = FakeClock()
+        self.timings = PathTimings(clock=self.clock)
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _write_done(self, contents):
+        with open(self.done_loc, 'w') as done_file:
+            done_file.write(contents)
+
+    def test_phase(self):
+        with self.timings.phase("dt"):
+            self.clock.now += 2.5
+        self.assertEqual({'dt_wall': 2.5}, self.timings.as_dict())
+
+    def test_sentinel_times(self):
+        self._write_done("0 100 160\n")
+        self.assertEqual((100, 160), read_sentinel_times(self.done_loc))
+
+    def test_status_only(self):
+        self._write_done("0\n")
+        self.assertEqual((None, None), read_sentinel_times(self.done_loc))
+
+    def test_missing(self):
+        self.assertEqual((None, None), read_sentinel_times(self.done_loc))
+
+    def test_add_job(self):
+        self._write_done("0 100 160\n")
+        self.timings.add_job("forward", 90, self.done_loc, noticed=165)
+        self.assertEqual({'forward_queue': 10, 'forward_run': 60,
+                          'forward_slack': 5}, self.timings.as_dict())
+
+    def test_add_job_stat(self):
+        self._write_done("0\n")
+        os.utime(self.done_loc, (160, 160))
+        stat = JobStatus(qtime=datetime.fromtimestamp(95),
+                         start_time=datetime.fromtimestamp(100))
+        self.timings.add_job("forward", 90, self.done_loc, stat=stat,
+                             noticed=165)
+        self.assertEqual({'forward_queue': 5, 'forward_run': 60,
+                          'forward_slack': 5}, self.timings.as_dict())
+
+
+class TestTimingsCsv(unittest.TestCase):
+    def test_write(self):
+        out = StringIO.StringIO()
+        write_timings_csv({1: {TIMINGS_KEY: {'total_wall': 12.0,
+                                             'other_wall': 1.0}},
+                           2: {}}, out, linesep="\n")
+        lines = out.getvalue().splitlines()
+        header = lines[0].split(",")
+        self.assertEqual(["path", "total_wall"], header[:2])
+        self.assertEqual("other_wall", header[-1])
+        self.assertEqual(["1", "12.000"], lines[1].split(",")[:2])
+        self.assertEqual("1.000", lines[1].split(",")[-1])
+        self.assertEqual(["2", ""], lines[2].split(",")[:2])
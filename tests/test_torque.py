@@ -0,0 +1,163 @@
+import unittest
+from mock import MagicMock
+from aimless.common import STATES
+import xml.etree.ElementTree as et
+from aimless.torque import (CachedStatusHandler, JobStatus, TorqueJob,
+                            TorqueSubmissionHandler, parse_id, array_job_ids)
+from aimless.common import OutputParsingError
+
+TEST_ID = 11
+TEST_ID2 = 22
+TEST_ID3 = 33
+
+
+class TestCachedStatusHandler(unittest.TestCase):
+    "Tests sharing batched status queries between waiters."
+
+    def setUp(self):
+        self.now = [1000.0]
+        self.handler = MagicMock()
+        self.cache = CachedStatusHandler(self.handler, ttl=10,
+                                         clock=lambda: self.now[0])
+        self.running = JobStatus(job_id=TEST_ID, job_state=STATES.RUNNING)
+        self.running2 = JobStatus(job_id=TEST_ID2, job_state=STATES.RUNNING)
+
+    def test_shared(self):
+        self.handler.stat_jobs.return_value = {TEST_ID: self.running,
+                                               TEST_ID2: self.running2}
+        self.cache.stat_jobs([TEST_ID])
+        self.cache.stat_jobs([TEST_ID2])
+        self.assertEqual({TEST_ID2: self.running2},
+                         self.cache.stat_jobs([TEST_ID2]))
+        self.assertEqual({TEST_ID: self.running},
+                         self.cache.stat_jobs([TEST_ID]))
+        # One refresh for the first ID, one when the second ID appeared
+        self.assertEqual(2, self.handler.stat_jobs.call_count)
+        self.assertEqual([TEST_ID, TEST_ID2],
+                         self.handler.stat_jobs.call_args[0][0])
+
+    def test_ttl(self):
+        self.handler.stat_jobs.return_value = {TEST_ID: self.running}
+        self.cache.stat_jobs([TEST_ID])
+        self.now[0] += 5
+        self.cache.stat_jobs([TEST_ID])
+        self.assertEqual(1, self.handler.stat_jobs.call_count)
+        self.now[0] += 5
+        self.cache.stat_jobs([TEST_ID])
+        self.assertEqual(2, self.handler.stat_jobs.call_count)
+
+    def test_finished_dropped(self):
+        self.handler.stat_jobs.side_effect = [
+            {TEST_ID: self.running, TEST_ID2: self.running2},
+            {TEST_ID: self.running}]
+        self.cache.stat_jobs([TEST_ID, TEST_ID2])
+        self.now[0] += 10
+        self.assertEqual({}, self.cache.stat_jobs([TEST_ID2]))
+        self.now[0] += 10
+        self.handler.stat_jobs.side_effect = None
+        self.handler.stat_jobs.return_value = {}
+        self.cache.stat_jobs([TEST_ID3])
+        self.assertEqual([TEST_ID, TEST_ID3],
+                         self.handler.stat_jobs.call_args[0][0])
+
+    def test_submit(self):
+        self.handler.submit.return_value = TEST_ID
+        self.assertEqual(TEST_ID, self.cache.submit("job"))
+
+    def test_cancel(self):
+        self.cache.cancel(TEST_ID)
+        self.handler.cancel.assert_called_once_with(TEST_ID)
+
+
+class TestSubmitCmd(unittest.TestCase):
+    "Tests qsub command creation."
+
+    def setUp(self):
+        self.handler = TorqueSubmissionHandler()
+
+    def test_basic(self):
+        cmd = self.handler.create_submit_cmd(TorqueJob(name="test"))
+        self.assertEqual(["qsub", "-V", "-N", "test", "-o", "/dev/null",
+                          "-e", "/dev/null", "-q", "batch",
+                          "-l", "walltime=999:00:00", "-l", "nodes=1"], cmd)
+
+    def test_depends(self):
+        job = TorqueJob(name="test")
+        job.depends = [TEST_ID, TEST_ID2]
+        cmd = self.handler.create_submit_cmd(job)
+        self.assertEqual(["-W", "depend=afterok:%d:%d" % (TEST_ID, TEST_ID2)],
+                         cmd[-2:])
+
+    def test_array(self):
+        job = TorqueJob(name="test")
+        job.array = "1-4"
+        cmd = self.handler.create_submit_cmd(job)
+        self.assertEqual(["-t", "1-4"], cmd[-2:])
+
+
+class TestParseId(unittest.TestCase):
+    "Tests job ID parsing."
+
+    def test_plain(self):
+        self.assertEqual(123, parse_id("123.host\n"))
+
+    def test_array(self):
+        self.assertEqual("123[]", parse_id("123[].host\n"))
+
+    def test_array_job(self):
+        self.assertEqual("123[4]", parse_id("123[4].host"))
+
+    def test_bad(self):
+        with self.assertRaises(OutputParsingError):
+            parse_id("abc.host")
+
+    def test_array_job_ids(self):
+        self.assertEqual(["123[1]", "123[2]"], array_job_ids("123[]", [1, 2]))
+
+    def test_xml(self):
+        entry = et.fromstring("<Data><Job><Job_Id>123[4].host</Job_Id>"
+                              "<job_state>R</job_state></Job></Data>")
+        stat = JobStatus.from_xml(entry)
+        self.assertEqual("123[4]", stat.job_id)
+        self.assertEqual(STATES.RUNNING, stat.job_state)
+
+
+class TestStatJobs(unittest.TestCase):
+    "Tests qstat command creation and parsing."
+
+    def setUp(self):
+        self.proc = MagicMock()
+        self.proc.communicate.return_value = (
+            "<Data><Job><Job_Id>123[1].host</Job_Id><job_state>C</job_state>"
+            "</Job></Data>", "")
+        self.pipe_cmd = MagicMock(return_value=self.proc)
+        self.handler = TorqueSubmissionHandler(pipe_cmd=self.pipe_cmd)
+
+    def test_array(self):
+        stats = self.handler.stat_jobs(["123[1]", "123[2]"])
+        self.assertEqual(["qstat", "-x", "-t", "123[1]", "123[2]"],
+                         self.pipe_cmd.call_args[0][0])
+        self.assertEqual(STATES.COMPLETED, stats["123[1]"].job_state)
+
+    def test_plain(self):
+        self.handler.stat_jobs([TEST_ID])
+        self.assertEqual(["qstat", "-x", str(TEST_ID)],
+                         self.pipe_cmd.call_args[0][0])
+
+
+class TestCancel(unittest.TestCase):
+    "Tests qdel command creation."
+
+    def setUp(self):
+        self.proc = MagicMock()
+        self.pipe_cmd = MagicMock(return_value=self.proc)
+        self.handler = TorqueSubmissionHandler(pipe_cmd=self.pipe_cmd)
+
+    def test_cancel(self):
+        self.proc.communicate.return_value = ("", "")
+        self.handler.cancel(TEST_ID)
+        self.assertEqual(["qdel", str(TEST_ID)], self.pipe_cmd.call_args[0][0])
+
+    def test_cancel_finished(self):
+        self.proc.communicate.return_value = ("", "qdel: Unknown Job Id")
+        self.handler.cancel(TEST_ID)
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from aimless.watch import FileWatcher, read_exit_status, all_exist
+
+
+class TestFileWatcher(unittest.TestCase):
+    "Tests waiting on completion sentinels."
+
+    def setUp(self):
+        self.tgt_dir = tempfile.mkdtemp()
+        self.done_loc = os.path.join(self.tgt_dir, "test.done")
+
+    def tearDown(self):
+        shutil.rmtree(self.tgt_dir)
+
+    def _write_done(self, status="0"):
+        with open(self.done_loc, 'w') as done_file:
+            done_file.write(status + "\n")
+
+    def test_exists(self):
+        self._write_done()
+        self.assertTrue(FileWatcher().wait([self.done_loc], 0))
+
+    def test_timeout(self):
+        self.assertFalse(FileWatcher(poll_secs=.001).wait([self.done_loc],
+                                                          .01))
+
+    def test_appears(self):
+        timer = threading.Timer(.05, self._write_done)
+        timer.start()
+        try:
+            self.assertTrue(FileWatcher().wait([self.done_loc], 10))
+        finally:
+            timer.join()
+
+    def test_appears_stat(self):
+        timer = threading.Timer(.05, self._write_done)
+        timer.start()
+        try:
+            watcher = FileWatcher(poll_secs=.01, use_inotify=False)
+            self.assertTrue(watcher.wait([self.done_loc], 10))
+        finally:
+            timer.join()
+
+    def _kernel_watches(self, watcher):
+        "Returns the number of watches the kernel holds for the watcher."
+        fdinfo = "/proc/self/fdinfo/%d" % watcher.inotify.fd
+        with open(fdinfo) as info:
+            return sum(1 for line in info if line.startswith("inotify wd:"))
+
+    def test_unwatched(self):
+        watcher = FileWatcher(poll_secs=.001)
+        if not watcher.inotify:
+            self.skipTest("inotify is not available")
+        try:
+            self.assertFalse(watcher.wait([self.done_loc], .01))
+            self.assertEqual({}, watcher.inotify.watched)
+            self.assertEqual(0, self._kernel_watches(watcher))
+        finally:
+            watcher.close()
+
+    def test_recreated_dir(self):
+        watcher = FileWatcher(poll_secs=5)
+        if not watcher.inotify:
+            self.skipTest("inotify is not available")
+        try:
+            self.assertFalse(watcher.wait([self.done_loc], .01))
+            shutil.rmtree(self.tgt_dir)
+            os.mkdir(self.tgt_dir)
+            timer = threading.Timer(.05, self._write_done)
+            timer.start()
+            try:
+                start = time.time()
+                self.assertTrue(watcher.wait([self.done_loc], 10))
+                # Woken by the new directory's watch, not the stat poll
+                self.assertTrue(time.time() - start < 2)
+            finally:
+                timer.join()
+        finally:
+            watcher.close()
+
+    def test_all_exist(self):
+        self._write_done()
+        self.assertFalse(all_exist([self.done_loc, self.done_loc + "x"]))
+
+    def test_status(self):
+        self._write_done("271")
+        self.assertEqual(271, read_exit_status(self.done_loc))
+
+    def test_status_missing(self):
+        self.assertIsNone(read_exit_status(self.done_loc))